@@ -0,0 +1,89 @@
+"""
+API Benchmark
+Requests per second of the scoring endpoints, served in-process over ASGI
+(no network in the way), with a fixed number of requests in flight.
+
+Run with:
+    python -m app.api.benchmark --requests 2000 --concurrency 64
+    python -m app.api.benchmark --endpoints bulk-scoring --requests 200
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.ml.risk_grid import DEFAULT_BOUNDS
+
+BULK_PROPERTIES = 1000
+
+
+def _location(rng: np.random.Generator) -> Dict:
+    """Random location in the default coverage"""
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+    return {
+        "latitude": float(rng.uniform(min_lat, max_lat)),
+        "longitude": float(rng.uniform(min_lon, max_lon)),
+    }
+
+
+# Path and payload factory per endpoint
+ENDPOINTS: Dict[str, tuple] = {
+    "score": ("/score", _location),
+    "forecast": ("/forecast", lambda rng: dict(_location(rng), years=[5, 10, 20])),
+    "bulk-scoring": (
+        "/bulk-scoring",
+        lambda rng: {"properties": [_location(rng) for _ in range(BULK_PROPERTIES)]},
+    ),
+}
+
+
+async def measure(app, path: str, payloads: List[Dict], concurrency: int) -> float:
+    """Requests per second posting every payload with `concurrency` in flight"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        pending = iter(payloads)
+        
+        async def worker():
+            for payload in pending:
+                response = await client.post(path, json=payload)
+                response.raise_for_status()
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return len(payloads) / (time.perf_counter() - started)
+
+
+def main():
+    """Command-line entry point for the API benchmark"""
+    parser = argparse.ArgumentParser(description="Measure scoring endpoint throughput")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=["score", "bulk-scoring"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--no-fast-json",
+        action="store_true",
+        help="Leave responses to FastAPI's response_model handling (FAST_JSON_RESPONSES off)",
+    )
+    args = parser.parse_args()
+    if args.no_fast_json:
+        settings.FAST_JSON_RESPONSES = False
+    
+    from app.main import app
+    
+    rng = np.random.default_rng(0)
+    for name in args.endpoints:
+        path, payload = ENDPOINTS[name]
+        requests = args.requests if name != "bulk-scoring" else max(1, args.requests // 10)
+        payloads = [payload(rng) for _ in range(requests)]
+        # Warm up models and caches of the code path
+        asyncio.run(measure(app, settings.API_V1_PREFIX + path, payloads[:args.concurrency], args.concurrency))
+        rate = asyncio.run(measure(app, settings.API_V1_PREFIX + path, payloads, args.concurrency))
+        print(f"{name:<14} {requests:>6} requests  {rate:>9.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Shared FastAPI dependencies
+"""
+from typing import Optional
+
+from app.core.config import settings
+from app.ml.executor import ScoringExecutor, get_scoring_executor
+from app.ml.property_clusters import PropertyClusters, get_property_clusters
+from app.ml.registry import get_model_registry
+from app.ml.score_cache import CachedEnsembleScorer
+from app.ml.tile_store import TileStore, get_tile_store
+from app.tasks.jobs import JobStore, get_job_store
+
+
+def get_scorer() -> CachedEnsembleScorer:
+    """Process-wide ensemble scorer, cached on the score cache grid"""
+    return get_model_registry().cached_scorer()
+
+
+def get_bulk_scorer() -> CachedEnsembleScorer:
+    """Process-wide ensemble scorer, cached on the bulk scoring grid"""
+    return get_model_registry().cached_scorer(settings.BULK_GRID_RESOLUTION)
+
+
+def get_executor() -> ScoringExecutor:
+    """Process-wide executor endpoints run blocking scoring on"""
+    return get_scoring_executor()
+
+
+def get_jobs() -> JobStore:
+    """Store of bulk scoring jobs, shared with the Celery workers"""
+    return get_job_store()
+
+
+def get_tiles() -> Optional[TileStore]:
+    """Store of rendered risk map tiles (None when RISK_TILE_STORE_ENABLED is off)"""
+    if not settings.RISK_TILE_STORE_ENABLED:
+        return None
+    return get_tile_store()
+
+
+def get_clusters() -> Optional[PropertyClusters]:
+    """Per-tenant property cluster indexes (None when PROPERTY_CLUSTERS_ENABLED is off)"""
+    if not settings.PROPERTY_CLUSTERS_ENABLED:
+        return None
+    return get_property_clusters()
@@ -0,0 +1,63 @@
+"""
+Fast JSON responses
+Endpoints build their response model once (that is the validation) and
+return it through `model_response`, which serializes it straight to JSON.
+FastAPI would otherwise dump the returned model, validate it again against
+`response_model` and encode it with the stdlib `json`. The `response_model`
+declared on each route still describes the response in the OpenAPI schema.
+"""
+import json
+from typing import Any
+
+import numpy as np
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional: plain content falls back to the stdlib json
+    orjson = None
+
+
+def _numpy_default(value: Any) -> Any:
+    """stdlib json fallback for NumPy arrays and scalars"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered without re-validation
+    
+    Pydantic models are serialized by pydantic-core; other content by orjson
+    (NumPy arrays and scalars included) when it is installed.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return pydantic_core.to_json(content)
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=_numpy_default,
+        ).encode("utf-8")
+
+
+def model_response(model: BaseModel):
+    """
+    Response for a model the endpoint has just validated
+    
+    Rendered directly with FAST_JSON_RESPONSES, otherwise returned as is for
+    FastAPI's `response_model` handling.
+    """
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse(model)
+    return model
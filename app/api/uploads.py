@@ -0,0 +1,35 @@
+"""
+Upload helpers shared by the endpoints that take portfolio files as the
+request body
+"""
+import tempfile
+from typing import BinaryIO
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+
+
+def request_media_type(request: Request) -> str:
+    """Media type of the request body, without parameters"""
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+async def spool_upload(request: Request) -> BinaryIO:
+    """
+    Copy the request body to a temporary file as it arrives
+    
+    Columnar formats are read from a seekable file (Parquet keeps its
+    metadata at the end), so they are spooled to disk rather than memory.
+    
+    Returns:
+        Temporary file positioned at the start, removed when closed
+    """
+    file = tempfile.TemporaryFile()
+    try:
+        async for data in request.stream():
+            await run_in_threadpool(file.write, data)
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+    return file
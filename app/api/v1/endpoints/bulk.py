@@ -2,17 +2,41 @@
 Bulk Scoring Endpoint for Enterprise Users
 Allows scoring multiple properties in a single request
 """
-from fastapi import APIRouter, HTTPException
-from typing import List
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive
+from typing import AsyncIterator, Dict, List, Optional, Union
 from pydantic import BaseModel, Field
+import numpy as np
+import pyarrow as pa
 
-from app.db.schemas.score import ScoreResponse, RiskBreakdown
+from app.api.deps import get_bulk_scorer, get_executor
+from app.api.responses import model_response
+from app.api.uploads import request_media_type, spool_upload
+from app.core.config import settings
 from app.ml.ensemble import EnsembleScorer
+from app.ml.executor import ScoringExecutor
+from app.ml.portfolio import PortfolioScorer, deduplicate_cells, score_chunk
+from app.ml.portfolio_formats import (
+    ARROW,
+    COLUMNAR_MEDIA_TYPES,
+    MEDIA_TYPES,
+    PARQUET,
+    create_reader,
+    create_writer,
+    extract_coordinates,
+    negotiate_media_type,
+    read_batches,
+    score_rows,
+    score_table,
+    table_coordinates,
+)
+from app.ml.score_cache import CachedEnsembleScorer
 
 router = APIRouter()
 
-ensemble_scorer = EnsembleScorer()
-
 
 class PropertyLocation(BaseModel):
     """Single property location for bulk scoring"""
@@ -32,11 +56,24 @@ class BulkScoreResponse(BaseModel):
     total_properties: int
     successful: int
     failed: int
+    deduplicated: int = Field(
+        default=0,
+        description="Rows served from a grid cell already scored in this request"
+    )
     scores: List[dict]
 
 
-@router.post("/bulk-scoring", response_model=BulkScoreResponse)
-async def bulk_score(request: BulkScoreRequest):
+@router.post(
+    "/bulk-scoring",
+    response_model=BulkScoreResponse,
+    responses={200: {"content": {ARROW: {}, PARQUET: {}}}},
+)
+async def bulk_score(
+    request: BulkScoreRequest,
+    http_request: Request,
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_bulk_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+):
     """
     Score multiple properties in bulk
     
@@ -44,6 +81,13 @@ async def bulk_score(request: BulkScoreRequest):
     
     Useful for banks, insurance companies, and real estate platforms
     that need to assess multiple properties at once.
+    
+    Coordinates are snapped to a grid of `BULK_GRID_RESOLUTION` degrees and
+    each distinct cell is scored once, so clustered portfolios are cheap.
+    
+    With `Accept: application/vnd.apache.arrow.stream` or
+    `application/vnd.apache.parquet` the scores come back as one flat table
+    (property_id, latitude, longitude, score columns) instead of JSON.
     """
     if len(request.properties) > 1000:
         raise HTTPException(
@@ -51,47 +95,268 @@ async def bulk_score(request: BulkScoreRequest):
             detail="Maximum 1000 properties per request"
         )
     
+    properties = request.properties
+    count = len(properties)
+    latitudes = np.fromiter((prop.latitude for prop in properties), dtype=float, count=count)
+    longitudes = np.fromiter((prop.longitude for prop in properties), dtype=float, count=count)
+    
+    output_type = negotiate_media_type(
+        http_request.headers.get("accept"), COLUMNAR_MEDIA_TYPES, "application/json"
+    )
+    if output_type in COLUMNAR_MEDIA_TYPES:
+        table = pa.table({
+            "property_id": [prop.property_id for prop in properties],
+            "latitude": latitudes,
+            "longitude": longitudes,
+        })
+        results = await executor.run(score_chunk, ensemble_scorer, latitudes, longitudes)
+        scored = score_table(table, results, np.full(count, None, dtype=object))
+        writer = create_writer(output_type)
+        return Response(writer.write_table(scored) + writer.close(), media_type=output_type)
+    
+    cell_latitudes, cell_longitudes, inverse = deduplicate_cells(
+        latitudes, longitudes, settings.BULK_GRID_RESOLUTION
+    )
+    cell_results = await _score_cells(
+        ensemble_scorer, executor, cell_latitudes, cell_longitudes
+    )
+    
+    # Scatter cell results back to the input rows
     scores = []
     successful = 0
     failed = 0
     
-    for prop in request.properties:
-        try:
-            # Calculate score
-            result = ensemble_scorer.calculate_score(
-                latitude=prop.latitude,
-                longitude=prop.longitude,
-                property_type=prop.property_type,
-            )
-            
-            # Format response
-            score_data = {
-                "property_id": prop.property_id or "",
-                "latitude": prop.latitude,
-                "longitude": prop.longitude,
-                "clima_risk_score": result['clima_risk_score'],
-                "risk_breakdown": result['risk_breakdown'],
-                "risk_level": result['risk_level'],
-                "confidence": result['confidence'],
-                "calculated_at": result['calculated_at'],
-            }
-            
-            scores.append(score_data)
-            successful += 1
-        
-        except Exception as e:
+    for prop, cell in zip(properties, inverse.tolist()):
+        result = cell_results[cell]
+        row = {
+            "property_id": prop.property_id or "",
+            "latitude": prop.latitude,
+            "longitude": prop.longitude,
+        }
+        if "error" in result:
             failed += 1
-            scores.append({
-                "property_id": prop.property_id or "",
-                "latitude": prop.latitude,
-                "longitude": prop.longitude,
-                "error": str(e)
-            })
-    
-    return BulkScoreResponse(
-        total_properties=len(request.properties),
+        else:
+            successful += 1
+        row.update(result)
+        scores.append(row)
+    
+    return model_response(BulkScoreResponse(
+        total_properties=count,
         successful=successful,
         failed=failed,
+        deduplicated=count - len(cell_results),
         scores=scores,
+    ))
+
+
+class _UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body is produced while the request is still read
+    
+    StreamingResponse listens for a disconnect from the start, which would
+    consume the upload itself; this waits until the body has read it all.
+    """
+    
+    def __init__(self, content, upload_read: asyncio.Event, **kwargs):
+        super().__init__(content, **kwargs)
+        self.upload_read = upload_read
+    
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        await self.upload_read.wait()
+        await super().listen_for_disconnect(receive)
+
+
+@router.post(
+    "/bulk-scoring/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in MEDIA_TYPES}}},
+)
+async def bulk_score_stream(
+    request: Request,
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_bulk_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+):
+    """
+    Score a portfolio of any size as a stream
+    
+    Send NDJSON (`Content-Type: application/x-ndjson`, one object with
+    `latitude` and `longitude` per line), CSV (`text/csv` with a header
+    row), an Arrow IPC stream (`application/vnd.apache.arrow.stream`) or
+    Parquet (`application/vnd.apache.parquet`). Other fields are passed
+    through. Rows come back in input order, in any of these formats per the
+    `Accept` header (the input format by default), with score columns or an
+    `error` per row.
+    
+    Row formats are parsed as they arrive; columnar uploads are spooled to
+    disk and read back batch by batch. Either way rows are scored in chunks
+    of `PORTFOLIO_CHUNK_SIZE`, so memory stays flat however large the upload.
+    """
+    input_type = request_media_type(request)
+    if input_type not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Send one of: {', '.join(MEDIA_TYPES)}"
+        )
+    output_type = negotiate_media_type(request.headers.get("accept"), MEDIA_TYPES, input_type)
+    if output_type is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Can respond with: {', '.join(MEDIA_TYPES)}"
+        )
+    chunk_size = settings.PORTFOLIO_CHUNK_SIZE
+    upload_read = asyncio.Event()
+    reader = create_reader(input_type)
+    
+    if input_type in COLUMNAR_MEDIA_TYPES:
+        upload = await spool_upload(request)
+        upload_read.set()
+        tables = read_batches(upload, input_type, chunk_size)
+        try:
+            first_table = await run_in_threadpool(next, tables, None)
+        except (OSError, ValueError) as e:
+            upload.close()
+            raise HTTPException(status_code=400, detail=f"Unreadable {input_type} upload: {e}")
+        
+        async def chunks() -> AsyncIterator[pa.Table]:
+            try:
+                table = first_table
+                while table is not None:
+                    yield table
+                    table = await run_in_threadpool(next, tables, None)
+            finally:
+                upload.close()
+    else:
+        async def chunks() -> AsyncIterator[List[Dict]]:
+            records: List[Dict] = []
+            async for data in request.stream():
+                records.extend(reader.feed(data))
+                while len(records) >= chunk_size:
+                    yield records[:chunk_size]
+                    records = records[chunk_size:]
+            upload_read.set()
+            records.extend(reader.close())
+            if records:
+                yield records
+    
+    writer = create_writer(output_type, reader)
+    
+    def write(scored: Union[List[Dict], pa.Table]) -> bytes:
+        if isinstance(scored, pa.Table):
+            return writer.write_table(scored)
+        return writer.write(scored)
+    
+    async def body():
+        # One chunk is scored while the next is read
+        scoring: Optional[asyncio.Task] = None
+        async for chunk in chunks():
+            task = asyncio.ensure_future(_score_stream_chunk(ensemble_scorer, executor, chunk))
+            if scoring is not None:
+                yield write(await scoring)
+            scoring = task
+        if scoring is not None:
+            yield write(await scoring)
+        yield writer.close()
+    
+    return _UploadStreamingResponse(body(), upload_read, media_type=output_type)
+
+
+async def _score_stream_chunk(
+    ensemble_scorer: CachedEnsembleScorer,
+    executor: ScoringExecutor,
+    chunk: Union[List[Dict], pa.Table]
+) -> Union[List[Dict], pa.Table]:
+    """Score one chunk of a stream: records into output rows, a table column-wise"""
+    if isinstance(chunk, pa.Table):
+        latitudes, longitudes, errors = table_coordinates(chunk)
+    else:
+        latitudes, longitudes, errors = extract_coordinates(chunk)
+    valid = np.array([error is None for error in errors], dtype=bool)
+    results = await executor.run(
+        score_chunk, ensemble_scorer, latitudes[valid], longitudes[valid]
     )
+    if isinstance(chunk, pa.Table):
+        return score_table(chunk, results, errors)
+    return score_rows(chunk, results, errors)
+
+
+async def _score_cells(
+    ensemble_scorer: CachedEnsembleScorer,
+    executor: ScoringExecutor,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray
+) -> List[dict]:
+    """
+    Score each distinct cell, returning the per-row response fields
+    
+    Cells are looked up in the score cache with one multi-get; only the
+    misses are computed, and their results stored back in one batch.
+    """
+    cache = ensemble_scorer.cache
+    keys = [
+        ensemble_scorer.score_key(lat, lon)
+        for lat, lon in zip(latitudes.tolist(), longitudes.tolist())
+    ]
+    cell_results = await run_in_threadpool(cache.get_many, keys)
+    
+    missing = [i for i, result in enumerate(cell_results) if result is None]
+    if missing:
+        computed = await _compute_cells(
+            ensemble_scorer, executor, latitudes[missing], longitudes[missing]
+        )
+        for i, result in zip(missing, computed):
+            cell_results[i] = result
+        await run_in_threadpool(cache.set_many, {
+            keys[i]: result for i, result in zip(missing, computed) if "error" not in result
+        })
+    
+    return cell_results
 
+
+async def _compute_cells(
+    ensemble_scorer: CachedEnsembleScorer,
+    executor: ScoringExecutor,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray
+) -> List[dict]:
+    """
+    Compute the per-row response fields for each cell
+    
+    Runs on the portfolio engine, in chunks spread over the executor's
+    workers; if that fails, cells are scored one at a time so the error
+    can be reported against the rows it belongs to.
+    """
+    try:
+        results = await PortfolioScorer(executor, ensemble_scorer).score_async(
+            latitudes, longitudes
+        )
+        return EnsembleScorer.format_scores(results)
+    except Exception:
+        return await executor.run(_score_cells_one_by_one, ensemble_scorer, latitudes, longitudes)
+
+
+def _score_cells_one_by_one(
+    ensemble_scorer: CachedEnsembleScorer,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray
+) -> List[dict]:
+    """Score cells individually, capturing each one's error"""
+    return [_score_cell(ensemble_scorer, lat, lon) for lat, lon in zip(latitudes, longitudes)]
+
+
+def _score_cell(ensemble_scorer: CachedEnsembleScorer, latitude: float, longitude: float) -> dict:
+    """Score a single cell, capturing any error for per-row reporting"""
+    try:
+        result = ensemble_scorer.calculate_score(
+            latitude=float(latitude),
+            longitude=float(longitude),
+        )
+    except Exception as e:
+        return {"error": str(e)}
+    
+    return {
+        "clima_risk_score": result['clima_risk_score'],
+        "risk_breakdown": result['risk_breakdown'],
+        "risk_level": result['risk_level'],
+        "confidence": result['confidence'],
+        "calculated_at": result['calculated_at'],
+    }
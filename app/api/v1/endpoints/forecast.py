@@ -1,19 +1,23 @@
 """
 Forecast Endpoint
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 
-from app.db.schemas.forecast import ForecastRequest, ForecastResponse, YearForecast
-from app.ml.ensemble import EnsembleScorer
+from app.api.deps import get_executor, get_scorer
+from app.api.responses import model_response
+from app.db.schemas.forecast import ForecastRequest, ForecastResponse
+from app.ml.executor import ScoringExecutor
+from app.ml.score_cache import CachedEnsembleScorer
 
 router = APIRouter()
 
-# Initialize ensemble scorer
-ensemble_scorer = EnsembleScorer()
-
 
 @router.post("", response_model=ForecastResponse)
-async def get_forecast(request: ForecastRequest):
+async def get_forecast(
+    request: ForecastRequest,
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+):
     """
     Get future climate risk forecast for a location
     
@@ -25,24 +29,22 @@ async def get_forecast(request: ForecastRequest):
     """
     try:
         # Get forecast from ensemble model
-        result = ensemble_scorer.forecast(
+        result = await executor.run(
+            CachedEnsembleScorer.forecast,
+            ensemble_scorer,
             latitude=request.latitude,
             longitude=request.longitude,
             years=request.years,
         )
         
-        # Format forecasts
-        forecasts = [
-            YearForecast(**forecast) for forecast in result['forecasts']
-        ]
-        
-        return ForecastResponse(
-            latitude=request.latitude,
-            longitude=request.longitude,
-            forecasts=forecasts,
-            current_score=result.get('current_score'),
-            forecasted_at=result['forecasted_at'],
-        )
+        # Format response (validated once, here)
+        return model_response(ForecastResponse.model_validate({
+            'latitude': request.latitude,
+            'longitude': request.longitude,
+            'forecasts': result['forecasts'],
+            'current_score': result.get('current_score'),
+            'forecasted_at': result['forecasted_at'],
+        }))
     
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,196 @@
+"""
+Bulk Scoring Job Endpoints
+Submit a portfolio file of any size as a background job, poll its progress
+and download the scored rows as Parquet once it completes
+"""
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+
+from app.api.deps import get_jobs
+from app.api.uploads import request_media_type, spool_upload
+from app.core.config import settings
+from app.ml.portfolio_formats import (
+    ARROW,
+    COLUMNAR_MEDIA_TYPES,
+    MEDIA_TYPES,
+    PARQUET,
+    ArrowWriter,
+    create_reader,
+    negotiate_media_type,
+    read_batches,
+)
+from app.tasks.jobs import JobStore
+from app.tasks.scoring import submit_job
+
+router = APIRouter()
+
+
+class JobStatus(BaseModel):
+    """Progress of a bulk scoring job"""
+    job_id: str
+    status: str
+    total_rows: int
+    rows_scored: int
+    total_chunks: int
+    chunks_scored: int
+    progress: float
+    rows_per_second: Optional[float] = None
+    submitted_at: float
+    completed_at: Optional[float] = None
+    error: Optional[str] = None
+    result_url: Optional[str] = None
+
+
+def _job_status(request: Request, status: Dict) -> JobStatus:
+    """Job status with the download link once the result exists"""
+    result_url = None
+    if status["status"] == "completed":
+        result_url = str(request.url_for("download_job_result", job_id=status["job_id"]))
+    return JobStatus(**status, result_url=result_url)
+
+
+@router.post("", response_model=JobStatus, status_code=202)
+async def submit_scoring_job(
+    request: Request,
+    store: JobStore = Depends(get_jobs),
+):
+    """
+    Submit a portfolio for background scoring
+    
+    Send the file as the request body: NDJSON (`application/x-ndjson`),
+    CSV (`text/csv`), an Arrow IPC stream (`application/vnd.apache.arrow.stream`)
+    or Parquet (`application/vnd.apache.parquet`) with `latitude` and
+    `longitude` per row; other fields are kept in the result. The upload is
+    split into chunks of `PORTFOLIO_CHUNK_SIZE` rows that Celery workers
+    score in parallel.
+    
+    Poll `GET /jobs/{job_id}` for progress and download the result from
+    `GET /jobs/{job_id}/result` when the status is `completed`.
+    """
+    media_type = request_media_type(request)
+    if media_type not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Send one of: {', '.join(MEDIA_TYPES)}"
+        )
+    
+    job_id = await run_in_threadpool(store.create)
+    if media_type in COLUMNAR_MEDIA_TYPES:
+        with await spool_upload(request) as upload:
+            try:
+                chunk_rows = await run_in_threadpool(_spool_tables, store, job_id, upload, media_type)
+            except (OSError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=f"Unreadable {media_type} upload: {e}")
+    else:
+        chunk_rows = await _spool_records(request, store, job_id, create_reader(media_type))
+    
+    await run_in_threadpool(store.submit, job_id, chunk_rows)
+    await run_in_threadpool(submit_job, job_id, len(chunk_rows))
+    return _job_status(request, await run_in_threadpool(store.status, job_id))
+
+
+def _spool_tables(store: JobStore, job_id: str, upload: BinaryIO, media_type: str) -> List[int]:
+    """Split a columnar upload into the job's chunk inputs, returning their rows"""
+    chunk_rows = []
+    for table in read_batches(upload, media_type, settings.PORTFOLIO_CHUNK_SIZE):
+        store.write_input(job_id, len(chunk_rows), table)
+        chunk_rows.append(table.num_rows)
+    return chunk_rows
+
+
+async def _spool_records(request: Request, store: JobStore, job_id: str, reader) -> List[int]:
+    """Split a row-format upload into the job's chunk inputs as it arrives"""
+    chunk_rows: List[int] = []
+    records: List[Dict] = []
+    
+    async def spool(records: List[Dict]):
+        await run_in_threadpool(store.write_input, job_id, len(chunk_rows), records)
+        chunk_rows.append(len(records))
+    
+    async for data in request.stream():
+        records.extend(reader.feed(data))
+        while len(records) >= settings.PORTFOLIO_CHUNK_SIZE:
+            await spool(records[:settings.PORTFOLIO_CHUNK_SIZE])
+            records = records[settings.PORTFOLIO_CHUNK_SIZE:]
+    records.extend(reader.close())
+    if records:
+        await spool(records)
+    return chunk_rows
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_scoring_job(
+    job_id: str,
+    request: Request,
+    store: JobStore = Depends(get_jobs),
+):
+    """
+    Progress of a bulk scoring job
+    
+    - **status**: queued, running, completed or failed
+    - **progress**: Fraction of rows scored
+    - **rows_per_second**: Throughput of the chunks scored so far
+    """
+    status = await run_in_threadpool(store.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(request, status)
+
+
+@router.get(
+    "/{job_id}/result",
+    response_class=FileResponse,
+    responses={200: {"content": {PARQUET: {}, ARROW: {}}}},
+)
+async def download_job_result(
+    job_id: str,
+    request: Request,
+    store: JobStore = Depends(get_jobs),
+):
+    """
+    Download the scored rows of a completed job
+    
+    Parquet by default, or an Arrow IPC stream with
+    `Accept: application/vnd.apache.arrow.stream`. Rows are in input order:
+    the input fields, then the score columns and an `error` for rows that
+    could not be scored.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"), (PARQUET, ARROW), PARQUET)
+    if media_type is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Can respond with: {PARQUET}, {ARROW}"
+        )
+    status = await run_in_threadpool(store.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status["status"] != "completed":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is {status['status']}; the result is available once it completes"
+        )
+    if media_type == ARROW:
+        return StreamingResponse(
+            _arrow_stream(store.result_path(job_id)),
+            media_type=ARROW,
+            headers={"Content-Disposition": f'attachment; filename="{job_id}.arrows"'},
+        )
+    return FileResponse(
+        store.result_path(job_id),
+        media_type=PARQUET,
+        filename=f"{job_id}.parquet",
+    )
+
+
+def _arrow_stream(path: str) -> Iterator[bytes]:
+    """A Parquet file re-encoded as an Arrow IPC stream, row group by row group"""
+    writer = ArrowWriter()
+    for batch in pq.ParquetFile(path).iter_batches():
+        yield writer.write_table(pa.Table.from_batches([batch]))
+    yield writer.close()
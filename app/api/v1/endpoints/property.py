@@ -1,19 +1,23 @@
 """
 Property Analysis Endpoint
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 
+from app.api.deps import get_executor, get_scorer
+from app.api.responses import model_response
 from app.db.schemas.property import PropertyAnalysisRequest, PropertyAnalysisResponse
-from app.db.schemas.score import ScoreResponse, RiskBreakdown
-from app.ml.ensemble import EnsembleScorer
+from app.ml.executor import ScoringExecutor
+from app.ml.score_cache import CachedEnsembleScorer
 
 router = APIRouter()
 
-ensemble_scorer = EnsembleScorer()
-
 
 @router.post("/analysis", response_model=PropertyAnalysisResponse)
-async def analyze_property(request: PropertyAnalysisRequest):
+async def analyze_property(
+    request: PropertyAnalysisRequest,
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+):
     """
     Comprehensive property analysis including risk scores and recommendations
     
@@ -45,7 +49,9 @@ async def analyze_property(request: PropertyAnalysisRequest):
         floor = request.property_details.get('floor')
         
         # Calculate risk score
-        score_result = ensemble_scorer.calculate_score(
+        score_result = await executor.run(
+            CachedEnsembleScorer.calculate_score,
+            ensemble_scorer,
             latitude=request.latitude,
             longitude=request.longitude,
             property_type=property_type,
@@ -57,15 +63,15 @@ async def analyze_property(request: PropertyAnalysisRequest):
         recommendations = _generate_recommendations(score_result)
         
         # Format risk score response
-        risk_score = ScoreResponse(
-            clima_risk_score=score_result['clima_risk_score'],
-            risk_breakdown=RiskBreakdown(**score_result['risk_breakdown']),
-            risk_level=score_result['risk_level'],
-            confidence=score_result['confidence'],
-            latitude=request.latitude,
-            longitude=request.longitude,
-            calculated_at=score_result['calculated_at'],
-        )
+        risk_score = {
+            'clima_risk_score': score_result['clima_risk_score'],
+            'risk_breakdown': score_result['risk_breakdown'],
+            'risk_level': score_result['risk_level'],
+            'confidence': score_result['confidence'],
+            'latitude': request.latitude,
+            'longitude': request.longitude,
+            'calculated_at': score_result['calculated_at'],
+        }
         
         # In production, this would:
         # - Check if property exists in database
@@ -76,16 +82,17 @@ async def analyze_property(request: PropertyAnalysisRequest):
         import uuid
         property_id = str(uuid.uuid4())
         
-        return PropertyAnalysisResponse(
-            property_id=property_id,
-            address=request.address,
-            latitude=request.latitude,
-            longitude=request.longitude,
-            risk_score=risk_score,
-            recommendations=recommendations,
-            nearby_risks=None,  # Would be populated in production
-            historical_trends=None,  # Would be populated in production
-        )
+        # Validated once, here
+        return model_response(PropertyAnalysisResponse.model_validate({
+            'property_id': property_id,
+            'address': request.address,
+            'latitude': request.latitude,
+            'longitude': request.longitude,
+            'risk_score': risk_score,
+            'recommendations': recommendations,
+            'nearby_risks': None,  # Would be populated in production
+            'historical_trends': None,  # Would be populated in production
+        }))
     
     except HTTPException:
         raise
@@ -1,13 +1,37 @@
 """
 Risk Map Endpoint
-Generates geospatial risk map data
+Generates geospatial risk map data: XYZ raster and vector tiles of each
+risk layer, the tiles covering a bounding box and clusters of a tenant's
+scored properties
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, Literal
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional, Literal
 from pydantic import BaseModel
 
+from app.api.deps import get_clusters, get_executor, get_scorer, get_tiles
+from app.core.config import settings
+from app.ml.executor import ScoringExecutor
+from app.ml.property_clusters import PropertyClusters
+from app.ml.risk_pyramid import DEFAULT_AGGREGATION
+from app.ml.risk_tiles import MAX_ZOOM, render_tile, tile_version, tiles_covering
+from app.ml.score_cache import CachedEnsembleScorer
+from app.ml.tile_store import PNG, TileStore
+from app.ml.vector_tiles import MVT, MVT_MEDIA_TYPE, render_vector_tile
+
 router = APIRouter()
 
+RiskType = Literal["flood", "heat", "drought", "groundwater", "rainfall", "overall"]
+Aggregation = Literal["mean", "max", "p90"]
+
+AGGREGATION_DESCRIPTION = (
+    "Risk shown where a pixel spans several risk grid cells: their mean, "
+    "or the worst case (max, or the 90th percentile p90)"
+)
+
+# Most tiles listed for one bounding box
+MAX_TILES_PER_REQUEST = 1024
+
 
 class RiskMapTile(BaseModel):
     """Risk map tile data"""
@@ -17,6 +41,16 @@ class RiskMapTile(BaseModel):
     risk_data: dict
 
 
+class PropertyCluster(BaseModel):
+    """Marker for one or more of a tenant's properties"""
+    latitude: float
+    longitude: float
+    count: int
+    mean_risk: float
+    max_risk: float
+    property_id: Optional[str] = None
+
+
 class RiskMapResponse(BaseModel):
     """Risk map response"""
     bbox: list
@@ -24,25 +58,45 @@ class RiskMapResponse(BaseModel):
     tiles: list
     min_risk: float
     max_risk: float
+    clusters: Optional[List[PropertyCluster]] = None
 
 
 @router.get("", response_model=RiskMapResponse)
 async def get_risk_map(
+    request: Request,
     bbox: str = Query(..., description="Bounding box: min_lon,min_lat,max_lon,max_lat"),
-    risk_type: Literal["flood", "heat", "drought", "groundwater", "overall"] = Query(
+    risk_type: RiskType = Query(
         default="overall",
         description="Type of risk to visualize"
     ),
     zoom: int = Query(default=10, ge=1, le=18, description="Zoom level"),
+    aggregation: Optional[Aggregation] = Query(default=None, description=AGGREGATION_DESCRIPTION),
+    tenant_id: Optional[str] = Query(
+        default=None,
+        description="Include clusters of this tenant's scored properties"
+    ),
+    property_clusters: Optional[PropertyClusters] = Depends(get_clusters),
 ):
     """
     Get risk map data for a bounding box
     
     - **bbox**: Bounding box as "min_lon,min_lat,max_lon,max_lat"
-    - **risk_type**: Type of risk to visualize (flood, heat, drought, groundwater, overall)
+    - **risk_type**: Type of risk to visualize (flood, heat, drought, groundwater, rainfall, overall)
     - **zoom**: Map zoom level (1-18)
+    - **aggregation**: mean (default), or worst case max or p90, of the grid
+      cells each pixel spans at low zoom
+    - **tenant_id**: Tenant whose properties to show as markers
+    
+    Returns the XYZ tiles covering the bounding box at the zoom level, each
+    with the `url` of its PNG and the `vector_url` of its vector tile (see
+    `GET /risk-map/tiles/...`), to overlay on a web map. min_risk and
+    max_risk are the ends of the colour scale.
     
-    Returns geospatial risk data that can be overlaid on maps.
+    With a tenant_id, `clusters` lists the tenant's scored properties in
+    the bounding box merged into markers for the zoom level: each has the
+    centroid, the number of properties and the mean and maximum of their
+    latest risk_type score (`property_id` for single properties). Above
+    zoom 16 every property is listed.
     """
     try:
         # Parse bounding box
@@ -64,20 +118,48 @@ async def get_risk_map(
                 detail="Invalid bounding box coordinates"
             )
         
-        # In production, this would:
-        # 1. Query pre-computed risk tiles from database
-        # 2. Or generate on-the-fly using ML models
-        # 3. Return GeoJSON or raster tiles
+        xs, ys = tiles_covering((min_lon, min_lat, max_lon, max_lat), zoom)
+        if len(xs) * len(ys) > MAX_TILES_PER_REQUEST:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Bounding box covers more than {MAX_TILES_PER_REQUEST} tiles at zoom {zoom}; zoom out"
+            )
         
-        # For now, return a simplified response structure
-        # In production, implement tile generation logic
+        def tile_url(name: str, x: int, y: int) -> str:
+            url = request.url_for(name, risk_type=risk_type, z=str(zoom), x=str(x), y=str(y))
+            if aggregation is not None:
+                url = url.include_query_params(aggregation=aggregation)
+            return str(url)
+        
+        tiles = [
+            RiskMapTile(
+                x=x,
+                y=y,
+                z=zoom,
+                risk_data={
+                    'url': tile_url("get_risk_tile", x, y),
+                    'vector_url': tile_url("get_risk_vector_tile", x, y),
+                },
+            )
+            for y in ys
+            for x in xs
+        ]
+        
+        clusters = None
+        if tenant_id is not None:
+            if property_clusters is None:
+                raise HTTPException(status_code=404, detail="Property clusters are disabled")
+            clusters = await run_in_threadpool(
+                property_clusters.clusters, tenant_id, (min_lon, min_lat, max_lon, max_lat), zoom, risk_type
+            )
         
         return RiskMapResponse(
             bbox=[min_lon, min_lat, max_lon, max_lat],
             risk_type=risk_type,
-            tiles=[],  # Would contain actual tile data
+            tiles=tiles,
             min_risk=0.0,
             max_risk=100.0,
+            clusters=clusters,
         )
     
     except HTTPException:
@@ -88,3 +170,103 @@ async def get_risk_map(
             detail=f"Error generating risk map: {str(e)}"
         )
 
+
+async def _tile_response(
+    render,
+    tile_format: str,
+    media_type: str,
+    risk_type: str,
+    z: int,
+    x: int,
+    y: int,
+    aggregation: str,
+    ensemble_scorer: CachedEnsembleScorer,
+    executor: ScoringExecutor,
+    store: Optional[TileStore],
+) -> Response:
+    """Serve a tile from the tile store, rendering and storing it on a miss"""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    try:
+        version = tile_version(ensemble_scorer)
+        tile = None
+        if store is not None:
+            tile = await run_in_threadpool(
+                store.get, risk_type, version, z, x, y, tile_format, aggregation
+            )
+        if tile is None:
+            tile = await executor.run(render, ensemble_scorer, risk_type, z, x, y, aggregation)
+            if store is not None:
+                await run_in_threadpool(
+                    store.put, risk_type, version, z, x, y, tile, tile_format, aggregation
+                )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error rendering risk tile: {str(e)}"
+        )
+    return Response(
+        tile,
+        media_type=media_type,
+        headers={"Cache-Control": f"public, max-age={settings.RISK_TILE_MAX_AGE_SECONDS}"},
+    )
+
+
+@router.get(
+    "/tiles/{risk_type}/{z}/{x}/{y}.png",
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}}}},
+)
+async def get_risk_tile(
+    risk_type: RiskType,
+    z: int = Path(..., ge=0, le=MAX_ZOOM, description="Zoom level"),
+    x: int = Path(..., ge=0, description="Tile column"),
+    y: int = Path(..., ge=0, description="Tile row (from the north)"),
+    aggregation: Aggregation = Query(default=DEFAULT_AGGREGATION, description=AGGREGATION_DESCRIPTION),
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+    store: Optional[TileStore] = Depends(get_tiles),
+):
+    """
+    XYZ raster tile of a risk layer
+    
+    256x256 Web Mercator PNG for web maps (Leaflet, MapLibre, OpenLayers),
+    coloured from green (low risk) to red (extreme) and transparent where
+    there is no risk data. Tiles are rendered from the precompiled risk grid
+    when it is built (from its pyramid at low zoom, showing the mean or
+    worst case of the cells each pixel spans), once per model version:
+    rendered tiles are kept in the tile store and served from it.
+    """
+    return await _tile_response(
+        render_tile, PNG, "image/png", risk_type, z, x, y, aggregation, ensemble_scorer, executor, store
+    )
+
+
+@router.get(
+    "/tiles/{risk_type}/{z}/{x}/{y}.mvt",
+    response_class=Response,
+    responses={200: {"content": {MVT_MEDIA_TYPE: {}}}},
+)
+async def get_risk_vector_tile(
+    risk_type: RiskType,
+    z: int = Path(..., ge=0, le=MAX_ZOOM, description="Zoom level"),
+    x: int = Path(..., ge=0, description="Tile column"),
+    y: int = Path(..., ge=0, description="Tile row (from the north)"),
+    aggregation: Aggregation = Query(default=DEFAULT_AGGREGATION, description=AGGREGATION_DESCRIPTION),
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+    store: Optional[TileStore] = Depends(get_tiles),
+):
+    """
+    XYZ vector tile of a risk layer
+    
+    Mapbox Vector Tile with one layer named after the risk type holding a
+    polygon feature per risk level (`risk_level`: low, moderate, high,
+    extreme; `risk_class`: 0-3), for clients that style the classes
+    themselves. Empty where there is no risk data. Stored and served like
+    the PNG tiles.
+    """
+    return await _tile_response(
+        render_vector_tile, MVT, MVT_MEDIA_TYPE, risk_type, z, x, y, aggregation,
+        ensemble_scorer, executor, store,
+    )
@@ -1,19 +1,69 @@
 """
 Risk Scoring Endpoint
 """
-from fastapi import APIRouter, HTTPException
+from functools import lru_cache, partial
+from typing import Dict, List, Optional
 
-from app.db.schemas.score import ScoreRequest, ScoreResponse, RiskBreakdown
-from app.ml.ensemble import EnsembleScorer
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.deps import get_executor, get_scorer
+from app.api.responses import model_response
+from app.core.config import settings
+from app.db.schemas.score import ScoreRequest, ScoreResponse
+from app.ml.executor import ScoringExecutor
+from app.ml.micro_batcher import MicroBatcher
+from app.ml.score_cache import CachedEnsembleScorer
 
 router = APIRouter()
 
-# Initialize ensemble scorer (in production, this would be a singleton)
-ensemble_scorer = EnsembleScorer()
+
+def get_score_batcher(
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_scorer),
+    executor: ScoringExecutor = Depends(get_executor),
+) -> Optional[MicroBatcher]:
+    """Micro-batcher in front of the scorer (None when SCORE_BATCH_ENABLED is off)"""
+    if not settings.SCORE_BATCH_ENABLED:
+        return None
+    return _score_batcher(ensemble_scorer, executor)
+
+
+@lru_cache(maxsize=None)
+def _score_batcher(ensemble_scorer: CachedEnsembleScorer, executor: ScoringExecutor) -> MicroBatcher:
+    """One batcher per scorer and executor, sized from settings"""
+    return MicroBatcher(
+        partial(executor.run, _score_requests, ensemble_scorer),
+        max_batch_size=settings.SCORE_BATCH_MAX_SIZE,
+        max_wait_seconds=settings.SCORE_BATCH_MAX_WAIT_MS / 1000,
+        name="score",
+    )
+
+
+def _score_requests(ensemble_scorer: CachedEnsembleScorer, requests: List[Dict]) -> List:
+    """
+    Score a micro-batch of requests
+    
+    If the batch fails, requests are scored one at a time so an error only
+    reaches the caller it belongs to.
+    """
+    try:
+        return ensemble_scorer.calculate_score_many(requests)
+    except Exception:
+        results = []
+        for request in requests:
+            try:
+                results.append(ensemble_scorer.calculate_score(**request))
+            except Exception as e:
+                results.append(e)
+        return results
 
 
 @router.post("", response_model=ScoreResponse)
-async def calculate_risk_score(request: ScoreRequest):
+async def calculate_risk_score(
+    request: ScoreRequest,
+    ensemble_scorer: CachedEnsembleScorer = Depends(get_scorer),
+    score_batcher: Optional[MicroBatcher] = Depends(get_score_batcher),
+    executor: ScoringExecutor = Depends(get_executor),
+):
     """
     Calculate climate risk score for a location
     
@@ -24,27 +74,36 @@ async def calculate_risk_score(request: ScoreRequest):
     - **floor**: Floor number (optional)
     
     Returns comprehensive climate risk score with breakdown by risk type.
+    
+    Concurrent requests are scored together in micro-batches of up to
+    `SCORE_BATCH_MAX_SIZE`, each waiting at most `SCORE_BATCH_MAX_WAIT_MS`.
     """
     try:
-        # Calculate score using ensemble model
-        result = ensemble_scorer.calculate_score(
+        score_request = dict(
             latitude=request.latitude,
             longitude=request.longitude,
             property_type=request.property_type,
             area_sqm=request.area_sqm,
             floor=request.floor,
         )
+        # Calculate score using ensemble model
+        if score_batcher is not None:
+            result = await score_batcher.submit(score_request)
+        else:
+            result = await executor.run(
+                CachedEnsembleScorer.calculate_score, ensemble_scorer, **score_request
+            )
         
-        # Format response
-        return ScoreResponse(
-            clima_risk_score=result['clima_risk_score'],
-            risk_breakdown=RiskBreakdown(**result['risk_breakdown']),
-            risk_level=result['risk_level'],
-            confidence=result['confidence'],
-            latitude=request.latitude,
-            longitude=request.longitude,
-            calculated_at=result['calculated_at'],
-        )
+        # Format response (validated once, here)
+        return model_response(ScoreResponse.model_validate({
+            'clima_risk_score': result['clima_risk_score'],
+            'risk_breakdown': result['risk_breakdown'],
+            'risk_level': result['risk_level'],
+            'confidence': result['confidence'],
+            'latitude': request.latitude,
+            'longitude': request.longitude,
+            'calculated_at': result['calculated_at'],
+        }))
     
     except Exception as e:
         raise HTTPException(
@@ -3,7 +3,7 @@ API Router for v1 endpoints
 """
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import score, forecast, risk_map, property as property_endpoint, bulk
+from app.api.v1.endpoints import score, forecast, risk_map, property as property_endpoint, bulk, jobs
 
 api_router = APIRouter()
 
@@ -13,4 +13,5 @@ api_router.include_router(forecast.router, prefix="/forecast", tags=["forecastin
 api_router.include_router(risk_map.router, prefix="/risk-map", tags=["maps"])
 api_router.include_router(property_endpoint.router, prefix="/property", tags=["property"])
 api_router.include_router(bulk.router, prefix="", tags=["bulk"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
 
@@ -42,6 +42,77 @@ class Settings(BaseSettings):
     
     # ML Models
     MODEL_BASE_PATH: str = Field(default="./data/models", env="MODEL_BASE_PATH")
+    # Load every model at startup instead of on the first request that needs it
+    MODEL_PRELOAD: bool = Field(default=False, env="MODEL_PRELOAD")
+    # Serve /score from the precompiled risk grid under MODEL_BASE_PATH when it exists
+    RISK_GRID_ENABLED: bool = Field(default=True, env="RISK_GRID_ENABLED")
+    # Urban centres CSV (name, latitude, longitude, population, radius_km);
+    # defaults to the gazetteer bundled with app/ml
+    URBAN_GAZETTEER_PATH: Optional[str] = Field(default=None, env="URBAN_GAZETTEER_PATH")
+    # River polylines (GeoJSON, or Shapefile etc. via geopandas); defaults to
+    # the major-river network bundled with app/ml
+    RIVER_NETWORK_PATH: Optional[str] = Field(default=None, env="RIVER_NETWORK_PATH")
+    # Coastline lines for distance-to-coast; defaults to the bundled coastline.
+    # A raster built from it under MODEL_BASE_PATH is used when present.
+    COASTLINE_PATH: Optional[str] = Field(default=None, env="COASTLINE_PATH")
+    # Directory of 1x1 degree DEM tiles (SRTM .hgt, Copernicus GeoTIFF) used
+    # for elevation when a request has none; rebuild the risk grid after adding tiles
+    DEM_PATH: Optional[str] = Field(default="./data/raw/dem", env="DEM_PATH")
+    # Memory budget for decoded DEM tiles (a 1 arc-second tile takes ~52 MB)
+    DEM_CACHE_MB: int = Field(default=512, env="DEM_CACHE_MB")
+    
+    # Bulk scoring: coordinates are snapped to this grid (degrees) and each
+    # distinct cell is scored once. 0 disables snapping (exact duplicates only).
+    BULK_GRID_RESOLUTION: float = Field(default=0.001, env="BULK_GRID_RESOLUTION")
+    
+    # Score cache: single-location scores and forecasts are cached per cell of
+    # SCORE_CACHE_PRECISION degrees (0 = exact coordinates) for the TTL, keyed
+    # on the scoring version (so a rule, data or model change starts afresh);
+    # hits return the calculated_at of the cached computation
+    SCORE_CACHE_ENABLED: bool = Field(default=True, env="SCORE_CACHE_ENABLED")
+    SCORE_CACHE_SIZE: int = Field(default=100_000, env="SCORE_CACHE_SIZE")
+    SCORE_CACHE_TTL_SECONDS: float = Field(default=3600.0, env="SCORE_CACHE_TTL_SECONDS")
+    SCORE_CACHE_PRECISION: float = Field(default=0.001, env="SCORE_CACHE_PRECISION")
+    # Second cache tier in Redis (REDIS_URL) shared by all API and Celery workers
+    SCORE_CACHE_REDIS_ENABLED: bool = Field(default=False, env="SCORE_CACHE_REDIS_ENABLED")
+    SCORE_CACHE_REDIS_TTL_SECONDS: float = Field(default=86400.0, env="SCORE_CACHE_REDIS_TTL_SECONDS")
+    
+    # Micro-batching of concurrent POST /score requests: a batch is scored once
+    # it holds SCORE_BATCH_MAX_SIZE requests or its first has waited SCORE_BATCH_MAX_WAIT_MS
+    SCORE_BATCH_ENABLED: bool = Field(default=True, env="SCORE_BATCH_ENABLED")
+    SCORE_BATCH_MAX_SIZE: int = Field(default=64, env="SCORE_BATCH_MAX_SIZE")
+    SCORE_BATCH_MAX_WAIT_MS: float = Field(default=2.0, env="SCORE_BATCH_MAX_WAIT_MS")
+    
+    # Where endpoints run blocking scoring: "inline" (on the event loop),
+    # "thread" or "process" pool (process workers load their own models);
+    # SCORING_WORKERS unset = the pool's default for this machine
+    SCORING_EXECUTOR: str = Field(default="thread", env="SCORING_EXECUTOR")
+    SCORING_WORKERS: Optional[int] = Field(default=None, env="SCORING_WORKERS")
+    # Rows per chunk the portfolio engine hands to one worker
+    PORTFOLIO_CHUNK_SIZE: int = Field(default=10_000, env="PORTFOLIO_CHUNK_SIZE")
+    
+    # Bulk scoring jobs run on Celery as one task per PORTFOLIO_CHUNK_SIZE rows;
+    # their inputs, progress and Parquet results are kept under JOBS_PATH
+    JOBS_PATH: str = Field(default="./data/processed/jobs", env="JOBS_PATH")
+    
+    # Render validated response models straight to JSON (orjson for plain
+    # content) instead of re-validating them through FastAPI's response_model
+    FAST_JSON_RESPONSES: bool = Field(default=True, env="FAST_JSON_RESPONSES")
+    
+    # Browser/CDN cache lifetime of rendered /risk-map tiles
+    RISK_TILE_MAX_AGE_SECONDS: int = Field(default=3600, env="RISK_TILE_MAX_AGE_SECONDS")
+    # Rendered tiles are kept per model version in this MBTiles file and served
+    # from it; pre-render with `python -m app.ml.tile_store`
+    RISK_TILE_STORE_ENABLED: bool = Field(default=True, env="RISK_TILE_STORE_ENABLED")
+    RISK_TILE_STORE_PATH: str = Field(default="./data/processed/risk_tiles.mbtiles", env="RISK_TILE_STORE_PATH")
+    
+    # Property markers on /risk-map (tenant_id): each tenant's cluster index is
+    # refreshed with the properties changed since the last refresh at most every
+    # PROPERTY_CLUSTER_REFRESH_SECONDS, and reloaded in full (dropping deleted
+    # properties) every PROPERTY_CLUSTER_RELOAD_SECONDS
+    PROPERTY_CLUSTERS_ENABLED: bool = Field(default=True, env="PROPERTY_CLUSTERS_ENABLED")
+    PROPERTY_CLUSTER_REFRESH_SECONDS: float = Field(default=30.0, env="PROPERTY_CLUSTER_REFRESH_SECONDS")
+    PROPERTY_CLUSTER_RELOAD_SECONDS: float = Field(default=3600.0, env="PROPERTY_CLUSTER_RELOAD_SECONDS")
     
     # CORS
     CORS_ORIGINS: List[str] = Field(
@@ -16,6 +16,9 @@ class Property(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
+    # Owning enterprise account (portfolio properties)
+    tenant_id = Column(String, nullable=True)
+    
     # Location
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
@@ -39,12 +42,13 @@ class Property(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Additional metadata
-    metadata = Column(JSON, nullable=True)
+    # Additional metadata ("metadata" is reserved on declarative models)
+    property_metadata = Column("metadata", JSON, nullable=True)
     
     # Indexes
     __table_args__ = (
         Index('idx_property_location', 'location', postgresql_using='gist'),
         Index('idx_property_lat_lon', 'latitude', 'longitude'),
+        Index('idx_property_tenant', 'tenant_id'),
     )
 
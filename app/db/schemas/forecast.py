@@ -45,5 +45,8 @@ class ForecastResponse(BaseModel):
     longitude: float = Field(..., description="Longitude")
     forecasts: List[YearForecast] = Field(..., description="Forecasts for each requested year")
     current_score: Optional[float] = Field(None, description="Current risk score for reference")
-    forecasted_at: str = Field(..., description="ISO timestamp")
+    forecasted_at: str = Field(
+        ...,
+        description="ISO timestamp of forecast (cached forecasts keep theirs for SCORE_CACHE_TTL_SECONDS)"
+    )
 
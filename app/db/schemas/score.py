@@ -34,5 +34,8 @@ class ScoreResponse(BaseModel):
     confidence: float = Field(..., ge=0, le=1, description="Confidence score (0-1)")
     latitude: float = Field(..., description="Latitude of scored location")
     longitude: float = Field(..., description="Longitude of scored location")
-    calculated_at: str = Field(..., description="ISO timestamp of calculation")
+    calculated_at: str = Field(
+        ...,
+        description="ISO timestamp of calculation (cached scores keep theirs for SCORE_CACHE_TTL_SECONDS)"
+    )
 
@@ -1,12 +1,16 @@
 """
 FastAPI Application Entry Point
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.core.config import settings
+from app.api.responses import FastJSONResponse
 from app.api.v1.router import api_router
+from app.ml.executor import get_scoring_executor
+from app.ml.registry import get_model_registry
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -15,6 +19,7 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
 )
 
 # CORS middleware - Allow all origins for development
@@ -33,6 +38,20 @@ app.add_middleware(GZipMiddleware, minimum_size=1000)
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
 
+@app.on_event("startup")
+async def preload_models():
+    """Load models before serving traffic when MODEL_PRELOAD is set"""
+    if settings.MODEL_PRELOAD:
+        get_model_registry().preload()
+
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    """Stop the scoring executor's workers"""
+    get_scoring_executor().shutdown()
+    get_scoring_executor.cache_clear()
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -53,3 +72,8 @@ async def health_check():
         "service": "ClimaRisk AI API",
     }
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (micro-batch sizes, queue waits)"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,14 +1,36 @@
 """
 Ensemble scoring engine that combines multiple risk models
 """
-from typing import Dict, Tuple
+import logging
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 from datetime import datetime
 
+from app.ml.fingerprint import scoring_version
 from app.ml.models.flood_model import FloodRiskModel
 from app.ml.models.heat_model import HeatRiskModel
 from app.ml.models.drought_model import DroughtRiskModel
 from app.ml.models.groundwater_model import GroundwaterRiskModel
+from app.ml.risk_grid import GridRiskLookup, RISK_GRID_BANDS
+from app.ml.spatial.elevation import ElevationService, get_elevation_service
+
+logger = logging.getLogger(__name__)
+
+# Risk levels in order of severity; batch results store the index into this tuple
+RISK_LEVELS = ("low", "moderate", "high", "extreme")
+
+# Upper bounds (exclusive) of the low, moderate and high levels
+RISK_LEVEL_THRESHOLDS = (25, 50, 75)
+
+# Model inputs that change a prediction; requests carrying any of them
+# are evaluated live instead of from the precompiled risk grid
+LIVE_EVALUATION_KWARGS = (
+    'elevation',
+    'is_urban',
+    'population_density',
+    'annual_precipitation',
+    'current_water_level',
+)
 
 
 class EnsembleScorer:
@@ -17,12 +39,29 @@ class EnsembleScorer:
     to generate a comprehensive ClimaRisk Score
     """
     
-    def __init__(self):
-        """Initialize ensemble with all risk models"""
-        self.flood_model = FloodRiskModel()
-        self.heat_model = HeatRiskModel()
-        self.drought_model = DroughtRiskModel()
-        self.groundwater_model = GroundwaterRiskModel()
+    def __init__(
+        self,
+        grid_lookup: Optional[GridRiskLookup] = None,
+        elevation_service: Optional[ElevationService] = None,
+        models: Optional[Dict[str, object]] = None
+    ):
+        """
+        Initialize ensemble with all risk models
+        
+        Args:
+            grid_lookup: Precompiled risk grid to answer default-input
+                queries from (optional; models are evaluated live without it,
+                or when it was built from other rules, data or models)
+            elevation_service: DEM sampler filling in missing elevations
+                (the process-wide service over DEM_PATH by default)
+            models: Already loaded models by risk type ('flood', 'heat',
+                'drought', 'groundwater'); missing ones are created here
+        """
+        models = models or {}
+        self.flood_model = models.get('flood') or FloodRiskModel()
+        self.heat_model = models.get('heat') or HeatRiskModel()
+        self.drought_model = models.get('drought') or DroughtRiskModel()
+        self.groundwater_model = models.get('groundwater') or GroundwaterRiskModel()
         
         # Weight configuration (can be region-specific)
         # These weights determine how much each risk contributes to overall score
@@ -33,6 +72,34 @@ class EnsembleScorer:
             'groundwater': 0.15,
             'rainfall': 0.15,  # Derived from drought model
         }
+        
+        # Part of every cached result's key: the release, a fingerprint of
+        # the scoring code and data, and each loaded trained model's version
+        self.model_version = scoring_version(self.models)
+        if grid_lookup is not None and grid_lookup.metadata.get('scoring_version') != self.model_version:
+            # e.g. a grid evaluated from the rules once a trained model is loaded
+            logger.warning(
+                "Not using risk grid built for scoring version %s with models at %s",
+                grid_lookup.metadata.get('scoring_version'), self.model_version,
+            )
+            grid_lookup = None
+        self.grid_lookup = grid_lookup
+        # Grid answers approximate the live models, so they are versioned apart
+        if grid_lookup is not None:
+            self.model_version += f"+grid.{grid_lookup.metadata.get('built_at', '')}"
+        self.elevation_service = (
+            elevation_service if elevation_service is not None else get_elevation_service()
+        )
+    
+    @property
+    def models(self) -> Dict[str, object]:
+        """The risk models by risk type"""
+        return {
+            'flood': self.flood_model,
+            'heat': self.heat_model,
+            'drought': self.drought_model,
+            'groundwater': self.groundwater_model,
+        }
     
     def calculate_score(
         self,
@@ -53,18 +120,31 @@ class EnsembleScorer:
         Returns:
             Dictionary with risk scores and breakdown
         """
-        # Get predictions from individual models
-        flood_score = self.flood_model.predict(latitude, longitude, **kwargs)
-        heat_score = self.heat_model.predict(latitude, longitude, **kwargs)
-        drought_score = self.drought_model.predict(latitude, longitude, **kwargs)
-        groundwater_score = self.groundwater_model.predict(latitude, longitude, **kwargs)
-        
-        # Rainfall risk is derived from drought/precipitation patterns
-        rainfall_score = self._calculate_rainfall_risk(
-            drought_score, 
-            latitude, 
-            longitude
-        )
+        # Precompiled grid answers default-input queries without running the models
+        grid_scores = None
+        if self._can_use_grid(kwargs):
+            grid_scores = self.grid_lookup.lookup(latitude, longitude)
+        
+        if grid_scores is not None:
+            flood_score, heat_score, drought_score, groundwater_score, rainfall_score = (
+                grid_scores[band] for band in RISK_GRID_BANDS
+            )
+        else:
+            if kwargs.get('elevation') is None:
+                kwargs['elevation'] = self.elevation_service.elevation(latitude, longitude)
+            
+            # Get predictions from individual models
+            flood_score = self.flood_model.predict(latitude, longitude, **kwargs)
+            heat_score = self.heat_model.predict(latitude, longitude, **kwargs)
+            drought_score = self.drought_model.predict(latitude, longitude, **kwargs)
+            groundwater_score = self.groundwater_model.predict(latitude, longitude, **kwargs)
+            
+            # Rainfall risk is derived from drought/precipitation patterns
+            rainfall_score = self._calculate_rainfall_risk(
+                drought_score, 
+                latitude, 
+                longitude
+            )
         
         # Calculate weighted ensemble score
         clima_risk_score = (
@@ -96,6 +176,158 @@ class EnsembleScorer:
             'calculated_at': datetime.utcnow().isoformat(),
         }
     
+    def calculate_score_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        elevation: Optional[np.ndarray] = None,
+        population_density: Optional[np.ndarray] = None,
+        annual_precipitation: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> Dict[str, np.ndarray]:
+        """
+        Calculate climate risk scores for many locations in one vectorized pass
+        
+        Produces exactly the same (unrounded) numbers as `calculate_score`
+        does per row, without per-point Python overhead.
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            elevation: Per-row elevation in meters (optional, NaN = unknown)
+            population_density: Per-row population density per sq km (optional, NaN = unknown)
+            annual_precipitation: Per-row annual precipitation in mm (optional, NaN = unknown)
+            **kwargs: Additional parameters
+            
+        Returns:
+            Dictionary of arrays: the five risk components, the weighted
+            clima_risk_score, risk_level_code (index into RISK_LEVELS)
+            and confidence
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        kwargs.update(
+            elevation=elevation,
+            population_density=population_density,
+            annual_precipitation=annual_precipitation,
+        )
+        
+        if self._can_use_grid(kwargs):
+            components, on_grid = self.grid_lookup.lookup_batch(latitudes, longitudes)
+            if not on_grid.all():
+                # Off-grid rows fall back to live evaluation
+                live = self._predict_components_batch(
+                    latitudes[~on_grid], longitudes[~on_grid], **kwargs
+                )
+                for band in RISK_GRID_BANDS:
+                    components[band][~on_grid] = live[band]
+        else:
+            components = self._predict_components_batch(latitudes, longitudes, **kwargs)
+        
+        flood_score, heat_score, drought_score, groundwater_score, rainfall_score = (
+            components[band] for band in RISK_GRID_BANDS
+        )
+        
+        clima_risk_score = (
+            self.weights['flood'] * flood_score +
+            self.weights['heat'] * heat_score +
+            self.weights['drought'] * drought_score +
+            self.weights['groundwater'] * groundwater_score +
+            self.weights['rainfall'] * rainfall_score
+        )
+        
+        scores = np.stack(
+            [flood_score, heat_score, drought_score, groundwater_score, rainfall_score],
+            axis=-1,
+        )
+        
+        return {
+            'clima_risk_score': clima_risk_score,
+            'flood': flood_score,
+            'heat': heat_score,
+            'drought': drought_score,
+            'groundwater': groundwater_score,
+            'rainfall': rainfall_score,
+            'risk_level_code': self._determine_risk_level_code(clima_risk_score),
+            'confidence': self._calculate_confidence_batch(scores),
+        }
+    
+    def calculate_scores(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        **kwargs
+    ) -> "ScoreBatch":
+        """
+        `calculate_score` results for many locations from one batched inference
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            **kwargs: Per-row inputs, as for `calculate_score_batch`
+            
+        Returns:
+            ScoreBatch: a compact record per location, read back as the
+            dictionaries `calculate_score` returns (sharing one timestamp)
+        """
+        from app.ml.score_batch import ScoreBatch
+        
+        return ScoreBatch.from_arrays(self.calculate_score_batch(latitudes, longitudes, **kwargs))
+    
+    @staticmethod
+    def format_scores(results: Dict[str, np.ndarray]) -> List[Dict]:
+        """Per-row `calculate_score` dictionaries from `calculate_score_batch` arrays"""
+        from app.ml.score_batch import ScoreBatch
+        
+        return ScoreBatch.from_arrays(results).to_dicts()
+    
+    def _can_use_grid(self, kwargs: Dict) -> bool:
+        """Whether a request can be answered from the precompiled grid"""
+        return self.grid_lookup is not None and all(
+            kwargs.get(name) is None for name in LIVE_EVALUATION_KWARGS
+        )
+    
+    def _predict_components_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        **kwargs
+    ) -> Dict[str, np.ndarray]:
+        """Evaluate every risk model live for a batch of locations"""
+        if len(self.elevation_service):
+            kwargs['elevation'] = self._fill_elevation(
+                latitudes, longitudes, kwargs.get('elevation')
+            )
+        
+        drought_score = self.drought_model.predict_batch(latitudes, longitudes, **kwargs)
+        return {
+            'flood': self.flood_model.predict_batch(latitudes, longitudes, **kwargs),
+            'heat': self.heat_model.predict_batch(latitudes, longitudes, **kwargs),
+            'drought': drought_score,
+            'groundwater': self.groundwater_model.predict_batch(latitudes, longitudes, **kwargs),
+            'rainfall': self._calculate_rainfall_risk_batch(drought_score, latitudes),
+        }
+    
+    def _fill_elevation(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        elevation: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """Sample the DEM for rows without a caller-supplied elevation"""
+        if elevation is None:
+            return self.elevation_service.elevations(latitudes, longitudes)
+        
+        elevation = np.array(
+            np.broadcast_to(np.asarray(elevation, dtype=float), latitudes.shape)
+        )
+        missing = np.isnan(elevation)
+        if missing.any():
+            elevation[missing] = self.elevation_service.elevations(
+                latitudes[missing], longitudes[missing]
+            )
+        return elevation
+    
     def _calculate_rainfall_risk(
         self,
         drought_score: float,
@@ -122,6 +354,17 @@ class EnsembleScorer:
         
         return min(100, max(0, rainfall_risk))
     
+    def _calculate_rainfall_risk_batch(
+        self,
+        drought_score: np.ndarray,
+        latitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_calculate_rainfall_risk`"""
+        excess_rainfall_risk = np.where((20 <= latitudes) & (latitudes <= 30), 40.0, 20.0)
+        rainfall_risk = (drought_score * 0.6) + (excess_rainfall_risk * 0.4)
+        
+        return np.clip(rainfall_risk, 0, 100)
+    
     def _determine_risk_level(self, score: float) -> str:
         """Determine risk level from score"""
         if score < 25:
@@ -133,6 +376,10 @@ class EnsembleScorer:
         else:
             return "extreme"
     
+    def _determine_risk_level_code(self, scores: np.ndarray) -> np.ndarray:
+        """Vectorized `_determine_risk_level`, returning indices into RISK_LEVELS"""
+        return np.searchsorted(RISK_LEVEL_THRESHOLDS, scores, side='right').astype(np.uint8)
+    
     def _calculate_confidence(self, scores: list) -> float:
         """
         Calculate confidence based on model agreement
@@ -148,6 +395,17 @@ class EnsembleScorer:
         
         return max(0.5, min(1.0, confidence))  # Clamp between 0.5 and 1.0
     
+    def _calculate_confidence_batch(self, scores: np.ndarray) -> np.ndarray:
+        """Vectorized `_calculate_confidence` over the last axis of `scores`"""
+        if scores.shape[-1] == 0:
+            return np.zeros(scores.shape[:-1])
+        
+        variance = np.var(scores, axis=-1)
+        normalized_variance = np.minimum(1.0, variance / 2500.0)
+        confidence = 1.0 - normalized_variance
+        
+        return np.clip(confidence, 0.5, 1.0)
+    
     def forecast(
         self,
         latitude: float,
@@ -0,0 +1,119 @@
+"""
+Scoring Executor
+Runs blocking scoring work for the async endpoints so it never stalls the
+event loop. Three strategies, picked with SCORING_EXECUTOR:
+
+- inline: call directly on the event loop (no concurrency; for debugging)
+- thread: a thread pool in this process, sharing its models and cache
+- process: a process pool whose workers each load the model registry once
+  at start-up; work is sent by reference and runs on the worker's own
+  scorer, so CPU-bound batches scale past the GIL
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ('inline', 'thread', 'process')
+
+
+def _init_worker():
+    """Process pool initializer: load every model once per worker"""
+    from app.ml.registry import get_model_registry
+    
+    get_model_registry().preload()
+
+
+def _call_in_worker(function: Callable, precision: float, args: tuple, kwargs: dict) -> Any:
+    """Run `function` on the worker's own scorer for the caller's cache grid"""
+    from app.ml.registry import get_model_registry
+    
+    return function(get_model_registry().cached_scorer(precision), *args, **kwargs)
+
+
+class ScoringExecutor:
+    """
+    Runs `function(ensemble_scorer, *args, **kwargs)` off the event loop
+    
+    `function` must be a module-level function or a method looked up on the
+    class (e.g. `CachedEnsembleScorer.forecast`) so the process strategy can
+    send it to its workers, which substitute their own scorer on the same
+    cache grid for `ensemble_scorer`.
+    """
+    
+    def __init__(self, kind: str = "thread", workers: Optional[int] = None):
+        """
+        Initialize executor
+        
+        Args:
+            kind: 'inline', 'thread' or 'process'
+            workers: Pool size (None: the pool's default for this machine)
+        
+        Raises:
+            ValueError: If kind is not one of EXECUTOR_KINDS
+        """
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(
+                f"Unknown scoring executor {kind!r}; expected one of {', '.join(EXECUTOR_KINDS)}"
+            )
+        self.kind = kind
+        self.workers = workers
+        self._pool: Optional[Executor] = None
+        if kind == 'thread':
+            self._pool = ThreadPoolExecutor(workers, thread_name_prefix="scoring")
+        elif kind == 'process':
+            self._pool = ProcessPoolExecutor(workers, initializer=_init_worker)
+    
+    async def run(self, function: Callable, ensemble_scorer, *args, **kwargs) -> Any:
+        """
+        Run a blocking scoring function and wait for its result
+        
+        Args:
+            function: Called as function(ensemble_scorer, *args, **kwargs)
+            ensemble_scorer: CachedEnsembleScorer the work is for
+            *args, **kwargs: Further arguments (picklable for 'process')
+        """
+        if self._pool is None:
+            return function(ensemble_scorer, *args, **kwargs)
+        return await asyncio.wrap_future(self.submit(function, ensemble_scorer, *args, **kwargs))
+    
+    def submit(self, function: Callable, ensemble_scorer, *args, **kwargs) -> Future:
+        """
+        Start a blocking scoring function from synchronous code
+        
+        Same arguments as `run`; inline work is done before returning.
+        
+        Returns:
+            Future of the function's result
+        """
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(function(ensemble_scorer, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        if self.kind == 'process':
+            return self._pool.submit(
+                _call_in_worker, function, ensemble_scorer.precision, args, kwargs
+            )
+        return self._pool.submit(function, ensemble_scorer, *args, **kwargs)
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the pool's workers"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+
+@lru_cache(maxsize=None)
+def get_scoring_executor() -> ScoringExecutor:
+    """Process-wide scoring executor configured from settings"""
+    executor = ScoringExecutor(settings.SCORING_EXECUTOR, settings.SCORING_WORKERS)
+    logger.info("Scoring executor: %s (%s workers)", executor.kind, executor.workers or "default")
+    return executor
@@ -0,0 +1,94 @@
+"""
+Scoring Fingerprint
+Identifies everything a live score depends on besides the request: the
+release, the scoring code, the rule and reference data files, the DEM
+tiles and the trained model artifacts in use. Precomputed answers (the
+risk grid, cached scores, rendered tiles) are keyed on it, so a change to
+any of these inputs stops earlier answers from being served.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app import __version__
+from app.core.config import settings
+
+_ML_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Packages and modules (under app/ml) whose code decides a score
+SCORING_SOURCE_DIRS = ('models', 'spatial')
+SCORING_SOURCE_FILES = ('ensemble.py',)
+
+
+def scoring_source_files() -> List[str]:
+    """Python sources of the risk models, the spatial data layer and the ensemble"""
+    paths = [os.path.join(_ML_DIR, name) for name in SCORING_SOURCE_FILES]
+    for directory in SCORING_SOURCE_DIRS:
+        directory = os.path.join(_ML_DIR, directory)
+        paths.extend(
+            os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.py')
+        )
+    return paths
+
+
+def scoring_data_files() -> List[str]:
+    """Rule and reference data files the models read, as configured"""
+    from app.ml.spatial.coast import COAST_GRID_METADATA_FILENAME, COASTLINE_PATH
+    from app.ml.spatial.gazetteer import URBAN_CENTRES_PATH
+    from app.ml.spatial.regions import REGIONAL_RULES_PATH
+    from app.ml.spatial.rivers import RIVERS_PATH
+    
+    return [
+        REGIONAL_RULES_PATH,
+        settings.RIVER_NETWORK_PATH or RIVERS_PATH,
+        settings.COASTLINE_PATH or COASTLINE_PATH,
+        # The distance-to-coast raster replaces the coastline when built
+        os.path.join(settings.MODEL_BASE_PATH, COAST_GRID_METADATA_FILENAME),
+        settings.URBAN_GAZETTEER_PATH or URBAN_CENTRES_PATH,
+    ]
+
+
+@lru_cache(maxsize=None)
+def rules_fingerprint() -> str:
+    """
+    Hash of the scoring code, the rule and data files and the DEM tiles
+    
+    Computed once per process. Files are hashed in full (missing ones
+    count as empty); DEM tiles are identified by name and size.
+    """
+    from app.ml.spatial.elevation import find_tiles
+    
+    digest = hashlib.sha256()
+    for path in scoring_source_files() + scoring_data_files():
+        digest.update(os.path.basename(path).encode() + b'\0')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        digest.update(b'\0')
+    tiles = find_tiles(settings.DEM_PATH)
+    digest.update(json.dumps(
+        [[*key, os.path.basename(path), os.path.getsize(path)] for key, path in sorted(tiles.items())]
+    ).encode())
+    return digest.hexdigest()[:12]
+
+
+def scoring_version(models: Optional[Dict[str, object]] = None) -> str:
+    """
+    Version of the scores a set of risk models gives
+    
+    Args:
+        models: Risk models by name; those with a trained artifact loaded
+            add its version (rule-based models by default)
+    
+    Returns:
+        Release, rules fingerprint and trained model versions,
+        e.g. "0.1.0+rules.3f2a9c1e0b7d+flood.v7"
+    """
+    version = f"{__version__}+rules.{rules_fingerprint()}"
+    for name, model in (models or {}).items():
+        if getattr(model, 'model_version', None):
+            version += f"+{name}.{model.model_version}"
+    return version
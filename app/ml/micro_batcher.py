@@ -0,0 +1,118 @@
+"""
+Micro-Batcher
+Collects concurrent single-item requests on the event loop into batches for
+one vectorized call. A batch runs once it holds max_batch_size items or its
+first item has waited max_wait_seconds; while it runs (e.g. on the scoring
+executor) the event loop keeps accepting requests. Batch sizes and queue
+waits are recorded in Prometheus histograms (served at /metrics).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from prometheus_client import Histogram
+
+BATCH_SIZE = Histogram(
+    'climarisk_micro_batch_size',
+    'Items per micro-batch',
+    ['batcher'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+QUEUE_WAIT = Histogram(
+    'climarisk_micro_batch_queue_wait_seconds',
+    'Time items wait before their micro-batch starts',
+    ['batcher'],
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class MicroBatcher:
+    """
+    Batches items submitted concurrently from coroutines
+    
+    `process` is awaited with a list of items and returns one result per item, in
+    order; an exception in place of a result is raised to that item's
+    caller only. If `process` itself raises, every caller in the batch gets
+    the exception.
+    """
+    
+    def __init__(
+        self,
+        process: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 64,
+        max_wait_seconds: float = 0.002,
+        name: str = "default",
+    ):
+        """
+        Initialize batcher
+        
+        Args:
+            process: Coroutine function scoring a batch off the event loop
+            max_batch_size: Items that make a batch run immediately
+            max_wait_seconds: Longest the first item of a batch waits for more
+            name: Label of this batcher's histograms
+        """
+        self.process = process
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_seconds
+        self.name = name
+        self._batch_size = BATCH_SIZE.labels(batcher=name)
+        self._queue_wait = QUEUE_WAIT.labels(batcher=name)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches, referenced so they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First use on this event loop (e.g. a new test client's)
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+    
+    def _flush(self):
+        """Start a batch with everything queued so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        """Process a batch and resolve its callers' futures"""
+        started = time.perf_counter()
+        self._batch_size.observe(len(batch))
+        for _, _, queued_at in batch:
+            self._queue_wait.observe(started - queued_at)
+        
+        try:
+            results = await self.process([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self.name} batch returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            results = [e] * len(batch)
+        
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                # The caller went away (e.g. the client disconnected)
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
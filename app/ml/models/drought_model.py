@@ -5,6 +5,9 @@ Predicts drought risk based on precipitation patterns, soil moisture, etc.
 import numpy as np
 from typing import Optional
 
+from app.ml.models.trained import TrainedModel, optional_column
+from app.ml.spatial.regions import load_region_tables
+
 
 class DroughtRiskModel:
     """
@@ -18,9 +21,16 @@ class DroughtRiskModel:
     - Aridity index
     """
     
+    # Features a trained model may be built on
+    FEATURES = ('latitude', 'longitude', 'annual_precipitation')
+    
     def __init__(self):
         """Initialize drought risk model"""
         self.model_loaded = False
+        self.trained: Optional[TrainedModel] = None
+        self.model_version: Optional[str] = None
+        # Regional knowledge lives in the declarative rule tables
+        self.regions = load_region_tables()
     
     def predict(
         self,
@@ -41,6 +51,12 @@ class DroughtRiskModel:
         Returns:
             Drought risk score (0-100)
         """
+        if self.trained is not None:
+            return float(self.predict_batch(
+                np.array([latitude]), np.array([longitude]),
+                annual_precipitation=annual_precipitation,
+            )[0])
+        
         base_risk = 35.0
         
         # Precipitation-based risk
@@ -65,6 +81,63 @@ class DroughtRiskModel:
         
         return min(100, max(0, drought_risk))
     
+    def predict_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        annual_precipitation: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Vectorized drought risk for many locations at once
+        
+        Gives exactly the same numbers as calling `predict` per row.
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            annual_precipitation: Per-row annual precipitation in mm (optional, NaN = unknown)
+            **kwargs: Additional features
+            
+        Returns:
+            Array of drought risk scores (0-100)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        
+        if self.trained is not None:
+            return self.trained.predict({
+                'latitude': lambda: latitudes,
+                'longitude': lambda: longitudes,
+                'annual_precipitation': lambda: optional_column(
+                    annual_precipitation, latitudes.shape
+                ),
+            }, latitudes.shape)
+        
+        prec_risk = self._estimate_regional_precipitation_risk_batch(latitudes, longitudes)
+        if annual_precipitation is not None:
+            precipitation = np.broadcast_to(
+                np.asarray(annual_precipitation, dtype=float), latitudes.shape
+            )
+            # Missing (NaN) or zero precipitation falls back to the regional estimate
+            known = ~np.isnan(precipitation) & (precipitation != 0)
+            prec_risk = np.where(
+                known,
+                self._calculate_precipitation_risk_batch(precipitation),
+                prec_risk,
+            )
+        
+        aridity_risk = self._calculate_aridity_risk_batch(latitudes, longitudes)
+        monsoon_dependency = self._calculate_monsoon_dependency_batch(latitudes, longitudes)
+        
+        drought_risk = (
+            prec_risk * 0.5 +
+            aridity_risk * 0.3 +
+            monsoon_dependency * 0.2
+        )
+        
+        return np.clip(drought_risk, 0, 100)
+    
     def _calculate_precipitation_risk(self, annual_precipitation: float) -> float:
         """Calculate risk based on annual precipitation"""
         # India average: ~1200mm/year
@@ -84,60 +157,64 @@ class DroughtRiskModel:
         else:
             return 25  # Low risk
     
+    def _calculate_precipitation_risk_batch(self, annual_precipitation: np.ndarray) -> np.ndarray:
+        """Vectorized `_calculate_precipitation_risk`"""
+        return np.select(
+            [
+                annual_precipitation < 400,
+                annual_precipitation < 600,
+                annual_precipitation < 800,
+                annual_precipitation < 1200,
+            ],
+            [85.0, 70.0, 55.0, 40.0],
+            25.0,
+        )
+    
     def _estimate_regional_precipitation_risk(self, latitude: float, longitude: float) -> float:
         """Estimate precipitation risk based on region"""
-        # Simplified regional estimation
-        # Western Rajasthan: Very dry
-        # Central India: Moderate
-        # Eastern/Northeastern: High precipitation
-        
-        # Western regions (Rajasthan, Gujarat)
-        if 23 <= latitude <= 30 and 68 <= longitude <= 75:
-            return 75  # High drought risk
-        
-        # Central India
-        elif 18 <= latitude <= 26 and 75 <= longitude <= 85:
-            return 50  # Moderate risk
-        
-        # Northeastern regions
-        elif 24 <= latitude <= 30 and 88 <= longitude <= 97:
-            return 25  # Low risk (high precipitation)
-        
-        # Southern regions
-        elif latitude < 18:
-            return 40  # Moderate (varies by monsoon)
-        
-        else:
-            return 45  # Default moderate
+        return self.regions['drought_precipitation'].lookup(latitude, longitude)
+    
+    def _estimate_regional_precipitation_risk_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_estimate_regional_precipitation_risk`"""
+        return self.regions['drought_precipitation'].lookup_batch(latitudes, longitudes)
     
     def _calculate_aridity_risk(self, latitude: float, longitude: float) -> float:
         """Calculate aridity risk based on location"""
-        # Simplified: Western and Northwestern regions are more arid
-        if 23 <= latitude <= 30 and 68 <= longitude <= 76:
-            return 80  # Arid region
-        elif 22 <= latitude <= 28 and 76 <= longitude <= 82:
-            return 50  # Semi-arid
-        else:
-            return 30  # Less arid
+        return self.regions['drought_aridity'].lookup(latitude, longitude)
+    
+    def _calculate_aridity_risk_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_calculate_aridity_risk`"""
+        return self.regions['drought_aridity'].lookup_batch(latitudes, longitudes)
     
     def _calculate_monsoon_dependency(self, latitude: float, longitude: float) -> float:
         """Calculate risk based on monsoon dependency"""
-        # Regions highly dependent on monsoon are more vulnerable to variability
-        # Most of India is monsoon-dependent, but some regions more than others
-        
-        # Core monsoon region (high dependency)
-        if 20 <= latitude <= 28 and 75 <= longitude <= 88:
-            return 60
-        
-        # Moderate dependency
-        elif 18 <= latitude <= 30:
-            return 50
-        
-        # Lower dependency (coastal or Himalayan)
-        else:
-            return 35
+        return self.regions['drought_monsoon_dependency'].lookup(latitude, longitude)
+    
+    def _calculate_monsoon_dependency_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_calculate_monsoon_dependency`"""
+        return self.regions['drought_monsoon_dependency'].lookup_batch(latitudes, longitudes)
     
     def load_model(self, model_path: str):
-        """Load trained model from file"""
+        """
+        Load a trained model (joblib file plus feature manifest) and warm it up
+        
+        Args:
+            model_path: Path of the joblib file; see `TrainedModel`
+        """
+        self.trained = TrainedModel.load(model_path, self.FEATURES)
+        self.trained.warm_up(self.predict_batch, "drought")
+        self.model_version = self.trained.version
         self.model_loaded = True
 
@@ -5,6 +5,19 @@ Predicts flood risk based on elevation, proximity to water bodies, historical da
 import numpy as np
 from typing import Dict, Optional
 
+from app.ml.models.trained import TrainedModel, optional_column
+from app.ml.spatial.coast import get_coast_sampler
+from app.ml.spatial.rivers import get_river_network
+
+# River proximity risk: (distance to nearest river in km, risk) from closest
+# band outwards; anything further gets RIVER_BACKGROUND_RISK
+RIVER_PROXIMITY_RISK = [
+    (5.0, 80),   # Active floodplain
+    (15.0, 50),
+    (40.0, 30),
+]
+RIVER_BACKGROUND_RISK = 20
+
 
 class FloodRiskModel:
     """
@@ -18,11 +31,17 @@ class FloodRiskModel:
     - Topography
     """
     
+    # Features a trained model may be built on
+    FEATURES = ('latitude', 'longitude', 'elevation', 'river_distance_km', 'coast_distance_km')
+    
     def __init__(self):
         """Initialize flood risk model"""
         self.model_loaded = False
-        # In production, this would load a trained model
-        # For now, using rule-based approach with placeholders
+        self.trained: Optional[TrainedModel] = None
+        self.model_version: Optional[str] = None
+        self.rivers = get_river_network()
+        self.coast = get_coast_sampler()
+        # Rule-based scoring until a trained model is loaded
     
     def predict(
         self,
@@ -43,8 +62,10 @@ class FloodRiskModel:
         Returns:
             Flood risk score (0-100)
         """
-        # Simplified risk calculation
-        # In production, this would use a trained ML model
+        if self.trained is not None:
+            return float(self.predict_batch(
+                np.array([latitude]), np.array([longitude]), elevation=elevation
+            )[0])
         
         base_risk = 30.0
         
@@ -81,53 +102,108 @@ class FloodRiskModel:
         
         return min(100, max(0, flood_risk))
     
-    def _is_coastal(self, latitude: float, longitude: float) -> bool:
-        """Check if location is near coast (simplified)"""
-        # India's coastline roughly: 8°N to 23°N latitude, 68°E to 97°E longitude
-        # This is a very simplified check
-        coastal_latitudes = [(8, 23), (19, 23)]  # West and East coasts
-        coastal_longitudes = [(68, 72), (80, 97)]  # West and East
-        
-        for lat_range in coastal_latitudes:
-            for lon_range in coastal_longitudes:
-                if lat_range[0] <= latitude <= lat_range[1] and lon_range[0] <= longitude <= lon_range[1]:
-                    return True
-        return False
-    
-    def _estimate_river_proximity_risk(self, latitude: float, longitude: float) -> float:
+    def predict_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        elevation: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> np.ndarray:
         """
-        Estimate risk based on proximity to major rivers
-        Simplified version - in production would use actual river network data
+        Vectorized flood risk for many locations at once
+        
+        Gives exactly the same numbers as calling `predict` per row.
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            elevation: Per-row elevation in meters (optional, NaN = unknown)
+            **kwargs: Additional features
+        
+        Returns:
+            Array of flood risk scores (0-100)
         """
-        # Major Indian rivers (simplified coordinates)
-        major_rivers = [
-            (25.3, 83.0, "Ganges"),
-            (22.7, 72.7, "Narmada"),
-            (19.1, 73.3, "Godavari"),
-            (16.9, 81.8, "Krishna"),
-            (12.8, 77.6, "Kaveri"),
-            (26.9, 88.1, "Brahmaputra"),
-        ]
-        
-        min_distance = float('inf')
-        for river_lat, river_lon, _ in major_rivers:
-            distance = np.sqrt(
-                (latitude - river_lat) ** 2 + (longitude - river_lon) ** 2
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        
+        if self.trained is not None:
+            return self.trained.predict({
+                'latitude': lambda: latitudes,
+                'longitude': lambda: longitudes,
+                'elevation': lambda: optional_column(elevation, latitudes.shape),
+                'river_distance_km': lambda: self.rivers.distances_km(latitudes, longitudes),
+                'coast_distance_km': lambda: self.coast.distances_km(latitudes, longitudes),
+            }, latitudes.shape)
+        
+        if elevation is not None:
+            elevation = np.broadcast_to(np.asarray(elevation, dtype=float), latitudes.shape)
+            elevation_risk = np.select(
+                [elevation < 10, elevation < 50, elevation < 200],
+                [70.0, 50.0, 30.0],
+                20.0,
             )
-            min_distance = min(min_distance, distance)
+            elevation_risk = np.where(np.isnan(elevation), 40.0, elevation_risk)
+        else:
+            elevation_risk = np.full(latitudes.shape, 40.0)
+        
+        coastal_adjustment = np.where(
+            self._is_coastal_batch(latitudes, longitudes), 20.0, 0.0
+        )
+        river_proximity_risk = self._estimate_river_proximity_risk_batch(latitudes, longitudes)
+        
+        flood_risk = (
+            elevation_risk * 0.5 +
+            river_proximity_risk * 0.3 +
+            coastal_adjustment * 0.2
+        )
+        
+        return np.clip(flood_risk, 0, 100)
+    
+    def _is_coastal(self, latitude: float, longitude: float) -> bool:
+        """Check if location is within the coastal zone (distance-to-coast raster)"""
+        return self.coast.is_coastal(latitude, longitude)
+    
+    def _is_coastal_batch(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `_is_coastal`"""
+        return self.coast.is_coastal_batch(latitudes, longitudes)
+    
+    def _estimate_river_proximity_risk(self, latitude: float, longitude: float) -> float:
+        """Estimate risk based on great-circle distance to the nearest river"""
+        distance = self.rivers.distance_km(
+            latitude, longitude, max_distance_km=RIVER_PROXIMITY_RISK[-1][0]
+        )
         
         # Convert distance to risk (closer = higher risk)
-        if min_distance < 0.5:  # ~50km
-            return 80
-        elif min_distance < 1.0:
-            return 50
-        elif min_distance < 2.0:
-            return 30
-        else:
-            return 20
+        for max_distance, risk in RIVER_PROXIMITY_RISK:
+            if distance < max_distance:
+                return risk
+        return RIVER_BACKGROUND_RISK
+    
+    def _estimate_river_proximity_risk_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_estimate_river_proximity_risk`"""
+        distance = self.rivers.distances_km(
+            latitudes, longitudes, max_distance_km=RIVER_PROXIMITY_RISK[-1][0]
+        )
+        
+        return np.select(
+            [distance < max_distance for max_distance, _ in RIVER_PROXIMITY_RISK],
+            [float(risk) for _, risk in RIVER_PROXIMITY_RISK],
+            float(RIVER_BACKGROUND_RISK),
+        )
     
     def load_model(self, model_path: str):
-        """Load trained model from file"""
-        # In production: load actual trained model (PyTorch, TensorFlow, XGBoost, etc.)
+        """
+        Load a trained model (joblib file plus feature manifest) and warm it up
+        
+        Args:
+            model_path: Path of the joblib file; see `TrainedModel`
+        """
+        self.trained = TrainedModel.load(model_path, self.FEATURES)
+        self.trained.warm_up(self.predict_batch, "flood")
+        self.model_version = self.trained.version
         self.model_loaded = True
 
@@ -5,6 +5,10 @@ Predicts groundwater depletion risk based on historical levels, extraction rates
 import numpy as np
 from typing import Optional
 
+from app.ml.models.trained import TrainedModel, optional_column
+from app.ml.spatial.gazetteer import get_urban_gazetteer
+from app.ml.spatial.regions import load_region_tables
+
 
 class GroundwaterRiskModel:
     """
@@ -18,9 +22,18 @@ class GroundwaterRiskModel:
     - Agricultural intensity
     """
     
+    # Features a trained model may be built on
+    FEATURES = ('latitude', 'longitude', 'current_water_level', 'is_urban')
+    
     def __init__(self):
         """Initialize groundwater risk model"""
         self.model_loaded = False
+        self.trained: Optional[TrainedModel] = None
+        self.model_version: Optional[str] = None
+        # Shared with the other models so they agree on what counts as urban
+        self.gazetteer = get_urban_gazetteer()
+        # Regional knowledge lives in the declarative rule tables
+        self.regions = load_region_tables()
     
     def predict(
         self,
@@ -41,6 +54,12 @@ class GroundwaterRiskModel:
         Returns:
             Groundwater risk score (0-100)
         """
+        if self.trained is not None:
+            return float(self.predict_batch(
+                np.array([latitude]), np.array([longitude]),
+                current_water_level=current_water_level,
+            )[0])
+        
         base_risk = 40.0
         
         # Region-based risk (known critical zones)
@@ -61,50 +80,72 @@ class GroundwaterRiskModel:
         
         return min(100, max(0, groundwater_risk))
     
-    def _get_regional_groundwater_risk(self, latitude: float, longitude: float) -> float:
-        """
-        Get risk based on known critical groundwater zones in India
-        Based on CGWB (Central Ground Water Board) data
+    def predict_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        current_water_level: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> np.ndarray:
         """
-        # Critical zones (simplified based on known problem areas)
-        # Punjab-Haryana region (very high extraction)
-        if 29 <= latitude <= 31 and 74 <= longitude <= 77:
-            return 85
+        Vectorized groundwater risk for many locations at once
         
-        # Northwestern regions (Rajasthan, Gujarat)
-        elif 24 <= latitude <= 29 and 70 <= longitude <= 76:
-            return 75
+        Gives exactly the same numbers as calling `predict` per row.
         
-        # Central India (Madhya Pradesh, parts of Maharashtra)
-        elif 22 <= latitude <= 26 and 74 <= longitude <= 80:
-            return 65
-        
-        # Tamil Nadu (some critical blocks)
-        elif 10 <= latitude <= 13 and 76 <= longitude <= 80:
-            return 60
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            current_water_level: Per-row groundwater level in meters (optional)
+            **kwargs: Additional features
+            
+        Returns:
+            Array of groundwater risk scores (0-100)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        
+        if self.trained is not None:
+            return self.trained.predict({
+                'latitude': lambda: latitudes,
+                'longitude': lambda: longitudes,
+                'current_water_level': lambda: optional_column(
+                    current_water_level, latitudes.shape
+                ),
+                'is_urban': lambda: self._is_likely_urban_batch(latitudes, longitudes).astype(float),
+            }, latitudes.shape)
+        
+        regional_risk = self._get_regional_groundwater_risk_batch(latitudes, longitudes)
+        agricultural_intensity = self._estimate_agricultural_intensity_batch(latitudes, longitudes)
+        recharge_potential = self._estimate_recharge_potential_batch(latitudes, longitudes)
         
-        # Northeastern regions (generally better)
-        elif 24 <= latitude <= 30 and 88 <= longitude <= 97:
-            return 35
+        groundwater_risk = (
+            regional_risk * 0.5 +
+            agricultural_intensity * 0.3 +
+            (100 - recharge_potential) * 0.2
+        )
         
-        # Default moderate risk
-        else:
-            return 50
+        return np.clip(groundwater_risk, 0, 100)
+    
+    def _get_regional_groundwater_risk(self, latitude: float, longitude: float) -> float:
+        """
+        Get risk based on known critical groundwater zones in India
+        Based on CGWB (Central Ground Water Board) data
+        """
+        return self.regions['groundwater_regional_risk'].lookup(latitude, longitude)
+    
+    def _get_regional_groundwater_risk_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_get_regional_groundwater_risk`"""
+        return self.regions['groundwater_regional_risk'].lookup_batch(latitudes, longitudes)
     
     def _estimate_agricultural_intensity(self, latitude: float, longitude: float) -> float:
         """Estimate agricultural intensity (higher = more groundwater extraction)"""
-        # Known agricultural intensive regions
-        # Punjab, Haryana (wheat-rice intensive)
-        if 29 <= latitude <= 31 and 74 <= longitude <= 77:
-            return 90
-        
-        # Western UP
-        elif 26 <= latitude <= 29 and 77 <= longitude <= 81:
-            return 75
-        
-        # Central India agricultural regions
-        elif 22 <= latitude <= 26 and 75 <= longitude <= 82:
-            return 65
+        intensity = self.regions['groundwater_agricultural_intensity'].lookup(latitude, longitude)
+        if intensity is not None:
+            return intensity
         
         # Urban areas (lower agricultural intensity)
         elif self._is_likely_urban(latitude, longitude):
@@ -114,44 +155,47 @@ class GroundwaterRiskModel:
         else:
             return 50
     
+    def _estimate_agricultural_intensity_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_estimate_agricultural_intensity`"""
+        intensity = self.regions['groundwater_agricultural_intensity'].lookup_batch(
+            latitudes, longitudes
+        )
+        fallback = np.where(self._is_likely_urban_batch(latitudes, longitudes), 30.0, 50.0)
+        return np.where(np.isnan(intensity), fallback, intensity)
+    
     def _estimate_recharge_potential(self, latitude: float, longitude: float) -> float:
         """Estimate groundwater recharge potential (higher = better)"""
-        # Recharge depends on precipitation and geological conditions
-        
-        # High precipitation regions = higher recharge
-        if 24 <= latitude <= 30 and 88 <= longitude <= 97:  # Northeastern
-            return 80
-        
-        elif latitude < 18:  # Southern (varies)
-            return 70
-        
-        # Low precipitation regions = lower recharge
-        elif 23 <= latitude <= 30 and 68 <= longitude <= 76:  # Western arid
-            return 30
-        
-        # Moderate
-        else:
-            return 55
+        return self.regions['groundwater_recharge_potential'].lookup(latitude, longitude)
+    
+    def _estimate_recharge_potential_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `_estimate_recharge_potential`"""
+        return self.regions['groundwater_recharge_potential'].lookup_batch(latitudes, longitudes)
     
     def _is_likely_urban(self, latitude: float, longitude: float) -> bool:
         """Check if location is likely urban"""
-        major_cities = [
-            (28.6139, 77.2090),  # Delhi
-            (19.0760, 72.8777),  # Mumbai
-            (13.0827, 80.2707),  # Chennai
-            (12.9716, 77.5946),  # Bangalore
-        ]
-        
-        for city_lat, city_lon in major_cities:
-            distance = np.sqrt(
-                (latitude - city_lat) ** 2 + (longitude - city_lon) ** 2
-            )
-            if distance < 0.5:
-                return True
-        
-        return False
+        return self.gazetteer.is_urban(latitude, longitude)
+    
+    def _is_likely_urban_batch(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `_is_likely_urban`"""
+        return self.gazetteer.is_urban_batch(latitudes, longitudes)
     
     def load_model(self, model_path: str):
-        """Load trained model from file"""
+        """
+        Load a trained model (joblib file plus feature manifest) and warm it up
+        
+        Args:
+            model_path: Path of the joblib file; see `TrainedModel`
+        """
+        self.trained = TrainedModel.load(model_path, self.FEATURES)
+        self.trained.warm_up(self.predict_batch, "groundwater")
+        self.model_version = self.trained.version
         self.model_loaded = True
 
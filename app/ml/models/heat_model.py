@@ -5,6 +5,9 @@ Predicts heat wave risk based on urban heat island effect, historical temperatur
 import numpy as np
 from typing import Optional
 
+from app.ml.models.trained import TrainedModel, optional_column
+from app.ml.spatial.gazetteer import get_urban_gazetteer
+
 
 class HeatRiskModel:
     """
@@ -18,9 +21,16 @@ class HeatRiskModel:
     - Latitude/climate zone
     """
     
+    # Features a trained model may be built on
+    FEATURES = ('latitude', 'longitude', 'is_urban', 'population_density')
+    
     def __init__(self):
         """Initialize heat risk model"""
         self.model_loaded = False
+        self.trained: Optional[TrainedModel] = None
+        self.model_version: Optional[str] = None
+        # Shared with the other models so they agree on what counts as urban
+        self.gazetteer = get_urban_gazetteer()
     
     def predict(
         self,
@@ -43,6 +53,12 @@ class HeatRiskModel:
         Returns:
             Heat risk score (0-100)
         """
+        if self.trained is not None:
+            return float(self.predict_batch(
+                np.array([latitude]), np.array([longitude]),
+                is_urban=is_urban, population_density=population_density,
+            )[0])
+        
         base_risk = 40.0
         
         # Latitude-based risk (lower latitude = higher baseline temperature)
@@ -81,6 +97,74 @@ class HeatRiskModel:
         
         return min(100, max(0, heat_risk))
     
+    def predict_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        is_urban: Optional[np.ndarray] = None,
+        population_density: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Vectorized heat risk for many locations at once
+        
+        Gives exactly the same numbers as calling `predict` per row.
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            is_urban: Per-row urban flags (optional)
+            population_density: Per-row population density per sq km (optional, NaN = unknown)
+            **kwargs: Additional features
+            
+        Returns:
+            Array of heat risk scores (0-100)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        
+        if self.trained is not None:
+            return self.trained.predict({
+                'latitude': lambda: latitudes,
+                'longitude': lambda: longitudes,
+                'is_urban': lambda: self._urban_column(latitudes, longitudes, is_urban),
+                'population_density': lambda: optional_column(population_density, latitudes.shape),
+            }, latitudes.shape)
+        
+        lat_risk = self._calculate_latitude_risk_batch(latitudes)
+        
+        if is_urban is None:
+            is_urban = self._is_likely_urban_batch(latitudes, longitudes)
+        else:
+            is_urban = np.broadcast_to(np.asarray(is_urban, dtype=bool), latitudes.shape)
+        
+        urban_heat_island_adjustment = np.where(is_urban, 25.0, 10.0)
+        
+        if population_density is not None:
+            density = np.broadcast_to(np.asarray(population_density, dtype=float), latitudes.shape)
+            density_adjustment = np.select(
+                [density > 10000, density > 5000],
+                [15.0, 10.0],
+                5.0,
+            )
+            # Missing (NaN) or zero density falls back to the default, as in `predict`
+            density_adjustment = np.where(
+                np.isnan(density) | (density == 0), 8.0, density_adjustment
+            )
+        else:
+            density_adjustment = np.full(latitudes.shape, 8.0)
+        
+        climate_adjustment = self._get_climate_zone_risk_batch(latitudes)
+        
+        heat_risk = (
+            lat_risk * 0.3 +
+            urban_heat_island_adjustment * 0.3 +
+            density_adjustment * 0.2 +
+            climate_adjustment * 0.2
+        )
+        
+        return np.clip(heat_risk, 0, 100)
+    
     def _calculate_latitude_risk(self, latitude: float) -> float:
         """Calculate base heat risk based on latitude"""
         # Lower latitudes (closer to equator) have higher baseline temperatures
@@ -94,27 +178,32 @@ class HeatRiskModel:
         else:
             return 40  # Himalayan region (cooler)
     
+    def _calculate_latitude_risk_batch(self, latitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `_calculate_latitude_risk`"""
+        return np.select(
+            [latitudes < 15, latitudes < 25, latitudes < 30],
+            [70.0, 60.0, 50.0],
+            40.0,
+        )
+    
     def _is_likely_urban(self, latitude: float, longitude: float) -> bool:
         """Check if location is likely urban (simplified)"""
-        # Major Indian cities (simplified)
-        major_cities = [
-            (28.6139, 77.2090, "Delhi"),
-            (19.0760, 72.8777, "Mumbai"),
-            (13.0827, 80.2707, "Chennai"),
-            (12.9716, 77.5946, "Bangalore"),
-            (22.5726, 88.3639, "Kolkata"),
-            (18.5204, 73.8567, "Pune"),
-            (23.0225, 72.5714, "Ahmedabad"),
-        ]
-        
-        for city_lat, city_lon, _ in major_cities:
-            distance = np.sqrt(
-                (latitude - city_lat) ** 2 + (longitude - city_lon) ** 2
-            )
-            if distance < 0.5:  # Within ~50km of major city
-                return True
-        
-        return False
+        return self.gazetteer.is_urban(latitude, longitude)
+    
+    def _is_likely_urban_batch(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `_is_likely_urban`"""
+        return self.gazetteer.is_urban_batch(latitudes, longitudes)
+    
+    def _urban_column(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        is_urban: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """Urban flags as a 0/1 feature column (looked up when not given)"""
+        if is_urban is None:
+            is_urban = self._is_likely_urban_batch(latitudes, longitudes)
+        return np.broadcast_to(np.asarray(is_urban, dtype=bool), latitudes.shape).astype(float)
     
     def _get_climate_zone_risk(self, latitude: float, longitude: float) -> float:
         """Get heat risk based on climate zone"""
@@ -130,7 +219,23 @@ class HeatRiskModel:
         else:
             return 40  # Temperate - moderate
     
+    def _get_climate_zone_risk_batch(self, latitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `_get_climate_zone_risk`"""
+        return np.select(
+            [latitudes < 23.5, latitudes < 30],
+            [65.0, 55.0],
+            40.0,
+        )
+    
     def load_model(self, model_path: str):
-        """Load trained model from file"""
+        """
+        Load a trained model (joblib file plus feature manifest) and warm it up
+        
+        Args:
+            model_path: Path of the joblib file; see `TrainedModel`
+        """
+        self.trained = TrainedModel.load(model_path, self.FEATURES)
+        self.trained.warm_up(self.predict_batch, "heat")
+        self.model_version = self.trained.version
         self.model_loaded = True
 
@@ -0,0 +1,176 @@
+"""
+Trained Model Artifacts
+Serialized scikit-learn/XGBoost estimators (joblib, loaded memory-mapped)
+paired with the feature-spec manifest they were trained with. The risk
+models use them in place of their rules once an artifact is loaded.
+"""
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ml.risk_grid import DEFAULT_BOUNDS
+
+logger = logging.getLogger(__name__)
+
+# flood_model.joblib is described by flood_model.json
+MANIFEST_EXTENSION = ".json"
+
+# Warm-up: single-row calls and 10k-row batches timed after loading
+WARM_UP_SINGLE_ROWS = 50
+WARM_UP_BATCH_ROWS = 10_000
+WARM_UP_BATCHES = 3
+
+
+def optional_column(values, shape) -> np.ndarray:
+    """Per-row feature values as floats (all NaN when the input was not given)"""
+    if values is None:
+        return np.full(shape, np.nan)
+    return np.broadcast_to(np.asarray(values, dtype=float), shape)
+
+
+class TrainedModel:
+    """
+    A trained estimator and its feature spec
+    
+    The manifest is a JSON object with:
+    
+    - `features`: ordered feature names, the estimator's input columns
+    - `version`: artifact version, part of cached results' keys
+    - `fill_values` (optional): replacement per feature for missing (NaN)
+      inputs; features without one are passed as NaN, which gradient
+      boosting models handle natively
+    - `output_range` (optional): scores are clipped to it (default [0, 100])
+    """
+    
+    def __init__(self, estimator, manifest: Dict, path: Optional[str] = None):
+        """Initialize from a fitted estimator and its manifest"""
+        self.estimator = estimator
+        self.manifest = manifest
+        self.path = path
+        self.features: List[str] = list(manifest['features'])
+        self.version = str(manifest.get('version', ''))
+        self.fill_values: Dict[str, float] = manifest.get('fill_values', {})
+        self.output_range = tuple(manifest.get('output_range', (0.0, 100.0)))
+        self.latency: Dict[str, float] = {}
+    
+    @classmethod
+    def load(cls, path: str, available_features: Sequence[str]) -> "TrainedModel":
+        """
+        Load an estimator and its manifest
+        
+        Args:
+            path: joblib file, saved uncompressed so its arrays can be memory-mapped
+            available_features: Features the loading model can compute
+        
+        Raises:
+            ValueError: If the manifest asks for features the model cannot compute
+        """
+        # joblib is part of the full install (scikit-learn depends on it)
+        import joblib
+        
+        with open(os.path.splitext(path)[0] + MANIFEST_EXTENSION) as f:
+            manifest = json.load(f)
+        unknown = [name for name in manifest['features'] if name not in available_features]
+        if unknown:
+            raise ValueError(
+                f"{path} needs features the model cannot compute: {', '.join(unknown)}"
+            )
+        
+        estimator = joblib.load(path, mmap_mode='r')
+        return cls(estimator, manifest, path)
+    
+    @staticmethod
+    def save(
+        estimator,
+        path: str,
+        features: Sequence[str],
+        version: str,
+        fill_values: Optional[Dict[str, float]] = None,
+    ):
+        """Write an estimator (uncompressed, so it can be memory-mapped) and its manifest"""
+        import joblib
+        
+        joblib.dump(estimator, path)
+        manifest = {'features': list(features), 'version': version}
+        if fill_values:
+            manifest['fill_values'] = fill_values
+        with open(os.path.splitext(path)[0] + MANIFEST_EXTENSION, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    
+    def predict(
+        self,
+        columns: Dict[str, Callable[[], np.ndarray]],
+        shape: Tuple[int, ...]
+    ) -> np.ndarray:
+        """
+        Scores for a batch of locations
+        
+        Args:
+            columns: Feature name -> function computing that feature per
+                location (only the manifest's features are computed)
+            shape: Shape of the location arrays
+        
+        Returns:
+            Array of risk scores of that shape, clipped to the output range
+        """
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.empty(shape)
+        
+        matrix = np.empty((count, len(self.features)))
+        for j, name in enumerate(self.features):
+            column = np.broadcast_to(columns[name](), shape).ravel()
+            if name in self.fill_values:
+                column = np.where(np.isnan(column), self.fill_values[name], column)
+            matrix[:, j] = column
+        
+        low, high = self.output_range
+        scores = np.asarray(self.estimator.predict(matrix), dtype=float).reshape(shape)
+        return np.minimum(np.maximum(scores, low), high)
+    
+    def warm_up(self, predict_batch: Callable[[np.ndarray, np.ndarray], np.ndarray], name: str):
+        """
+        Run and time predictions so lazy initialization is paid before serving
+        
+        Single-row and WARM_UP_BATCH_ROWS-row latencies (p50/p99, seconds)
+        are logged and kept in `latency`.
+        
+        Args:
+            predict_batch: The owning model's batch prediction
+            name: Model name for the log line
+        """
+        min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+        rng = np.random.default_rng(0)
+        latitudes = rng.uniform(min_lat, max_lat, WARM_UP_BATCH_ROWS)
+        longitudes = rng.uniform(min_lon, max_lon, WARM_UP_BATCH_ROWS)
+        
+        single = []
+        for i in range(WARM_UP_SINGLE_ROWS):
+            started = time.perf_counter()
+            predict_batch(latitudes[i:i + 1], longitudes[i:i + 1])
+            single.append(time.perf_counter() - started)
+        
+        batch = []
+        for _ in range(WARM_UP_BATCHES):
+            started = time.perf_counter()
+            predict_batch(latitudes, longitudes)
+            batch.append(time.perf_counter() - started)
+        
+        self.latency = {
+            'single_p50': float(np.percentile(single, 50)),
+            'single_p99': float(np.percentile(single, 99)),
+            'batch_p50': float(np.percentile(batch, 50)),
+            'batch_p99': float(np.percentile(batch, 99)),
+        }
+        logger.info(
+            "%s model %s: single-row p50 %.2f ms, p99 %.2f ms; "
+            "%d-row p50 %.1f ms, p99 %.1f ms",
+            name, self.version,
+            self.latency['single_p50'] * 1e3, self.latency['single_p99'] * 1e3,
+            WARM_UP_BATCH_ROWS,
+            self.latency['batch_p50'] * 1e3, self.latency['batch_p99'] * 1e3,
+        )
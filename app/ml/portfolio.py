@@ -0,0 +1,343 @@
+"""
+Portfolio Scoring Engine
+Scores portfolios of millions of locations: the input is split into chunks
+that the scoring executor's workers score in parallel (vectorized, each
+process with its own models) and results stream back in input order. At
+most `max_pending` chunks are in flight, so memory stays bounded however
+long the input is.
+
+Score a CSV (latitude/longitude columns, other columns passed through) with:
+    python -m app.ml.portfolio score properties.csv scores.csv --workers 8
+
+Measure scaling over worker counts with:
+    python -m app.ml.portfolio benchmark --rows 1000000
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.executor import ScoringExecutor
+from app.ml.portfolio_formats import CsvWriter, extract_coordinates, score_rows
+from app.ml.risk_grid import DEFAULT_BOUNDS, RISK_GRID_BANDS
+
+# Result columns of every scored chunk
+RESULT_COLUMNS = ('clima_risk_score',) + RISK_GRID_BANDS + ('risk_level_code', 'confidence')
+
+# Called after each chunk with (rows scored so far, chunks scored so far)
+ProgressCallback = Callable[[int, int], None]
+
+
+def deduplicate_cells(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    resolution: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Snap coordinates to the grid and collapse rows sharing a cell
+    
+    Returns:
+        Tuple of (cell latitudes, cell longitudes, row -> cell index)
+    """
+    if resolution > 0:
+        latitudes = np.round(latitudes / resolution) * resolution
+        longitudes = np.round(longitudes / resolution) * resolution
+    
+    cells, inverse = np.unique(
+        np.column_stack([latitudes, longitudes]),
+        axis=0,
+        return_inverse=True,
+    )
+    return cells[:, 0], cells[:, 1], inverse.reshape(-1)
+
+
+def score_chunk(ensemble_scorer, latitudes: np.ndarray, longitudes: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Score one chunk in a single batched inference, each distinct grid cell once
+    
+    Args:
+        ensemble_scorer: CachedEnsembleScorer; its precision is the cell grid
+        latitudes: Array of latitudes
+        longitudes: Array of longitudes
+    
+    Returns:
+        Dictionary of RESULT_COLUMNS arrays, one value per input row
+    """
+    cell_latitudes, cell_longitudes, inverse = deduplicate_cells(
+        np.asarray(latitudes, dtype=float),
+        np.asarray(longitudes, dtype=float),
+        ensemble_scorer.precision,
+    )
+    results = ensemble_scorer.calculate_score_batch(cell_latitudes, cell_longitudes)
+    return {name: results[name][inverse] for name in RESULT_COLUMNS}
+
+
+class PortfolioScorer:
+    """
+    Chunked, ordered scoring of large portfolios on a ScoringExecutor
+    
+    With a process executor the chunks are scored on all its workers at
+    once; thread and inline executors work too (e.g. in tests).
+    """
+    
+    def __init__(
+        self,
+        executor: ScoringExecutor,
+        ensemble_scorer,
+        chunk_size: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        """
+        Initialize engine
+        
+        Args:
+            executor: Executor the chunks run on
+            ensemble_scorer: CachedEnsembleScorer whose precision sets the
+                deduplication grid (process workers use their own scorer)
+            chunk_size: Rows per chunk (PORTFOLIO_CHUNK_SIZE by default)
+            max_pending: Chunks in flight at once (twice the workers by default)
+        """
+        self.executor = executor
+        self.ensemble_scorer = ensemble_scorer
+        self.chunk_size = chunk_size or settings.PORTFOLIO_CHUNK_SIZE
+        workers = executor.workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * workers
+    
+    def score(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        progress: Optional[ProgressCallback] = None
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Score coordinate arrays, yielding each chunk's results in order"""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        chunks = (
+            (latitudes[start:start + self.chunk_size], longitudes[start:start + self.chunk_size])
+            for start in range(0, len(latitudes), self.chunk_size)
+        )
+        return self.score_chunks(chunks, progress)
+    
+    def score_rows(
+        self,
+        rows: Iterable[Tuple[float, float]],
+        progress: Optional[ProgressCallback] = None
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Score an iterable of (latitude, longitude) pairs, read lazily"""
+        def chunks():
+            rows_iter = iter(rows)
+            while True:
+                batch = list(islice(rows_iter, self.chunk_size))
+                if not batch:
+                    return
+                coordinates = np.array(batch, dtype=float).reshape(-1, 2)
+                yield coordinates[:, 0], coordinates[:, 1]
+        
+        return self.score_chunks(chunks(), progress)
+    
+    def score_chunks(
+        self,
+        chunks: Iterable[Tuple[np.ndarray, np.ndarray]],
+        progress: Optional[ProgressCallback] = None
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Score (latitudes, longitudes) chunks, yielding results in input order
+        
+        Chunks are read only as fast as results are consumed (at most
+        max_pending ahead). Abandoning the iterator cancels queued chunks.
+        
+        Args:
+            chunks: Iterable of coordinate array pairs
+            progress: Called after each chunk with rows and chunks scored so far
+        
+        Yields:
+            Dictionary of RESULT_COLUMNS arrays per chunk
+        """
+        pending: Deque[Future] = deque()
+        rows_scored = 0
+        chunks_scored = 0
+        chunks = iter(chunks)
+        try:
+            while True:
+                while len(pending) < self.max_pending:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append(
+                        self.executor.submit(score_chunk, self.ensemble_scorer, *chunk)
+                    )
+                if not pending:
+                    return
+                
+                results = pending.popleft().result()
+                rows_scored += len(results['clima_risk_score'])
+                chunks_scored += 1
+                if progress is not None:
+                    progress(rows_scored, chunks_scored)
+                yield results
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    async def score_async(self, latitudes: np.ndarray, longitudes: np.ndarray) -> Dict[str, np.ndarray]:
+        """Score coordinate arrays from a coroutine, all chunks in parallel"""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        chunks = await asyncio.gather(*(
+            self.executor.run(
+                score_chunk,
+                self.ensemble_scorer,
+                latitudes[start:start + self.chunk_size],
+                longitudes[start:start + self.chunk_size],
+            )
+            for start in range(0, len(latitudes), self.chunk_size)
+        ))
+        if not chunks:
+            return {name: np.empty(0) for name in RESULT_COLUMNS}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in RESULT_COLUMNS}
+
+
+def _create_engine(workers: int, chunk_size: int, resolution: float) -> PortfolioScorer:
+    """Engine on a fresh process pool (in-process for 0 workers)"""
+    from app.ml.registry import get_model_registry
+    
+    # Loaded before the pool starts, so forked workers inherit the models
+    ensemble_scorer = get_model_registry().cached_scorer(resolution)
+    executor = ScoringExecutor("process", workers) if workers > 0 else ScoringExecutor("inline")
+    return PortfolioScorer(executor, ensemble_scorer, chunk_size=chunk_size)
+
+
+def score_csv(
+    input_path: str,
+    output_path: str,
+    workers: int,
+    chunk_size: int,
+    resolution: float,
+    latitude_column: str = "latitude",
+    longitude_column: str = "longitude",
+):
+    """
+    Score a CSV file into another, streaming, with progress on stderr
+    
+    Rows without valid coordinates get an `error` instead of scores.
+    """
+    engine = _create_engine(workers, chunk_size, resolution)
+    started = time.perf_counter()
+    
+    def report(rows: int, chunks: int):
+        elapsed = time.perf_counter() - started
+        print(f"\rScored {rows:,} rows ({rows / elapsed:,.0f} rows/s)", end="", file=sys.stderr)
+    
+    with open(input_path, newline="") as source, open(output_path, "w", newline="") as target:
+        reader = csv.DictReader(source)
+        writer = CsvWriter(reader)
+        
+        # Input rows and per-row errors of the chunks in flight, to merge
+        # with their results
+        row_chunks: Deque[Tuple[List[Dict], List[Optional[str]]]] = deque()
+        
+        def chunks():
+            while True:
+                rows = list(islice(reader, chunk_size))
+                if not rows:
+                    return
+                latitudes, longitudes, errors = extract_coordinates([
+                    {'latitude': row.get(latitude_column), 'longitude': row.get(longitude_column)}
+                    for row in rows
+                ])
+                row_chunks.append((rows, errors))
+                valid = np.array([error is None for error in errors], dtype=bool)
+                yield latitudes[valid], longitudes[valid]
+        
+        try:
+            for results in engine.score_chunks(chunks(), progress=report):
+                rows, errors = row_chunks.popleft()
+                target.write(writer.write(score_rows(rows, results, errors)).decode())
+            if writer.input_fields is None:
+                # No rows: the header alone
+                target.write(writer.write([]).decode())
+        finally:
+            engine.executor.shutdown()
+    print(file=sys.stderr)
+
+
+def benchmark(rows: int, worker_counts: List[int], chunk_size: int, resolution: float):
+    """Print throughput over random locations for each worker count"""
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(min_lat, max_lat, rows)
+    longitudes = rng.uniform(min_lon, max_lon, rows)
+    
+    baseline = None
+    for workers in worker_counts:
+        engine = _create_engine(workers, chunk_size, resolution)
+        try:
+            # Start the workers before timing
+            list(engine.score(latitudes[:workers or 1], longitudes[:workers or 1]))
+            started = time.perf_counter()
+            for _ in engine.score(latitudes, longitudes):
+                pass
+            elapsed = time.perf_counter() - started
+        finally:
+            engine.executor.shutdown()
+        baseline = baseline or elapsed
+        print(
+            f"{workers:>3} workers: {rows / elapsed:>12,.0f} rows/s "
+            f"({elapsed:.2f}s, {baseline / elapsed:.2f}x)"
+        )
+
+
+def main():
+    """Command-line entry point for portfolio scoring"""
+    parser = argparse.ArgumentParser(description="Score large portfolios in parallel")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="Worker processes (0: in-process)"
+    )
+    parser.add_argument("--chunk-size", type=int, default=settings.PORTFOLIO_CHUNK_SIZE)
+    parser.add_argument(
+        "--resolution",
+        type=float,
+        default=settings.BULK_GRID_RESOLUTION,
+        help="Grid (degrees) locations are snapped to and deduplicated on",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    score = commands.add_parser("score", help="Score a CSV of locations")
+    score.add_argument("input", help="CSV with latitude and longitude columns")
+    score.add_argument("output", help="Output CSV (input columns plus scores)")
+    score.add_argument("--latitude-column", default="latitude")
+    score.add_argument("--longitude-column", default="longitude")
+    
+    bench = commands.add_parser("benchmark", help="Measure throughput from 1 to N workers")
+    bench.add_argument("--rows", type=int, default=1_000_000)
+    bench.add_argument("--worker-counts", type=int, nargs="+", help="Default: 1, 2, 4 ... workers")
+    args = parser.parse_args()
+    
+    if args.command == "score":
+        score_csv(
+            args.input,
+            args.output,
+            args.workers,
+            args.chunk_size,
+            args.resolution,
+            args.latitude_column,
+            args.longitude_column,
+        )
+    else:
+        worker_counts = args.worker_counts or [
+            2 ** i for i in range(int(np.log2(max(1, args.workers))) + 1)
+        ]
+        benchmark(args.rows, worker_counts, args.chunk_size, args.resolution)
+
+
+if __name__ == "__main__":
+    main()
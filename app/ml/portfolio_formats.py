@@ -0,0 +1,618 @@
+"""
+Portfolio File Formats
+Readers and writers for the formats portfolios are sent in. Row formats
+(NDJSON and CSV) are read incrementally: readers take bytes as they arrive
+and return the complete records so far. Columnar formats (Arrow IPC stream
+and Parquet) are read from a spooled file as record batches and scored
+column-wise, with score columns built straight from the result arrays.
+Writers turn one scored chunk into bytes, so streaming scoring stays at
+O(chunk) memory whatever the size of the upload.
+
+Rows are flat in every format: the input fields, then the score columns
+(or an `error` for rows that could not be scored). Score and error fields
+in the input, e.g. a scored file sent back for rescoring, are replaced.
+
+Compare encoded size and serialization time against the JSON bulk path with:
+    python -m app.ml.portfolio_formats --rows 100000
+"""
+import argparse
+import codecs
+import csv
+import io
+import json
+import time
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from app.ml.ensemble import RISK_LEVELS
+from app.ml.risk_grid import RISK_GRID_BANDS
+
+NDJSON = "application/x-ndjson"
+CSV = "text/csv"
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+MEDIA_TYPES = (NDJSON, CSV, ARROW, PARQUET)
+COLUMNAR_MEDIA_TYPES = (ARROW, PARQUET)
+
+# Columns added to every scored row, in output order
+SCORE_FIELDS = ('clima_risk_score',) + RISK_GRID_BANDS + ('confidence', 'risk_level')
+ERROR_FIELD = "error"
+OUTPUT_FIELDS = SCORE_FIELDS + (ERROR_FIELD,)
+# Key of the records NdjsonReader makes for lines it cannot parse; removed
+# from parsed records, so input fields can never be taken for it
+_READ_ERROR_FIELD = "_read_error"
+
+# Arrow types of the added columns; risk levels are dictionary-encoded
+_RISK_LEVELS = pa.array(RISK_LEVELS)
+SCORE_SCHEMA = pa.schema(
+    [
+        (name, pa.dictionary(pa.int8(), pa.string()) if name == 'risk_level' else pa.float64())
+        for name in SCORE_FIELDS
+    ] + [(ERROR_FIELD, pa.string())]
+)
+
+
+class _LineReader:
+    """Splits incoming bytes into complete UTF-8 text lines"""
+    
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buffer = ""
+    
+    def _lines(self, data: bytes, final: bool = False) -> List[str]:
+        """Complete lines in the data received so far (the rest is kept)"""
+        lines = (self._buffer + self._decoder.decode(data, final)).split("\n")
+        self._buffer = "" if final else lines.pop()
+        return lines
+
+
+class NdjsonReader(_LineReader):
+    """Reads one JSON object per line; blank lines are skipped"""
+    
+    def __init__(self):
+        super().__init__()
+        self.line_number = 0
+    
+    def feed(self, data: bytes) -> List[Dict]:
+        """Records completed by this piece of the input"""
+        return self._parse(self._lines(data))
+    
+    def close(self) -> List[Dict]:
+        """Records left once the input has ended"""
+        return self._parse(self._lines(b"", final=True))
+    
+    def _parse(self, lines: List[str]) -> List[Dict]:
+        """Decode lines; unreadable ones become records carrying a read error"""
+        records = []
+        for line in lines:
+            self.line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                record.pop(_READ_ERROR_FIELD, None)
+            else:
+                record = {_READ_ERROR_FIELD: f"Line {self.line_number} is not a JSON object"}
+            records.append(record)
+        return records
+
+
+class CsvReader(_LineReader):
+    """Reads CSV with a header row; quoted fields may span lines"""
+    
+    def __init__(self):
+        super().__init__()
+        self.fieldnames: Optional[List[str]] = None
+        # Lines of a record whose quotes are still open
+        self._open_lines: List[str] = []
+        self._open_quotes = 0
+    
+    def feed(self, data: bytes) -> List[Dict]:
+        """Records completed by this piece of the input"""
+        return self._parse(self._lines(data))
+    
+    def close(self) -> List[Dict]:
+        """Records left once the input has ended"""
+        records = self._parse(self._lines(b"", final=True))
+        if self._open_lines:
+            records.extend(self._records(self._open_lines))
+            self._open_lines = []
+        return records
+    
+    def _parse(self, lines: List[str]) -> List[Dict]:
+        """Records in the lines up to the last one that closes all quotes"""
+        complete = []
+        for line in lines:
+            self._open_lines.append(line + "\n")
+            self._open_quotes += line.count('"')
+            if self._open_quotes % 2 == 0:
+                complete.extend(self._open_lines)
+                self._open_lines = []
+                self._open_quotes = 0
+        return self._records(complete)
+    
+    def _records(self, lines: List[str]) -> List[Dict]:
+        """Records in complete CSV lines (the first row read is the header)"""
+        rows = [row for row in csv.reader(lines) if row]
+        if rows and self.fieldnames is None:
+            self.fieldnames = rows.pop(0)
+        return [dict(zip(self.fieldnames, row)) for row in rows]
+
+
+def create_reader(media_type: str):
+    """Incremental reader for a row media type (None for others)"""
+    return {NDJSON: NdjsonReader, CSV: CsvReader}.get(media_type, lambda: None)()
+
+
+def negotiate_media_type(accept: Optional[str], supported: Sequence[str], default: str) -> Optional[str]:
+    """
+    Response media type for an Accept header
+    
+    Returns:
+        First supported type listed, default for a missing header or a
+        wildcard listed first, None if nothing listed is supported
+    """
+    if not accept:
+        return default
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in supported:
+            return media_type
+        if media_type in ("*/*", "application/*", "text/*"):
+            return default
+    return None
+
+
+def read_batches(file: BinaryIO, media_type: str, chunk_size: int) -> Iterator[pa.Table]:
+    """
+    Read an Arrow IPC stream or Parquet file in tables of chunk_size rows
+    
+    Args:
+        file: Seekable binary file (Parquet keeps its metadata at the end)
+        media_type: ARROW or PARQUET
+        chunk_size: Rows per table (the last may have fewer)
+    """
+    if media_type == PARQUET:
+        batches = pq.ParquetFile(file).iter_batches(batch_size=chunk_size)
+    else:
+        batches = pa.ipc.open_stream(file)
+    
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_size)
+            pending = table.slice(chunk_size).to_batches()
+            pending_rows -= chunk_size
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
+
+
+def table_coordinates(table: pa.Table) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Coordinates of each row of a table, validated column-wise
+    
+    Returns:
+        Tuple of (latitudes, longitudes, per-row error or None as an object
+        array); coordinates of rows with an error are NaN
+    """
+    count = table.num_rows
+    errors = np.full(count, None, dtype=object)
+    if 'latitude' not in table.column_names or 'longitude' not in table.column_names:
+        errors[:] = "latitude and longitude are required numbers"
+        return np.full(count, np.nan), np.full(count, np.nan), errors
+    
+    latitudes = _float_column(table.column('latitude'))
+    longitudes = _float_column(table.column('longitude'))
+    missing = np.isnan(latitudes) | np.isnan(longitudes)
+    out_of_range = ~missing & ((np.abs(latitudes) > 90) | (np.abs(longitudes) > 180))
+    errors[missing] = "latitude and longitude are required numbers"
+    errors[out_of_range] = "latitude or longitude out of range"
+    invalid = ~np.equal(errors, None)
+    latitudes[invalid] = np.nan
+    longitudes[invalid] = np.nan
+    return latitudes, longitudes, errors
+
+
+def _float_column(column: pa.ChunkedArray) -> np.ndarray:
+    """Column as float64 with NaN for nulls and unreadable values"""
+    try:
+        column = pc.cast(column, pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return np.array([_to_float(value) for value in column.to_pylist()], dtype=float)
+    return column.to_numpy().astype(float, copy=True)
+
+
+def _to_float(value) -> float:
+    """Value as a float (NaN if it is not a number)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def score_table(table: pa.Table, results: Dict[str, np.ndarray], errors: np.ndarray) -> pa.Table:
+    """
+    Input table with the score columns appended, built from the result arrays
+    
+    Args:
+        table: Input rows of the chunk
+        results: Score arrays (portfolio RESULT_COLUMNS) of the error-free
+            rows, in order
+        errors: Per-row error or None (from table_coordinates)
+    """
+    valid = np.equal(errors, None)
+    invalid = ~valid
+    names = [name for name in table.column_names if name not in SCORE_SCHEMA.names]
+    columns = [table.column(name) for name in names]
+    
+    for field in SCORE_SCHEMA:
+        if field.name == ERROR_FIELD:
+            column = pa.array(errors.tolist(), type=pa.string())
+        elif field.name == 'risk_level':
+            codes = np.zeros(len(valid), dtype=np.int8)
+            codes[valid] = results['risk_level_code']
+            column = pa.DictionaryArray.from_arrays(pa.array(codes, mask=invalid), _RISK_LEVELS)
+        else:
+            values = np.full(len(valid), np.nan)
+            values[valid] = np.round(results[field.name], 2)
+            column = pa.array(values, mask=invalid)
+        names.append(field.name)
+        columns.append(column)
+    return pa.table(columns, names=names)
+
+
+def rows_table(rows: Sequence[Dict]) -> pa.Table:
+    """
+    Table of output rows: input fields, then the score columns and error
+    
+    Input fields whose values have mixed types are stored as JSON text.
+    """
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {
+        name: _column([row.get(name) for row in rows])
+        for name in names if name not in SCORE_SCHEMA.names
+    }
+    for field in SCORE_SCHEMA:
+        values = [row.get(field.name) for row in rows]
+        if field.name == 'risk_level':
+            codes = [None if value is None else RISK_LEVELS.index(value) for value in values]
+            columns[field.name] = pa.DictionaryArray.from_arrays(pa.array(codes, pa.int8()), _RISK_LEVELS)
+        else:
+            columns[field.name] = pa.array(values, type=field.type)
+    return pa.table(columns)
+
+
+def _column(values: List) -> pa.Array:
+    """Arrow array of a field's values (as JSON text when their types are mixed)"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([
+            value if value is None or isinstance(value, str) else json.dumps(value)
+            for value in values
+        ], type=pa.string())
+
+
+def conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Table with exactly the schema's columns (missing ones null)"""
+    columns = [
+        table.column(field.name).cast(field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def extract_coordinates(records: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]]]:
+    """
+    Coordinates of each record
+    
+    Returns:
+        Tuple of (latitudes, longitudes, per-record error or None);
+        coordinates of records with an error are NaN
+    """
+    latitudes = np.full(len(records), np.nan)
+    longitudes = np.full(len(records), np.nan)
+    errors: List[Optional[str]] = [None] * len(records)
+    for i, record in enumerate(records):
+        if _READ_ERROR_FIELD in record:
+            errors[i] = record[_READ_ERROR_FIELD]
+            continue
+        try:
+            latitude = float(record['latitude'])
+            longitude = float(record['longitude'])
+        except (KeyError, TypeError, ValueError):
+            errors[i] = "latitude and longitude are required numbers"
+            continue
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            errors[i] = "latitude or longitude out of range"
+            continue
+        latitudes[i] = latitude
+        longitudes[i] = longitude
+    return latitudes, longitudes, errors
+
+
+def score_rows(
+    records: Sequence[Dict],
+    results: Dict[str, np.ndarray],
+    errors: Sequence[Optional[str]]
+) -> List[Dict]:
+    """
+    Output rows: each record's input fields plus its scores or error
+    
+    Args:
+        records: Input records of the chunk
+        results: Score arrays (portfolio RESULT_COLUMNS) of the error-free
+            records, in order
+        errors: Per-record error or None
+    """
+    columns = {
+        name: np.round(results[name], 2).tolist()
+        for name in SCORE_FIELDS if name != 'risk_level'
+    }
+    levels = results['risk_level_code'].tolist()
+    
+    rows = []
+    scored = 0
+    for record, error in zip(records, errors):
+        row = {
+            name: value for name, value in record.items()
+            if name not in OUTPUT_FIELDS and name != _READ_ERROR_FIELD
+        }
+        if error is not None:
+            row[ERROR_FIELD] = error
+        else:
+            for name, values in columns.items():
+                row[name] = values[scored]
+            row['risk_level'] = RISK_LEVELS[levels[scored]]
+            scored += 1
+        rows.append(row)
+    return rows
+
+
+class NdjsonWriter:
+    """Writes one JSON object per row"""
+    
+    media_type = NDJSON
+    
+    def write(self, rows: List[Dict]) -> bytes:
+        """Encoded rows"""
+        return "".join(json.dumps(row) + "\n" for row in rows).encode()
+    
+    def write_table(self, table: pa.Table) -> bytes:
+        """Encoded rows of a scored table"""
+        return self.write(table.to_pylist())
+    
+    def close(self) -> bytes:
+        """Bytes that end the output (none)"""
+        return b""
+
+
+class CsvWriter:
+    """Writes CSV: the input columns, then the score columns and error"""
+    
+    media_type = CSV
+    
+    def __init__(self, reader=None):
+        """
+        Initialize writer
+        
+        Args:
+            reader: CsvReader of the input, whose header gives the input
+                columns (otherwise the fields of the first chunk's rows;
+                fields that first appear in later chunks are left out)
+        """
+        self.reader = reader
+        self.input_fields: Optional[List[str]] = None
+    
+    def write(self, rows: List[Dict]) -> bytes:
+        """Encoded rows, preceded by the header the first time"""
+        output = io.StringIO()
+        first_write = self.input_fields is None
+        if first_write:
+            fieldnames = getattr(self.reader, 'fieldnames', None)
+            if fieldnames is None:
+                fieldnames = dict.fromkeys(name for row in rows for name in row)
+            self.input_fields = [name for name in fieldnames if name not in OUTPUT_FIELDS]
+        writer = csv.DictWriter(
+            output,
+            fieldnames=self.input_fields + list(OUTPUT_FIELDS),
+            extrasaction='ignore',
+        )
+        if first_write:
+            writer.writeheader()
+        writer.writerows(rows)
+        return output.getvalue().encode()
+    
+    def write_table(self, table: pa.Table) -> bytes:
+        """Encoded rows of a scored table"""
+        return self.write(table.to_pylist())
+    
+    def close(self) -> bytes:
+        """Bytes that end the output (none)"""
+        return b""
+
+
+class _ByteSink(io.RawIOBase):
+    """Collects what an Arrow writer writes until it is taken"""
+    
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def take(self) -> bytes:
+        """Bytes written since the last take"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _ArrowFormatWriter:
+    """
+    Writes scored tables to a columnar format as they come
+    
+    The first table fixes the schema; later ones are cast to it (row
+    formats can infer different types for an input field chunk by chunk).
+    """
+    
+    def __init__(self):
+        self._sink = _ByteSink()
+        self._writer = None
+        self.schema: Optional[pa.Schema] = None
+    
+    def _open(self, schema: pa.Schema):
+        """Start the format's writer on the sink"""
+        raise NotImplementedError
+    
+    def write(self, rows: List[Dict]) -> bytes:
+        """Encoded rows"""
+        return self.write_table(rows_table(rows))
+    
+    def write_table(self, table: pa.Table) -> bytes:
+        """Encoded scored table"""
+        if self._writer is None:
+            self.schema = table.schema
+            self._writer = self._open(table.schema)
+        elif table.schema != self.schema:
+            table = conform_table(table, self.schema)
+        self._writer.write_table(table)
+        return self._sink.take()
+    
+    def close(self) -> bytes:
+        """Bytes that end the output (an empty table if nothing was written)"""
+        if self._writer is None:
+            self.schema = SCORE_SCHEMA
+            self._writer = self._open(SCORE_SCHEMA)
+        self._writer.close()
+        return self._sink.take()
+
+
+class ArrowWriter(_ArrowFormatWriter):
+    """Writes an Arrow IPC stream, one record batch per chunk"""
+    
+    media_type = ARROW
+    
+    def _open(self, schema: pa.Schema):
+        return pa.ipc.new_stream(self._sink, schema)
+
+
+class ParquetWriter(_ArrowFormatWriter):
+    """Writes Parquet, one row group per chunk"""
+    
+    media_type = PARQUET
+    
+    def _open(self, schema: pa.Schema):
+        return pq.ParquetWriter(self._sink, schema)
+
+
+def create_writer(media_type: str, reader=None):
+    """Writer for a media type (None if unsupported), taking CSV columns from the reader"""
+    if media_type == NDJSON:
+        return NdjsonWriter()
+    if media_type == CSV:
+        return CsvWriter(reader)
+    if media_type == ARROW:
+        return ArrowWriter()
+    if media_type == PARQUET:
+        return ParquetWriter()
+    return None
+
+
+def benchmark(rows: int, repeat: int = 3):
+    """Print encoded size and serialization time per format for scored rows"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    
+    from app.api.v1.endpoints.bulk import BulkScoreResponse
+    from app.core.config import settings
+    from app.ml.ensemble import EnsembleScorer
+    from app.ml.portfolio import score_chunk
+    from app.ml.registry import get_model_registry
+    from app.ml.risk_grid import DEFAULT_BOUNDS
+    
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+    rng = np.random.default_rng(0)
+    table = pa.table({
+        "property_id": [f"p{i}" for i in range(rows)],
+        "latitude": rng.uniform(min_lat, max_lat, rows),
+        "longitude": rng.uniform(min_lon, max_lon, rows),
+    })
+    latitudes = table.column("latitude").to_numpy()
+    longitudes = table.column("longitude").to_numpy()
+    scorer = get_model_registry().cached_scorer(settings.BULK_GRID_RESOLUTION)
+    results = score_chunk(scorer, latitudes, longitudes)
+    records = table.to_pylist()
+    errors = np.full(rows, None, dtype=object)
+    
+    def json_response() -> bytes:
+        # The /bulk-scoring path: per-row dicts, response model, JSON encoding
+        scores = [
+            dict(record, **result)
+            for record, result in zip(records, EnsembleScorer.format_scores(results))
+        ]
+        response = BulkScoreResponse(
+            total_properties=rows, successful=rows, failed=0, scores=scores
+        )
+        return JSONResponse(jsonable_encoder(response)).body
+    
+    def encoder(media_type: str) -> Callable[[], bytes]:
+        def encode() -> bytes:
+            writer = create_writer(media_type)
+            if media_type in COLUMNAR_MEDIA_TYPES:
+                return writer.write_table(score_table(table, results, errors)) + writer.close()
+            return writer.write(score_rows(records, results, errors)) + writer.close()
+        return encode
+    
+    candidates = [("json (bulk-scoring)", json_response)] + [
+        (media_type, encoder(media_type)) for media_type in MEDIA_TYPES
+    ]
+    baseline = None
+    print(f"{rows:,} rows")
+    for name, encode in candidates:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = encode()
+            timings.append(time.perf_counter() - started)
+        elapsed = min(timings)
+        baseline = baseline or elapsed
+        print(
+            f"{name:<38} {len(data) / 1e6:>9.2f} MB {elapsed * 1000:>9.1f} ms "
+            f"({baseline / elapsed:.1f}x)"
+        )
+
+
+def main():
+    """Command-line entry point for the format benchmark"""
+    parser = argparse.ArgumentParser(description="Compare bulk scoring output formats")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
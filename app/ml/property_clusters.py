@@ -0,0 +1,556 @@
+"""
+Property Clusters
+Hierarchical clustering of a tenant's scored properties for the risk map,
+in the style of supercluster: at each zoom level nearby properties merge
+into one marker at their centroid, carrying the number of properties and
+the mean and maximum risk among them, so a country-wide portfolio of
+100k+ properties is sent as a few hundred markers.
+
+Clusters are nested Web Mercator grid cells, 2**CLUSTER_CELL_BITS across a
+tile at each zoom, each splitting into 2x2 at the next zoom. Properties
+are kept sorted by the Morton code of their cell at CLUSTER_MAX_ZOOM, so
+the cells of every zoom are contiguous runs and each level is one
+reduction of the level below; the whole index is rebuilt in one
+vectorized pass when properties change. Above CLUSTER_MAX_ZOOM properties
+are returned individually.
+
+A tenant's index is loaded from the Property table with the latest
+RiskScore of each property, then refreshed with only the rows created,
+updated or rescored since the previous refresh; a periodic full reload
+drops deleted properties.
+
+Measure build, refresh and query time with:
+    python -m app.ml.property_clusters --points 100000
+"""
+import argparse
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.risk_tiles import MAX_MERCATOR_LATITUDE, RISK_TILE_TYPES
+
+# Deepest clustered zoom; properties are returned one by one above it
+CLUSTER_MAX_ZOOM = 16
+
+# Clusters per tile side at each zoom: 2**3 = 8 (one per 32 px of a 256 px tile)
+CLUSTER_CELL_BITS = 3
+
+# Cell coordinate bits per axis at CLUSTER_MAX_ZOOM
+_BITS = CLUSTER_MAX_ZOOM + CLUSTER_CELL_BITS
+
+# RiskScore columns holding each of RISK_TILE_TYPES
+RISK_SCORE_COLUMNS = {
+    'flood': 'flood_risk',
+    'heat': 'heat_risk',
+    'drought': 'drought_risk',
+    'groundwater': 'groundwater_risk',
+    'rainfall': 'rainfall_risk',
+    'overall': 'clima_risk_score',
+}
+
+
+class ScoredProperties(NamedTuple):
+    """Properties with their latest risk scores, as loaded from the database"""
+    ids: List[str]
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    # (n, len(RISK_TILE_TYPES)) scores in RISK_TILE_TYPES order
+    risks: np.ndarray
+    # Latest change among the rows (None if there are none)
+    watermark: Optional[datetime]
+
+
+def _mercator(latitudes: np.ndarray, longitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Web Mercator (x, y) in [0, 1], y from the north"""
+    latitudes = np.radians(np.clip(latitudes, -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE))
+    return (np.asarray(longitudes) + 180.0) / 360.0, (1.0 - np.arcsinh(np.tan(latitudes)) / np.pi) / 2.0
+
+
+def _geographic(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(latitude, longitude) of Web Mercator (x, y)"""
+    return np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * y)))), x * 360.0 - 180.0
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Insert a zero bit above each bit of values below 2**32"""
+    values = values.astype(np.uint64)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton_codes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Morton (Z-order) codes of the CLUSTER_MAX_ZOOM cells of Web Mercator (x, y)"""
+    cells = 1 << _BITS
+    column = np.clip((x * cells).astype(np.int64), 0, cells - 1)
+    row = np.clip((y * cells).astype(np.int64), 0, cells - 1)
+    return _spread_bits(column) | (_spread_bits(row) << np.uint64(1))
+
+
+class _Level(NamedTuple):
+    """Clusters of one zoom level, in Morton order"""
+    codes: np.ndarray
+    # Each cluster's properties are the Morton-ordered run first..end - 1
+    first: np.ndarray
+    end: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+
+
+class _Hierarchy(NamedTuple):
+    """Clusters of every zoom level over the properties in Morton order"""
+    levels: List[_Level]
+    # Row of each property in Morton order
+    order: np.ndarray
+    # (bands, n + 1) risks in Morton order (last column padding) and their
+    # prefix sums (first column zero)
+    risks: np.ndarray
+    risk_sums: np.ndarray
+
+
+def _runs(codes: np.ndarray) -> np.ndarray:
+    """Start of each run of equal values in sorted codes"""
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+
+class ClusterIndex:
+    """
+    Cluster hierarchy of one set of properties
+    
+    Properties are added, updated and removed by id; the hierarchy is
+    rebuilt on the next query after a change.
+    """
+    
+    def __init__(self):
+        """Initialize an empty index"""
+        self.ids = np.empty(0, dtype=object)
+        self.latitudes = np.empty(0)
+        self.longitudes = np.empty(0)
+        self.risks = np.empty((0, len(RISK_TILE_TYPES)))
+        self._rows: Dict[str, int] = {}
+        self._hierarchy: Optional[_Hierarchy] = None
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        """Number of properties indexed"""
+        return len(self.ids)
+    
+    def upsert(self, properties: ScoredProperties):
+        """Add properties, replacing the location and risks of those already indexed"""
+        if not len(properties.ids):
+            return
+        with self._lock:
+            rows = np.array([self._rows.get(property_id, -1) for property_id in properties.ids])
+            known = rows >= 0
+            self.latitudes[rows[known]] = properties.latitudes[known]
+            self.longitudes[rows[known]] = properties.longitudes[known]
+            self.risks[rows[known]] = properties.risks[known]
+            
+            new = np.flatnonzero(~known)
+            if len(new):
+                # An id listed twice keeps its last row
+                added: Dict[str, int] = {}
+                for i in new.tolist():
+                    added[properties.ids[i]] = i
+                new = np.fromiter(added.values(), dtype=np.intp, count=len(added))
+                start = len(self.ids)
+                self._rows.update((property_id, start + k) for k, property_id in enumerate(added))
+                self.ids = np.concatenate((self.ids, np.array(list(added), dtype=object)))
+                self.latitudes = np.concatenate((self.latitudes, properties.latitudes[new]))
+                self.longitudes = np.concatenate((self.longitudes, properties.longitudes[new]))
+                self.risks = np.concatenate((self.risks, properties.risks[new]))
+            self._hierarchy = None
+    
+    def remove(self, ids: List[str]):
+        """Drop properties by id (unknown ids are ignored)"""
+        with self._lock:
+            drop = [self._rows[property_id] for property_id in ids if property_id in self._rows]
+            if not drop:
+                return
+            keep = np.ones(len(self.ids), dtype=bool)
+            keep[drop] = False
+            self.ids = self.ids[keep]
+            self.latitudes = self.latitudes[keep]
+            self.longitudes = self.longitudes[keep]
+            self.risks = self.risks[keep]
+            self._rows = {property_id: row for row, property_id in enumerate(self.ids.tolist())}
+            self._hierarchy = None
+    
+    def _build(self) -> _Hierarchy:
+        """
+        Clusters of every zoom level, from the deepest up
+        
+        A cluster is a run of properties in Morton order, so its count,
+        centroid and risk sum are differences of prefix sums.
+        """
+        x, y = _mercator(self.latitudes, self.longitudes)
+        codes = morton_codes(x, y)
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        
+        def prefix_sums(values: np.ndarray) -> np.ndarray:
+            sums = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+            np.cumsum(values, axis=-1, out=sums[..., 1:])
+            return sums
+        
+        sum_x, sum_y = prefix_sums(x[order]), prefix_sums(y[order])
+        risks = np.zeros((len(RISK_TILE_TYPES), len(codes) + 1))
+        risks[:, :-1] = self.risks[order].T
+        
+        levels: List[Optional[_Level]] = [None] * (CLUSTER_MAX_ZOOM + 1)
+        if not len(codes):
+            empty = np.empty(0)
+            levels = [_Level(codes, order, order, empty, empty)] * (CLUSTER_MAX_ZOOM + 1)
+            return _Hierarchy(levels, order, risks, prefix_sums(risks[:, :-1]))
+        
+        first = np.arange(len(codes))
+        for zoom in range(CLUSTER_MAX_ZOOM, -1, -1):
+            if zoom < CLUSTER_MAX_ZOOM:
+                # A cell's four children share its code with two more low bits
+                codes = codes >> np.uint64(2)
+            starts = _runs(codes)
+            if zoom < CLUSTER_MAX_ZOOM and len(starts) == len(codes):
+                # No cells merge (common at deep zooms): same clusters, coarser codes
+                levels[zoom] = levels[zoom + 1]._replace(codes=codes)
+                continue
+            codes, first = codes[starts], first[starts]
+            end = np.r_[first[1:], len(order)]
+            counts = end - first
+            latitudes, longitudes = _geographic(
+                (sum_x[end] - sum_x[first]) / counts, (sum_y[end] - sum_y[first]) / counts
+            )
+            levels[zoom] = _Level(codes, first, end, latitudes, longitudes)
+        return _Hierarchy(levels, order, risks, prefix_sums(risks[:, :-1]))
+    
+    def clusters(
+        self,
+        bbox: Tuple[float, float, float, float],
+        zoom: int,
+        risk_type: str = 'overall'
+    ) -> List[Dict]:
+        """
+        Clusters (or, above CLUSTER_MAX_ZOOM, properties) with their centroid in a bbox
+        
+        Args:
+            bbox: (min_lon, min_lat, max_lon, max_lat)
+            zoom: Map zoom level
+            risk_type: One of RISK_TILE_TYPES to aggregate
+        
+        Returns:
+            List of dictionaries with latitude, longitude, count, mean_risk,
+            max_risk and property_id (set for single-property clusters)
+        
+        Raises:
+            ValueError: If risk_type is not one of RISK_TILE_TYPES
+        """
+        if risk_type not in RISK_TILE_TYPES:
+            raise ValueError(f"Unknown risk type {risk_type!r}; expected one of {', '.join(RISK_TILE_TYPES)}")
+        band = RISK_TILE_TYPES.index(risk_type)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        
+        with self._lock:
+            if zoom > CLUSTER_MAX_ZOOM:
+                ids, latitudes, longitudes = self.ids, self.latitudes, self.longitudes
+                risks = self.risks[:, band].copy()
+            else:
+                if self._hierarchy is None:
+                    self._hierarchy = self._build()
+                hierarchy, ids = self._hierarchy, self.ids
+        
+        if zoom > CLUSTER_MAX_ZOOM:
+            inside = np.flatnonzero(
+                (longitudes >= min_lon) & (longitudes <= max_lon) &
+                (latitudes >= min_lat) & (latitudes <= max_lat)
+            )
+            return [
+                {
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'count': 1,
+                    'mean_risk': risk,
+                    'max_risk': risk,
+                    'property_id': property_id,
+                }
+                for latitude, longitude, risk, property_id in zip(
+                    latitudes[inside].tolist(),
+                    longitudes[inside].tolist(),
+                    risks[inside].tolist(),
+                    ids[inside].tolist(),
+                )
+            ]
+        
+        level = hierarchy.levels[max(0, zoom)]
+        inside = np.flatnonzero(
+            (level.longitudes >= min_lon) & (level.longitudes <= max_lon) &
+            (level.latitudes >= min_lat) & (level.latitudes <= max_lat)
+        )
+        first, end = level.first[inside], level.end[inside]
+        counts = end - first
+        risk_sums = hierarchy.risk_sums[band]
+        # Maximum of each run: reduce over (first, end) pairs, keeping the runs
+        risk_max = np.maximum.reduceat(hierarchy.risks[band], np.column_stack((first, end)).ravel())[::2]
+        # Differences of long prefix sums can round past the maximum
+        risk_mean = np.minimum((risk_sums[end] - risk_sums[first]) / counts, risk_max)
+        return [
+            {
+                'latitude': latitude,
+                'longitude': longitude,
+                'count': count,
+                'mean_risk': mean_risk,
+                'max_risk': max_risk,
+                'property_id': property_id if count == 1 else None,
+            }
+            for latitude, longitude, count, mean_risk, max_risk, property_id in zip(
+                level.latitudes[inside].tolist(),
+                level.longitudes[inside].tolist(),
+                counts.tolist(),
+                risk_mean.tolist(),
+                risk_max.tolist(),
+                ids[hierarchy.order[first]].tolist(),
+            )
+        ]
+
+
+def load_scored_properties(tenant_id: str, since: Optional[datetime] = None) -> ScoredProperties:
+    """
+    A tenant's properties with the latest risk score of each
+    
+    Args:
+        tenant_id: Tenant whose properties to load
+        since: Only properties created, updated or rescored at or after
+            this time (all properties by default)
+    
+    Returns:
+        ScoredProperties; properties without a risk score are left out
+    """
+    from sqlalchemy import func, or_, select
+    
+    from app.db.models import Property, RiskScore
+    from app.db.session import SessionLocal
+    
+    latest = (
+        select(RiskScore.property_id, func.max(RiskScore.calculated_at).label('calculated_at'))
+        .join(Property, Property.id == RiskScore.property_id)
+        .where(Property.tenant_id == tenant_id)
+        .group_by(RiskScore.property_id)
+        .subquery()
+    )
+    query = (
+        select(
+            Property.id,
+            Property.latitude,
+            Property.longitude,
+            *(getattr(RiskScore, RISK_SCORE_COLUMNS[risk_type]) for risk_type in RISK_TILE_TYPES),
+            func.greatest(
+                RiskScore.calculated_at,
+                Property.created_at,
+                func.coalesce(Property.updated_at, Property.created_at),
+            ),
+        )
+        .join(latest, latest.c.property_id == Property.id)
+        .join(
+            RiskScore,
+            (RiskScore.property_id == latest.c.property_id) &
+            (RiskScore.calculated_at == latest.c.calculated_at),
+        )
+        .where(Property.tenant_id == tenant_id)
+    )
+    if since is not None:
+        query = query.where(or_(
+            RiskScore.calculated_at >= since,
+            Property.created_at >= since,
+            Property.updated_at >= since,
+        ))
+    
+    with SessionLocal() as session:
+        rows = session.execute(query).all()
+    
+    columns = len(RISK_TILE_TYPES)
+    values = np.array([row[1:3 + columns] for row in rows], dtype=float).reshape(-1, 2 + columns)
+    changed = [row[-1] for row in rows if row[-1] is not None]
+    return ScoredProperties(
+        ids=[str(row[0]) for row in rows],
+        latitudes=values[:, 0],
+        longitudes=values[:, 1],
+        risks=values[:, 2:],
+        watermark=max(changed) if changed else since,
+    )
+
+
+class _Tenant:
+    """A tenant's index and refresh bookkeeping"""
+    
+    def __init__(self):
+        self.index = ClusterIndex()
+        self.lock = threading.Lock()
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at = float('-inf')
+        self.loaded_at = float('-inf')
+
+
+class PropertyClusters:
+    """
+    Per-tenant cluster indexes, kept current with the properties database
+    
+    Safe to share between threads; a tenant's index is refreshed by one
+    thread at a time while others keep querying it.
+    """
+    
+    def __init__(
+        self,
+        load: Callable[[str, Optional[datetime]], ScoredProperties] = load_scored_properties,
+        refresh_seconds: Optional[float] = None,
+        reload_seconds: Optional[float] = None,
+    ):
+        """
+        Initialize store (tenants are loaded on first query)
+        
+        Args:
+            load: Loads a tenant's scored properties changed since a time
+                (all for None)
+            refresh_seconds: Least time between incremental refreshes
+                (PROPERTY_CLUSTER_REFRESH_SECONDS by default)
+            reload_seconds: Time between full reloads
+                (PROPERTY_CLUSTER_RELOAD_SECONDS by default)
+        """
+        self.load = load
+        self.refresh_seconds = (
+            settings.PROPERTY_CLUSTER_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        )
+        self.reload_seconds = (
+            settings.PROPERTY_CLUSTER_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        )
+        self._tenants: Dict[str, _Tenant] = {}
+        self._lock = threading.Lock()
+    
+    def refresh(self, tenant_id: str, full: bool = False) -> int:
+        """
+        Bring a tenant's index up to date with the database
+        
+        Args:
+            tenant_id: Tenant to refresh
+            full: Reload every property instead of the changed ones
+        
+        Returns:
+            Number of properties loaded
+        """
+        with self._lock:
+            tenant = self._tenants.setdefault(tenant_id, _Tenant())
+        with tenant.lock:
+            now = time.monotonic()
+            if full or tenant.watermark is None:
+                properties = self.load(tenant_id, None)
+                index = ClusterIndex()
+                index.upsert(properties)
+                tenant.index = index
+                tenant.loaded_at = now
+            else:
+                # Rows stamped at the watermark are loaded again (upserts are idempotent)
+                properties = self.load(tenant_id, tenant.watermark)
+                tenant.index.upsert(properties)
+            tenant.watermark = properties.watermark or tenant.watermark
+            tenant.refreshed_at = now
+        return len(properties.ids)
+    
+    def index(self, tenant_id: str) -> ClusterIndex:
+        """A tenant's index, refreshed first when it is due"""
+        tenant = self._tenants.get(tenant_id)
+        now = time.monotonic()
+        if tenant is None or now - tenant.loaded_at >= self.reload_seconds:
+            self.refresh(tenant_id, full=True)
+        elif now - tenant.refreshed_at >= self.refresh_seconds:
+            self.refresh(tenant_id)
+        return self._tenants[tenant_id].index
+    
+    def clusters(
+        self,
+        tenant_id: str,
+        bbox: Tuple[float, float, float, float],
+        zoom: int,
+        risk_type: str = 'overall'
+    ) -> List[Dict]:
+        """A tenant's clusters in a bbox at a zoom level (see `ClusterIndex.clusters`)"""
+        return self.index(tenant_id).clusters(bbox, zoom, risk_type)
+
+
+@lru_cache(maxsize=None)
+def get_property_clusters() -> PropertyClusters:
+    """Process-wide per-tenant property cluster indexes"""
+    return PropertyClusters()
+
+
+def synthetic_properties(count: int, seed: int = 0) -> ScoredProperties:
+    """Properties clustered around the urban centres of India, with random risks"""
+    rng = np.random.default_rng(seed)
+    centres = np.array([
+        (28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (13.08, 80.27), (22.57, 88.36),
+        (17.39, 78.49), (23.02, 72.57), (18.52, 73.86), (26.91, 75.79), (26.85, 80.95),
+    ])
+    cities = rng.integers(0, len(centres), count)
+    spread = rng.exponential(0.3, count)[:, None] * rng.normal(size=(count, 2))
+    points = centres[cities] + spread
+    return ScoredProperties(
+        ids=[f"p{i}" for i in range(count)],
+        latitudes=points[:, 0],
+        longitudes=points[:, 1],
+        risks=rng.uniform(0, 100, (count, len(RISK_TILE_TYPES))),
+        watermark=None,
+    )
+
+
+def benchmark(points: int, changed: int):
+    """Print the time to build, update and query an index of synthetic properties"""
+    properties = synthetic_properties(points)
+    index = ClusterIndex()
+    
+    started = time.perf_counter()
+    index.upsert(properties)
+    index.clusters((66.0, 5.0, 100.0, 38.0), 0)
+    print(f"build {points:,} properties: {(time.perf_counter() - started) * 1e3:.1f} ms")
+    
+    update = synthetic_properties(changed, seed=1)._replace(ids=properties.ids[:changed])
+    started = time.perf_counter()
+    index.upsert(update)
+    index.clusters((66.0, 5.0, 100.0, 38.0), 0)
+    print(f"update {changed:,} properties and rebuild: {(time.perf_counter() - started) * 1e3:.1f} ms")
+    
+    views = {
+        4: (66.0, 5.0, 100.0, 38.0),
+        8: (76.0, 27.5, 78.5, 29.5),
+        12: (77.1, 28.5, 77.3, 28.7),
+        17: (77.19, 28.60, 77.23, 28.63),
+    }
+    for zoom, bbox in views.items():
+        started = time.perf_counter()
+        repeats = 20
+        for _ in range(repeats):
+            found = index.clusters(bbox, zoom)
+        elapsed = (time.perf_counter() - started) / repeats
+        print(
+            f"z{zoom:<3} {elapsed * 1e3:>7.2f} ms  {len(found):>6,} markers  "
+            f"{sum(cluster['count'] for cluster in found):>8,} properties"
+        )
+
+
+def main():
+    """Command-line entry point for the clustering benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark property clustering")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--changed", type=int, default=1_000, help="Properties updated by a refresh")
+    args = parser.parse_args()
+    benchmark(args.points, args.changed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Redis Score Cache
+Second cache tier shared by every API worker and Celery process through
+REDIS_URL. Values are msgpack-encoded, bulk lookups go out as one pipelined
+multi-get, and a burst of identical requests triggers a single computation:
+cold keys are computed under a short lock, and hot keys are refreshed by one
+caller slightly before they expire (probabilistic early expiry).
+
+redis and msgpack (part of the full install) are only imported once the
+Redis tier is in use.
+"""
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "climarisk:cache:"
+LOCK_SUFFIX = ":lock"
+
+# Deletes a computation lock only while it still holds the caller's token,
+# so a caller outliving its lock cannot release the next holder's
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Early expiry aggressiveness (XFetch beta): higher refreshes earlier
+EARLY_EXPIRY_BETA = 1.0
+
+# How often callers waiting on another worker's computation re-check the key
+LOCK_POLL_SECONDS = 0.02
+
+
+def encode_key(key: Hashable) -> str:
+    """Redis key for a cache key (stable across processes)"""
+    return KEY_PREFIX + hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+class RedisScoreCache:
+    """
+    Shared cache on a Redis client
+    
+    Each entry stores the value, how long it took to compute and when it
+    expires; Redis drops it at expiry. Redis errors are logged and treated
+    as misses, so an unavailable Redis only costs recomputation.
+    """
+    
+    def __init__(
+        self,
+        client,
+        ttl_seconds: float = 3600.0,
+        lock_timeout: float = 5.0,
+        beta: float = EARLY_EXPIRY_BETA,
+        clock: Callable[[], float] = time.time,
+        random_source: Callable[[], float] = random.random,
+    ):
+        """
+        Initialize cache
+        
+        Args:
+            client: redis.Redis (or compatible) client
+            ttl_seconds: Entry lifetime in seconds
+            lock_timeout: Longest a computation may hold a key's lock, and
+                the longest other callers wait for it before computing themselves
+            beta: Early expiry aggressiveness (0 disables early refresh)
+            clock: Wall-clock time source shared with other processes
+            random_source: Uniform [0, 1) source (injectable for tests)
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.lock_timeout = lock_timeout
+        self.beta = beta
+        self.clock = clock
+        self.random_source = random_source
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.early_refreshes = 0
+        self.lock_waits = 0
+        self.errors = 0
+    
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisScoreCache":
+        """Create a cache on a new client for a redis:// URL"""
+        import redis
+        
+        return cls(redis.Redis.from_url(url, socket_timeout=1.0), **kwargs)
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for a key, or None"""
+        return self.get_many([key])[0]
+    
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Any]]:
+        """Cached values for many keys in one round trip (None for misses)"""
+        if not keys:
+            return []
+        try:
+            raw = self.client.mget([encode_key(key) for key in keys])
+        except Exception:
+            self._error("get")
+            raw = [None] * len(keys)
+        
+        values = [None if item is None else self._decode(item)[0] for item in raw]
+        hits = sum(value is not None for value in values)
+        self._count(hits=hits, misses=len(values) - hits)
+        return values
+    
+    def set(self, key: Hashable, value: Any, compute_seconds: float = 0.0):
+        """Store a value for ttl_seconds"""
+        self.set_many({key: value}, compute_seconds)
+    
+    def set_many(self, items: Dict[Hashable, Any], compute_seconds: float = 0.0):
+        """Store many values in one pipelined round trip"""
+        if not items:
+            return
+        import msgpack
+        
+        expires_at = self.clock() + self.ttl_seconds
+        ttl_ms = max(1, int(self.ttl_seconds * 1000))
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(
+                    encode_key(key),
+                    msgpack.packb([value, compute_seconds, expires_at], use_bin_type=True),
+                    px=ttl_ms,
+                )
+            pipeline.execute()
+        except Exception:
+            self._error("set")
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Cached value for a key, computing it at most once across workers
+        
+        A miss takes the key's lock and computes; callers finding the lock
+        taken wait for the result instead. A hit close to expiry is, with
+        rising probability, refreshed early by one caller while the others
+        keep being served the current value.
+        """
+        redis_key = encode_key(key)
+        try:
+            raw = self.client.get(redis_key)
+        except Exception:
+            self._error("get")
+            return compute()
+        
+        if raw is not None:
+            value, compute_seconds, expires_at = self._decode(raw)
+            if not self._expires_early(compute_seconds, expires_at):
+                self._count(hits=1)
+                return value
+            token = self._acquire(redis_key)
+            if token is None:
+                # Someone else is already refreshing it
+                self._count(hits=1)
+                return value
+            self._count(early_refreshes=1)
+            return self._compute_and_release(key, redis_key, token, compute)
+        
+        self._count(misses=1)
+        token = self._acquire(redis_key)
+        if token is not None:
+            return self._compute_and_release(key, redis_key, token, compute)
+        
+        # Another worker is computing this key: wait for its result
+        self._count(lock_waits=1)
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            try:
+                raw = self.client.get(redis_key)
+            except Exception:
+                self._error("get")
+                break
+            if raw is not None:
+                return self._decode(raw)[0]
+        return compute()
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and stampede protection activity"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'early_refreshes': self.early_refreshes,
+                'lock_waits': self.lock_waits,
+                'errors': self.errors,
+            }
+    
+    def _expires_early(self, compute_seconds: float, expires_at: float) -> bool:
+        """XFetch test: refresh ahead of expiry, the earlier the costlier the value"""
+        if self.beta <= 0 or compute_seconds <= 0:
+            return False
+        # 1 - random() lies in (0, 1], keeping the logarithm finite
+        head_start = -compute_seconds * self.beta * math.log(1.0 - self.random_source())
+        return self.clock() + head_start >= expires_at
+    
+    def _compute_and_release(
+        self,
+        key: Hashable,
+        redis_key: str,
+        token: bytes,
+        compute: Callable[[], Any]
+    ) -> Any:
+        """Compute a value under its lock, store it and release the lock if still held"""
+        try:
+            started = time.perf_counter()
+            value = compute()
+            self.set(key, value, time.perf_counter() - started)
+            return value
+        finally:
+            try:
+                self.client.eval(RELEASE_LOCK_SCRIPT, 1, redis_key + LOCK_SUFFIX, token)
+            except Exception:
+                self._error("unlock")
+    
+    def _acquire(self, redis_key: str) -> Optional[bytes]:
+        """
+        Try to take a key's computation lock (expires after lock_timeout)
+        
+        Returns:
+            Random token identifying this holder, or None if the lock is
+            taken (a token too when Redis fails, as the caller computes anyway)
+        """
+        token = os.urandom(16)
+        try:
+            taken = self.client.set(
+                redis_key + LOCK_SUFFIX,
+                token,
+                nx=True,
+                px=max(1, int(self.lock_timeout * 1000)),
+            )
+        except Exception:
+            self._error("lock")
+            return token
+        return token if taken else None
+    
+    def _decode(self, raw: bytes) -> list:
+        """Decode a stored [value, compute seconds, expiry] entry"""
+        import msgpack
+        
+        return msgpack.unpackb(raw, raw=False)
+    
+    def _count(self, **increments: int):
+        """Update counters under the lock"""
+        with self._lock:
+            for name, increment in increments.items():
+                setattr(self, name, getattr(self, name) + increment)
+    
+    def _error(self, operation: str):
+        """Log a Redis failure; the caller carries on without the shared tier"""
+        self._count(errors=1)
+        logger.warning("Redis score cache %s failed", operation, exc_info=True)
+
+
+class TieredScoreCache:
+    """
+    In-process cache in front of the shared Redis cache
+    
+    Lookups try the local tier first; values found in Redis, or computed,
+    are copied into the local tier.
+    """
+    
+    def __init__(self, local, remote: RedisScoreCache):
+        """Initialize from the local ScoreCache and the Redis tier"""
+        self.local = local
+        self.remote = remote
+    
+    def __len__(self) -> int:
+        """Number of entries in the local tier"""
+        return len(self.local)
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for a key from either tier, or None"""
+        return self.get_many([key])[0]
+    
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Any]]:
+        """Cached values for many keys; local misses go to Redis in one round trip"""
+        values = self.local.get_many(keys)
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            remote_values = self.remote.get_many([keys[i] for i in missing])
+            for i, value in zip(missing, remote_values):
+                if value is not None:
+                    values[i] = value
+                    self.local.set(keys[i], value)
+        return values
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value in both tiers"""
+        self.set_many({key: value})
+    
+    def set_many(self, items: Dict[Hashable, Any]):
+        """Store many values in both tiers"""
+        self.local.set_many(items)
+        self.remote.set_many(items)
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached value for a key, computing it (once across workers) on a miss"""
+        value = self.local.get(key)
+        if value is None:
+            value = self.remote.get_or_compute(key, compute)
+            self.local.set(key, value)
+        return value
+    
+    def clear(self):
+        """Drop the local tier (shared entries expire on their own)"""
+        self.local.clear()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Counters of both tiers"""
+        return {'local': self.local.stats(), 'remote': self.remote.stats()}
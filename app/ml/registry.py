@@ -0,0 +1,174 @@
+"""
+Model Registry
+Process-wide home of the risk models, their shared spatial data and the one
+EnsembleScorer every endpoint uses. Components are loaded once per process,
+on first use or all at startup (MODEL_PRELOAD); rasters under
+MODEL_BASE_PATH are memory-mapped, so workers forked after loading share
+their pages copy-on-write. Load time and resident memory growth are
+recorded per component.
+"""
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.ml.ensemble import EnsembleScorer
+from app.ml.models.drought_model import DroughtRiskModel
+from app.ml.models.flood_model import FloodRiskModel
+from app.ml.models.groundwater_model import GroundwaterRiskModel
+from app.ml.models.heat_model import HeatRiskModel
+from app.ml.risk_grid import load_default_grid
+from app.ml.score_cache import CachedEnsembleScorer
+from app.ml.spatial.coast import get_coast_sampler
+from app.ml.spatial.elevation import get_elevation_service
+from app.ml.spatial.gazetteer import get_urban_gazetteer
+from app.ml.spatial.rivers import get_river_network
+
+logger = logging.getLogger(__name__)
+
+# Risk models by name, with the artifact file each loads under MODEL_BASE_PATH
+MODEL_CLASSES = {
+    'flood': FloodRiskModel,
+    'heat': HeatRiskModel,
+    'drought': DroughtRiskModel,
+    'groundwater': GroundwaterRiskModel,
+}
+MODEL_ARTIFACT_SUFFIX = "_model.joblib"
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Resident set size of this process (None where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Loads each component once and hands out the same instances
+    
+    Components, in load order: the shared spatial data, the four risk
+    models, the precompiled risk grid (only if it was built from those
+    models, trained artifacts included) and the ensemble scorer built on them.
+    """
+    
+    def __init__(self, base_path: Optional[str] = None):
+        """
+        Initialize registry (nothing is loaded until requested)
+        
+        Args:
+            base_path: Directory holding model artifacts (MODEL_BASE_PATH by default)
+        """
+        self.base_path = base_path or settings.MODEL_BASE_PATH
+        self._loaders: Dict[str, Callable[[], object]] = {
+            'rivers': get_river_network,
+            'coast': get_coast_sampler,
+            'gazetteer': get_urban_gazetteer,
+            'elevation': get_elevation_service,
+        }
+        for name in MODEL_CLASSES:
+            self._loaders[name] = lambda name=name: self._load_model(name)
+        self._loaders['risk_grid'] = lambda: load_default_grid(
+            self.base_path, {name: self.get(name) for name in MODEL_CLASSES}
+        )
+        self._loaders['ensemble'] = self._load_ensemble
+        
+        self._components: Dict[str, object] = {}
+        self._reports: Dict[str, Dict] = {}
+        self._scorers: Dict[float, CachedEnsembleScorer] = {}
+        # Re-entrant: loading the ensemble loads the models it is built on
+        self._lock = threading.RLock()
+    
+    def get(self, name: str) -> object:
+        """Component by name, loading it on first use"""
+        if name in self._components:
+            return self._components[name]
+        
+        with self._lock:
+            if name not in self._components:
+                resident_before = resident_memory_bytes()
+                started = time.perf_counter()
+                component = self._loaders[name]()
+                load_seconds = time.perf_counter() - started
+                resident_after = resident_memory_bytes()
+                
+                self._components[name] = component
+                self._reports[name] = {
+                    'name': name,
+                    'load_seconds': round(load_seconds, 4),
+                    'resident_bytes': (
+                        None if resident_before is None or resident_after is None
+                        else max(0, resident_after - resident_before)
+                    ),
+                }
+                logger.info(
+                    "Loaded %s in %.3fs (+%s bytes resident)",
+                    name, load_seconds, self._reports[name]['resident_bytes'],
+                )
+            return self._components[name]
+    
+    def preload(self):
+        """Load every component now (e.g. at startup, before serving traffic)"""
+        for name in self._loaders:
+            self.get(name)
+    
+    @property
+    def scorer(self) -> EnsembleScorer:
+        """The shared ensemble scorer"""
+        return self.get('ensemble')
+    
+    def cached_scorer(self, precision: Optional[float] = None) -> CachedEnsembleScorer:
+        """
+        The shared scorer behind the score cache
+        
+        Args:
+            precision: Cache grid in degrees (SCORE_CACHE_PRECISION by default)
+        """
+        if precision is None:
+            precision = settings.SCORE_CACHE_PRECISION
+        scorer = self._scorers.get(precision)
+        if scorer is None:
+            scorer = self._scorers.setdefault(
+                precision, CachedEnsembleScorer(self.scorer, precision=precision)
+            )
+        return scorer
+    
+    def report(self) -> List[Dict]:
+        """
+        Load time and resident memory growth of each loaded component
+        
+        A component's figures include the components it loaded first
+        (the ensemble includes any models not loaded before it).
+        """
+        return [self._reports[name] for name in self._loaders if name in self._reports]
+    
+    def _load_model(self, name: str):
+        """Create a risk model, loading its trained artifact when one exists"""
+        # Shared spatial data is loaded (and reported) on its own first
+        for dependency in ('rivers', 'coast', 'gazetteer'):
+            self.get(dependency)
+        
+        model = MODEL_CLASSES[name]()
+        artifact = os.path.join(self.base_path, name + MODEL_ARTIFACT_SUFFIX)
+        if os.path.exists(artifact):
+            model.load_model(artifact)
+        return model
+    
+    def _load_ensemble(self) -> EnsembleScorer:
+        """Build the ensemble scorer on the registry's models and grid"""
+        return EnsembleScorer(
+            grid_lookup=self.get('risk_grid'),
+            elevation_service=self.get('elevation'),
+            models={name: self.get(name) for name in MODEL_CLASSES},
+        )
+
+
+@lru_cache(maxsize=None)
+def get_model_registry() -> ModelRegistry:
+    """Process-wide model registry"""
+    return ModelRegistry()
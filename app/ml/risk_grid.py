@@ -0,0 +1,329 @@
+"""
+Precompiled National Risk Grid
+Evaluates the risk models once over a fixed lat/lon grid and serves
+point/batch queries from a memory-mapped array, so scoring a location
+becomes an O(1) index computation instead of running the rule chains.
+
+Build the grid with:
+    python -m app.ml.risk_grid --resolution 0.01
+"""
+import argparse
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.fingerprint import scoring_version
+
+logger = logging.getLogger(__name__)
+
+# Bands stored per grid cell, in file order
+RISK_GRID_BANDS = ('flood', 'heat', 'drought', 'groundwater', 'rainfall')
+
+# India & Asia coverage: (min_lat, max_lat, min_lon, max_lon)
+DEFAULT_BOUNDS = (5.0, 38.0, 66.0, 100.0)
+
+RISK_GRID_FILENAME = "risk_grid.npy"
+RISK_GRID_METADATA_FILENAME = "risk_grid.json"
+
+# Grid rows evaluated per build step (bounds peak memory while building)
+BUILD_CHUNK_ROWS = 64
+
+
+class GridRiskLookup:
+    """
+    Memory-mapped lookup of precomputed risk components
+    
+    The grid array has shape (n_lat, n_lon, n_bands) so the bands of one
+    cell are contiguous. Bands are either float16 scores or uint8 codes
+    into a per-band palette of the exact values the models produced.
+    `pyramid` holds the grid's overview levels when they have been built.
+    """
+    
+    def __init__(self, grid: np.ndarray, metadata: Dict):
+        """Initialize lookup from a (memory-mapped) grid array and its metadata"""
+        self.grid = grid
+        self.metadata = metadata
+        self.bands = tuple(metadata['bands'])
+        self.resolution = float(metadata['resolution'])
+        self.min_lat = float(metadata['min_lat'])
+        self.min_lon = float(metadata['min_lon'])
+        self.n_lat, self.n_lon = grid.shape[:2]
+        self.pyramid = None
+        
+        if metadata['encoding'] == 'palette':
+            # Pad palettes to 256 entries so any uint8 code indexes safely
+            self.palettes = np.zeros((len(self.bands), 256))
+            for i, band in enumerate(self.bands):
+                values = metadata['palettes'][band]
+                self.palettes[i, :len(values)] = values
+            self._palette_lists = self.palettes.tolist()
+        else:
+            self.palettes = None
+            self._palette_lists = None
+    
+    @classmethod
+    def load(cls, directory: str) -> "GridRiskLookup":
+        """Memory-map a grid written by `build_risk_grid`, with its pyramid if built"""
+        from app.ml.risk_pyramid import load_pyramid
+        
+        with open(os.path.join(directory, RISK_GRID_METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+        grid = np.load(os.path.join(directory, RISK_GRID_FILENAME), mmap_mode='r')
+        lookup = cls(grid, metadata)
+        lookup.pyramid = load_pyramid(directory, lookup)
+        return lookup
+    
+    def cell_indices(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Map coordinates to the nearest grid cell
+        
+        Returns:
+            Tuple of (row indices, column indices, on-grid mask)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        
+        with np.errstate(invalid='ignore'):
+            rows = np.rint((latitudes - self.min_lat) / self.resolution)
+            cols = np.rint((longitudes - self.min_lon) / self.resolution)
+            on_grid = (
+                (rows >= 0) & (rows < self.n_lat) &
+                (cols >= 0) & (cols < self.n_lon)
+            )
+        
+        rows = np.where(on_grid, rows, 0).astype(np.intp)
+        cols = np.where(on_grid, cols, 0).astype(np.intp)
+        return rows, cols, on_grid
+    
+    def lookup_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Look up risk components for many locations
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+        
+        Returns:
+            Tuple of (band name -> float64 array, on-grid mask). Values for
+            off-grid rows are meaningless and must be filled by the caller.
+        """
+        rows, cols, on_grid = self.cell_indices(latitudes, longitudes)
+        cells = self.grid[rows, cols]
+        
+        components = {}
+        for i, band in enumerate(self.bands):
+            if self.palettes is not None:
+                components[band] = self.palettes[i][cells[..., i]]
+            else:
+                components[band] = cells[..., i].astype(float)
+        
+        return components, on_grid
+    
+    def lookup(self, latitude: float, longitude: float) -> Optional[Dict[str, float]]:
+        """
+        Look up risk components for a single location
+        
+        Returns:
+            Dictionary of band name -> score, or None if the point is off-grid
+        """
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return None
+        
+        # Plain-Python index arithmetic: avoids array overhead on the hot path
+        row = round((latitude - self.min_lat) / self.resolution)
+        col = round((longitude - self.min_lon) / self.resolution)
+        if not (0 <= row < self.n_lat and 0 <= col < self.n_lon):
+            return None
+        
+        cell = self.grid[row, col].tolist()
+        if self._palette_lists is not None:
+            return {
+                band: self._palette_lists[i][code]
+                for i, (band, code) in enumerate(zip(self.bands, cell))
+            }
+        return dict(zip(self.bands, cell))
+
+
+def load_default_grid(
+    directory: Optional[str] = None,
+    models: Optional[Dict[str, object]] = None
+) -> Optional[GridRiskLookup]:
+    """
+    Load the grid under MODEL_BASE_PATH (or `directory`) if it is current
+    
+    Args:
+        directory: Directory holding the grid
+        models: Risk models the grid must have been built from (the
+            rule-based models by default)
+    
+    Returns:
+        GridRiskLookup, or None if disabled, not built or built from other
+        rules, data or models (logged, as it needs rebuilding)
+    """
+    directory = directory or settings.MODEL_BASE_PATH
+    if not settings.RISK_GRID_ENABLED:
+        return None
+    if not os.path.exists(os.path.join(directory, RISK_GRID_METADATA_FILENAME)):
+        return None
+    grid = GridRiskLookup.load(directory)
+    expected = scoring_version(models)
+    if grid.metadata.get('scoring_version') != expected:
+        logger.warning(
+            "Ignoring risk grid in %s: built for scoring version %s, not %s; "
+            "rebuild it with python -m app.ml.risk_grid --output %s",
+            directory, grid.metadata.get('scoring_version'), expected, directory,
+        )
+        return None
+    return grid
+
+
+def build_risk_grid(
+    output_dir: str,
+    resolution: float = 0.01,
+    bounds: Tuple[float, float, float, float] = DEFAULT_BOUNDS,
+    encoding: str = 'palette',
+    scorer=None,
+) -> GridRiskLookup:
+    """
+    Evaluate all risk models over a lat/lon grid and write it to disk
+    
+    Args:
+        output_dir: Directory to write the grid and its metadata to
+        resolution: Cell size in degrees
+        bounds: (min_lat, max_lat, min_lon, max_lon) of the grid
+        encoding: 'palette' (uint8 codes, exact values) or 'float16'
+        scorer: EnsembleScorer to evaluate (a fresh one by default)
+    
+    Returns:
+        GridRiskLookup over the written file
+    """
+    if encoding not in ('palette', 'float16'):
+        raise ValueError(f"Unknown grid encoding: {encoding}")
+    
+    if scorer is None:
+        from app.ml.ensemble import EnsembleScorer
+        scorer = EnsembleScorer()
+    
+    min_lat, max_lat, min_lon, max_lon = bounds
+    n_lat = int(round((max_lat - min_lat) / resolution)) + 1
+    n_lon = int(round((max_lon - min_lon) / resolution)) + 1
+    latitudes = min_lat + np.arange(n_lat) * resolution
+    longitudes = min_lon + np.arange(n_lon) * resolution
+    
+    os.makedirs(output_dir, exist_ok=True)
+    dtype = np.uint8 if encoding == 'palette' else np.float16
+    grid = np.lib.format.open_memmap(
+        os.path.join(output_dir, RISK_GRID_FILENAME),
+        mode='w+',
+        dtype=dtype,
+        shape=(n_lat, n_lon, len(RISK_GRID_BANDS)),
+    )
+    # Palette value -> code, per band, in order of first appearance
+    palettes = {band: {} for band in RISK_GRID_BANDS}
+    
+    for start in range(0, n_lat, BUILD_CHUNK_ROWS):
+        stop = min(start + BUILD_CHUNK_ROWS, n_lat)
+        chunk_lat, chunk_lon = np.meshgrid(latitudes[start:stop], longitudes, indexing='ij')
+        components = scorer._predict_components_batch(chunk_lat, chunk_lon)
+        
+        for i, band in enumerate(RISK_GRID_BANDS):
+            if encoding == 'palette':
+                grid[start:stop, :, i] = _encode_palette(components[band], palettes[band], band)
+            else:
+                grid[start:stop, :, i] = components[band]
+    
+    grid.flush()
+    
+    metadata = {
+        'bands': list(RISK_GRID_BANDS),
+        'resolution': resolution,
+        'min_lat': min_lat,
+        'min_lon': min_lon,
+        'max_lat': float(latitudes[-1]),
+        'max_lon': float(longitudes[-1]),
+        'encoding': encoding,
+        # Rules, data and models the grid was evaluated from
+        'scoring_version': scoring_version(scorer.models),
+        'built_at': datetime.utcnow().isoformat(),
+    }
+    if encoding == 'palette':
+        metadata['palettes'] = {
+            band: list(palette.keys()) for band, palette in palettes.items()
+        }
+    
+    with open(os.path.join(output_dir, RISK_GRID_METADATA_FILENAME), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    del grid
+    return GridRiskLookup.load(output_dir)
+
+
+def _encode_palette(values: np.ndarray, palette: Dict[float, int], band: str) -> np.ndarray:
+    """Encode values as uint8 palette codes, growing the palette as needed"""
+    unique, inverse = np.unique(values, return_inverse=True)
+    codes = np.empty(len(unique), dtype=np.uint8)
+    
+    for i, value in enumerate(unique.tolist()):
+        if value not in palette:
+            if len(palette) == 256:
+                raise ValueError(
+                    f"Band '{band}' has more than 256 distinct values; "
+                    "rebuild with encoding='float16'"
+                )
+            palette[value] = len(palette)
+        codes[i] = palette[value]
+    
+    return codes[inverse.reshape(values.shape)]
+
+
+def main():
+    """Command-line entry point for building the risk grid"""
+    parser = argparse.ArgumentParser(description="Build the precompiled national risk grid")
+    parser.add_argument("--resolution", type=float, default=0.01, help="Cell size in degrees")
+    parser.add_argument(
+        "--bounds",
+        type=float,
+        nargs=4,
+        default=DEFAULT_BOUNDS,
+        metavar=("MIN_LAT", "MAX_LAT", "MIN_LON", "MAX_LON"),
+    )
+    parser.add_argument("--encoding", choices=["palette", "float16"], default="palette")
+    parser.add_argument("--output", default=settings.MODEL_BASE_PATH, help="Output directory")
+    args = parser.parse_args()
+    
+    # Evaluate the models the registry will serve the grid with, trained
+    # artifacts in the output directory included
+    from app.ml.ensemble import EnsembleScorer
+    from app.ml.registry import MODEL_CLASSES, ModelRegistry
+    registry = ModelRegistry(args.output)
+    scorer = EnsembleScorer(models={name: registry.get(name) for name in MODEL_CLASSES})
+    
+    lookup = build_risk_grid(
+        args.output,
+        resolution=args.resolution,
+        bounds=tuple(args.bounds),
+        encoding=args.encoding,
+        scorer=scorer,
+    )
+    print(
+        f"Wrote {lookup.n_lat}x{lookup.n_lon} risk grid "
+        f"({lookup.grid.nbytes / 1e6:.1f} MB) to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Risk Grid Pyramid
+Overview levels of the precompiled risk grid for rendering low-zoom map
+tiles. Level k reduces each block of 2**k x 2**k grid cells to one cell
+holding the mean, the maximum and the 90th percentile of every band and
+of the weighted overall score, so a tile pixel spanning many grid cells
+shows their average or worst case instead of whichever single cell its
+centre falls on, and a low-zoom tile reads a small overview instead of
+pages scattered across the whole grid.
+
+Levels are float16 .npy files written beside the grid and memory-mapped
+with it; a pyramid is only used with the grid it was built from. The tile
+renderer reads the level whose cells are closest to the pixel size of the
+requested zoom.
+
+Build the pyramid of the grid under MODEL_BASE_PATH with:
+    python -m app.ml.risk_pyramid
+"""
+import argparse
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Block statistics kept per level: the mean, and two worst-case measures
+PYRAMID_AGGREGATIONS = ('mean', 'max', 'p90')
+DEFAULT_AGGREGATION = 'mean'
+
+RISK_PYRAMID_METADATA_FILENAME = "risk_pyramid.json"
+_LEVEL_FILENAME = "risk_pyramid_{level}_{aggregation}.npy"
+
+# Coarsest level kept: its longer side has at least this many cells
+MIN_OVERVIEW_CELLS = 16
+
+# Grid cells reduced per build step (bounds peak memory while building)
+BUILD_CHUNK_CELLS = 1 << 22
+
+
+class RiskPyramid:
+    """
+    Memory-mapped overview levels of a risk grid
+    
+    Level k (1..n_levels) has arrays of shape (ceil(n_lat / 2**k),
+    ceil(n_lon / 2**k), n_bands) per aggregation; its cell (i, j) covers
+    grid rows i * 2**k .. (i + 1) * 2**k - 1 and the matching columns.
+    The last band is the weighted overall score.
+    """
+    
+    def __init__(self, levels: List[Dict[str, np.ndarray]], metadata: Dict):
+        """Initialize from per-level {aggregation: array} dictionaries and metadata"""
+        self.levels = levels
+        self.metadata = metadata
+        self.bands = tuple(metadata['bands'])
+        self.resolution = float(metadata['resolution'])
+    
+    @property
+    def n_levels(self) -> int:
+        """Number of overview levels (not counting the grid itself)"""
+        return len(self.levels)
+    
+    @classmethod
+    def load(cls, directory: str) -> "RiskPyramid":
+        """Memory-map a pyramid written by `build_risk_pyramid`"""
+        with open(os.path.join(directory, RISK_PYRAMID_METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+        levels = [
+            {
+                aggregation: np.load(
+                    os.path.join(directory, _LEVEL_FILENAME.format(level=level, aggregation=aggregation)),
+                    mmap_mode='r',
+                )
+                for aggregation in metadata['aggregations']
+            }
+            for level in range(1, metadata['levels'] + 1)
+        ]
+        return cls(levels, metadata)
+    
+    def level_for(self, pixel_size: float) -> int:
+        """
+        Level whose cell size is closest to a pixel size
+        
+        Args:
+            pixel_size: Pixel spacing in degrees
+        
+        Returns:
+            Level index, 0 for the grid itself
+        """
+        if pixel_size <= self.resolution:
+            return 0
+        return min(self.n_levels, max(0, round(math.log2(pixel_size / self.resolution))))
+    
+    def overview(self, level: int, aggregation: str) -> np.ndarray:
+        """(rows, columns, bands) array of one level (1..n_levels) and aggregation"""
+        check_aggregation(aggregation)
+        return self.levels[level - 1][aggregation]
+
+
+def check_aggregation(aggregation: str):
+    """Raise ValueError unless aggregation is one of PYRAMID_AGGREGATIONS"""
+    if aggregation not in PYRAMID_AGGREGATIONS:
+        raise ValueError(
+            f"Unknown aggregation {aggregation!r}; expected one of {', '.join(PYRAMID_AGGREGATIONS)}"
+        )
+
+
+def load_pyramid(directory: str, grid) -> Optional[RiskPyramid]:
+    """Load the pyramid in `directory` if there is one built from `grid`, else None"""
+    if not os.path.exists(os.path.join(directory, RISK_PYRAMID_METADATA_FILENAME)):
+        return None
+    pyramid = RiskPyramid.load(directory)
+    if pyramid.metadata.get('grid_built_at') != grid.metadata.get('built_at'):
+        logger.warning("Ignoring risk pyramid in %s: built from another risk grid", directory)
+        return None
+    return pyramid
+
+
+def _grid_values(grid, weights: Dict[str, float], start: int, stop: int) -> np.ndarray:
+    """(rows, columns, bands + overall) float32 scores of grid rows start..stop"""
+    cells = np.asarray(grid.grid[start:stop])
+    values = np.empty(cells.shape[:2] + (len(grid.bands) + 1,), dtype=np.float32)
+    for i in range(len(grid.bands)):
+        if grid.palettes is not None:
+            values[..., i] = grid.palettes[i][cells[..., i]]
+        else:
+            values[..., i] = cells[..., i]
+    values[..., -1] = sum(weights[band] * values[..., i] for i, band in enumerate(grid.bands))
+    return values
+
+
+def reduce_blocks(values: np.ndarray, factor: int) -> Dict[str, np.ndarray]:
+    """
+    Block statistics of (rows, columns, bands) values
+    
+    Args:
+        values: Scores; rows and columns are multiples of factor, NaN
+            marks padding beyond the grid (every block has a real cell)
+        factor: Block side in cells
+    
+    Returns:
+        Dictionary of aggregation -> (rows / factor, columns / factor, bands)
+    """
+    rows, cols, bands = values.shape
+    blocks = values.reshape(rows // factor, factor, cols // factor, factor, bands)
+    blocks = blocks.transpose(0, 2, 4, 1, 3).reshape(rows // factor, cols // factor, bands, -1)
+    
+    # NaN sorts last, so each block's real values lead its sorted run
+    ordered = np.sort(blocks, axis=-1)
+    counts = np.count_nonzero(~np.isnan(ordered), axis=-1)
+    
+    def ranked(rank: np.ndarray) -> np.ndarray:
+        return np.take_along_axis(ordered, rank[..., None], axis=-1)[..., 0]
+    
+    # Linear interpolation between ranks, as np.percentile
+    position = 0.9 * (counts - 1)
+    below = np.floor(position).astype(np.intp)
+    low, high = ranked(below), ranked(np.minimum(below + 1, counts - 1))
+    return {
+        'mean': np.nansum(ordered, axis=-1) / counts,
+        'max': ranked(counts - 1),
+        'p90': low + (high - low) * (position - below),
+    }
+
+
+def build_risk_pyramid(
+    grid,
+    output_dir: str,
+    weights: Dict[str, float],
+    levels: Optional[int] = None
+) -> RiskPyramid:
+    """
+    Block-reduce a risk grid into overview levels and write them to disk
+    
+    Every level is reduced from the grid itself (percentiles do not
+    compose), in bands of rows to bound memory.
+    
+    Args:
+        grid: GridRiskLookup to reduce
+        output_dir: Directory to write the levels and their metadata to
+        weights: Band weights of the overall score
+        levels: Number of levels (by default down to MIN_OVERVIEW_CELLS)
+    
+    Returns:
+        RiskPyramid over the written files
+    """
+    longest = max(grid.n_lat, grid.n_lon)
+    if levels is None:
+        levels = max(0, int(math.floor(math.log2(longest / MIN_OVERVIEW_CELLS))))
+    
+    os.makedirs(output_dir, exist_ok=True)
+    bands = len(grid.bands) + 1
+    for level in range(1, levels + 1):
+        factor = 2 ** level
+        n_rows, n_cols = -(-grid.n_lat // factor), -(-grid.n_lon // factor)
+        arrays = {
+            aggregation: np.lib.format.open_memmap(
+                os.path.join(output_dir, _LEVEL_FILENAME.format(level=level, aggregation=aggregation)),
+                mode='w+',
+                dtype=np.float16,
+                shape=(n_rows, n_cols, bands),
+            )
+            for aggregation in PYRAMID_AGGREGATIONS
+        }
+        step = max(1, BUILD_CHUNK_CELLS // (factor * factor * n_cols))
+        for first in range(0, n_rows, step):
+            last = min(first + step, n_rows)
+            values = np.full(((last - first) * factor, n_cols * factor, bands), np.nan, dtype=np.float32)
+            chunk = _grid_values(grid, weights, first * factor, min(last * factor, grid.n_lat))
+            values[:len(chunk), :grid.n_lon] = chunk
+            for aggregation, reduced in reduce_blocks(values, factor).items():
+                arrays[aggregation][first:last] = reduced
+        for array in arrays.values():
+            array.flush()
+        del arrays
+    
+    metadata = {
+        'bands': list(grid.bands) + ['overall'],
+        'aggregations': list(PYRAMID_AGGREGATIONS),
+        'levels': levels,
+        'resolution': grid.resolution,
+        'weights': {band: weights[band] for band in grid.bands},
+        'grid_built_at': grid.metadata.get('built_at'),
+        'built_at': datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(output_dir, RISK_PYRAMID_METADATA_FILENAME), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    return RiskPyramid.load(output_dir)
+
+
+def main():
+    """Command-line entry point for building the risk grid pyramid"""
+    from app.ml.registry import ModelRegistry
+    
+    parser = argparse.ArgumentParser(description="Build overview levels of the risk grid")
+    parser.add_argument("--grid", default=settings.MODEL_BASE_PATH, help="Directory of the risk grid")
+    parser.add_argument("--levels", type=int, default=None, help="Number of levels (default: down to ~16 cells)")
+    args = parser.parse_args()
+    
+    # The grid and weights the server uses, trained artifacts included
+    registry = ModelRegistry(args.grid)
+    grid = registry.get('risk_grid')
+    if grid is None:
+        parser.error(
+            f"No current risk grid in {args.grid}; build it with python -m app.ml.risk_grid --output {args.grid}"
+        )
+    pyramid = build_risk_pyramid(grid, args.grid, registry.scorer.weights, args.levels)
+    size = sum(array.nbytes for level in pyramid.levels for array in level.values())
+    print(f"Wrote {pyramid.n_levels} overview levels ({size / 1e6:.1f} MB) to {args.grid}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+Risk Map Tiles
+Renders XYZ (Web Mercator, "slippy map") raster tiles of a risk layer. A
+tile's pixel centres are computed as one latitude per row and one longitude
+per column; with the precompiled risk grid the layer is then a single
+gather of grid rows x grid columns, so a 256x256 tile costs a few
+milliseconds whatever the zoom. Where a pixel spans several grid cells the
+gather reads the grid's pyramid level closest to the pixel size, holding
+the mean or a worst case (max, p90) of the cells it covers. Without the
+grid every pixel in coverage is evaluated live by the vectorized models
+(far slower, point samples; build the grid for serving tiles).
+
+Scores are quantized to 255 classes and written as an 8-bit palette PNG
+whose palette is the colormap lookup table, so colouring is done by the
+decoder and each pixel is one byte to compress.
+
+Measure per-tile render time with:
+    python -m app.ml.risk_tiles --zoom 8 --tiles 200
+"""
+import argparse
+import math
+import struct
+import time
+import zlib
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from app.ml.risk_grid import DEFAULT_BOUNDS, RISK_GRID_BANDS
+from app.ml.risk_pyramid import DEFAULT_AGGREGATION, PYRAMID_AGGREGATIONS, check_aggregation
+
+TILE_SIZE = 256
+MAX_ZOOM = 18
+
+# Layers a tile can show: one risk band or the weighted overall score
+RISK_TILE_TYPES = RISK_GRID_BANDS + ('overall',)
+
+# Latitude limit of the Web Mercator projection
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+# Palette index of pixels without data (fully transparent); scores 0..100
+# take indices 0..254
+NODATA_INDEX = 255
+SCORE_CLASSES = 255
+
+# Colormap stops: score -> RGB, green through yellow to red
+_COLORMAP_STOPS = (
+    (0.0, (26, 152, 80)),
+    (25.0, (145, 207, 96)),
+    (50.0, (254, 224, 139)),
+    (75.0, (252, 141, 89)),
+    (100.0, (215, 48, 39)),
+)
+
+PNG_COMPRESSION_LEVEL = 6
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _build_colormap() -> np.ndarray:
+    """(256, 4) RGBA lookup table of palette index -> colour"""
+    scores = np.linspace(0.0, 100.0, SCORE_CLASSES)
+    stops = np.array([score for score, _ in _COLORMAP_STOPS])
+    colors = np.array([rgb for _, rgb in _COLORMAP_STOPS], dtype=float)
+    colormap = np.zeros((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        colormap[:SCORE_CLASSES, channel] = np.rint(np.interp(scores, stops, colors[:, channel]))
+    colormap[:SCORE_CLASSES, 3] = 255
+    return colormap
+
+
+RISK_COLORMAP = _build_colormap()
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a tile"""
+    n = 2 ** z
+    
+    def latitude(row: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+    
+    return (x / n * 360.0 - 180.0, latitude(y + 1), (x + 1) / n * 360.0 - 180.0, latitude(y))
+
+
+def tile_pixel_coordinates(
+    z: int,
+    x: int,
+    y: int,
+    size: int = TILE_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Coordinates of a tile's pixel centres
+    
+    Web Mercator keeps latitude constant along a pixel row and longitude
+    along a column, so the size x size centres are the outer product of
+    the two returned vectors.
+    
+    Returns:
+        Tuple of (latitude per row, top to bottom; longitude per column)
+    """
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    longitudes = (x + offsets) / n * 360.0 - 180.0
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return latitudes, longitudes
+
+
+def tiles_covering(
+    bbox: Tuple[float, float, float, float],
+    z: int
+) -> Tuple[range, range]:
+    """
+    Tile columns and rows intersecting a bounding box at a zoom level
+    
+    Args:
+        bbox: (min_lon, min_lat, max_lon, max_lat)
+        z: Zoom level
+    
+    Returns:
+        Tuple of (x range, y range)
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    n = 2 ** z
+    
+    def column(lon: float) -> int:
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+    
+    def row(lat: float) -> int:
+        lat = math.radians(max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, lat)))
+        return min(n - 1, max(0, int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)))
+    
+    return range(column(min_lon), column(max_lon) + 1), range(row(max_lat), row(min_lat) + 1)
+
+
+def coverage_bounds(ensemble_scorer) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) the scorer has risk data for"""
+    grid = ensemble_scorer.grid_lookup
+    if grid is None:
+        return DEFAULT_BOUNDS
+    # Points up to half a cell beyond the outer cell centres snap onto the grid
+    half = grid.resolution / 2
+    return (
+        grid.min_lat - half,
+        grid.min_lat + (grid.n_lat - 1) * grid.resolution + half,
+        grid.min_lon - half,
+        grid.min_lon + (grid.n_lon - 1) * grid.resolution + half,
+    )
+
+
+def _check_risk_type(risk_type: str):
+    """Raise ValueError unless risk_type is one of RISK_TILE_TYPES"""
+    if risk_type not in RISK_TILE_TYPES:
+        raise ValueError(f"Unknown risk type {risk_type!r}; expected one of {', '.join(RISK_TILE_TYPES)}")
+
+
+def _quantize(scores: np.ndarray) -> np.ndarray:
+    """Scores (0-100, NaN = no data) as palette indices"""
+    with np.errstate(invalid='ignore'):
+        indices = np.rint(np.clip(scores, 0, 100) * ((SCORE_CLASSES - 1) / 100.0))
+    return np.where(np.isnan(scores), NODATA_INDEX, indices).astype(np.uint8)
+
+
+def _grid_layer(
+    ensemble_scorer,
+    risk_type: str,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    classify: Callable[[np.ndarray], np.ndarray],
+    aggregation: str,
+    pixel_size: Optional[float]
+) -> np.ndarray:
+    """Classified layer from the precompiled grid or its pyramid (rows x columns gather)"""
+    grid = ensemble_scorer.grid_lookup
+    rows = np.rint((latitudes - grid.min_lat) / grid.resolution)
+    cols = np.rint((longitudes - grid.min_lon) / grid.resolution)
+    row_on_grid = (rows >= 0) & (rows < grid.n_lat)
+    col_on_grid = (cols >= 0) & (cols < grid.n_lon)
+    on_grid = row_on_grid[:, None] & col_on_grid[None, :]
+    rows = np.where(row_on_grid, rows, 0).astype(np.intp)
+    cols = np.where(col_on_grid, cols, 0).astype(np.intp)
+    
+    level = 0
+    if grid.pyramid is not None and pixel_size is not None:
+        level = grid.pyramid.level_for(pixel_size)
+    if level:
+        # Overview cells cover 2**level grid cells a side
+        overview = grid.pyramid.overview(level, aggregation)
+        band = grid.pyramid.bands.index(risk_type)
+        scores = overview[(rows >> level)[:, None], (cols >> level)[None, :], band]
+        indices = classify(scores.astype(float))
+        indices[~on_grid] = NODATA_INDEX
+        return indices
+    
+    cells = grid.grid[rows[:, None], cols[None, :]]
+    if risk_type == 'overall':
+        scores = sum(
+            ensemble_scorer.weights[band] * _band_values(grid, cells, i)
+            for i, band in enumerate(grid.bands)
+        )
+        indices = classify(scores)
+    elif grid.palettes is not None:
+        # Palette codes map straight to classes: one lookup per pixel
+        i = grid.bands.index(risk_type)
+        indices = classify(grid.palettes[i])[cells[..., i]]
+    else:
+        indices = classify(_band_values(grid, cells, grid.bands.index(risk_type)))
+    
+    indices[~on_grid] = NODATA_INDEX
+    return indices
+
+
+def _band_values(grid, cells: np.ndarray, i: int) -> np.ndarray:
+    """Scores of one band of gathered grid cells"""
+    if grid.palettes is not None:
+        return grid.palettes[i][cells[..., i]]
+    return cells[..., i].astype(float)
+
+
+def _live_layer(
+    ensemble_scorer,
+    risk_type: str,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    classify: Callable[[np.ndarray], np.ndarray]
+) -> np.ndarray:
+    """Classified layer evaluated by the models for every pixel in coverage"""
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+    row_covered = (latitudes >= min_lat) & (latitudes <= max_lat)
+    col_covered = (longitudes >= min_lon) & (longitudes <= max_lon)
+    indices = np.full((len(latitudes), len(longitudes)), NODATA_INDEX, dtype=np.uint8)
+    if not (row_covered.any() and col_covered.any()):
+        return indices
+    
+    lat_grid, lon_grid = np.meshgrid(latitudes[row_covered], longitudes[col_covered], indexing='ij')
+    results = ensemble_scorer.calculate_score_batch(lat_grid.ravel(), lon_grid.ravel())
+    band = 'clima_risk_score' if risk_type == 'overall' else risk_type
+    indices[np.ix_(row_covered, col_covered)] = classify(results[band]).reshape(lat_grid.shape)
+    return indices
+
+
+def risk_layer(
+    ensemble_scorer,
+    risk_type: str,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    classify: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    aggregation: str = DEFAULT_AGGREGATION,
+    pixel_size: Optional[float] = None
+) -> np.ndarray:
+    """
+    Colour indices (or other classes) of a risk layer over a grid of pixel centres
+    
+    Args:
+        ensemble_scorer: EnsembleScorer (or CachedEnsembleScorer) to read
+        risk_type: One of RISK_TILE_TYPES
+        latitudes: Latitude of each pixel row
+        longitudes: Longitude of each pixel column
+        classify: Maps scores (NaN = no data) to uint8 classes, NODATA_INDEX
+            for no data; indices into RISK_COLORMAP by default
+        aggregation: Statistic of the grid cells a pixel spans (one of
+            PYRAMID_AGGREGATIONS), read from the grid's pyramid
+        pixel_size: Pixel spacing in degrees, to pick the pyramid level
+            (None: sample the grid itself)
+    
+    Returns:
+        (rows, columns) uint8 classes; NODATA_INDEX outside coverage
+    
+    Raises:
+        ValueError: If risk_type or aggregation is unknown
+    """
+    _check_risk_type(risk_type)
+    check_aggregation(aggregation)
+    classify = classify or _quantize
+    if ensemble_scorer.grid_lookup is not None:
+        return _grid_layer(
+            ensemble_scorer, risk_type, latitudes, longitudes, classify, aggregation, pixel_size
+        )
+    return _live_layer(ensemble_scorer, risk_type, latitudes, longitudes, classify)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    """One length-prefixed, CRC-checked PNG chunk"""
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(
+    indices: np.ndarray,
+    colormap: np.ndarray = RISK_COLORMAP,
+    level: int = PNG_COMPRESSION_LEVEL
+) -> bytes:
+    """
+    Encode colour indices as an 8-bit palette PNG
+    
+    Args:
+        indices: (height, width) uint8 indices into colormap
+        colormap: (256, 4) RGBA palette
+        level: zlib compression level
+    
+    Returns:
+        PNG file bytes
+    """
+    height, width = indices.shape
+    # Each scanline starts with its filter type (0: none, best for palette images)
+    scanlines = np.zeros((height, width + 1), dtype=np.uint8)
+    scanlines[:, 1:] = indices
+    return b"".join((
+        _PNG_SIGNATURE,
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+        _png_chunk(b"PLTE", colormap[:, :3].tobytes()),
+        _png_chunk(b"tRNS", colormap[:, 3].tobytes()),
+        _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), level)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def check_tile(risk_type: str, z: int, x: int, y: int):
+    """Raise ValueError unless risk_type and the tile address are valid"""
+    n = 2 ** z
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Invalid tile address {z}/{x}/{y}")
+    _check_risk_type(risk_type)
+
+
+def tile_in_coverage(ensemble_scorer, z: int, x: int, y: int) -> bool:
+    """Whether a tile overlaps the area the scorer has risk data for"""
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    cover_min_lat, cover_max_lat, cover_min_lon, cover_max_lon = coverage_bounds(ensemble_scorer)
+    return (
+        min_lon <= cover_max_lon and max_lon >= cover_min_lon and
+        min_lat <= cover_max_lat and max_lat >= cover_min_lat
+    )
+
+
+def tile_version(ensemble_scorer) -> str:
+    """
+    Version rendered tiles are kept under
+    
+    The scorer's model version (release, fingerprint of the scoring code,
+    rules and data, trained model versions and grid build) and the
+    pyramid build, so any change to what a tile shows changes it.
+    """
+    grid = ensemble_scorer.grid_lookup
+    if grid is None or grid.pyramid is None:
+        return ensemble_scorer.model_version
+    return f"{ensemble_scorer.model_version}+pyramid.{grid.pyramid.metadata.get('built_at', '')}"
+
+
+_EMPTY_TILE: Optional[bytes] = None
+
+
+def empty_tile() -> bytes:
+    """Fully transparent tile (encoded once)"""
+    global _EMPTY_TILE
+    if _EMPTY_TILE is None:
+        _EMPTY_TILE = encode_png(np.full((TILE_SIZE, TILE_SIZE), NODATA_INDEX, dtype=np.uint8))
+    return _EMPTY_TILE
+
+
+def render_tile(
+    ensemble_scorer,
+    risk_type: str,
+    z: int,
+    x: int,
+    y: int,
+    aggregation: str = DEFAULT_AGGREGATION
+) -> bytes:
+    """
+    Render one XYZ tile of a risk layer as PNG
+    
+    Args:
+        ensemble_scorer: EnsembleScorer (or CachedEnsembleScorer) to read
+        risk_type: One of RISK_TILE_TYPES
+        z, x, y: Tile address (x, y < 2**z)
+        aggregation: Statistic shown where a pixel spans several grid
+            cells: 'mean', or the worst case 'max' or 'p90'
+    
+    Returns:
+        PNG bytes; transparent where there is no risk data
+    
+    Raises:
+        ValueError: If risk_type, aggregation or the tile address is invalid
+    """
+    check_tile(risk_type, z, x, y)
+    check_aggregation(aggregation)
+    if not tile_in_coverage(ensemble_scorer, z, x, y):
+        return empty_tile()
+    
+    latitudes, longitudes = tile_pixel_coordinates(z, x, y)
+    return encode_png(risk_layer(
+        ensemble_scorer, risk_type, latitudes, longitudes,
+        aggregation=aggregation, pixel_size=360.0 / 2 ** z / TILE_SIZE,
+    ))
+
+
+def benchmark(zoom: int, tiles: int, risk_type: str, aggregation: str = DEFAULT_AGGREGATION):
+    """Print the time per stage of rendering tiles in coverage at one zoom"""
+    from app.ml.registry import get_model_registry
+    
+    scorer = get_model_registry().scorer
+    min_lat, max_lat, min_lon, max_lon = coverage_bounds(scorer)
+    xs, ys = tiles_covering((min_lon, min_lat, max_lon, max_lat), zoom)
+    addresses = [(x, y) for y in ys for x in xs][:tiles]
+    pixel_size = 360.0 / 2 ** zoom / TILE_SIZE
+    
+    evaluate = encode = 0.0
+    size = 0
+    for x, y in addresses:
+        started = time.perf_counter()
+        latitudes, longitudes = tile_pixel_coordinates(zoom, x, y)
+        indices = risk_layer(
+            scorer, risk_type, latitudes, longitudes,
+            aggregation=aggregation, pixel_size=pixel_size,
+        )
+        evaluated = time.perf_counter()
+        size += len(encode_png(indices))
+        evaluate += evaluated - started
+        encode += time.perf_counter() - evaluated
+    
+    count = len(addresses)
+    grid = scorer.grid_lookup
+    level = grid.pyramid.level_for(pixel_size) if grid is not None and grid.pyramid is not None else 0
+    if grid is None:
+        source = "live models"
+    elif level:
+        source = f"risk pyramid level {level} ({aggregation})"
+    else:
+        source = "risk grid"
+    print(f"{count} {risk_type} tiles at zoom {zoom} from the {source}")
+    print(
+        f"evaluate {evaluate / count * 1e3:.2f} ms  encode {encode / count * 1e3:.2f} ms  "
+        f"total {(evaluate + encode) / count * 1e3:.2f} ms/tile  {size / count / 1e3:.1f} kB/tile"
+    )
+
+
+def main():
+    """Command-line entry point for the tile rendering benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark risk map tile rendering")
+    parser.add_argument("--zoom", type=int, default=8)
+    parser.add_argument("--tiles", type=int, default=200, help="Tiles in coverage to render")
+    parser.add_argument("--risk-type", choices=RISK_TILE_TYPES, default="overall")
+    parser.add_argument("--aggregation", choices=PYRAMID_AGGREGATIONS, default=DEFAULT_AGGREGATION)
+    args = parser.parse_args()
+    benchmark(args.zoom, args.tiles, args.risk_type, args.aggregation)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Score Batches
+Compact results of batched scoring: one NumPy structured array with a fixed
+57-byte record per row (risk levels as codes into RISK_LEVELS) and a single
+timestamp for the whole batch, instead of two dictionaries per row. Rows take
+the `calculate_score` dictionary shape only when they are read, e.g. at the
+API boundary.
+
+Compare memory and allocations with per-row dictionaries with:
+    python -m app.ml.score_batch --rows 1000000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from app.ml.ensemble import RISK_LEVELS
+from app.ml.risk_grid import DEFAULT_BOUNDS, RISK_GRID_BANDS
+
+# One record per row (packed: 7 float64 scores and a uint8 level code)
+SCORE_DTYPE = np.dtype(
+    [('clima_risk_score', 'f8')]
+    + [(band, 'f8') for band in RISK_GRID_BANDS]
+    + [('confidence', 'f8'), ('risk_level_code', 'u1')]
+)
+
+# Rows converted to Python objects at once while iterating
+_ITER_BLOCK_ROWS = 4096
+
+
+class ScoreBatch:
+    """
+    Scores of many locations as one structured array
+    
+    Indexing with a column name gives that column as an array view; with an
+    integer, the row as a `calculate_score` dictionary; with a slice or index
+    array, another ScoreBatch. Iterating yields the row dictionaries, built a
+    block at a time.
+    """
+    
+    __slots__ = ('records', 'calculated_at')
+    
+    def __init__(self, records: np.ndarray, calculated_at: Optional[str] = None):
+        """
+        Initialize batch
+        
+        Args:
+            records: Structured array of SCORE_DTYPE
+            calculated_at: ISO timestamp shared by every row (now by default)
+        """
+        self.records = records
+        self.calculated_at = calculated_at or datetime.utcnow().isoformat()
+    
+    @classmethod
+    def from_arrays(cls, results: Dict[str, np.ndarray], calculated_at: Optional[str] = None) -> "ScoreBatch":
+        """Batch from `calculate_score_batch` arrays"""
+        records = np.empty(len(results['clima_risk_score']), dtype=SCORE_DTYPE)
+        for name in SCORE_DTYPE.names:
+            records[name] = results[name]
+        return cls(records, calculated_at)
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def __getitem__(self, index: Union[str, int, slice, np.ndarray]):
+        if isinstance(index, str):
+            return self.records[index]
+        if isinstance(index, (int, np.integer)):
+            return self._format(self.records[index].item())
+        return ScoreBatch(self.records[index], self.calculated_at)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        for start in range(0, len(self.records), _ITER_BLOCK_ROWS):
+            for row in self.records[start:start + _ITER_BLOCK_ROWS].tolist():
+                yield self._format(row)
+    
+    def to_dicts(self) -> List[Dict]:
+        """Every row as a `calculate_score` dictionary"""
+        return list(self)
+    
+    def _format(self, row: tuple) -> Dict:
+        """`calculate_score` dictionary of one record"""
+        score, flood, heat, drought, groundwater, rainfall, confidence, code = row
+        return {
+            'clima_risk_score': round(score, 2),
+            'risk_breakdown': {
+                'flood': round(flood, 2),
+                'heat': round(heat, 2),
+                'drought': round(drought, 2),
+                'groundwater': round(groundwater, 2),
+                'rainfall': round(rainfall, 2),
+            },
+            'risk_level': RISK_LEVELS[code],
+            'confidence': round(confidence, 2),
+            'calculated_at': self.calculated_at,
+        }
+
+
+def benchmark(rows: int):
+    """Print retained memory, allocations and time of each result representation"""
+    from app.ml.registry import get_model_registry
+    
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+    rng = np.random.default_rng(0)
+    scorer = get_model_registry().scorer
+    results = scorer.calculate_score_batch(
+        rng.uniform(min_lat, max_lat, rows), rng.uniform(min_lon, max_lon, rows)
+    )
+    
+    representations = [
+        ("per-row dicts", lambda: ScoreBatch.from_arrays(results).to_dicts()),
+        ("ScoreBatch", lambda: ScoreBatch.from_arrays(results)),
+    ]
+    print(f"{rows:,} rows")
+    for name, build in representations:
+        tracemalloc.start()
+        started = time.perf_counter()
+        value = build()
+        elapsed = time.perf_counter() - started
+        retained, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        tracemalloc.stop()
+        print(
+            f"{name:<14} {retained / rows:>8.1f} B/row retained  {peak / 1e6:>9.1f} MB peak  "
+            f"{blocks:>11,} blocks  {elapsed:>6.2f}s"
+        )
+        del value
+
+
+def main():
+    """Command-line entry point for the representation benchmark"""
+    parser = argparse.ArgumentParser(description="Compare batch score representations")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    benchmark(args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Score Cache
+In-process LRU cache with expiry in front of the ensemble scorer. Keys are
+coordinates snapped to a configurable grid plus every input that changes a
+result and the model version, so repeated lookups of the same neighbourhood
+are served without re-running the models.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.ensemble import LIVE_EVALUATION_KWARGS
+from app.ml.redis_cache import RedisScoreCache, TieredScoreCache
+
+
+class ScoreCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL
+    
+    Cached values are shared between callers and must not be modified.
+    """
+    
+    def __init__(
+        self,
+        max_size: int = 100_000,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize cache
+        
+        Args:
+            max_size: Maximum number of entries (least recently used are evicted)
+            ttl_seconds: Entry lifetime in seconds (0 or less: entries never expire)
+            clock: Time source in seconds (injectable for tests)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self) -> int:
+        """Number of entries currently held (expired ones included until touched)"""
+        return len(self._entries)
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for a key, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting least recently used entries beyond max_size"""
+        if self.max_size <= 0:
+            return
+        expires_at = self.clock() + self.ttl_seconds if self.ttl_seconds > 0 else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Any]]:
+        """Cached values for many keys (None for misses)"""
+        return [self.get(key) for key in keys]
+    
+    def set_many(self, items: Dict[Hashable, Any]):
+        """Store many values"""
+        for key, value in items.items():
+            self.set(key, value)
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Cached value for a key, computing and storing it on a miss
+        
+        The computation runs outside the lock, so concurrent misses on one
+        key may each compute it; the last result is kept.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+    
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def snap_coordinates(
+    latitude: float,
+    longitude: float,
+    precision: float
+) -> Tuple[float, float, Tuple[int, int]]:
+    """
+    Snap a location to the cache grid
+    
+    Returns:
+        Tuple of (snapped latitude, snapped longitude, integer cell key);
+        with precision 0 coordinates are used (and keyed) as given
+    """
+    if precision <= 0:
+        return latitude, longitude, (latitude, longitude)
+    row = round(latitude / precision)
+    col = round(longitude / precision)
+    return row * precision, col * precision, (row, col)
+
+
+class CachedEnsembleScorer:
+    """
+    EnsembleScorer front end answering repeated lookups from a ScoreCache
+    
+    Results are computed at the snapped cell coordinates (as bulk scoring
+    does), so every request falling in a cell gets the same answer whether
+    or not it was cached. Cached answers keep the `calculated_at` (or
+    `forecasted_at`) of their computation, up to the cache TTL earlier.
+    Other scorer methods pass straight through.
+    """
+    
+    def __init__(
+        self,
+        scorer,
+        cache: Optional[ScoreCache] = None,
+        precision: Optional[float] = None,
+    ):
+        """
+        Initialize cached scorer
+        
+        Args:
+            scorer: EnsembleScorer to compute misses with
+            cache: Cache to use (the process-wide score cache by default)
+            precision: Coordinate grid in degrees (SCORE_CACHE_PRECISION by default)
+        """
+        self.scorer = scorer
+        self.cache = cache if cache is not None else get_score_cache()
+        self.precision = settings.SCORE_CACHE_PRECISION if precision is None else precision
+    
+    def __getattr__(self, name: str):
+        """Delegate everything else to the wrapped scorer"""
+        if name == 'scorer':
+            # Not yet initialized (e.g. while unpickling)
+            raise AttributeError(name)
+        return getattr(self.scorer, name)
+    
+    def score_key(
+        self,
+        latitude: float,
+        longitude: float,
+        property_type: str = "residential",
+        **kwargs
+    ) -> Tuple:
+        """Cache key `calculate_score` uses for a request"""
+        cell = snap_coordinates(latitude, longitude, self.precision)[2]
+        return self._key('score', cell, property_type, kwargs)
+    
+    def calculate_score(
+        self,
+        latitude: float,
+        longitude: float,
+        property_type: str = "residential",
+        **kwargs
+    ) -> Dict:
+        """Cached `EnsembleScorer.calculate_score`"""
+        latitude, longitude, cell = snap_coordinates(latitude, longitude, self.precision)
+        key = self._key('score', cell, property_type, kwargs)
+        return self._get_or_compute(
+            key,
+            lambda: self.scorer.calculate_score(latitude, longitude, property_type, **kwargs),
+        )
+    
+    def calculate_score_many(self, requests: Sequence[Dict]) -> List[Dict]:
+        """
+        Cached `calculate_score` for many requests at once
+        
+        Cache lookups go out as one multi-get and the misses are computed in
+        one batched inference. Misses carrying inputs that change a
+        prediction (LIVE_EVALUATION_KWARGS) are scored one at a time.
+        
+        Args:
+            requests: `calculate_score` keyword arguments per request
+        
+        Returns:
+            One result per request, as `calculate_score` returns it
+        """
+        calls = []
+        for request in requests:
+            kwargs = dict(request)
+            latitude, longitude, cell = snap_coordinates(
+                kwargs.pop('latitude'), kwargs.pop('longitude'), self.precision
+            )
+            property_type = kwargs.pop('property_type', 'residential')
+            key = self._key('score', cell, property_type, kwargs)
+            calls.append((latitude, longitude, property_type, kwargs, key))
+        
+        cacheable = [i for i, call in enumerate(calls) if _is_hashable(call[4])]
+        results: List[Optional[Dict]] = [None] * len(calls)
+        for i, result in zip(cacheable, self.cache.get_many([calls[i][4] for i in cacheable])):
+            results[i] = result
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        batched = [
+            i for i in missing
+            if all(calls[i][3].get(name) is None for name in LIVE_EVALUATION_KWARGS)
+        ]
+        if batched:
+            computed = self.scorer.calculate_scores(
+                np.array([calls[i][0] for i in batched]),
+                np.array([calls[i][1] for i in batched]),
+            )
+            for i, result in zip(batched, computed):
+                results[i] = result
+        for i in missing:
+            if results[i] is None:
+                latitude, longitude, property_type, kwargs, _ = calls[i]
+                results[i] = self.scorer.calculate_score(
+                    latitude, longitude, property_type, **kwargs
+                )
+        
+        cacheable = set(cacheable)
+        self.cache.set_many({calls[i][4]: results[i] for i in missing if i in cacheable})
+        return results
+    
+    def forecast(
+        self,
+        latitude: float,
+        longitude: float,
+        years: list,
+        **kwargs
+    ) -> Dict:
+        """Cached `EnsembleScorer.forecast`"""
+        latitude, longitude, cell = snap_coordinates(latitude, longitude, self.precision)
+        key = self._key('forecast', cell, tuple(years), kwargs)
+        return self._get_or_compute(
+            key,
+            lambda: self.scorer.forecast(latitude, longitude, years, **kwargs),
+        )
+    
+    def _key(self, kind: str, cell: Tuple, argument: Any, kwargs: Dict) -> Tuple:
+        """Cache key: result kind, model version, cell grid and cell, and every non-None input"""
+        inputs = tuple(sorted(
+            (name, value) for name, value in kwargs.items() if value is not None
+        ))
+        return (kind, self.scorer.model_version, self.precision, cell, argument, inputs)
+    
+    def _get_or_compute(self, key: Tuple, compute: Callable[[], Dict]) -> Dict:
+        """Serve from the cache unless the key is unhashable (e.g. list inputs)"""
+        if not _is_hashable(key):
+            return compute()
+        return self.cache.get_or_compute(key, compute)
+
+
+def _is_hashable(key: Tuple) -> bool:
+    """Whether a key can be cached (inputs such as lists make it unhashable)"""
+    try:
+        hash(key)
+    except TypeError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def get_score_cache():
+    """
+    Process-wide score cache sized from settings (disabled caches hold nothing)
+    
+    With SCORE_CACHE_REDIS_ENABLED the in-process cache is backed by the
+    Redis tier at REDIS_URL, shared with every other worker.
+    """
+    if not settings.SCORE_CACHE_ENABLED:
+        return ScoreCache(max_size=0)
+    
+    local = ScoreCache(settings.SCORE_CACHE_SIZE, settings.SCORE_CACHE_TTL_SECONDS)
+    if not settings.SCORE_CACHE_REDIS_ENABLED:
+        return local
+    remote = RedisScoreCache.from_url(
+        settings.REDIS_URL, ttl_seconds=settings.SCORE_CACHE_REDIS_TTL_SECONDS
+    )
+    return TieredScoreCache(local, remote)
@@ -0,0 +1 @@
+"""Spatial indexes and geographic lookups used by the risk models"""
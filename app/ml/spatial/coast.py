@@ -0,0 +1,283 @@
+"""
+Distance to Coast
+Offline distance transform of a coastline dataset onto a lat/lon raster,
+saved as a memory-mapped array, plus the sampler every model uses to get a
+continuous distance-to-coast for points or arrays.
+
+Build the raster with:
+    python -m app.ml.spatial.coast --resolution 0.02
+"""
+import argparse
+import json
+import math
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.risk_grid import DEFAULT_BOUNDS
+from app.ml.spatial.polylines import PolylineIndex
+
+COASTLINE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "coastline.geojson"
+)
+
+COAST_GRID_FILENAME = "coast_distance.npy"
+COAST_GRID_METADATA_FILENAME = "coast_distance.json"
+
+# Locations closer than this to the coast count as coastal
+COASTAL_DISTANCE_KM = 50.0
+
+# Raster rows evaluated per build step (bounds peak memory while building)
+BUILD_CHUNK_ROWS = 64
+
+
+class CoastDistanceGrid:
+    """
+    Memory-mapped distance-to-coast raster
+    
+    Values are great-circle km from each grid point to the nearest
+    coastline segment; samples between grid points are bilinearly
+    interpolated, so the distance varies continuously.
+    """
+    
+    def __init__(self, grid: np.ndarray, metadata: Dict):
+        """Initialize sampler from a (memory-mapped) float32 raster and its metadata"""
+        self.grid = grid
+        self.metadata = metadata
+        self.resolution = float(metadata['resolution'])
+        self.min_lat = float(metadata['min_lat'])
+        self.min_lon = float(metadata['min_lon'])
+        self.n_lat, self.n_lon = grid.shape
+        # Plain ndarray view: skips memmap bookkeeping on single-cell reads
+        self._cells = grid.view(np.ndarray)
+    
+    @classmethod
+    def load(cls, directory: str) -> "CoastDistanceGrid":
+        """Memory-map a raster written by `build_coast_distance_grid`"""
+        with open(os.path.join(directory, COAST_GRID_METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+        grid = np.load(os.path.join(directory, COAST_GRID_FILENAME), mmap_mode='r')
+        return cls(grid, metadata)
+    
+    def distance_km(self, latitude: float, longitude: float) -> Optional[float]:
+        """
+        Interpolated distance to the coast at a single location
+        
+        Returns:
+            Distance in km, or None if the location is outside the raster
+        """
+        row = (latitude - self.min_lat) / self.resolution
+        col = (longitude - self.min_lon) / self.resolution
+        if not (0 <= row <= self.n_lat - 1 and 0 <= col <= self.n_lon - 1):
+            return None
+        
+        # Plain-Python arithmetic mirroring `distances_km` exactly
+        row0 = min(math.floor(row), self.n_lat - 2)
+        col0 = min(math.floor(col), self.n_lon - 2)
+        t = row - row0
+        u = col - col0
+        cells = self._cells
+        a = cells.item(row0, col0)
+        b = cells.item(row0, col0 + 1)
+        c = cells.item(row0 + 1, col0)
+        d = cells.item(row0 + 1, col0 + 1)
+        return (1 - t) * ((1 - u) * a + u * b) + t * ((1 - u) * c + u * d)
+    
+    def distances_km(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `distance_km`
+        
+        Returns:
+            Array of distances in km (NaN outside the raster)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.broadcast_to(np.asarray(longitudes, dtype=float), latitudes.shape)
+        
+        rows = (latitudes - self.min_lat) / self.resolution
+        cols = (longitudes - self.min_lon) / self.resolution
+        with np.errstate(invalid='ignore'):
+            inside = (rows >= 0) & (rows <= self.n_lat - 1) & (cols >= 0) & (cols <= self.n_lon - 1)
+        rows = np.where(inside, rows, 0.0)
+        cols = np.where(inside, cols, 0.0)
+        
+        row0 = np.minimum(np.floor(rows), self.n_lat - 2).astype(np.intp)
+        col0 = np.minimum(np.floor(cols), self.n_lon - 2).astype(np.intp)
+        t = rows - row0
+        u = cols - col0
+        a = self.grid[row0, col0].astype(float)
+        b = self.grid[row0, col0 + 1].astype(float)
+        c = self.grid[row0 + 1, col0].astype(float)
+        d = self.grid[row0 + 1, col0 + 1].astype(float)
+        distances = (1 - t) * ((1 - u) * a + u * b) + t * ((1 - u) * c + u * d)
+        return np.where(inside, distances, np.nan)
+
+
+class CoastDistanceSampler:
+    """
+    Distance to the coast from the raster where it exists
+    
+    Locations outside the raster (or everything, when no raster has been
+    built) are measured directly against the coastline index.
+    """
+    
+    def __init__(self, coastline: PolylineIndex, grid: Optional[CoastDistanceGrid] = None):
+        """Initialize sampler from the coastline index and an optional raster"""
+        self.coastline = coastline
+        self.grid = grid
+    
+    def distance_km(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float = math.inf
+    ) -> float:
+        """
+        Distance to the coast in km (inf for non-finite coordinates)
+        
+        Args:
+            latitude: Latitude
+            longitude: Longitude
+            max_distance_km: Callers only interested in nearby coast can bound
+                the direct search; distances at or beyond it may come back as inf
+        """
+        if self.grid is not None:
+            distance = self.grid.distance_km(latitude, longitude)
+            if distance is not None:
+                return distance
+        return self.coastline.distance_km(latitude, longitude, max_distance_km)
+    
+    def distances_km(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        max_distance_km: float = math.inf
+    ) -> np.ndarray:
+        """Vectorized `distance_km`"""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.broadcast_to(np.asarray(longitudes, dtype=float), latitudes.shape)
+        if self.grid is None:
+            return self.coastline.distances_km(latitudes, longitudes, max_distance_km)
+        
+        distances = self.grid.distances_km(latitudes, longitudes)
+        outside = np.isnan(distances)
+        if outside.any():
+            distances[outside] = self.coastline.distances_km(
+                latitudes[outside], longitudes[outside], max_distance_km
+            )
+        return distances
+    
+    def is_coastal(self, latitude: float, longitude: float) -> bool:
+        """Whether the location is within COASTAL_DISTANCE_KM of the coast"""
+        return self.distance_km(latitude, longitude, COASTAL_DISTANCE_KM) < COASTAL_DISTANCE_KM
+    
+    def is_coastal_batch(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `is_coastal`"""
+        return self.distances_km(latitudes, longitudes, COASTAL_DISTANCE_KM) < COASTAL_DISTANCE_KM
+
+
+def load_coastline() -> PolylineIndex:
+    """Coastline index from COASTLINE_PATH, or the bundled coastline"""
+    return PolylineIndex.load(settings.COASTLINE_PATH or COASTLINE_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_coast_sampler() -> CoastDistanceSampler:
+    """Process-wide sampler, using the raster under MODEL_BASE_PATH when built"""
+    directory = settings.MODEL_BASE_PATH
+    grid = None
+    if os.path.exists(os.path.join(directory, COAST_GRID_METADATA_FILENAME)):
+        grid = CoastDistanceGrid.load(directory)
+    return CoastDistanceSampler(load_coastline(), grid)
+
+
+def build_coast_distance_grid(
+    output_dir: str,
+    resolution: float = 0.02,
+    bounds: Tuple[float, float, float, float] = DEFAULT_BOUNDS,
+    coastline: Optional[PolylineIndex] = None,
+) -> CoastDistanceGrid:
+    """
+    Compute the distance-to-coast raster and write it to disk
+    
+    The transform is exact: every grid point is measured against the
+    coastline segments themselves (not a rasterized coastline), in
+    great-circle km, so the result is isotropic despite the degree grid.
+    
+    Args:
+        output_dir: Directory to write the raster and its metadata to
+        resolution: Grid spacing in degrees
+        bounds: (min_lat, max_lat, min_lon, max_lon) of the raster
+        coastline: Coastline index (the configured coastline by default)
+    
+    Returns:
+        CoastDistanceGrid over the written file
+    """
+    if coastline is None:
+        coastline = load_coastline()
+    
+    min_lat, max_lat, min_lon, max_lon = bounds
+    n_lat = int(round((max_lat - min_lat) / resolution)) + 1
+    n_lon = int(round((max_lon - min_lon) / resolution)) + 1
+    latitudes = min_lat + np.arange(n_lat) * resolution
+    longitudes = min_lon + np.arange(n_lon) * resolution
+    
+    os.makedirs(output_dir, exist_ok=True)
+    grid = np.lib.format.open_memmap(
+        os.path.join(output_dir, COAST_GRID_FILENAME),
+        mode='w+',
+        dtype=np.float32,
+        shape=(n_lat, n_lon),
+    )
+    for start in range(0, n_lat, BUILD_CHUNK_ROWS):
+        stop = min(start + BUILD_CHUNK_ROWS, n_lat)
+        chunk_lat, chunk_lon = np.meshgrid(latitudes[start:stop], longitudes, indexing='ij')
+        grid[start:stop] = coastline.distances_km(chunk_lat, chunk_lon)
+    grid.flush()
+    
+    metadata = {
+        'resolution': resolution,
+        'min_lat': min_lat,
+        'min_lon': min_lon,
+        'max_lat': float(latitudes[-1]),
+        'max_lon': float(longitudes[-1]),
+        'units': 'km',
+        'built_at': datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(output_dir, COAST_GRID_METADATA_FILENAME), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    del grid
+    return CoastDistanceGrid.load(output_dir)
+
+
+def main():
+    """Command-line entry point for building the distance-to-coast raster"""
+    parser = argparse.ArgumentParser(description="Build the distance-to-coast raster")
+    parser.add_argument("--resolution", type=float, default=0.02, help="Grid spacing in degrees")
+    parser.add_argument(
+        "--bounds",
+        type=float,
+        nargs=4,
+        default=DEFAULT_BOUNDS,
+        metavar=("MIN_LAT", "MAX_LAT", "MIN_LON", "MAX_LON"),
+    )
+    parser.add_argument("--output", default=settings.MODEL_BASE_PATH, help="Output directory")
+    args = parser.parse_args()
+    
+    grid = build_coast_distance_grid(
+        args.output,
+        resolution=args.resolution,
+        bounds=tuple(args.bounds),
+    )
+    print(
+        f"Wrote {grid.n_lat}x{grid.n_lon} distance-to-coast raster "
+        f"({grid.grid.nbytes / 1e6:.1f} MB) to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
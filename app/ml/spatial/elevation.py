@@ -0,0 +1,332 @@
+"""
+DEM Elevation Service
+Samples terrain elevation from 1x1 degree DEM tiles on local disk: SRTM
+.hgt files are memory-mapped and only decoded when a batch needs them,
+Copernicus GeoTIFF tiles are read (and decoded) through rasterio. Decoded
+tiles are kept in an LRU cache bounded by a memory budget, and batches are
+grouped by tile so each tile is visited once however many points fall on it.
+"""
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# Tile names carry the south-west corner: N28E077.hgt (SRTM),
+# Copernicus_DSM_COG_10_N28_00_E077_00_DEM.tif (Copernicus GLO-30/90)
+TILE_NAME_PATTERN = re.compile(r'([NS])(\d{2})(?:_00)?_?([EW])(\d{3})', re.IGNORECASE)
+
+TILE_EXTENSIONS = ('.hgt', '.tif', '.tiff')
+
+# SRTM marks missing samples with this value
+SRTM_VOID = -32768
+
+
+class DemTile:
+    """
+    One DEM tile: elevation samples on a regular lat/lon lattice
+    
+    `north`/`west` are the coordinates of the first sample (row 0, column 0);
+    rows run southwards. Raw samples may be big-endian integers with a
+    nodata value; `decode` turns them into float32 metres with NaN voids.
+    """
+    
+    def __init__(
+        self,
+        data: np.ndarray,
+        north: float,
+        west: float,
+        step_lat: float,
+        step_lon: float,
+        nodata: Optional[float] = None,
+    ):
+        """Initialize tile from its (possibly memory-mapped) samples and lattice"""
+        self.data = data
+        self.north = north
+        self.west = west
+        self.step_lat = step_lat
+        self.step_lon = step_lon
+        self.nodata = nodata
+        self.n_rows, self.n_cols = data.shape
+        self.memory_mapped = isinstance(data, np.memmap)
+        # Plain ndarray view: skips memmap bookkeeping on single-cell reads
+        self._cells = data.view(np.ndarray)
+    
+    @classmethod
+    def open(cls, path: str, latitude: int, longitude: int) -> "DemTile":
+        """
+        Open a tile file (memory-mapped for .hgt, read in full for GeoTIFF)
+        
+        Args:
+            path: Tile file
+            latitude: Latitude of the tile's southern edge
+            longitude: Longitude of the tile's western edge
+        """
+        if path.lower().endswith('.hgt'):
+            # SRTM: square big-endian int16 grid whose edges overlap the neighbours'
+            size = int(math.isqrt(os.path.getsize(path) // 2))
+            if size * size * 2 != os.path.getsize(path) or size < 2:
+                raise ValueError(f"{path} is not a square SRTM tile")
+            data = np.memmap(path, dtype='>i2', mode='r', shape=(size, size))
+            step = 1.0 / (size - 1)
+            return cls(data, latitude + 1.0, float(longitude), step, step, nodata=SRTM_VOID)
+        
+        # GeoTIFF tiles are usually compressed, so they go through rasterio
+        # (part of the full install) and are decoded on open
+        import rasterio
+        
+        with rasterio.open(path) as dataset:
+            data = dataset.read(1, out_dtype='float32')
+            nodata = dataset.nodata
+            transform = dataset.transform
+        if nodata is not None and not np.isnan(nodata):
+            data[data == nodata] = np.nan
+        return cls(
+            data,
+            transform.f + transform.e / 2,
+            transform.c + transform.a / 2,
+            abs(transform.e),
+            transform.a,
+        )
+    
+    @property
+    def decoded_nbytes(self) -> int:
+        """Memory taken by the decoded (float32) tile"""
+        return self.n_rows * self.n_cols * 4
+    
+    def decode(self) -> np.ndarray:
+        """Read the whole tile as float32 metres, voids as NaN"""
+        return self._decode(self._cells)
+    
+    def _decode(self, values: np.ndarray) -> np.ndarray:
+        """Convert raw samples to float32 metres, voids as NaN"""
+        # Tiles read as float32 without a nodata value are already decoded
+        decoded = values.astype(np.float32, copy=self.nodata is not None)
+        if self.nodata is not None:
+            decoded[values == self.nodata] = np.nan
+        return decoded
+    
+    def _lattice_position(self, latitude, longitude):
+        """Fractional (row, column) of coordinates on the tile lattice"""
+        row = (self.north - latitude) / self.step_lat
+        col = (longitude - self.west) / self.step_lon
+        return row, col
+    
+    def sample(self, latitude: float, longitude: float, cells: Optional[np.ndarray] = None) -> float:
+        """
+        Bilinear elevation at a single location on the tile
+        
+        Args:
+            latitude: Latitude
+            longitude: Longitude
+            cells: Decoded tile (raw samples are read directly without it)
+        
+        Returns:
+            Elevation in meters (NaN if a surrounding sample is void)
+        """
+        row, col = self._lattice_position(latitude, longitude)
+        # Plain-Python arithmetic mirroring `sample_batch` exactly
+        row = min(max(row, 0.0), self.n_rows - 1.0)
+        col = min(max(col, 0.0), self.n_cols - 1.0)
+        row0 = min(math.floor(row), self.n_rows - 2)
+        col0 = min(math.floor(col), self.n_cols - 2)
+        t = row - row0
+        u = col - col0
+        
+        if cells is None:
+            corners = self._cells[row0:row0 + 2, col0:col0 + 2]
+            a, b, c, d = self._decode(corners).ravel().tolist()
+        else:
+            a = cells.item(row0, col0)
+            b = cells.item(row0, col0 + 1)
+            c = cells.item(row0 + 1, col0)
+            d = cells.item(row0 + 1, col0 + 1)
+        return (1 - t) * ((1 - u) * a + u * b) + t * ((1 - u) * c + u * d)
+    
+    def sample_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        cells: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized `sample` against the decoded tile"""
+        rows, cols = self._lattice_position(latitudes, longitudes)
+        rows = np.minimum(np.maximum(rows, 0.0), self.n_rows - 1.0)
+        cols = np.minimum(np.maximum(cols, 0.0), self.n_cols - 1.0)
+        row0 = np.minimum(np.floor(rows), self.n_rows - 2).astype(np.intp)
+        col0 = np.minimum(np.floor(cols), self.n_cols - 2).astype(np.intp)
+        t = rows - row0
+        u = cols - col0
+        a = cells[row0, col0].astype(float)
+        b = cells[row0, col0 + 1].astype(float)
+        c = cells[row0 + 1, col0].astype(float)
+        d = cells[row0 + 1, col0 + 1].astype(float)
+        return (1 - t) * ((1 - u) * a + u * b) + t * ((1 - u) * c + u * d)
+
+
+def find_tiles(directory: Optional[str]) -> Dict[Tuple[int, int], str]:
+    """
+    Index the DEM tiles under a directory (searched recursively)
+    
+    Returns:
+        Dictionary mapping (south latitude, west longitude) to tile path
+    """
+    tiles = {}
+    if not directory or not os.path.isdir(directory):
+        return tiles
+    
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            match = TILE_NAME_PATTERN.search(name)
+            if match is None or not name.lower().endswith(TILE_EXTENSIONS):
+                continue
+            hemisphere_lat, latitude, hemisphere_lon, longitude = match.groups()
+            latitude = int(latitude) * (1 if hemisphere_lat.upper() == 'N' else -1)
+            longitude = int(longitude) * (1 if hemisphere_lon.upper() == 'E' else -1)
+            tiles.setdefault((latitude, longitude), os.path.join(root, name))
+    return tiles
+
+
+class ElevationService:
+    """
+    Elevation lookups over a directory of DEM tiles
+    
+    Single lookups read the four surrounding samples straight from the
+    memory-mapped tile unless it is already decoded; batches decode each
+    tile they touch once. Decoded tiles (GeoTIFF tiles as soon as they are
+    read) are shared through an LRU cache holding at most `cache_bytes`.
+    """
+    
+    def __init__(self, directory: Optional[str], cache_bytes: int = 512 * 2 ** 20):
+        """
+        Initialize service (tiles are only opened when first sampled)
+        
+        Args:
+            directory: Directory holding the DEM tiles
+            cache_bytes: Memory budget for decoded tiles
+        """
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self.tile_paths = find_tiles(directory)
+        self._tiles = {}
+        self._decoded = OrderedDict()
+        self._decoded_bytes = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        """Number of tiles available"""
+        return len(self.tile_paths)
+    
+    @property
+    def cached_bytes(self) -> int:
+        """Memory currently held by decoded tiles"""
+        return self._decoded_bytes
+    
+    def elevation(self, latitude: float, longitude: float) -> Optional[float]:
+        """
+        Elevation at a single location
+        
+        Returns:
+            Elevation in meters, or None without DEM coverage (or over voids)
+        """
+        if not self.tile_paths or not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return None
+        
+        key = (math.floor(latitude), math.floor(longitude))
+        if key not in self.tile_paths:
+            return None
+        
+        with self._lock:
+            tile, cells = self._tile(key, decode=False)
+        
+        elevation = tile.sample(latitude, longitude, cells)
+        return None if math.isnan(elevation) else elevation
+    
+    def elevations(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `elevation`
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+        
+        Returns:
+            Array of elevations in meters (NaN without DEM coverage or over voids)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.broadcast_to(np.asarray(longitudes, dtype=float), latitudes.shape)
+        elevations = np.full(latitudes.shape, np.nan)
+        if not self.tile_paths:
+            return elevations
+        
+        flat_lat = latitudes.ravel()
+        flat_lon = longitudes.ravel()
+        points = np.nonzero(np.isfinite(flat_lat) & np.isfinite(flat_lon))[0]
+        if not len(points):
+            return elevations
+        tile_lat = np.floor(flat_lat[points]).astype(np.int64)
+        tile_lon = np.floor(flat_lon[points]).astype(np.int64)
+        
+        # Group points by tile so every tile is decoded and sampled once
+        keys, inverse = np.unique(tile_lat * 1000 + tile_lon, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(keys)))
+        flat = elevations.reshape(-1)
+        for tile_points in np.split(points[order], starts[1:]):
+            key = (math.floor(flat_lat[tile_points[0]]), math.floor(flat_lon[tile_points[0]]))
+            if key not in self.tile_paths:
+                continue
+            with self._lock:
+                tile, cells = self._tile(key, decode=True)
+            flat[tile_points] = tile.sample_batch(
+                flat_lat[tile_points], flat_lon[tile_points], cells
+            )
+        return elevations
+    
+    def _tile(self, key: Tuple[int, int], decode: bool) -> Tuple[DemTile, Optional[np.ndarray]]:
+        """
+        A tile and its decoded samples, from the LRU cache when possible
+        
+        Memory-mapped tiles stay open and are only decoded when `decode` is
+        set (samples are None otherwise); other tiles are decoded as they
+        are read, so they are cached whether or not `decode` is set.
+        """
+        cached = self._decoded.get(key)
+        if cached is not None:
+            self._decoded.move_to_end(key)
+            return cached
+        
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = DemTile.open(self.tile_paths[key], *key)
+            if tile.memory_mapped:
+                self._tiles[key] = tile
+        if tile.memory_mapped and not decode:
+            return tile, None
+        return tile, self._decode(key, tile)
+    
+    def _decode(self, key: Tuple[int, int], tile: DemTile) -> np.ndarray:
+        """Decode a tile and cache it, evicting least recently used tiles over budget"""
+        cells = tile.decode()
+        if tile.decoded_nbytes > self.cache_bytes:
+            # Larger than the whole budget: used for this request only
+            return cells
+        
+        while self._decoded and self._decoded_bytes + tile.decoded_nbytes > self.cache_bytes:
+            _, (_, evicted) = self._decoded.popitem(last=False)
+            self._decoded_bytes -= evicted.nbytes
+        self._decoded[key] = (tile, cells)
+        self._decoded_bytes += cells.nbytes
+        return cells
+
+
+@lru_cache(maxsize=None)
+def get_elevation_service() -> ElevationService:
+    """Process-wide elevation service over the tiles in DEM_PATH"""
+    return ElevationService(settings.DEM_PATH, settings.DEM_CACHE_MB * 2 ** 20)
@@ -0,0 +1,202 @@
+"""
+Urban Gazetteer
+Shared table of urban centres (name, location, population, urban radius)
+answering "which urban centre's radius covers this point?" with
+great-circle distances. Used by every model that needs an urban check,
+so they all agree on what counts as urban.
+"""
+import csv
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.spatial.grid_index import GridIndex
+
+URBAN_CENTRES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "urban_centres.csv"
+)
+
+# Mean Earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+# Great-circle kilometres per degree of latitude
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def default_urban_radius_km(population: float) -> float:
+    """Urban radius for centres listed without one (grows with sqrt of population)"""
+    return min(40.0, max(5.0, 2.5 * math.sqrt(population / 100000)))
+
+
+def haversine_km(
+    latitude1: np.ndarray,
+    longitude1: np.ndarray,
+    latitude2: np.ndarray,
+    longitude2: np.ndarray
+) -> np.ndarray:
+    """Great-circle distance in km between coordinate arrays (degrees)"""
+    phi1 = np.radians(latitude1)
+    phi2 = np.radians(latitude2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = (np.radians(longitude2) - np.radians(longitude1)) / 2
+    a = np.sin(half_dphi) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class UrbanGazetteer:
+    """
+    Spatially indexed urban centres
+    
+    Each centre's urban radius is indexed as a lat/lon bounding box in a
+    uniform bucket grid (radii are small and similar, so every cell holds a
+    handful of candidates); candidates are confirmed with the exact
+    haversine distance. A point is urban if it lies within the radius of
+    at least one centre, and its urban centre is the nearest such one.
+    """
+    
+    def __init__(
+        self,
+        names: List[str],
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        populations: np.ndarray,
+        radii_km: np.ndarray
+    ):
+        """Initialize gazetteer and build its spatial index"""
+        self.names = list(names)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.populations = np.asarray(populations, dtype=float)
+        self.radii_km = np.asarray(radii_km, dtype=float)
+        
+        # Bounding box of each radius circle (longitude span widens with latitude)
+        lat_span = self.radii_km / KM_PER_DEGREE
+        cos_lat = np.maximum(np.cos(np.radians(self.latitudes)), 1e-6)
+        lon_span = np.minimum(lat_span / cos_lat, 180.0)
+        self.index = GridIndex(np.column_stack([
+            self.longitudes - lon_span,
+            self.latitudes - lat_span,
+            self.longitudes + lon_span,
+            self.latitudes + lat_span,
+        ]))
+        
+        # Plain-Python copies for single lookups
+        self._centres = list(zip(
+            np.radians(self.latitudes).tolist(),
+            np.radians(self.longitudes).tolist(),
+            self.radii_km.tolist(),
+        ))
+    
+    @classmethod
+    def load(cls, path: str) -> "UrbanGazetteer":
+        """
+        Load a gazetteer CSV
+        
+        Expected columns: name, latitude, longitude, population and optionally
+        radius_km (derived from population when missing or empty).
+        """
+        names, latitudes, longitudes, populations, radii = [], [], [], [], []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                population = float(row.get('population') or 0)
+                names.append(row['name'])
+                latitudes.append(float(row['latitude']))
+                longitudes.append(float(row['longitude']))
+                populations.append(population)
+                radii.append(
+                    float(row['radius_km']) if row.get('radius_km')
+                    else default_urban_radius_km(population)
+                )
+        return cls(names, latitudes, longitudes, populations, radii)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def nearest_urban_centre(self, latitude: float, longitude: float) -> Optional[int]:
+        """
+        Index of the nearest centre whose urban radius covers the location
+        
+        Returns:
+            Centre index, or None if the location is not urban
+        """
+        phi = math.radians(latitude)
+        lam = math.radians(longitude)
+        cos_phi = math.cos(phi)
+        
+        best = None
+        best_distance = math.inf
+        for i in self.index.query_point(longitude, latitude):
+            centre_phi, centre_lam, radius = self._centres[i]
+            a = (
+                math.sin((centre_phi - phi) / 2) ** 2 +
+                cos_phi * math.cos(centre_phi) * math.sin((centre_lam - lam) / 2) ** 2
+            )
+            distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+            if distance <= radius and distance < best_distance:
+                best = i
+                best_distance = distance
+        return best
+    
+    def nearest_urban_centres(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized `nearest_urban_centre`
+        
+        Returns:
+            Tuple of (centre index per point, -1 if not urban; distance in km, inf if not urban)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        shape = latitudes.shape
+        latitudes = latitudes.ravel()
+        longitudes = np.broadcast_to(longitudes, shape).ravel()
+        
+        points, centres = self.index.query_points(longitudes, latitudes)
+        distances = haversine_km(
+            latitudes[points], longitudes[points],
+            self.latitudes[centres], self.longitudes[centres],
+        )
+        within = distances <= self.radii_km[centres]
+        points, centres, distances = points[within], centres[within], distances[within]
+        
+        # Keep the closest covering centre per point
+        order = np.lexsort((distances, points))
+        points, first = np.unique(points[order], return_index=True)
+        
+        nearest = np.full(len(latitudes), -1, dtype=np.intp)
+        nearest_distance = np.full(len(latitudes), np.inf)
+        nearest[points] = centres[order][first]
+        nearest_distance[points] = distances[order][first]
+        return nearest.reshape(shape), nearest_distance.reshape(shape)
+    
+    def is_urban(self, latitude: float, longitude: float) -> bool:
+        """Whether the location lies within any urban centre's radius"""
+        return self.nearest_urban_centre(latitude, longitude) is not None
+    
+    def is_urban_batch(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Vectorized `is_urban`"""
+        nearest, _ = self.nearest_urban_centres(latitudes, longitudes)
+        return nearest >= 0
+    
+    def centre(self, index: int) -> Dict:
+        """Details of an urban centre"""
+        return {
+            'name': self.names[index],
+            'latitude': float(self.latitudes[index]),
+            'longitude': float(self.longitudes[index]),
+            'population': float(self.populations[index]),
+            'radius_km': float(self.radii_km[index]),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_urban_gazetteer() -> UrbanGazetteer:
+    """Process-wide gazetteer, built once on first use"""
+    return UrbanGazetteer.load(settings.URBAN_GAZETTEER_PATH or URBAN_CENTRES_PATH)
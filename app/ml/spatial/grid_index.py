@@ -0,0 +1,141 @@
+"""
+Uniform Grid Index
+Buckets boxes into fixed-size grid cells so a point query only inspects
+the few boxes registered in its own cell. Suited to many small boxes of
+similar size (e.g. urban radii); large, overlapping regions should use
+the packed R-tree instead.
+"""
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Upper bound on the number of grid cells; the cell size grows to respect it
+MAX_CELLS = 4_000_000
+
+
+class GridIndex:
+    """
+    Read-only bucket grid over axis-aligned boxes
+    
+    Boxes are (min_x, min_y, max_x, max_y) rows, the same layout as
+    `PackedRTree`, and queries return the same (point, box id) pairs.
+    """
+    
+    def __init__(self, boxes: np.ndarray, cell_size: Optional[float] = None):
+        """
+        Build the index
+        
+        Args:
+            boxes: Array of shape (n, 4) with (min_x, min_y, max_x, max_y) per item
+            cell_size: Grid cell size (defaults to the largest box extent, so
+                each box is registered in at most 2x2 cells)
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.boxes = boxes
+        self.size = len(boxes)
+        
+        if self.size == 0:
+            self.origin_x = self.origin_y = 0.0
+            self.cell_size = 1.0
+            self.n_x = self.n_y = 1
+            self.cell_starts = np.zeros(2, dtype=np.intp)
+            self.cell_items = np.empty(0, dtype=np.intp)
+            self._cell_lists = {}
+            return
+        
+        self.origin_x = float(boxes[:, 0].min())
+        self.origin_y = float(boxes[:, 1].min())
+        extent_x = float(boxes[:, 2].max()) - self.origin_x
+        extent_y = float(boxes[:, 3].max()) - self.origin_y
+        
+        if cell_size is None:
+            cell_size = float(np.max(boxes[:, 2:] - boxes[:, :2]))
+        cell_size = max(cell_size, 1e-9, np.sqrt(extent_x * extent_y / MAX_CELLS))
+        self.cell_size = cell_size
+        self.n_x = int(extent_x // cell_size) + 1
+        self.n_y = int(extent_y // cell_size) + 1
+        
+        # Register each box in every cell its extent touches
+        first_x, first_y = self._cell_coordinates(boxes[:, 0], boxes[:, 1])
+        last_x, last_y = self._cell_coordinates(boxes[:, 2], boxes[:, 3])
+        span_x = last_x - first_x + 1
+        span_y = last_y - first_y + 1
+        counts = span_x * span_y
+        
+        items = np.repeat(np.arange(self.size), counts)
+        offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (
+            (first_y[items] + offsets // span_x[items]) * self.n_x +
+            first_x[items] + offsets % span_x[items]
+        )
+        
+        order = np.argsort(cells, kind='stable')
+        self.cell_items = items[order]
+        self.cell_starts = np.searchsorted(
+            cells[order], np.arange(self.n_x * self.n_y + 1)
+        )
+        
+        # Plain-Python buckets for single-point queries (non-empty cells only)
+        self._cell_lists = {}
+        for cell, item in zip(cells[order].tolist(), self.cell_items.tolist()):
+            self._cell_lists.setdefault(cell, []).append(item)
+        self._box_list = boxes.tolist()
+    
+    def _cell_coordinates(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Grid column/row of coordinates, clipped to the grid"""
+        cell_x = np.clip((x - self.origin_x) // self.cell_size, 0, self.n_x - 1).astype(np.intp)
+        cell_y = np.clip((y - self.origin_y) // self.cell_size, 0, self.n_y - 1).astype(np.intp)
+        return cell_x, cell_y
+    
+    def query_point(self, x: float, y: float) -> List[int]:
+        """Return ids of all boxes containing the point (boundaries inclusive)"""
+        if self.size == 0 or not (math.isfinite(x) and math.isfinite(y)):
+            return []
+        
+        cell_x = (x - self.origin_x) // self.cell_size
+        cell_y = (y - self.origin_y) // self.cell_size
+        # Points just past the last edge still belong to the clipped edge cell
+        cell_x = min(max(cell_x, 0), self.n_x - 1)
+        cell_y = min(max(cell_y, 0), self.n_y - 1)
+        
+        matches = []
+        for item in self._cell_lists.get(int(cell_y) * self.n_x + int(cell_x), ()):
+            min_x, min_y, max_x, max_y = self._box_list[item]
+            if min_x <= x <= max_x and min_y <= y <= max_y:
+                matches.append(item)
+        return matches
+    
+    def query_points(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find all (point, box) containment pairs for a batch of points
+        
+        Args:
+            x: Array of point x coordinates
+            y: Array of point y coordinates
+        
+        Returns:
+            Tuple of (point indices, box ids), one entry per containing box
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        
+        points = np.nonzero(np.isfinite(x) & np.isfinite(y))[0]
+        cell_x, cell_y = self._cell_coordinates(x[points], y[points])
+        cells = cell_y * self.n_x + cell_x
+        
+        starts = self.cell_starts[cells]
+        counts = self.cell_starts[cells + 1] - starts
+        total = int(counts.sum())
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        points = np.repeat(points, counts)
+        items = self.cell_items[np.repeat(starts, counts) + offsets]
+        
+        box = self.boxes[items]
+        px = x[points]
+        py = y[points]
+        keep = (
+            (box[:, 0] <= px) & (px <= box[:, 2]) &
+            (box[:, 1] <= py) & (py <= box[:, 3])
+        )
+        return points[keep], items[keep]
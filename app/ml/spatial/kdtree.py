@@ -0,0 +1,311 @@
+"""
+Segment KD-Tree
+Static k-d tree over line segments (points are zero-length segments) for
+nearest-neighbour queries, with a plain-Python single-point query and a
+vectorized batch query. Visited nodes grow logarithmically with the number
+of segments.
+"""
+import math
+from typing import Tuple
+
+import numpy as np
+
+# Queries evaluated together in `query`; bounds temporary memory per batch
+QUERY_CHUNK = 32768
+
+# Start coordinate of padding slots in leaves (never the nearest)
+PADDING = 1e30
+
+
+class SegmentKDTree:
+    """
+    Read-only k-d tree of line segments (Euclidean distance)
+    
+    Segments are split at the median midpoint along the widest axis until
+    at most `leaf_size` remain; node boxes cover whole segments, so the box
+    distance bounds the distance to everything below a node. Leaves are
+    stored padded to `leaf_size` so batches of leaves are compared in one
+    array operation.
+    """
+    
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, leaf_size: int = 32):
+        """
+        Build the tree
+        
+        Args:
+            starts: Segment start points, shape (n, d)
+            ends: Segment end points, shape (n, d) (equal to starts for points)
+            leaf_size: Maximum segments per leaf
+        """
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        self.size, self.dims = starts.shape
+        self.leaf_size = leaf_size
+        
+        # Split nodes breadth-first; children always get larger ids than parents
+        midpoints = (starts + ends) / 2
+        order = np.arange(self.size)
+        first, last = [0], [self.size]
+        left, right, axes, splits, depths = [-1], [-1], [0], [0.0], [0]
+        node = 0
+        while node < len(first):
+            start, end = first[node], last[node]
+            if end - start > leaf_size:
+                segment = midpoints[order[start:end]]
+                axis = int(np.argmax(segment.max(axis=0) - segment.min(axis=0)))
+                middle = (end - start) // 2
+                order[start:end] = order[start:end][np.argpartition(segment[:, axis], middle)]
+                
+                axes[node] = axis
+                splits[node] = float(midpoints[order[start + middle], axis])
+                left[node] = len(first)
+                right[node] = len(first) + 1
+                first += [start, start + middle]
+                last += [start + middle, end]
+                left += [-1, -1]
+                right += [-1, -1]
+                axes += [0, 0]
+                splits += [0.0, 0.0]
+                depths += [depths[node] + 1] * 2
+            node += 1
+        
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.axes = np.array(axes, dtype=np.intp)
+        self.splits = np.array(splits)
+        
+        # Leaves: padded segment table (start, direction, 1/length^2) and
+        # original indices; coordinates are stored per axis, shape (leaves, d, slots)
+        leaves = np.nonzero(self.left < 0)[0]
+        self.leaf_ids = np.full(len(first), -1, dtype=np.intp)
+        self.leaf_ids[leaves] = np.arange(len(leaves))
+        
+        leaf_first = np.array(first)[leaves]
+        slots = np.arange(leaf_size)
+        filled = slots < (np.array(last)[leaves] - leaf_first)[:, None]
+        members = np.where(filled, leaf_first[:, None] + slots, 0)
+        members = order[members] if self.size else members
+        self.leaf_indices = np.where(filled, members, -1)
+        
+        # Pad with a far-away zero-length segment
+        starts = np.vstack([starts, np.full((1, self.dims), PADDING)])
+        ends = np.vstack([ends, np.full((1, self.dims), PADDING)])
+        members = np.where(filled, members, self.size)
+        direction = ends - starts
+        length2 = (direction ** 2).sum(axis=1)
+        with np.errstate(divide='ignore'):
+            inverse_length2 = np.where(length2 > 0, 1 / length2, 0.0)
+        self.leaf_starts = starts[members].transpose(0, 2, 1).copy()
+        self.leaf_directions = direction[members].transpose(0, 2, 1).copy()
+        self.leaf_inverse_length2 = inverse_length2[members]
+        
+        # Bounding boxes: leaves from their segments, then parents level by level
+        self.node_min = np.full((len(first), self.dims), np.inf)
+        self.node_max = np.full((len(first), self.dims), -np.inf)
+        low = np.where(filled[..., None], np.minimum(starts, ends)[members], np.inf)
+        high = np.where(filled[..., None], np.maximum(starts, ends)[members], -np.inf)
+        self.node_min[leaves] = low.min(axis=1)
+        self.node_max[leaves] = high.max(axis=1)
+        depths = np.array(depths)
+        for depth in range(int(depths.max()) - 1, -1, -1):
+            parents = np.nonzero((depths == depth) & (self.left >= 0))[0]
+            self.node_min[parents] = np.minimum(
+                self.node_min[self.left[parents]], self.node_min[self.right[parents]]
+            )
+            self.node_max[parents] = np.maximum(
+                self.node_max[self.left[parents]], self.node_max[self.right[parents]]
+            )
+        
+        # Plain-Python copies for single-point queries
+        self._left_list = left
+        self._right_list = right
+        self._axis_list = axes
+        self._split_list = splits
+        self._leaf_list = self.leaf_ids.tolist()
+        self._box_list = list(zip(self.node_min.tolist(), self.node_max.tolist()))
+    
+    def query_point(self, point, max_distance: float = math.inf) -> Tuple[float, int]:
+        """
+        Nearest segment to a single point
+        
+        Args:
+            point: Query coordinates
+            max_distance: Only segments closer than this are searched for
+        
+        Returns:
+            Tuple of (Euclidean distance, segment index); (inf, -1) if no
+            segment is closer than max_distance or the point is not finite
+        """
+        point = [float(value) for value in point]
+        if self.size == 0 or not all(math.isfinite(value) for value in point):
+            return math.inf, -1
+        
+        best_distance2 = max_distance ** 2
+        best = -1
+        coordinates = np.array(point)[:, None]
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            box_min, box_max = self._box_list[node]
+            distance2 = 0.0
+            for value, low, high in zip(point, box_min, box_max):
+                if value < low:
+                    distance2 += (low - value) ** 2
+                elif value > high:
+                    distance2 += (value - high) ** 2
+            if distance2 >= best_distance2:
+                continue
+            
+            left = self._left_list[node]
+            if left < 0:
+                leaf = self._leaf_list[node]
+                starts = self.leaf_starts[leaf]
+                directions = self.leaf_directions[leaf]
+                offsets = coordinates - starts
+                along = np.minimum(np.maximum(
+                    (offsets * directions).sum(axis=0) * self.leaf_inverse_length2[leaf], 0
+                ), 1)
+                leaf_distance2 = ((offsets - along * directions) ** 2).sum(axis=0)
+                i = int(leaf_distance2.argmin())
+                if leaf_distance2[i] < best_distance2:
+                    best_distance2 = float(leaf_distance2[i])
+                    best = int(self.leaf_indices[leaf, i])
+            elif point[self._axis_list[node]] < self._split_list[node]:
+                # Nearer child last so it is searched first
+                stack += [self._right_list[node], left]
+            else:
+                stack += [left, self._right_list[node]]
+        
+        if best < 0:
+            return math.inf, -1
+        return math.sqrt(best_distance2), best
+    
+    def query(
+        self,
+        points: np.ndarray,
+        max_distance: float = math.inf
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest segment to many points
+        
+        Args:
+            points: Array of shape (m, d)
+            max_distance: Only segments closer than this are searched for
+        
+        Returns:
+            Tuple of (Euclidean distances, segment indices); inf/-1 where no
+            segment is closer than max_distance or the point is not finite
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, self.dims)
+        distances = np.full(len(points), np.inf)
+        indices = np.full(len(points), -1, dtype=np.intp)
+        if self.size == 0:
+            return distances, indices
+        
+        valid = np.nonzero(np.isfinite(points).all(axis=1))[0]
+        for start in range(0, len(valid), QUERY_CHUNK):
+            chunk = valid[start:start + QUERY_CHUNK]
+            distances[chunk], indices[chunk] = self._query_chunk(
+                points[chunk], max_distance ** 2
+            )
+        return distances, indices
+    
+    def _query_chunk(
+        self,
+        points: np.ndarray,
+        max_distance2: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Batch nearest segment for finite query points"""
+        count = len(points)
+        
+        best_distance2 = np.full(count, max_distance2)
+        best = np.full(count, -1, dtype=np.intp)
+        
+        if math.isinf(max_distance2) and self.left[0] >= 0:
+            # Unbounded search: descend to each point's own leaf for a first candidate
+            nodes = np.zeros(count, dtype=np.intp)
+            internal = np.arange(count)
+            while len(internal):
+                node = nodes[internal]
+                go_left = points[internal, self.axes[node]] < self.splits[node]
+                nodes[internal] = np.where(go_left, self.left[node], self.right[node])
+                internal = internal[self.left[nodes[internal]] >= 0]
+            best_distance2, best = self._search_leaves(points, self.leaf_ids[nodes])
+        
+        # Then visit every node whose box could still hold something closer.
+        # Any box holds a segment no further than its farthest corner, which
+        # tightens the bound level by level before leaves are reached.
+        bound = best_distance2.copy()
+        pair_points = np.arange(count)
+        pair_nodes = np.zeros(count, dtype=np.intp)
+        while len(pair_points):
+            box_distance2 = np.zeros(len(pair_points))
+            far_distance2 = np.zeros(len(pair_points))
+            for axis in range(self.dims):
+                value = points[pair_points, axis]
+                below = self.node_min[pair_nodes, axis] - value
+                above = value - self.node_max[pair_nodes, axis]
+                box_distance2 += np.maximum(np.maximum(below, above), 0) ** 2
+                far_distance2 += np.minimum(below, above) ** 2
+            
+            # Pairs stay sorted by point, so per-point minima are segment reductions
+            starts = np.flatnonzero(np.diff(pair_points, prepend=-1))
+            grouped = pair_points[starts]
+            bound[grouped] = np.minimum(bound[grouped], np.minimum.reduceat(far_distance2, starts))
+            
+            keep = (
+                (box_distance2 <= bound[pair_points]) &
+                (box_distance2 < best_distance2[pair_points])
+            )
+            pair_points, pair_nodes = pair_points[keep], pair_nodes[keep]
+            
+            is_leaf = self.left[pair_nodes] < 0
+            if is_leaf.any():
+                leaf_points = pair_points[is_leaf]
+                distance2, found = self._search_leaves(
+                    points[leaf_points], self.leaf_ids[pair_nodes[is_leaf]]
+                )
+                # Several leaves may report for one point: keep the closest
+                order = np.lexsort((distance2, leaf_points))
+                unique_points, first = np.unique(leaf_points[order], return_index=True)
+                distance2, found = distance2[order][first], found[order][first]
+                better = distance2 < best_distance2[unique_points]
+                best_distance2[unique_points[better]] = distance2[better]
+                best[unique_points[better]] = found[better]
+            
+            internal = ~is_leaf
+            pair_points = np.repeat(pair_points[internal], 2)
+            pair_nodes = np.column_stack([
+                self.left[pair_nodes[internal]], self.right[pair_nodes[internal]]
+            ]).ravel()
+        
+        return np.where(best >= 0, np.sqrt(best_distance2), np.inf), best
+    
+    def _search_leaves(
+        self,
+        points: np.ndarray,
+        leaves: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Closest segment of the paired leaf for each point (squared distance, index)"""
+        distance2 = self._segment_distance2(points, leaves)
+        slot = distance2.argmin(axis=1)
+        rows = np.arange(len(leaves))
+        return distance2[rows, slot], self.leaf_indices[leaves, slot]
+    
+    def _segment_distance2(self, points: np.ndarray, leaves: np.ndarray) -> np.ndarray:
+        """Squared distance from each point to every segment slot of its leaf"""
+        # Axis by axis: avoids reductions over a tiny trailing axis
+        offsets, directions = [], []
+        projection = 0.0
+        for axis in range(self.dims):
+            offset = points[:, axis, None] - self.leaf_starts[leaves, axis]
+            direction = self.leaf_directions[leaves, axis]
+            projection = projection + offset * direction
+            offsets.append(offset)
+            directions.append(direction)
+        along = np.minimum(np.maximum(projection * self.leaf_inverse_length2[leaves], 0), 1)
+        
+        distance2 = 0.0
+        for offset, direction in zip(offsets, directions):
+            distance2 = distance2 + (offset - along * direction) ** 2
+        return distance2
@@ -0,0 +1,218 @@
+"""
+Polyline Distance Index
+Loads geographic polylines (rivers, coastlines), maps their segments onto
+the unit sphere and indexes them in a segment k-d tree, answering "how far
+is the nearest line?" in great-circle kilometres for single points or batches.
+"""
+import json
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.ml.spatial.gazetteer import EARTH_RADIUS_KM, haversine_km
+from app.ml.spatial.kdtree import SegmentKDTree
+
+# Longer segments are split so their chords hug the sphere (sag < 1 m at 5 km)
+DEFAULT_MAX_SEGMENT_KM = 5.0
+
+
+def unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Map degrees to 3D unit vectors (chord length grows with great-circle distance)"""
+    phi = np.radians(latitudes)
+    lam = np.radians(longitudes)
+    cos_phi = np.cos(phi)
+    return np.stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)], axis=-1)
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km for a chord length on the unit sphere (inf stays inf)"""
+    chord = np.asarray(chord, dtype=float)
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+    return np.where(np.isinf(chord), np.inf, distance)
+
+
+class PolylineIndex:
+    """
+    Nearest-line distance index
+    
+    Distances are measured to the nearest point on any segment, not just
+    to vertices. Segments are treated as straight chords between their
+    endpoints on the unit sphere, which is why long ones are split first.
+    """
+    
+    def __init__(
+        self,
+        lines: List[np.ndarray],
+        names: List[str],
+        max_segment_km: float = DEFAULT_MAX_SEGMENT_KM
+    ):
+        """
+        Split polylines into segments and build the index
+        
+        Args:
+            lines: Polylines as arrays of (lon, lat) vertices
+            names: Name per polyline
+            max_segment_km: Maximum segment length after splitting
+        """
+        self.names = list(names)
+        self.max_segment_km = max_segment_km
+        
+        segments, line_ids = [], []
+        for line_id, line in enumerate(lines):
+            line = np.asarray(line, dtype=float).reshape(-1, 2)
+            if len(line) == 0:
+                continue
+            vertices = _densify(line, max_segment_km)
+            # A single vertex becomes a zero-length segment
+            pairs = np.stack([vertices[:-1], vertices[1:]], axis=1) if len(vertices) > 1 \
+                else np.stack([vertices, vertices], axis=1)
+            segments.append(pairs)
+            line_ids.append(np.full(len(pairs), line_id, dtype=np.intp))
+        
+        # Shape (n, 2, 2): segment, endpoint, (lon, lat)
+        self.segments = np.concatenate(segments) if segments else np.empty((0, 2, 2))
+        self.line_ids = np.concatenate(line_ids) if line_ids else np.empty(0, dtype=np.intp)
+        self.tree = SegmentKDTree(
+            unit_vectors(self.segments[:, 0, 1], self.segments[:, 0, 0]),
+            unit_vectors(self.segments[:, 1, 1], self.segments[:, 1, 0]),
+        )
+    
+    @classmethod
+    def load(cls, path: str, max_segment_km: float = DEFAULT_MAX_SEGMENT_KM) -> "PolylineIndex":
+        """
+        Load lines from GeoJSON, or from any format geopandas reads (e.g. Shapefile)
+        
+        LineString and MultiLineString geometries are used (polygon rings
+        too, as closed lines); the name is taken from the `name` property
+        when present.
+        """
+        lines, names = [], []
+        for geometry, name in _read_line_features(path):
+            if geometry['type'] == 'LineString':
+                parts = [geometry['coordinates']]
+            elif geometry['type'] in ('MultiLineString', 'Polygon'):
+                parts = geometry['coordinates']
+            elif geometry['type'] == 'MultiPolygon':
+                parts = [ring for polygon in geometry['coordinates'] for ring in polygon]
+            else:
+                continue
+            for part in parts:
+                # Drop any Z/M values
+                lines.append([vertex[:2] for vertex in part])
+                names.append(name)
+        return cls(lines, names, max_segment_km=max_segment_km)
+    
+    def __len__(self) -> int:
+        return len(self.segments)
+    
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float = math.inf
+    ) -> Tuple[float, Optional[str]]:
+        """
+        Nearest line to a location
+        
+        Args:
+            latitude: Latitude
+            longitude: Longitude
+            max_distance_km: Search radius; lines this far or further are ignored
+        
+        Returns:
+            Tuple of (distance in km, line name); (inf, None) if no line is in range
+        """
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return math.inf, None
+        
+        phi = math.radians(latitude)
+        lam = math.radians(longitude)
+        point = (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+        chord, segment = self.tree.query_point(point, _km_to_chord(max_distance_km))
+        if segment < 0:
+            return math.inf, None
+        distance = 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+        return distance, self.names[self.line_ids[segment]]
+    
+    def distance_km(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float = math.inf
+    ) -> float:
+        """
+        Great-circle distance in km to the nearest line
+        
+        A finite `max_distance_km` bounds the search, which is much cheaper
+        for callers that only care about nearby lines; anything at or beyond
+        it is reported as inf.
+        """
+        return self.nearest(latitude, longitude, max_distance_km)[0]
+    
+    def distances_km(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        max_distance_km: float = math.inf
+    ) -> np.ndarray:
+        """
+        Vectorized `distance_km`
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+            max_distance_km: Search radius (see `distance_km`)
+        
+        Returns:
+            Array of distances in km (inf out of range or for non-finite coordinates)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.broadcast_to(np.asarray(longitudes, dtype=float), latitudes.shape)
+        with np.errstate(invalid='ignore'):
+            points = unit_vectors(latitudes.ravel(), longitudes.ravel())
+        chords, _ = self.tree.query(points, _km_to_chord(max_distance_km))
+        return chord_to_km(chords).reshape(latitudes.shape)
+
+
+def _km_to_chord(distance_km: float) -> float:
+    """Unit-sphere chord length for a great-circle distance (inf stays inf)"""
+    if distance_km >= math.pi * EARTH_RADIUS_KM:
+        return math.inf
+    return 2 * math.sin(distance_km / (2 * EARTH_RADIUS_KM))
+
+
+def _densify(line: np.ndarray, max_segment_km: float) -> np.ndarray:
+    """Insert evenly spaced vertices so no segment exceeds `max_segment_km`"""
+    if len(line) == 1:
+        return line
+    
+    starts, ends = line[:-1], line[1:]
+    lengths = haversine_km(starts[:, 1], starts[:, 0], ends[:, 1], ends[:, 0])
+    pieces = np.maximum(np.ceil(lengths / max_segment_km), 1).astype(np.intp)
+    
+    # Segment i contributes its start plus pieces[i] - 1 interior vertices
+    segments = np.repeat(np.arange(len(starts)), pieces)
+    fractions = (np.arange(len(segments)) - np.repeat(np.cumsum(pieces) - pieces, pieces)) / pieces[segments]
+    interpolated = starts[segments] + (ends[segments] - starts[segments]) * fractions[:, None]
+    return np.vstack([interpolated, line[-1:]])
+
+
+def _read_line_features(path: str):
+    """Yield (GeoJSON geometry, name) for every feature in a vector file"""
+    if path.lower().endswith(('.geojson', '.json')):
+        with open(path) as f:
+            collection = json.load(f)
+        for feature in collection['features']:
+            if feature.get('geometry'):
+                yield feature['geometry'], (feature.get('properties') or {}).get('name', '')
+        return
+    
+    # Other vector formats go through geopandas (part of the full install)
+    import geopandas
+    
+    frame = geopandas.read_file(path).to_crs(epsg=4326)
+    names = frame['name'] if 'name' in frame.columns else [''] * len(frame)
+    for geometry, name in zip(frame.geometry, names):
+        if geometry is not None:
+            yield geometry.__geo_interface__, name if isinstance(name, str) else ''
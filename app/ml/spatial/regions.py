@@ -0,0 +1,196 @@
+"""
+Regional Rule Tables
+Declarative tables of prioritized lat/lon regions (boxes or polygons) that
+map a location to a value, replacing hand-written if/elif chains. Lookups
+go through a packed R-tree so cost stays flat as regions are added.
+"""
+import json
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.ml.spatial.rtree import PackedRTree
+
+REGIONAL_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "regional_rules.json"
+)
+
+
+class RegionTable:
+    """
+    Prioritized region table
+    
+    Each region has a value, a priority (higher wins where regions overlap,
+    ties go to the earlier entry) and either a box or a polygon:
+    
+    - Box: min_lat/max_lat/min_lon/max_lon, all inclusive; omitted bounds
+      are unbounded. `max_lat_inclusive`/`max_lon_inclusive` set to false
+      make that edge exclusive.
+    - Polygon: `polygon` as a list of [lon, lat] vertices (even-odd rule).
+    
+    Locations matching no region get `default` (None/NaN if unset).
+    """
+    
+    def __init__(self, regions: List[Dict], default: Optional[float] = None):
+        """Initialize table from region definitions"""
+        self.regions = regions
+        self.default = default
+        
+        count = len(regions)
+        self.values = np.array([region['value'] for region in regions], dtype=float)
+        self.min_lat = np.array([region.get('min_lat', -90.0) for region in regions], dtype=float)
+        self.max_lat = np.array([region.get('max_lat', 90.0) for region in regions], dtype=float)
+        self.min_lon = np.array([region.get('min_lon', -180.0) for region in regions], dtype=float)
+        self.max_lon = np.array([region.get('max_lon', 180.0) for region in regions], dtype=float)
+        self.max_lat_inclusive = np.array(
+            [region.get('max_lat_inclusive', True) for region in regions], dtype=bool
+        )
+        self.max_lon_inclusive = np.array(
+            [region.get('max_lon_inclusive', True) for region in regions], dtype=bool
+        )
+        
+        # Polygons replace the box bounds with their own extent
+        self.polygons = {}
+        for i, region in enumerate(regions):
+            if 'polygon' in region:
+                polygon = np.asarray(region['polygon'], dtype=float)
+                self.polygons[i] = polygon
+                self.min_lon[i], self.min_lat[i] = polygon.min(axis=0)
+                self.max_lon[i], self.max_lat[i] = polygon.max(axis=0)
+        
+        # Rank 0 is the region that wins overlaps
+        order = sorted(range(count), key=lambda i: (-regions[i].get('priority', 0), i))
+        self.ranks = np.empty(count, dtype=np.intp)
+        self.ranks[order] = np.arange(count)
+        
+        self.index = PackedRTree(
+            np.column_stack([self.min_lon, self.min_lat, self.max_lon, self.max_lat])
+        )
+        
+        # Plain-Python copies for single lookups
+        self._value_list = [region['value'] for region in regions]
+        self._rank_list = self.ranks.tolist()
+        self._bounds_list = list(zip(
+            self.max_lat.tolist(),
+            self.max_lon.tolist(),
+            self.max_lat_inclusive.tolist(),
+            self.max_lon_inclusive.tolist(),
+        ))
+    
+    @classmethod
+    def from_dict(cls, table: Dict) -> "RegionTable":
+        """Create a table from its JSON definition"""
+        return cls(table['regions'], default=table.get('default'))
+    
+    def lookup(self, latitude: float, longitude: float) -> Optional[float]:
+        """
+        Value of the highest-priority region containing the location
+        
+        Args:
+            latitude: Latitude
+            longitude: Longitude
+        
+        Returns:
+            Region value, or the table default if no region matches
+        """
+        best = None
+        best_rank = math.inf
+        for i in self.index.query_point(longitude, latitude):
+            if self._rank_list[i] < best_rank and self._contains(i, latitude, longitude):
+                best = i
+                best_rank = self._rank_list[i]
+        
+        if best is None:
+            return self.default
+        return self._value_list[best]
+    
+    def lookup_batch(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `lookup`
+        
+        Args:
+            latitudes: Array of latitudes
+            longitudes: Array of longitudes
+        
+        Returns:
+            Array of region values (default, or NaN without one, where no region matches)
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        shape = latitudes.shape
+        latitudes = latitudes.ravel()
+        longitudes = np.broadcast_to(longitudes, shape).ravel()
+        
+        points, regions = self.index.query_points(longitudes, latitudes)
+        keep = self._contains_batch(regions, latitudes[points], longitudes[points])
+        points, regions = points[keep], regions[keep]
+        
+        # Highest-priority match per point
+        best_rank = np.full(len(latitudes), len(self.regions), dtype=np.intp)
+        np.minimum.at(best_rank, points, self.ranks[regions])
+        
+        default = np.nan if self.default is None else self.default
+        rank_values = np.append(self.values[np.argsort(self.ranks)], default)
+        return rank_values[best_rank].reshape(shape)
+    
+    def _contains(self, region: int, latitude: float, longitude: float) -> bool:
+        """Exact containment test for one candidate region"""
+        if region in self.polygons:
+            return bool(_points_in_polygon(
+                self.polygons[region], np.array([longitude]), np.array([latitude])
+            )[0])
+        
+        # Minimum edges were already checked inclusively by the index
+        max_lat, max_lon, max_lat_inclusive, max_lon_inclusive = self._bounds_list[region]
+        return (
+            (max_lat_inclusive or latitude < max_lat) and
+            (max_lon_inclusive or longitude < max_lon)
+        )
+    
+    def _contains_batch(
+        self,
+        regions: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> np.ndarray:
+        """Exact containment test for candidate (point, region) pairs"""
+        inside = (
+            (self.max_lat_inclusive[regions] | (latitudes < self.max_lat[regions])) &
+            (self.max_lon_inclusive[regions] | (longitudes < self.max_lon[regions]))
+        )
+        if not self.polygons:
+            return inside
+        
+        # Group candidate pairs by polygon so each ring is tested once
+        polygon_pairs = np.nonzero(np.isin(regions, list(self.polygons)))[0]
+        polygon_pairs = polygon_pairs[np.argsort(regions[polygon_pairs], kind='stable')]
+        polygon_ids, starts = np.unique(regions[polygon_pairs], return_index=True)
+        for region, pairs in zip(polygon_ids.tolist(), np.split(polygon_pairs, starts[1:])):
+            inside[pairs] = _points_in_polygon(
+                self.polygons[region], longitudes[pairs], latitudes[pairs]
+            )
+        return inside
+
+
+def _points_in_polygon(polygon: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Even-odd ray casting test of points against a polygon ring"""
+    inside = np.zeros(len(x), dtype=bool)
+    x1, y1 = polygon[-1]
+    for x2, y2 in polygon:
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < x_cross)
+        x1, y1 = x2, y2
+    return inside
+
+
+@lru_cache(maxsize=None)
+def load_region_tables(path: str = REGIONAL_RULES_PATH) -> Dict[str, RegionTable]:
+    """Load and index every region table in a rules file (cached per path)"""
+    with open(path) as f:
+        tables = json.load(f)
+    return {name: RegionTable.from_dict(table) for name, table in tables.items()}
@@ -0,0 +1,40 @@
+"""
+River Network
+Nearest-river distances over the bundled major-river polylines, or a full
+hydrography extract configured with RIVER_NETWORK_PATH.
+"""
+import math
+import os
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.ml.spatial.polylines import PolylineIndex
+
+RIVERS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "rivers.geojson"
+)
+
+
+class RiverNetwork(PolylineIndex):
+    """Nearest-river distance index (features are named rivers)"""
+    
+    def nearest_river(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float = math.inf
+    ) -> Tuple[float, Optional[str]]:
+        """
+        Nearest river to a location
+        
+        Returns:
+            Tuple of (distance in km, river name); (inf, None) if no river is in range
+        """
+        return self.nearest(latitude, longitude, max_distance_km)
+
+
+@lru_cache(maxsize=None)
+def get_river_network() -> RiverNetwork:
+    """Process-wide river network, built once on first use"""
+    return RiverNetwork.load(settings.RIVER_NETWORK_PATH or RIVERS_PATH)
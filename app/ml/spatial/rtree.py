@@ -0,0 +1,176 @@
+"""
+Packed R-tree
+Static Sort-Tile-Recursive (STR) bulk-loaded R-tree over axis-aligned boxes,
+with a vectorized point query for batches and a plain-Python point query
+for single lookups on the request hot path.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+# Maximum children per node
+DEFAULT_NODE_CAPACITY = 16
+
+
+class PackedRTree:
+    """
+    Read-only R-tree packed with the STR algorithm
+    
+    Boxes are (min_x, min_y, max_x, max_y) rows; here x is longitude and
+    y is latitude. Query cost grows with tree depth and the number of
+    overlapping boxes, not with the total number of boxes.
+    """
+    
+    def __init__(self, boxes: np.ndarray, node_capacity: int = DEFAULT_NODE_CAPACITY):
+        """
+        Build the tree
+        
+        Args:
+            boxes: Array of shape (n, 4) with (min_x, min_y, max_x, max_y) per item
+            node_capacity: Maximum children per node
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        if node_capacity < 2:
+            raise ValueError("node_capacity must be at least 2")
+        
+        self.node_capacity = node_capacity
+        self.size = len(boxes)
+        
+        # Leaf entries in packed order
+        order = _str_order(boxes, node_capacity)
+        self.item_ids = order
+        self.item_boxes = boxes[order]
+        
+        # Levels from the leaves' parents up to the root; each level is
+        # (node boxes, first child index, child count) into the level below
+        levels = []
+        child_boxes = self.item_boxes
+        while True:
+            starts = np.arange(0, len(child_boxes), node_capacity)
+            counts = np.diff(np.append(starts, len(child_boxes)))
+            node_boxes = _union_boxes(child_boxes, starts)
+            levels.append([node_boxes, starts, counts])
+            if len(node_boxes) <= 1:
+                break
+            
+            # Pack the next level; reorder this one so siblings stay contiguous
+            order = _str_order(node_boxes, node_capacity)
+            levels[-1] = [node_boxes[order], starts[order], counts[order]]
+            child_boxes = node_boxes[order]
+        
+        self.levels = levels[::-1]
+        
+        # Plain-Python copies for single-point queries
+        self._level_lists = [
+            (boxes_.tolist(), starts.tolist(), counts.tolist())
+            for boxes_, starts, counts in self.levels
+        ]
+        self._item_box_list = self.item_boxes.tolist()
+        self._item_id_list = self.item_ids.tolist()
+    
+    def query_point(self, x: float, y: float) -> List[int]:
+        """Return ids of all boxes containing the point (boundaries inclusive)"""
+        if self.size == 0:
+            return []
+        
+        nodes = [0]
+        for boxes, starts, counts in self._level_lists:
+            children = []
+            for node in nodes:
+                min_x, min_y, max_x, max_y = boxes[node]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    start = starts[node]
+                    children.extend(range(start, start + counts[node]))
+            nodes = children
+        
+        matches = []
+        for item in nodes:
+            min_x, min_y, max_x, max_y = self._item_box_list[item]
+            if min_x <= x <= max_x and min_y <= y <= max_y:
+                matches.append(self._item_id_list[item])
+        return matches
+    
+    def query_points(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find all (point, box) containment pairs for a batch of points
+        
+        Args:
+            x: Array of point x coordinates
+            y: Array of point y coordinates
+            
+        Returns:
+            Tuple of (point indices, box ids), one entry per containing box
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        if self.size == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        
+        points = np.arange(len(x))
+        nodes = np.zeros(len(x), dtype=np.intp)
+        
+        for boxes, starts, counts in self.levels:
+            points, nodes = _filter_contains(boxes, nodes, points, x, y)
+            points, nodes = _expand_children(points, starts[nodes], counts[nodes])
+        
+        points, items = _filter_contains(self.item_boxes, nodes, points, x, y)
+        return points, self.item_ids[items]
+
+
+def _str_order(boxes: np.ndarray, node_capacity: int) -> np.ndarray:
+    """Sort-Tile-Recursive ordering of boxes by their centres"""
+    count = len(boxes)
+    if count == 0:
+        return np.empty(0, dtype=np.intp)
+    
+    centre_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    centre_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    
+    leaf_count = int(np.ceil(count / node_capacity))
+    slice_count = int(np.ceil(np.sqrt(leaf_count)))
+    slice_size = slice_count * node_capacity
+    
+    by_x = np.argsort(centre_x, kind='stable')
+    slices = [by_x[start:start + slice_size] for start in range(0, count, slice_size)]
+    return np.concatenate([
+        part[np.argsort(centre_y[part], kind='stable')] for part in slices
+    ])
+
+
+def _union_boxes(boxes: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Bounding box of each consecutive group of boxes"""
+    return np.column_stack([
+        np.minimum.reduceat(boxes[:, 0], starts),
+        np.minimum.reduceat(boxes[:, 1], starts),
+        np.maximum.reduceat(boxes[:, 2], starts),
+        np.maximum.reduceat(boxes[:, 3], starts),
+    ])
+
+
+def _filter_contains(
+    boxes: np.ndarray,
+    nodes: np.ndarray,
+    points: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep (point, node) pairs whose node box contains the point"""
+    node_boxes = boxes[nodes]
+    px = x[points]
+    py = y[points]
+    keep = (
+        (node_boxes[:, 0] <= px) & (px <= node_boxes[:, 2]) &
+        (node_boxes[:, 1] <= py) & (py <= node_boxes[:, 3])
+    )
+    return points[keep], nodes[keep]
+
+
+def _expand_children(
+    points: np.ndarray,
+    starts: np.ndarray,
+    counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Replace each (point, node) pair with one pair per child of the node"""
+    total = int(counts.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(points, counts), np.repeat(starts, counts) + offsets
@@ -0,0 +1,377 @@
+"""
+Risk Tile Store
+Rendered /risk-map tiles kept in an MBTiles (SQLite) file, so a tile that
+has been rendered once is served by one indexed read with no model
+evaluation. The file follows the MBTiles layout (a `metadata` table and a
+`tiles` table addressed by zoom_level/tile_column/tile_row, rows numbered
+from the south as in TMS) with the risk type, aggregation, tile format and
+the tile version (the scorer's model version and risk pyramid build) added
+to the tile key. The model version fingerprints the scoring code, rules and
+data, so a rule, data or model update changes it and tiles rendered before
+are never served; `prune` (or seeding with --prune) drops them.
+
+Pre-render a zoom range over a bounding box (resumable: tiles already in
+the store are skipped) with:
+    python -m app.ml.tile_store --zooms 4 10 --bbox 66 5 100 38 --workers 4
+    python -m app.ml.tile_store --zooms 4 10 --format mvt
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.ml.registry import get_model_registry
+from app.ml.risk_grid import DEFAULT_BOUNDS
+from app.ml.risk_pyramid import DEFAULT_AGGREGATION, PYRAMID_AGGREGATIONS, check_aggregation
+from app.ml.risk_tiles import MAX_ZOOM, RISK_TILE_TYPES, render_tile, tile_version, tiles_covering
+from app.ml.vector_tiles import MVT, render_vector_tile
+
+PNG = "png"
+
+# Renderer of each stored tile format
+TILE_RENDERERS: Dict[str, Callable[..., bytes]] = {
+    PNG: render_tile,
+    MVT: render_vector_tile,
+}
+
+# Tiles rendered per seeding task (also the unit of work lost on interruption)
+SEED_BATCH_TILES = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    risk_type TEXT NOT NULL,
+    aggregation TEXT NOT NULL,
+    tile_format TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_data BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (
+    risk_type, aggregation, tile_format, model_version, zoom_level, tile_column, tile_row
+);
+"""
+
+# One (risk_type, aggregation, tile_format, model_version, z, x, y, data) row to store
+TileRow = Tuple[str, str, str, str, int, int, int, bytes]
+
+
+def _tms_row(z: int, y: int) -> int:
+    """MBTiles row (from the south) of an XYZ row (from the north)"""
+    return (1 << z) - 1 - y
+
+
+class TileStore:
+    """
+    Rendered tiles in an MBTiles file
+    
+    Safe to share between threads (each gets its own connection) and
+    processes: the database runs in WAL mode, so reads are not blocked by
+    a writer.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Initialize store (the file is created on first use)
+        
+        Args:
+            path: MBTiles file
+        """
+        self.path = path
+        self._local = threading.local()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection, opening the database on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            connection.executemany(
+                "INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)",
+                [
+                    ("name", "ClimaRisk risk layers"),
+                    ("type", "overlay"),
+                    ("format", PNG),
+                    ("minzoom", "0"),
+                    ("maxzoom", str(MAX_ZOOM)),
+                ],
+            )
+            connection.commit()
+            self._local.connection = connection
+        return connection
+    
+    def get(
+        self,
+        risk_type: str,
+        model_version: str,
+        z: int,
+        x: int,
+        y: int,
+        tile_format: str = PNG,
+        aggregation: str = DEFAULT_AGGREGATION
+    ) -> Optional[bytes]:
+        """Stored tile, or None if it has not been rendered for this model version"""
+        row = self._connection().execute(
+            "SELECT tile_data FROM tiles WHERE risk_type = ? AND aggregation = ? AND tile_format = ? "
+            "AND model_version = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (risk_type, aggregation, tile_format, model_version, z, x, _tms_row(z, y)),
+        ).fetchone()
+        return None if row is None else row[0]
+    
+    def put(
+        self,
+        risk_type: str,
+        model_version: str,
+        z: int,
+        x: int,
+        y: int,
+        data: bytes,
+        tile_format: str = PNG,
+        aggregation: str = DEFAULT_AGGREGATION
+    ):
+        """Store one tile (replacing any stored for the same key)"""
+        self.put_many([(risk_type, aggregation, tile_format, model_version, z, x, y, data)])
+    
+    def put_many(self, tiles: Iterable[TileRow]):
+        """Store many tiles in one transaction"""
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO tiles (risk_type, aggregation, tile_format, model_version, "
+                "zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (risk_type, aggregation, tile_format, version, z, x, _tms_row(z, y), data)
+                    for risk_type, aggregation, tile_format, version, z, x, y, data in tiles
+                ),
+            )
+    
+    def existing(
+        self,
+        risk_type: str,
+        model_version: str,
+        z: int,
+        tile_format: str = PNG,
+        aggregation: str = DEFAULT_AGGREGATION
+    ) -> Set[Tuple[int, int]]:
+        """XYZ (x, y) of the tiles stored at one zoom level"""
+        rows = self._connection().execute(
+            "SELECT tile_column, tile_row FROM tiles WHERE risk_type = ? AND aggregation = ? "
+            "AND tile_format = ? AND model_version = ? AND zoom_level = ?",
+            (risk_type, aggregation, tile_format, model_version, z),
+        )
+        return {(x, _tms_row(z, row)) for x, row in rows}
+    
+    def prune(self, model_version: str) -> int:
+        """Delete tiles of every other model version, returning how many"""
+        connection = self._connection()
+        with connection:
+            deleted = connection.execute(
+                "DELETE FROM tiles WHERE model_version != ?", (model_version,)
+            ).rowcount
+        return deleted
+    
+    def close(self):
+        """Close this thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+@lru_cache(maxsize=None)
+def get_tile_store() -> TileStore:
+    """Process-wide tile store at RISK_TILE_STORE_PATH"""
+    return TileStore(settings.RISK_TILE_STORE_PATH)
+
+
+def _init_seed_worker():
+    """Process pool initializer: load every model once per worker"""
+    get_model_registry().preload()
+
+
+def _render_batch(
+    risk_type: str,
+    aggregation: str,
+    tile_format: str,
+    z: int,
+    addresses: List[Tuple[int, int]]
+) -> List[Tuple[int, int, bytes]]:
+    """Render a batch of tiles on this process's scorer"""
+    scorer = get_model_registry().scorer
+    render = TILE_RENDERERS[tile_format]
+    return [(x, y, render(scorer, risk_type, z, x, y, aggregation)) for x, y in addresses]
+
+
+def _missing_batches(
+    store: TileStore,
+    risk_types: Iterable[str],
+    zooms: Iterable[int],
+    bbox: Tuple[float, float, float, float],
+    model_version: str,
+    aggregation: str,
+    tile_format: str,
+    batch_tiles: int
+) -> Iterator[Tuple[str, int, List[Tuple[int, int]]]]:
+    """(risk type, zoom, addresses) batches of the tiles not yet stored"""
+    for risk_type in risk_types:
+        for z in zooms:
+            done = store.existing(risk_type, model_version, z, tile_format, aggregation)
+            xs, ys = tiles_covering(bbox, z)
+            batch = []
+            for y in ys:
+                for x in xs:
+                    if (x, y) not in done:
+                        batch.append((x, y))
+                        if len(batch) == batch_tiles:
+                            yield risk_type, z, batch
+                            batch = []
+            if batch:
+                yield risk_type, z, batch
+
+
+def seed_tiles(
+    store: TileStore,
+    risk_types: Iterable[str],
+    zooms: Tuple[int, int],
+    bbox: Tuple[float, float, float, float],
+    workers: Optional[int] = None,
+    batch_tiles: int = SEED_BATCH_TILES,
+    progress: bool = False,
+    tile_format: str = PNG,
+    aggregation: str = DEFAULT_AGGREGATION,
+) -> Dict[str, float]:
+    """
+    Pre-render a tile pyramid into the store
+    
+    Tiles already stored for the current model version are skipped, so an
+    interrupted run resumes where it stopped.
+    
+    Args:
+        store: Store to fill
+        risk_types: Layers to render (RISK_TILE_TYPES)
+        zooms: (min zoom, max zoom), inclusive
+        bbox: (min_lon, min_lat, max_lon, max_lat) to cover
+        workers: Rendering processes (0: render in this process;
+            None: one per CPU)
+        batch_tiles: Tiles per rendering task
+        progress: Print progress as batches complete
+        tile_format: Format to render (a key of TILE_RENDERERS)
+        aggregation: Pyramid aggregation to render (PYRAMID_AGGREGATIONS)
+    
+    Returns:
+        Dictionary with tiles rendered, seconds taken and tiles per second
+    
+    Raises:
+        ValueError: If a risk type is not one of RISK_TILE_TYPES, or the
+            format or aggregation is unknown
+    """
+    risk_types = list(risk_types)
+    unknown = sorted(set(risk_types) - set(RISK_TILE_TYPES))
+    if unknown:
+        raise ValueError(f"Unknown risk types: {', '.join(unknown)}")
+    if tile_format not in TILE_RENDERERS:
+        raise ValueError(f"Unknown tile format: {tile_format}")
+    check_aggregation(aggregation)
+    model_version = tile_version(get_model_registry().scorer)
+    batches = _missing_batches(
+        store,
+        risk_types,
+        range(zooms[0], zooms[1] + 1),
+        bbox,
+        model_version,
+        aggregation,
+        tile_format,
+        batch_tiles,
+    )
+    
+    rendered = 0
+    started = time.perf_counter()
+    
+    def save(risk_type: str, z: int, tiles: List[Tuple[int, int, bytes]]):
+        nonlocal rendered
+        store.put_many(
+            (risk_type, aggregation, tile_format, model_version, z, x, y, data) for x, y, data in tiles
+        )
+        rendered += len(tiles)
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"{rendered:>9,} tiles  {rendered / elapsed:>8.1f} tiles/s  (z{z} {risk_type})", flush=True)
+    
+    if workers == 0:
+        for risk_type, z, addresses in batches:
+            save(risk_type, z, _render_batch(risk_type, aggregation, tile_format, z, addresses))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_seed_worker) as pool:
+            # Keep a bounded number of batches in flight
+            limit = 2 * (workers or os.cpu_count() or 1)
+            pending = {}
+            for risk_type, z, addresses in batches:
+                pending[pool.submit(_render_batch, risk_type, aggregation, tile_format, z, addresses)] = (risk_type, z)
+                if len(pending) >= limit:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        save(*pending.pop(future), future.result())
+            for future in list(pending):
+                save(*pending.pop(future), future.result())
+    
+    seconds = time.perf_counter() - started
+    return {
+        'tiles': rendered,
+        'seconds': round(seconds, 3),
+        'tiles_per_second': round(rendered / seconds, 1) if seconds else 0.0,
+    }
+
+
+def main():
+    """Command-line entry point for seeding the tile store"""
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_BOUNDS
+    parser = argparse.ArgumentParser(description="Pre-render risk map tiles into the tile store")
+    parser.add_argument("--zooms", type=int, nargs=2, default=(4, 8), metavar=("MIN", "MAX"))
+    parser.add_argument(
+        "--bbox",
+        type=float,
+        nargs=4,
+        default=(min_lon, min_lat, max_lon, max_lat),
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+    )
+    parser.add_argument("--risk-types", nargs="+", choices=RISK_TILE_TYPES, default=["overall"])
+    parser.add_argument("--format", choices=sorted(TILE_RENDERERS), default=PNG, help="Tile format to render")
+    parser.add_argument("--aggregation", choices=PYRAMID_AGGREGATIONS, default=DEFAULT_AGGREGATION)
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (0: in-process)")
+    parser.add_argument("--store", default=settings.RISK_TILE_STORE_PATH, help="MBTiles file")
+    parser.add_argument("--prune", action="store_true", help="Drop tiles of other model versions first")
+    args = parser.parse_args()
+    
+    store = TileStore(args.store)
+    if args.prune:
+        print(f"Pruned {store.prune(tile_version(get_model_registry().scorer)):,} stale tiles")
+    result = seed_tiles(
+        store,
+        args.risk_types,
+        tuple(args.zooms),
+        tuple(args.bbox),
+        args.workers,
+        progress=True,
+        tile_format=args.format,
+        aggregation=args.aggregation,
+    )
+    print(
+        f"Rendered {result['tiles']:,} tiles in {result['seconds']:.1f}s "
+        f"({result['tiles_per_second']:.1f} tiles/s) into {args.store}"
+    )
+
+
+if __name__ == "__main__":
+    main()
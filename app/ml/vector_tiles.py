@@ -0,0 +1,435 @@
+"""
+Risk Vector Tiles
+Mapbox Vector Tiles (MVT) of a risk layer, for clients that style the risk
+classes themselves. The layer is sampled over the tile as for the raster
+tiles, quantized into the risk levels (low, moderate, high, extreme),
+polygonized per level and encoded as a protobuf tile with one layer named
+after the risk type and one multipolygon feature per level.
+
+The sampling grid follows the zoom: never finer than the risk grid (at
+high zoom a tile spans few grid cells, so it is sampled with as few as
+MIN_SAMPLES per side) and at most TILE_SIZE per side. Polygons are
+simplified to a tolerance of about one screen pixel.
+
+Compare size and encode time with the PNG tiles with:
+    python -m app.ml.vector_tiles --zooms 4 8 12 --tiles 50
+"""
+import argparse
+import gzip
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import MultiPolygon
+from shapely.geometry.polygon import orient
+
+from app.ml.ensemble import RISK_LEVELS, RISK_LEVEL_THRESHOLDS
+from app.ml.risk_pyramid import DEFAULT_AGGREGATION, check_aggregation
+from app.ml.risk_tiles import (
+    NODATA_INDEX,
+    TILE_SIZE,
+    check_tile,
+    render_tile,
+    risk_layer,
+    tile_in_coverage,
+    tile_pixel_coordinates,
+    tiles_covering,
+)
+
+MVT = "mvt"
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Tile coordinate space of the encoded geometry
+MVT_EXTENT = 4096
+
+# Fewest samples per tile side
+MIN_SAMPLES = 16
+
+# Sample spacing assumed when the scorer has no risk grid (degrees)
+LIVE_SAMPLE_RESOLUTION = 0.01
+
+# Geometry commands
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+_POLYGON = 3
+
+
+def risk_classes(scores: np.ndarray) -> np.ndarray:
+    """Scores (NaN = no data) as indices into RISK_LEVELS, NODATA_INDEX for no data"""
+    with np.errstate(invalid='ignore'):
+        classes = np.searchsorted(RISK_LEVEL_THRESHOLDS, scores, side='right')
+    return np.where(np.isnan(scores), NODATA_INDEX, classes).astype(np.uint8)
+
+
+def sample_size(ensemble_scorer, z: int) -> int:
+    """Samples per tile side at a zoom level: about one per risk grid cell, within bounds"""
+    grid = ensemble_scorer.grid_lookup
+    resolution = grid.resolution if grid is not None else LIVE_SAMPLE_RESOLUTION
+    cells = 360.0 / 2 ** z / resolution
+    return int(min(TILE_SIZE, max(MIN_SAMPLES, 2 ** math.ceil(math.log2(max(cells, 1))))))
+
+
+def _boundary_edges(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Directed unit edges between the cells inside and outside a mask
+    
+    Edges run with the inside on their right (y down): top edges along +x,
+    right edges +y, bottom edges -x and left edges -y, so rings around an
+    area have a positive and rings around a hole a negative area.
+    
+    Returns:
+        Tuple of (start x, start y, end vertex id, direction 0-3), vertex
+        (x, y) having id y * (width + 1) + x
+    """
+    height, width = mask.shape
+    padded = np.zeros((height + 2, width + 2), dtype=bool)
+    padded[1:-1, 1:-1] = mask
+    above, below = padded[:-1, 1:-1], padded[1:, 1:-1]
+    left, right = padded[1:-1, :-1], padded[1:-1, 1:]
+    
+    # Per direction: where the edges are, and their start and end vertex
+    # offsets from the (lattice row, column) they are found at
+    sides = (
+        (below & ~above, 0, 0, 1, 0),
+        (left & ~right, 0, 0, 0, 1),
+        (above & ~below, 1, 0, 0, 0),
+        (right & ~left, 0, 1, 0, 0),
+    )
+    start_x, start_y, end, direction = [], [], [], []
+    for side, (edges, start_dx, start_dy, end_dx, end_dy) in enumerate(sides):
+        ys, xs = np.nonzero(edges)
+        start_x.append(xs + start_dx)
+        start_y.append(ys + start_dy)
+        end.append((ys + end_dy) * (width + 1) + xs + end_dx)
+        direction.append(np.full(len(xs), side, dtype=np.int8))
+    return (
+        np.concatenate(start_x), np.concatenate(start_y),
+        np.concatenate(end), np.concatenate(direction),
+    )
+
+
+def _trace_rings(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Closed boundary rings of a mask, as their corner points
+    
+    Returns:
+        Tuple of ((n, 2) corner coordinates, ring index of each corner)
+    """
+    start_x, start_y, end, direction = _boundary_edges(mask)
+    count = len(direction)
+    if not count:
+        return np.empty((0, 2)), np.empty(0, dtype=np.intp)
+    width = mask.shape[1]
+    
+    # Each vertex starts at most two edges (two where cells touch diagonally)
+    start = start_y * (width + 1) + start_x
+    order = np.argsort(start, kind='stable')
+    first = np.ones(count, dtype=bool)
+    first[1:] = start[order][1:] != start[order][:-1]
+    out_first = np.full((mask.shape[0] + 1) * (width + 1), -1)
+    out_second = np.full_like(out_first, -1)
+    out_first[start[order][first]] = order[first]
+    out_second[start[order][~first]] = order[~first]
+    
+    # At a diagonal touch, turn right: cells touching only at a corner get
+    # separate rings
+    candidate = out_second[end]
+    right_turn = (candidate >= 0) & (direction[np.maximum(candidate, 0)] == (direction + 1) % 4)
+    following = np.where(right_turn, candidate, out_first[end])
+    
+    # Corners start a straight run; jump from each to the next by pointer doubling
+    preceding = np.empty(count, dtype=np.intp)
+    preceding[following] = np.arange(count)
+    corners = np.flatnonzero(direction[preceding] != direction)
+    jump = following
+    straight = direction[jump] == direction
+    while straight.any():
+        jump = np.where(straight, jump[jump], jump)
+        straight = direction[jump] == direction
+    
+    next_corner = jump.tolist()
+    visited = bytearray(count)
+    path, rings = [], []
+    ring = 0
+    for corner in corners.tolist():
+        if visited[corner]:
+            continue
+        while not visited[corner]:
+            visited[corner] = 1
+            path.append(corner)
+            rings.append(ring)
+            corner = next_corner[corner]
+        ring += 1
+    path = np.asarray(path, dtype=np.intp)
+    return np.column_stack((start_x[path], start_y[path])).astype(float), np.asarray(rings, dtype=np.intp)
+
+
+def polygonize(mask: np.ndarray):
+    """
+    Area of the cells of a boolean raster as polygons
+    
+    Cell (row, col) covers [col, col + 1] x [row, row + 1] (y down). Cells
+    touching only at a corner belong to separate polygons.
+    
+    Returns:
+        MultiPolygon in cell coordinates (empty if no cell is set)
+    """
+    coords, ring_index = _trace_rings(mask)
+    if not len(coords):
+        return MultiPolygon()
+    
+    # Signed (shoelace) area per ring: shells positive, holes negative
+    ring_starts = np.flatnonzero(np.r_[True, ring_index[1:] != ring_index[:-1]])
+    following = np.arange(1, len(coords) + 1)
+    following[np.r_[ring_starts[1:], len(coords)] - 1] = ring_starts
+    x, y = coords[:, 0], coords[:, 1]
+    area = 0.5 * np.bincount(ring_index, x * y[following] - x[following] * y)
+    rings = shapely.linearrings(coords, indices=ring_index)
+    shells = np.flatnonzero(area > 0)
+    holes = np.flatnonzero(area < 0)
+    
+    # Each hole belongs to the smallest shell it lies within
+    owner = np.empty(len(holes), dtype=np.intp)
+    if len(holes):
+        shell_polygons = shapely.polygons(rings[shells])
+        hole_at, shell_at = STRtree(shell_polygons).query(
+            shapely.polygons(rings[holes]), predicate='within'
+        )
+        by_area = np.argsort(-area[shells][shell_at], kind='stable')
+        owner[hole_at[by_area]] = shell_at[by_area]
+    
+    polygon_index = np.concatenate((np.arange(len(shells)), owner))
+    members = np.concatenate((shells, holes))
+    order = np.argsort(polygon_index, kind='stable')
+    polygons = shapely.polygons(rings[members[order]], indices=polygon_index[order])
+    
+    # A ring can touch itself where one area meets itself diagonally
+    invalid = ~shapely.is_valid(polygons)
+    if invalid.any():
+        polygons[invalid] = shapely.make_valid(polygons[invalid])
+        parts = shapely.get_parts(polygons)
+        polygons = parts[shapely.get_type_id(parts) == 3]
+    return shapely.multipolygons(polygons)
+
+
+def _zigzag(value: int) -> int:
+    """Protobuf sint32 encoding"""
+    return (value << 1) if value >= 0 else ((-value) << 1) - 1
+
+
+def _varint(value: int) -> bytes:
+    """Protobuf base-128 varint"""
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    """Protobuf field key"""
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field: int, data: bytes) -> bytes:
+    """Protobuf length-delimited field (message, string or packed values)"""
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _packed(field: int, values: List[int]) -> bytes:
+    """Protobuf packed repeated uint32 field"""
+    return _length_delimited(field, b"".join(_varint(value) for value in values))
+
+
+def _ring_commands(ring: np.ndarray, cursor: List[int]) -> List[int]:
+    """Geometry commands of one closed ring of integer tile coordinates"""
+    points = ring[:-1]
+    # Rounding to the tile grid can repeat points
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (np.diff(points, axis=0) != 0).any(axis=1)
+    points = points[keep]
+    if len(points) > 1 and (points[0] == points[-1]).all():
+        points = points[:-1]
+    if len(points) < 3:
+        return []
+    
+    commands = []
+    for i, (x, y) in enumerate(points.tolist()):
+        if i == 0:
+            commands.append(_MOVE_TO | (1 << 3))
+        elif i == 1:
+            commands.append(_LINE_TO | ((len(points) - 1) << 3))
+        commands.extend((_zigzag(x - cursor[0]), _zigzag(y - cursor[1])))
+        cursor[0], cursor[1] = x, y
+    commands.append(_CLOSE_PATH | (1 << 3))
+    return commands
+
+
+def encode_geometry(geometry, scale: float) -> List[int]:
+    """
+    MVT geometry commands of a (multi)polygon in sample coordinates
+    
+    Exterior rings get a positive and interior rings a negative area in
+    tile coordinates, as the MVT specification requires.
+    """
+    polygons = geometry.geoms if isinstance(geometry, MultiPolygon) else [geometry]
+    cursor = [0, 0]
+    commands: List[int] = []
+    for polygon in polygons:
+        if polygon.is_empty:
+            continue
+        polygon = orient(polygon, sign=1.0)
+        exterior = _ring_commands(np.rint(np.asarray(polygon.exterior.coords) * scale).astype(int), cursor)
+        if not exterior:
+            continue
+        commands.extend(exterior)
+        for interior in polygon.interiors:
+            commands.extend(_ring_commands(np.rint(np.asarray(interior.coords) * scale).astype(int), cursor))
+    return commands
+
+
+def encode_layer(name: str, features: List[Tuple[List[int], Dict[str, object]]]) -> bytes:
+    """
+    One protobuf MVT layer
+    
+    Args:
+        name: Layer name
+        features: (geometry commands, properties) of each polygon feature;
+            property values are strings or integers
+    """
+    keys: Dict[str, int] = {}
+    values: Dict[object, int] = {}
+    encoded_features = []
+    for feature_id, (commands, properties) in enumerate(features, start=1):
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        encoded_features.append(_length_delimited(2, b"".join((
+            _key(1, 0) + _varint(feature_id),
+            _packed(2, tags),
+            _key(3, 0) + _varint(_POLYGON),
+            _packed(4, commands),
+        ))))
+    
+    encoded_values = []
+    for kind, value in values:
+        if kind == 'str':
+            encoded_values.append(_length_delimited(4, _length_delimited(1, value.encode('utf-8'))))
+        else:
+            encoded_values.append(_length_delimited(4, _key(6, 0) + _varint(_zigzag(value))))
+    
+    return b"".join((
+        _key(15, 0) + _varint(2),
+        _length_delimited(1, name.encode('utf-8')),
+        *encoded_features,
+        *(_length_delimited(3, key.encode('utf-8')) for key in keys),
+        *encoded_values,
+        _key(5, 0) + _varint(MVT_EXTENT),
+    ))
+
+
+def render_vector_tile(
+    ensemble_scorer,
+    risk_type: str,
+    z: int,
+    x: int,
+    y: int,
+    aggregation: str = DEFAULT_AGGREGATION,
+    samples: Optional[int] = None
+) -> bytes:
+    """
+    Render one XYZ tile of a risk layer as a Mapbox Vector Tile
+    
+    Args:
+        ensemble_scorer: EnsembleScorer (or CachedEnsembleScorer) to read
+        risk_type: One of RISK_TILE_TYPES (also the layer name)
+        z, x, y: Tile address (x, y < 2**z)
+        aggregation: Statistic classified where a sample spans several
+            grid cells: 'mean', or the worst case 'max' or 'p90'
+        samples: Samples per tile side (chosen for the zoom by default)
+    
+    Returns:
+        Protobuf tile bytes with a feature per risk level present (empty
+        outside coverage); features carry `risk_level` and `risk_class`
+    
+    Raises:
+        ValueError: If risk_type, aggregation or the tile address is invalid
+    """
+    check_tile(risk_type, z, x, y)
+    check_aggregation(aggregation)
+    if not tile_in_coverage(ensemble_scorer, z, x, y):
+        return b""
+    
+    samples = samples or sample_size(ensemble_scorer, z)
+    latitudes, longitudes = tile_pixel_coordinates(z, x, y, samples)
+    classes = risk_layer(
+        ensemble_scorer, risk_type, latitudes, longitudes,
+        classify=risk_classes, aggregation=aggregation, pixel_size=360.0 / 2 ** z / samples,
+    )
+    
+    # About one screen pixel of a TILE_SIZE tile, in sample units
+    tolerance = samples / TILE_SIZE
+    scale = MVT_EXTENT / samples
+    features = []
+    for value, level in enumerate(RISK_LEVELS):
+        area = polygonize(classes == value)
+        if area.is_empty:
+            continue
+        commands = encode_geometry(shapely.simplify(area, tolerance, preserve_topology=True), scale)
+        if commands:
+            features.append((commands, {'risk_level': level, 'risk_class': value}))
+    if not features:
+        return b""
+    return _length_delimited(3, encode_layer(risk_type, features))
+
+
+def benchmark(zooms: List[int], tiles: int, risk_type: str):
+    """Print the size and render time of vector and PNG tiles in coverage per zoom"""
+    from app.ml.registry import get_model_registry
+    from app.ml.risk_tiles import coverage_bounds
+    
+    scorer = get_model_registry().scorer
+    min_lat, max_lat, min_lon, max_lon = coverage_bounds(scorer)
+    source = "risk grid" if scorer.grid_lookup is not None else "live models"
+    print(f"{risk_type} tiles from the {source}, per tile:")
+    for zoom in zooms:
+        # Tiles around the middle of coverage
+        centre = ((min_lon + max_lon) / 2, (min_lat + max_lat) / 2)
+        xs, ys = tiles_covering(centre * 2, zoom)
+        side = max(1, int(math.sqrt(tiles)))
+        addresses = [
+            (x, y)
+            for y in range(max(0, ys[0] - side // 2), min(2 ** zoom, ys[0] - side // 2 + side))
+            for x in range(max(0, xs[0] - side // 2), min(2 ** zoom, xs[0] - side // 2 + side))
+        ]
+        for name, render in (("mvt", render_vector_tile), ("png", render_tile)):
+            sizes, gzipped = 0, 0
+            started = time.perf_counter()
+            for x, y in addresses:
+                data = render(scorer, risk_type, zoom, x, y)
+                sizes += len(data)
+                gzipped += len(gzip.compress(data))
+            elapsed = time.perf_counter() - started
+            count = len(addresses)
+            print(
+                f"z{zoom:<3} {name}  {elapsed / count * 1e3:>7.2f} ms  {sizes / count / 1e3:>7.2f} kB  "
+                f"{gzipped / count / 1e3:>7.2f} kB gzipped  ({count} tiles)"
+            )
+
+
+def main():
+    """Command-line entry point for the vector tile benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark vector against raster risk tiles")
+    parser.add_argument("--zooms", type=int, nargs="+", default=[4, 8, 12])
+    parser.add_argument("--tiles", type=int, default=49, help="Tiles per zoom (a square around the centre)")
+    parser.add_argument("--risk-type", default="overall")
+    args = parser.parse_args()
+    benchmark(args.zooms, args.tiles, args.risk_type)
+
+
+if __name__ == "__main__":
+    main()
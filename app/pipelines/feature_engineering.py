@@ -7,6 +7,8 @@ import numpy as np
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
+from app.ml.spatial.coast import COASTAL_DISTANCE_KM, get_coast_sampler
+
 
 class FeatureEngineer:
     """
@@ -21,7 +23,7 @@ class FeatureEngineer:
     
     def __init__(self):
         """Initialize feature engineer"""
-        pass
+        self.coast = get_coast_sampler()
     
     def process_weather_features(
         self,
@@ -172,8 +174,10 @@ class FeatureEngineer:
             latitude, longitude
         )
         
-        # Coastal proximity (simplified)
-        features['region_features']['coastal'] = self._is_coastal(latitude, longitude)
+        # Coastal proximity (same distance-to-coast raster as the flood model)
+        coast_distance = self.coast.distance_km(latitude, longitude)
+        features['region_features']['coast_distance_km'] = coast_distance
+        features['region_features']['coastal'] = coast_distance < COASTAL_DISTANCE_KM
         
         return features
     
@@ -193,15 +197,4 @@ class FeatureEngineer:
     
     def _is_coastal(self, latitude: float, longitude: float) -> bool:
         """Check if location is coastal"""
-        # Very simplified
-        coastal_ranges = [
-            (8, 23, 68, 72),  # West coast
-            (19, 23, 80, 97),  # East coast
-        ]
-        
-        for min_lat, max_lat, min_lon, max_lon in coastal_ranges:
-            if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
-                return True
-        
-        return False
-
+        return self.coast.is_coastal(latitude, longitude)
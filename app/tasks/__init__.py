@@ -1,2 +1,4 @@
 """Celery tasks"""
+from app.tasks.scoring import finish_job, score_job_chunk
 
+__all__ = ["finish_job", "score_job_chunk"]
@@ -0,0 +1,237 @@
+"""
+Bulk Scoring Job Store
+Keeps the state of bulk scoring jobs on disk under JOBS_PATH, shared by the
+API (which spools uploads and reports status) and the Celery workers (which
+score the chunks). One directory per job:
+
+    job.json              rows per chunk, submission and completion times
+    input-00000.ndjson    spooled input records, one file per chunk
+                          (input-00000.arrow for Arrow or Parquet uploads)
+    part-00000.parquet    scored rows of a finished chunk
+    part-00000.json       its row count and timing (progress and throughput)
+    error.json            first failure, if any
+    result.parquet        all scored rows in input order, once complete
+"""
+import glob
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+from app.ml.portfolio_formats import conform_table
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _write_json(path: str, data: Dict):
+    """Write JSON atomically, so readers never see a partial file"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    """JSON file contents (None if missing)"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _unify_schemas(schemas: List[pa.Schema]) -> pa.Schema:
+    """Union of the chunks' columns; types that cannot be promoted become strings"""
+    types: Dict[str, List[pa.DataType]] = {}
+    for schema in schemas:
+        for field in schema:
+            types.setdefault(field.name, []).append(field.type)
+    fields = []
+    for name, field_types in types.items():
+        try:
+            field = pa.unify_schemas(
+                [pa.schema([(name, field_type)]) for field_type in field_types],
+                promote_options="permissive",
+            ).field(name)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            field = pa.field(name, pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class JobStore:
+    """Bulk scoring jobs kept on a filesystem shared by API and workers"""
+    
+    def __init__(self, root: str):
+        """
+        Initialize store
+        
+        Args:
+            root: Directory holding one subdirectory per job
+        """
+        self.root = root
+    
+    def _path(self, job_id: str, name: str = "") -> str:
+        """
+        Path inside a job's directory
+        
+        Raises:
+            KeyError: If job_id is not a job id
+        """
+        if not _JOB_ID.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id, name)
+    
+    def create(self) -> str:
+        """Create an empty job and return its id"""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._path(job_id))
+        return job_id
+    
+    def write_input(self, job_id: str, index: int, chunk: Union[List[Dict], pa.Table]):
+        """Spool the input of one chunk: records, or a table from a columnar upload"""
+        if isinstance(chunk, pa.Table):
+            with pa.OSFile(self._path(job_id, f"input-{index:05d}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, chunk.schema) as writer:
+                    writer.write_table(chunk)
+            return
+        with open(self._path(job_id, f"input-{index:05d}.ndjson"), "w") as f:
+            for record in chunk:
+                f.write(json.dumps(record) + "\n")
+    
+    def read_input(self, job_id: str, index: int) -> Union[List[Dict], pa.Table]:
+        """Input of one chunk, as it was spooled"""
+        path = self._path(job_id, f"input-{index:05d}.arrow")
+        if os.path.exists(path):
+            with pa.OSFile(path, "rb") as source:
+                return pa.ipc.open_file(source).read_all()
+        with open(self._path(job_id, f"input-{index:05d}.ndjson")) as f:
+            return [json.loads(line) for line in f]
+    
+    def submit(self, job_id: str, chunk_rows: List[int]):
+        """Record a fully spooled job and the rows in each of its chunks"""
+        _write_json(self._path(job_id, "job.json"), {
+            "chunk_rows": chunk_rows,
+            "submitted_at": time.time(),
+        })
+    
+    def write_part(self, job_id: str, index: int, table: pa.Table, started_at: float):
+        """Store the scored rows of one chunk and mark it done"""
+        path = self._path(job_id, f"part-{index:05d}.parquet")
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        _write_json(self._path(job_id, f"part-{index:05d}.json"), {
+            "rows": table.num_rows,
+            "started_at": started_at,
+            "finished_at": time.time(),
+        })
+    
+    def fail(self, job_id: str, message: str):
+        """Mark a job failed (the first failure is kept)"""
+        path = self._path(job_id, "error.json")
+        if not os.path.exists(path):
+            _write_json(path, {"error": message, "failed_at": time.time()})
+    
+    def complete(self, job_id: str) -> str:
+        """
+        Merge the chunk results into the job's result in input order
+        
+        Parts are read one at a time, so memory stays at one chunk; spooled
+        inputs and parts are removed afterwards.
+        
+        Returns:
+            Path of the result Parquet file
+        """
+        job = _read_json(self._path(job_id, "job.json"))
+        parts = [
+            self._path(job_id, f"part-{index:05d}.parquet") for index in range(len(job["chunk_rows"]))
+        ]
+        schema = _unify_schemas([pq.read_schema(path) for path in parts])
+        path = self.result_path(job_id)
+        with pq.ParquetWriter(f"{path}.tmp", schema) as writer:
+            for part in parts:
+                writer.write_table(conform_table(pq.read_table(part), schema))
+        os.replace(f"{path}.tmp", path)
+        
+        for pattern in ("input-*", "part-*.parquet"):
+            for leftover in glob.glob(self._path(job_id, pattern)):
+                os.remove(leftover)
+        job["completed_at"] = time.time()
+        _write_json(self._path(job_id, "job.json"), job)
+        return path
+    
+    def result_path(self, job_id: str) -> str:
+        """Path of a job's result Parquet file"""
+        return self._path(job_id, "result.parquet")
+    
+    def status(self, job_id: str) -> Optional[Dict]:
+        """
+        Progress of a job
+        
+        Returns:
+            Dictionary with status ('queued', 'running', 'completed' or
+            'failed'), row and chunk counts, progress, throughput and times;
+            None for an unknown job
+        """
+        try:
+            job = _read_json(self._path(job_id, "job.json"))
+        except KeyError:
+            return None
+        if job is None:
+            return None
+        
+        parts = [
+            part for part in (
+                _read_json(self._path(job_id, f"part-{index:05d}.json"))
+                for index in range(len(job["chunk_rows"]))
+            )
+            if part is not None
+        ]
+        total_rows = sum(job["chunk_rows"])
+        rows_scored = sum(part["rows"] for part in parts)
+        error = _read_json(self._path(job_id, "error.json"))
+        
+        if error is not None:
+            status = "failed"
+        elif "completed_at" in job:
+            status = "completed"
+        elif parts:
+            status = "running"
+        else:
+            status = "queued"
+        
+        # Throughput over the time chunks were being scored
+        rows_per_second = None
+        if parts:
+            elapsed = max(part["finished_at"] for part in parts) - min(part["started_at"] for part in parts)
+            rows_per_second = round(rows_scored / elapsed, 1) if elapsed > 0 else None
+        
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total_rows": total_rows,
+            "rows_scored": rows_scored,
+            "total_chunks": len(job["chunk_rows"]),
+            "chunks_scored": len(parts),
+            "progress": round(rows_scored / total_rows, 4) if total_rows else 1.0,
+            "rows_per_second": rows_per_second,
+            "submitted_at": job["submitted_at"],
+            "completed_at": job.get("completed_at"),
+            "error": error["error"] if error else None,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_job_store() -> JobStore:
+    """Process-wide job store under JOBS_PATH"""
+    return JobStore(settings.JOBS_PATH)
@@ -0,0 +1,100 @@
+"""
+Bulk Scoring Tasks
+A job's chunks are scored as a Celery chord: one task per spooled chunk
+(batched, deduplicated scoring on the worker's models), then a task that
+merges the chunk results into the job's Parquet file.
+"""
+import logging
+import time
+from typing import List
+
+import numpy as np
+import pyarrow as pa
+from celery import chord
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.ml.portfolio import score_chunk
+from app.ml.portfolio_formats import (
+    extract_coordinates,
+    rows_table,
+    score_rows,
+    score_table,
+    table_coordinates,
+)
+from app.tasks.jobs import get_job_store
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.scoring.score_job_chunk")
+def score_job_chunk(job_id: str, index: int) -> int:
+    """
+    Score one spooled chunk of a job
+    
+    Args:
+        job_id: Job id
+        index: Chunk number
+    
+    Returns:
+        Rows scored
+    """
+    from app.ml.registry import get_model_registry
+    
+    store = get_job_store()
+    started_at = time.time()
+    try:
+        chunk = store.read_input(job_id, index)
+        if isinstance(chunk, pa.Table):
+            latitudes, longitudes, errors = table_coordinates(chunk)
+        else:
+            latitudes, longitudes, errors = extract_coordinates(chunk)
+        valid = np.array([error is None for error in errors], dtype=bool)
+        results = score_chunk(
+            get_model_registry().cached_scorer(settings.BULK_GRID_RESOLUTION),
+            latitudes[valid],
+            longitudes[valid],
+        )
+        if isinstance(chunk, pa.Table):
+            table = score_table(chunk, results, errors)
+        else:
+            table = rows_table(score_rows(chunk, results, errors))
+        store.write_part(job_id, index, table, started_at)
+    except Exception as e:
+        store.fail(job_id, f"Chunk {index} failed: {e}")
+        raise
+    return len(chunk)
+
+
+@celery_app.task(name="app.tasks.scoring.finish_job")
+def finish_job(chunk_rows: List[int], job_id: str) -> str:
+    """
+    Merge a job's chunk results once every chunk is scored
+    
+    Args:
+        chunk_rows: Rows scored per chunk (the chord's results)
+        job_id: Job id
+    
+    Returns:
+        Path of the result Parquet file
+    """
+    store = get_job_store()
+    try:
+        path = store.complete(job_id)
+    except Exception as e:
+        store.fail(job_id, f"Merging results failed: {e}")
+        raise
+    status = store.status(job_id)
+    logger.info(
+        "Job %s: %d rows in %d chunks (%s rows/s)",
+        job_id, status["total_rows"], status["total_chunks"], status["rows_per_second"],
+    )
+    return path
+
+
+def submit_job(job_id: str, chunks: int):
+    """Queue the chunk tasks of a spooled job, then the merge"""
+    header = [score_job_chunk.si(job_id, index) for index in range(chunks)]
+    if not header:
+        return finish_job.delay([], job_id)
+    return chord(header)(finish_job.s(job_id))
@@ -1,8 +1,15 @@
 """
 Tests for API endpoints
 """
+import csv
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from fastapi.testclient import TestClient
+from app.core.config import settings
 from app.main import app
 
 client = TestClient(app)
@@ -51,3 +58,306 @@ def test_forecast_endpoint():
     assert "forecasts" in data
     assert len(data["forecasts"]) == 3
 
+
+def _without_timestamps(value):
+    """Response body without the per-request fields (timestamps and generated ids)"""
+    if isinstance(value, dict):
+        return {k: _without_timestamps(v) for k, v in value.items() if k not in ("calculated_at", "property_id")}
+    if isinstance(value, list):
+        return [_without_timestamps(v) for v in value]
+    return value
+
+
+@pytest.mark.parametrize("path,payload", [
+    ("/api/v1/score", {"latitude": 19.0760, "longitude": 72.8777}),
+    ("/api/v1/forecast", {"latitude": 19.0760, "longitude": 72.8777, "years": [5, 10]}),
+    ("/api/v1/property/analysis", {"latitude": 19.0760, "longitude": 72.8777}),
+    ("/api/v1/bulk-scoring", {"properties": [{"latitude": 19.0760, "longitude": 72.8777}]}),
+])
+def test_fast_json_responses_match_response_model(monkeypatch, path, payload):
+    """Test fast JSON responses have the same body as FastAPI's response_model path"""
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", True)
+    fast = client.post(path, json=payload)
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", False)
+    slow = client.post(path, json=payload)
+    
+    assert fast.status_code == slow.status_code == 200
+    assert fast.headers["content-type"] == slow.headers["content-type"]
+    assert _without_timestamps(fast.json()) == _without_timestamps(slow.json())
+
+
+
+def test_bulk_scoring_endpoint_deduplicates_cells():
+    """Test bulk scoring scores shared grid cells once and keeps row order"""
+    payload = {
+        "properties": [
+            {"latitude": 19.0760, "longitude": 72.8777, "property_id": "a"},
+            {"latitude": 19.07601, "longitude": 72.87771, "property_id": "b"},
+            {"latitude": 28.6139, "longitude": 77.2090, "property_id": "c"},
+        ]
+    }
+    response = client.post("/api/v1/bulk-scoring", json=payload)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_properties"] == 3
+    assert data["successful"] == 3
+    assert data["failed"] == 0
+    assert data["deduplicated"] == 1
+    assert [row["property_id"] for row in data["scores"]] == ["a", "b", "c"]
+    assert data["scores"][1]["latitude"] == 19.07601
+    assert data["scores"][0]["clima_risk_score"] == data["scores"][1]["clima_risk_score"]
+    assert data["scores"][2]["risk_level"] in ["low", "moderate", "high", "extreme"]
+
+
+def test_bulk_scoring_stream_ndjson(monkeypatch):
+    """Test streamed NDJSON is scored in chunks, in order, with per-row errors"""
+    from app.api.v1.endpoints import bulk
+    from app.core.config import settings
+    
+    monkeypatch.setattr(settings, "PORTFOLIO_CHUNK_SIZE", 4)
+    chunk_sizes = []
+    score_chunk = bulk.score_chunk
+    
+    def recording_score_chunk(scorer, latitudes, longitudes):
+        chunk_sizes.append(len(latitudes))
+        return score_chunk(scorer, latitudes, longitudes)
+    
+    monkeypatch.setattr(bulk, "score_chunk", recording_score_chunk)
+    lines = [json.dumps({"id": i, "latitude": 8 + i * 0.5, "longitude": 77.0}) for i in range(10)]
+    lines[3] = "not json"
+    lines[6] = json.dumps({"id": 6, "latitude": 95, "longitude": 77.0})
+    
+    def body():
+        # Uneven pieces so records span them
+        data = ("\n".join(lines) + "\n").encode()
+        for start in range(0, len(data), 7):
+            yield data[start:start + 7]
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=body(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 10
+    assert [row.get("id") for row in rows] == [0, 1, 2, None, 4, 5, 6, 7, 8, 9]
+    assert rows[3]["error"] == "Line 4 is not a JSON object"
+    assert rows[6]["error"] == "latitude or longitude out of range"
+    assert all(row["risk_level"] in ["low", "moderate", "high", "extreme"]
+               for i, row in enumerate(rows) if i not in (3, 6))
+    assert chunk_sizes == [3, 3, 2]
+
+
+def test_bulk_scoring_stream_csv():
+    """Test CSV in gives CSV out with the input columns first, or NDJSON on request"""
+    data = 'property_id,latitude,longitude\n"p,1",19.0760,72.8777\np2,28.6139,77.2090\n'
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=data,
+        headers={"Content-Type": "text/csv; charset=utf-8"},
+    )
+    
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0])[:4] == ["property_id", "latitude", "longitude", "clima_risk_score"]
+    assert [row["property_id"] for row in rows] == ["p,1", "p2"]
+    assert all(row["error"] == "" for row in rows)
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=data,
+        headers={"Content-Type": "text/csv", "Accept": "application/x-ndjson"},
+    )
+    assert json.loads(response.text.splitlines()[1])["property_id"] == "p2"
+
+
+def test_bulk_scoring_stream_ndjson_to_csv():
+    """Test CSV output of NDJSON keeps the first chunk's fields when line 1 is bad"""
+    lines = [
+        "not json",
+        json.dumps({"id": 1, "latitude": 19.0760, "longitude": 72.8777}),
+        json.dumps({"id": 2, "latitude": 28.6139, "longitude": 77.2090, "property_id": "p2"}),
+    ]
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson", "Accept": "text/csv"},
+    )
+    
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0])[:4] == ["id", "latitude", "longitude", "property_id"]
+    assert rows[0]["error"] == "Line 1 is not a JSON object" and rows[0]["id"] == ""
+    assert [row["id"] for row in rows[1:]] == ["1", "2"]
+    assert rows[2]["property_id"] == "p2"
+    assert all(row["error"] == "" and row["risk_level"] for row in rows[1:])
+
+
+def test_bulk_scoring_stream_rescores_its_output():
+    """Test input error and score fields are replaced, not taken as failures"""
+    data = 'property_id,latitude,longitude\np1,19.0760,72.8777\np2,,72.8777\n'
+    scored = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=data,
+        headers={"Content-Type": "text/csv"},
+    ).text
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=scored,
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.text == scored
+    
+    lines = [
+        json.dumps({"latitude": 19.07, "longitude": 72.87, "error": None}),
+        json.dumps({"latitude": 19.07, "longitude": 72.87, "_read_error": "spoofed", "risk_level": "x"}),
+        json.dumps({"latitude": None, "longitude": 72.87, "clima_risk_score": 1.0}),
+    ]
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert "error" not in rows[0] and "_read_error" not in rows[1]
+    assert rows[0]["risk_level"] == rows[1]["risk_level"] != "x"
+    assert rows[2] == {
+        "latitude": None, "longitude": 72.87, "error": "latitude and longitude are required numbers",
+    }
+
+
+def test_bulk_scoring_stream_media_types():
+    """Test unsupported upload and response formats are refused"""
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content="{}",
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 415
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content="latitude,longitude\n",
+        headers={"Content-Type": "text/csv", "Accept": "application/xml"},
+    )
+    assert response.status_code == 406
+
+
+def test_bulk_scoring_stream_columnar(monkeypatch):
+    """Test Parquet and Arrow uploads are scored column-wise in any output format"""
+    from app.core.config import settings
+    
+    monkeypatch.setattr(settings, "PORTFOLIO_CHUNK_SIZE", 3)
+    table = pa.table({
+        "property_id": [f"p{i}" for i in range(8)],
+        "latitude": [8 + i * 0.5 for i in range(7)] + [None],
+        "longitude": [77.0] * 6 + [200.0, 77.0],
+    })
+    parquet = io.BytesIO()
+    pq.write_table(table, parquet, row_group_size=2)
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=parquet.getvalue(),
+        headers={"Content-Type": "application/vnd.apache.parquet"},
+    )
+    assert response.status_code == 200
+    scored = pq.read_table(io.BytesIO(response.content))
+    assert scored.column("property_id").to_pylist() == table.column("property_id").to_pylist()
+    assert scored.column("error").to_pylist()[6:] == [
+        "latitude or longitude out of range", "latitude and longitude are required numbers"
+    ]
+    assert scored.column("clima_risk_score").null_count == 2
+    assert pa.types.is_dictionary(scored.schema.field("risk_level").type)
+    
+    arrow = io.BytesIO()
+    with pa.ipc.new_stream(arrow, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=5):
+            writer.write_batch(batch)
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=arrow.getvalue(),
+        headers={"Content-Type": "application/vnd.apache.arrow.stream", "Accept": "application/x-ndjson"},
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["clima_risk_score"] for row in rows] == scored.column("clima_risk_score").to_pylist()
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content="property_id,latitude,longitude\na,19.07,72.87\nb,28.61,77.20\n",
+        headers={"Content-Type": "text/csv", "Accept": "application/vnd.apache.arrow.stream"},
+    )
+    streamed = pa.ipc.open_stream(response.content).read_all()
+    assert streamed.column("property_id").to_pylist() == ["a", "b"]
+    
+    response = client.post(
+        "/api/v1/bulk-scoring/stream",
+        content=b"not parquet",
+        headers={"Content-Type": "application/vnd.apache.parquet"},
+    )
+    assert response.status_code == 400
+
+
+def test_bulk_scoring_endpoint_columnar_response():
+    """Test bulk scoring returns the same scores as Parquet when asked"""
+    payload = {
+        "properties": [
+            {"latitude": 19.0760, "longitude": 72.8777, "property_id": "a"},
+            {"latitude": 28.6139, "longitude": 77.2090, "property_id": "b"},
+        ]
+    }
+    scores = client.post("/api/v1/bulk-scoring", json=payload).json()["scores"]
+    response = client.post(
+        "/api/v1/bulk-scoring",
+        json=payload,
+        headers={"Accept": "application/vnd.apache.parquet"},
+    )
+    
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    rows = pq.read_table(io.BytesIO(response.content)).to_pylist()
+    assert [row["property_id"] for row in rows] == ["a", "b"]
+    assert [row["clima_risk_score"] for row in rows] == [row["clima_risk_score"] for row in scores]
+    assert [row["risk_level"] for row in rows] == [row["risk_level"] for row in scores]
+
+
+def test_risk_map_tile_endpoint(monkeypatch):
+    """Test risk tiles are served as PNG and out-of-range tiles are not found"""
+    monkeypatch.setattr(settings, "RISK_TILE_STORE_ENABLED", False)
+    response = client.get("/api/v1/risk-map/tiles/flood/6/45/27.png")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG\r\n\x1a\n")
+    assert "max-age" in response.headers["cache-control"]
+    assert client.get("/api/v1/risk-map/tiles/flood/2/4/0.png").status_code == 404
+    assert client.get("/api/v1/risk-map/tiles/wind/2/0/0.png").status_code == 422
+    assert client.get("/api/v1/risk-map/tiles/flood/6/45/27.png?aggregation=p90").status_code == 200
+    assert client.get("/api/v1/risk-map/tiles/flood/6/45/27.png?aggregation=min").status_code == 422
+
+
+def test_risk_map_lists_covering_tiles(monkeypatch):
+    """Test the risk map lists the tiles covering the bounding box"""
+    monkeypatch.setattr(settings, "RISK_TILE_STORE_ENABLED", False)
+    response = client.get("/api/v1/risk-map", params={"bbox": "72.8,18.9,73.0,19.1", "zoom": 10, "risk_type": "heat"})
+    
+    assert response.status_code == 200
+    tiles = response.json()["tiles"]
+    assert tiles and all(tile["z"] == 10 for tile in tiles)
+    url = tiles[0]["risk_data"]["url"]
+    assert url.endswith(f"/risk-map/tiles/heat/10/{tiles[0]['x']}/{tiles[0]['y']}.png")
+    assert client.get(url).status_code == 200
+    vector_url = tiles[0]["risk_data"]["vector_url"]
+    assert vector_url == url[:-len("png")] + "mvt"
+    
+    worst = client.get(
+        "/api/v1/risk-map", params={"bbox": "72.8,18.9,73.0,19.1", "zoom": 10, "aggregation": "max"}
+    )
+    assert worst.json()["tiles"][0]["risk_data"]["url"].endswith(".png?aggregation=max")
+    
+    too_many = client.get("/api/v1/risk-map", params={"bbox": "66,5,100,38", "zoom": 18})
+    assert too_many.status_code == 400
@@ -1,8 +1,13 @@
 """
 Tests for ensemble scorer
 """
+import pickle
+
+import numpy as np
 import pytest
-from app.ml.ensemble import EnsembleScorer
+from app.ml.ensemble import EnsembleScorer, RISK_LEVELS
+from app.ml.score_batch import ScoreBatch
+from app.ml.spatial.elevation import ElevationService
 
 
 def test_ensemble_scorer():
@@ -41,3 +46,70 @@ def test_ensemble_forecast():
         assert 'predicted_clima_risk_score' in forecast
         assert 0 <= forecast['predicted_clima_risk_score'] <= 100
 
+
+
+def test_ensemble_score_batch_matches_calculate_score():
+    """Test batch scoring agrees with calculate_score row by row"""
+    scorer = EnsembleScorer()
+    latitudes = np.array([28.6139, 19.0760, 13.0827, 26.9, 10.5])
+    longitudes = np.array([77.2090, 72.8777, 80.2707, 88.1, 78.0])
+    
+    batch = scorer.calculate_score_batch(latitudes, longitudes)
+    
+    for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+        result = scorer.calculate_score(latitude=lat, longitude=lon)
+        assert round(float(batch['clima_risk_score'][i]), 2) == result['clima_risk_score']
+        assert RISK_LEVELS[batch['risk_level_code'][i]] == result['risk_level']
+        assert round(float(batch['confidence'][i]), 2) == result['confidence']
+        for risk_type, score in result['risk_breakdown'].items():
+            assert round(float(batch[risk_type][i]), 2) == score
+
+
+def test_ensemble_fills_missing_elevation_from_dem(tmp_path):
+    """Test the scorer samples the DEM when no elevation is given"""
+    # Flat 5 m tile around Kolkata
+    np.full((11, 11), 5, dtype='>i2').tofile(str(tmp_path / "N22E088.hgt"))
+    scorer = EnsembleScorer(elevation_service=ElevationService(str(tmp_path)))
+    plain = EnsembleScorer(elevation_service=ElevationService(None))
+    
+    sampled = scorer.calculate_score(latitude=22.5726, longitude=88.3639)
+    explicit = plain.calculate_score(latitude=22.5726, longitude=88.3639, elevation=5.0)
+    assert sampled['risk_breakdown'] == explicit['risk_breakdown']
+    assert sampled['risk_breakdown'] != plain.calculate_score(
+        latitude=22.5726, longitude=88.3639
+    )['risk_breakdown']
+    
+    # Rows outside the DEM, or with their own elevation, are left alone
+    latitudes = np.array([22.5726, 28.6139, 22.5726])
+    longitudes = np.array([88.3639, 77.2090, 88.3639])
+    batch = scorer.calculate_score_batch(
+        latitudes, longitudes, elevation=np.array([np.nan, np.nan, 300.0])
+    )
+    expected = plain.calculate_score_batch(
+        latitudes, longitudes, elevation=np.array([5.0, np.nan, 300.0])
+    )
+    assert batch['flood'].tolist() == expected['flood'].tolist()
+
+
+
+def test_calculate_scores_returns_compact_batch():
+    """Test batched results are one structured array, read back as calculate_score dicts"""
+    scorer = EnsembleScorer()
+    latitudes = np.array([28.6139, 19.0760, 13.0827])
+    longitudes = np.array([77.2090, 72.8777, 80.2707])
+    
+    batch = scorer.calculate_scores(latitudes, longitudes)
+    
+    assert isinstance(batch, ScoreBatch)
+    assert batch.records.dtype.itemsize == 57
+    assert batch['risk_level_code'].dtype == np.uint8
+    rows = list(batch)
+    assert len({row['calculated_at'] for row in rows}) == 1
+    for row, lat, lon in zip(rows, latitudes, longitudes):
+        expected = scorer.calculate_score(latitude=lat, longitude=lon)
+        expected['calculated_at'] = row['calculated_at']
+        assert row == expected
+    
+    assert batch[1] == rows[1]
+    assert batch[1:].to_dicts() == rows[1:]
+    assert pickle.loads(pickle.dumps(batch)).to_dicts() == rows
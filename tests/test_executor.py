@@ -0,0 +1,91 @@
+"""
+Tests for the scoring executor
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.api.deps import get_bulk_scorer, get_executor
+from app.main import app
+from app.ml.ensemble import EnsembleScorer
+from app.ml.executor import ScoringExecutor
+from app.ml.score_cache import CachedEnsembleScorer, ScoreCache
+
+BULK_SECONDS = 1.0
+
+
+class SlowScorer(EnsembleScorer):
+    """Ensemble scorer whose batches take BULK_SECONDS of blocking work"""
+    
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.started_at = None
+    
+    def calculate_score_batch(self, latitudes, longitudes, **kwargs):
+        self.started_at = time.perf_counter()
+        self.started.set()
+        time.sleep(BULK_SECONDS)
+        return super().calculate_score_batch(latitudes, longitudes, **kwargs)
+
+
+def health_latency_during_bulk(executor: ScoringExecutor) -> float:
+    """Seconds from the start of a slow bulk job until /health answers"""
+    slow_scorer = SlowScorer()
+    scorer = CachedEnsembleScorer(slow_scorer, cache=ScoreCache(), precision=0.001)
+    app.dependency_overrides[get_bulk_scorer] = lambda: scorer
+    app.dependency_overrides[get_executor] = lambda: executor
+    payload = {
+        "properties": [
+            {"latitude": 8.0 + i * 0.01, "longitude": 77.0} for i in range(1000)
+        ]
+    }
+    
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            bulk = asyncio.create_task(client.post("/api/v1/bulk-scoring", json=payload))
+            while not slow_scorer.started.is_set():
+                await asyncio.sleep(0.001)
+            health = await client.get("/health")
+            elapsed = time.perf_counter() - slow_scorer.started_at
+            assert health.status_code == 200
+            assert (await bulk).status_code == 200
+            return elapsed
+    
+    try:
+        return asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+        executor.shutdown()
+
+
+def test_bulk_job_does_not_block_health_check():
+    """Test a long bulk job no longer stalls other requests on the worker"""
+    assert health_latency_during_bulk(ScoringExecutor("inline")) >= BULK_SECONDS
+    assert health_latency_during_bulk(ScoringExecutor("thread", 2)) < BULK_SECONDS / 2
+
+
+def test_process_executor_matches_thread_executor():
+    """Test process workers score with their own models, like the parent would"""
+    scorer = CachedEnsembleScorer(EnsembleScorer(), cache=ScoreCache(), precision=0.001)
+    results = []
+    for executor in (ScoringExecutor("thread", 1), ScoringExecutor("process", 1)):
+        try:
+            results.append(asyncio.run(executor.run(
+                CachedEnsembleScorer.calculate_score, scorer, 28.6139, 77.2090
+            )))
+        finally:
+            executor.shutdown()
+    
+    assert results[0]['risk_breakdown'] == results[1]['risk_breakdown']
+    assert results[0]['clima_risk_score'] == results[1]['clima_risk_score']
+
+
+def test_unknown_executor_kind():
+    """Test an unknown SCORING_EXECUTOR is rejected"""
+    with pytest.raises(ValueError, match="gevent"):
+        ScoringExecutor("gevent")
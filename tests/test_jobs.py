@@ -0,0 +1,116 @@
+"""
+Tests for bulk scoring jobs
+"""
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_jobs
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.main import app
+from app.tasks.jobs import JobStore
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Job store in a temporary directory, with tasks run eagerly in-process"""
+    store = JobStore(str(tmp_path))
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(celery_app.conf, "task_eager_propagates", True)
+    monkeypatch.setattr("app.tasks.scoring.get_job_store", lambda: store)
+    app.dependency_overrides[get_jobs] = lambda: store
+    yield store
+    app.dependency_overrides.clear()
+
+
+def test_job_scores_chunks_into_parquet(store, monkeypatch):
+    """Test a job is scored as chunk tasks and its result keeps input order"""
+    monkeypatch.setattr(settings, "PORTFOLIO_CHUNK_SIZE", 4)
+    lines = [json.dumps({"id": i, "latitude": 8 + i * 0.5, "longitude": 77.0}) for i in range(10)]
+    lines[5] = json.dumps({"id": 5, "latitude": "north"})
+    
+    response = client.post(
+        "/api/v1/jobs",
+        content="\n".join(lines),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "completed"
+    assert (job["total_rows"], job["rows_scored"]) == (10, 10)
+    assert (job["total_chunks"], job["chunks_scored"]) == (3, 3)
+    assert job["progress"] == 1.0
+    assert job["result_url"].endswith(f"/api/v1/jobs/{job['job_id']}/result")
+    assert client.get(f"/api/v1/jobs/{job['job_id']}").json()["status"] == "completed"
+    
+    result = client.get(f"/api/v1/jobs/{job['job_id']}/result")
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "application/vnd.apache.parquet"
+    rows = pq.read_table(io.BytesIO(result.content)).to_pylist()
+    assert [row["id"] for row in rows] == list(range(10))
+    assert rows[5]["error"] == "latitude and longitude are required numbers"
+    assert rows[5]["clima_risk_score"] is None
+    assert all(row["risk_level"] in ("low", "moderate", "high", "extreme")
+               for row in rows if row["id"] != 5)
+
+
+def test_job_progress_and_failure(store):
+    """Test status before the chunks run, after a failed chunk, and unknown jobs"""
+    job_id = store.create()
+    store.write_input(job_id, 0, [{"latitude": 19.07, "longitude": 72.87}])
+    store.submit(job_id, [1, 1])
+    
+    status = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert (status["status"], status["progress"]) == ("queued", 0.0)
+    assert client.get(f"/api/v1/jobs/{job_id}/result").status_code == 409
+    
+    from app.tasks.scoring import score_job_chunk
+    
+    score_job_chunk(job_id, 0)
+    status = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert (status["status"], status["chunks_scored"], status["progress"]) == ("running", 1, 0.5)
+    
+    with pytest.raises(FileNotFoundError):
+        score_job_chunk(job_id, 1)
+    status = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert status["status"] == "failed"
+    assert status["error"].startswith("Chunk 1 failed")
+    
+    assert client.get("/api/v1/jobs/0123456789abcdef0123456789abcdef").status_code == 404
+    assert client.get("/api/v1/jobs/..%2F..%2Fetc").status_code == 404
+
+
+def test_job_from_parquet_with_arrow_download(store, monkeypatch):
+    """Test a Parquet upload is spooled as table chunks and downloadable as Arrow"""
+    monkeypatch.setattr(settings, "PORTFOLIO_CHUNK_SIZE", 4)
+    table = pa.table({
+        "id": list(range(10)),
+        "latitude": [8 + i * 0.5 for i in range(10)],
+        "longitude": [77.0] * 10,
+    })
+    upload = io.BytesIO()
+    pq.write_table(table, upload)
+    
+    response = client.post(
+        "/api/v1/jobs",
+        content=upload.getvalue(),
+        headers={"Content-Type": "application/vnd.apache.parquet"},
+    )
+    job = response.json()
+    assert (job["status"], job["total_chunks"]) == ("completed", 3)
+    
+    parquet = pq.read_table(io.BytesIO(client.get(job["result_url"]).content))
+    assert parquet.column("id").to_pylist() == list(range(10))
+    assert parquet.schema.field("id").type == pa.int64()
+    
+    response = client.get(job["result_url"], headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert pa.ipc.open_stream(response.content).read_all().equals(parquet)
@@ -0,0 +1,79 @@
+"""
+Tests for micro-batching of concurrent requests
+"""
+import asyncio
+
+import httpx
+from prometheus_client import REGISTRY
+
+from app.main import app
+from app.ml.micro_batcher import MicroBatcher
+
+
+def test_micro_batcher_batches_concurrent_items():
+    """Test concurrent submits share batches of at most max_batch_size"""
+    batches = []
+    
+    async def process(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+    
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_seconds=0.05, name="test-size")
+    
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    
+    assert asyncio.run(run()) == [i * 10 for i in range(10)]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sum(batches, []) == list(range(10))
+    labels = {'batcher': 'test-size'}
+    assert REGISTRY.get_sample_value('climarisk_micro_batch_size_count', labels) == 3
+    assert REGISTRY.get_sample_value('climarisk_micro_batch_size_sum', labels) == 10
+    assert REGISTRY.get_sample_value('climarisk_micro_batch_queue_wait_seconds_count', labels) == 10
+
+
+def test_micro_batcher_errors_reach_their_callers():
+    """Test per-item errors and failed batches are raised to the right callers"""
+    async def process(items):
+        if 'fail' in items:
+            raise RuntimeError("batch failed")
+        return [ValueError(item) if item == 'bad' else item.upper() for item in items]
+    
+    batcher = MicroBatcher(process, max_batch_size=10, max_wait_seconds=0.01, name="test-errors")
+    
+    async def run(items):
+        return await asyncio.gather(
+            *(batcher.submit(item) for item in items), return_exceptions=True
+        )
+    
+    good, bad = asyncio.run(run(['good', 'bad']))
+    assert good == 'GOOD'
+    assert isinstance(bad, ValueError)
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run(['a', 'fail'])))
+    # A single item is not held back longer than max_wait_seconds
+    assert asyncio.run(run(['alone'])) == ['ALONE']
+
+
+def test_score_endpoint_batches_concurrent_requests():
+    """Test concurrent /score requests are batched and answered like single ones"""
+    locations = [(8.5 + i, 76.9 + i * 0.1) for i in range(20)]
+    labels = {'batcher': 'score'}
+    batches_before = REGISTRY.get_sample_value('climarisk_micro_batch_size_count', labels) or 0
+    
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/api/v1/score", json={"latitude": lat, "longitude": lon})
+                for lat, lon in locations
+            ))
+            metrics = await client.get("/metrics")
+        return responses, metrics
+    
+    responses, metrics = asyncio.run(run())
+    
+    assert all(response.status_code == 200 for response in responses)
+    assert [response.json()["latitude"] for response in responses] == [lat for lat, _ in locations]
+    batches = REGISTRY.get_sample_value('climarisk_micro_batch_size_count', labels) - batches_before
+    assert batches < len(locations)
+    assert "climarisk_micro_batch_queue_wait_seconds_bucket" in metrics.text
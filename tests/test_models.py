@@ -1,11 +1,15 @@
 """
 Tests for ML models
 """
+import json
+
+import numpy as np
 import pytest
 from app.ml.models.flood_model import FloodRiskModel
 from app.ml.models.heat_model import HeatRiskModel
 from app.ml.models.drought_model import DroughtRiskModel
 from app.ml.models.groundwater_model import GroundwaterRiskModel
+from app.ml.models.trained import TrainedModel
 
 
 def test_flood_model():
@@ -43,3 +47,88 @@ def test_groundwater_model():
     assert 0 <= score <= 100
     assert isinstance(score, (int, float))
 
+
+
+@pytest.mark.parametrize(
+    "model_class",
+    [FloodRiskModel, HeatRiskModel, DroughtRiskModel, GroundwaterRiskModel],
+)
+def test_predict_batch_matches_predict(model_class):
+    """Test vectorized predictions match the scalar path exactly"""
+    model = model_class()
+    latitudes = np.array([8.0, 12.9716, 19.0760, 23.0, 25.3, 28.6139, 30.0, 35.0])
+    longitudes = np.array([68.0, 77.5946, 72.8777, 72.0, 83.0, 77.2090, 97.0, 75.0])
+    
+    batch = model.predict_batch(latitudes, longitudes)
+    
+    expected = [model.predict(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+    assert batch.tolist() == expected
+
+
+def test_flood_predict_batch_with_missing_elevation():
+    """Test NaN elevations fall back to the default like the scalar path"""
+    model = FloodRiskModel()
+    elevation = np.array([5.0, np.nan, 150.0])
+    
+    batch = model.predict_batch([19.0, 19.0, 19.0], [72.8, 72.8, 72.8], elevation=elevation)
+    
+    assert batch[0] == model.predict(19.0, 72.8, elevation=5.0)
+    assert batch[1] == model.predict(19.0, 72.8)
+    assert batch[2] == model.predict(19.0, 72.8, elevation=150.0)
+
+
+def fit_artifact(model_class, path, version="test-1"):
+    """Fit a linear model on the model's features and save it as an artifact"""
+    from sklearn.linear_model import LinearRegression
+    
+    rng = np.random.default_rng(0)
+    features = rng.uniform(0, 1, (200, len(model_class.FEATURES)))
+    # Scores reach past 0-100 so clipping is exercised
+    target = 150 * features[:, 0] - 25
+    TrainedModel.save(
+        LinearRegression().fit(features, target),
+        str(path),
+        model_class.FEATURES,
+        version,
+        fill_values={name: 0.5 for name in model_class.FEATURES},
+    )
+
+
+@pytest.mark.parametrize(
+    "model_class",
+    [FloodRiskModel, HeatRiskModel, DroughtRiskModel, GroundwaterRiskModel],
+)
+def test_trained_model_artifact(model_class, tmp_path):
+    """Test a loaded artifact replaces the rules, memory-mapped and warmed up"""
+    path = tmp_path / "model.joblib"
+    fit_artifact(model_class, path)
+    model = model_class()
+    rules = model.predict(28.6139, 77.2090)
+    
+    model.load_model(str(path))
+    
+    assert model.model_loaded and model.model_version == "test-1"
+    assert isinstance(model.trained.estimator.coef_, np.memmap)
+    assert set(model.trained.latency) == {'single_p50', 'single_p99', 'batch_p50', 'batch_p99'}
+    
+    latitudes = np.array([8.0, 12.9716, 19.0760, 28.6139, 35.0])
+    longitudes = np.array([68.0, 77.5946, 72.8777, 77.2090, 75.0])
+    batch = model.predict_batch(latitudes, longitudes)
+    assert np.all((batch >= 0) & (batch <= 100))
+    assert batch.tolist() == [model.predict(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+    assert model.predict(28.6139, 77.2090) != rules
+
+
+def test_trained_model_unknown_feature(tmp_path):
+    """Test artifacts needing features a model cannot compute are rejected"""
+    path = tmp_path / "model.joblib"
+    fit_artifact(FloodRiskModel, path)
+    manifest_path = tmp_path / "model.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest['features'][-1] = 'soil_moisture'
+    manifest_path.write_text(json.dumps(manifest))
+    
+    model = FloodRiskModel()
+    with pytest.raises(ValueError, match="soil_moisture"):
+        model.load_model(str(path))
+    assert model.trained is None and not model.model_loaded
@@ -0,0 +1,126 @@
+"""
+Tests for the portfolio scoring engine
+"""
+import asyncio
+import csv
+
+import numpy as np
+
+from app.ml.ensemble import EnsembleScorer
+from app.ml.executor import ScoringExecutor
+from app.ml.portfolio import PortfolioScorer, RESULT_COLUMNS, deduplicate_cells, score_csv
+from app.ml.score_cache import CachedEnsembleScorer, ScoreCache
+
+
+def random_locations(count: int, seed: int = 0):
+    """Random locations across India"""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(8, 35, count), rng.uniform(68, 95, count)
+
+
+def test_portfolio_scorer_streams_chunks_in_order():
+    """Test chunked results match one batch, in order, with progress and bounded read-ahead"""
+    scorer = CachedEnsembleScorer(EnsembleScorer(), cache=ScoreCache(), precision=0.01)
+    latitudes, longitudes = random_locations(2_500)
+    executor = ScoringExecutor("thread", 2)
+    engine = PortfolioScorer(executor, scorer, chunk_size=1_000, max_pending=2)
+    
+    chunks_read = []
+    
+    def chunks():
+        for start in range(0, len(latitudes), 1_000):
+            chunks_read.append(start)
+            yield latitudes[start:start + 1_000], longitudes[start:start + 1_000]
+    
+    progress = []
+    results = []
+    try:
+        for chunk in engine.score_chunks(chunks(), progress=lambda *args: progress.append(args)):
+            # Never more than max_pending chunks read ahead of the consumer
+            assert len(chunks_read) - len(results) <= 2
+            results.append(chunk)
+    finally:
+        executor.shutdown()
+    
+    assert [len(chunk['clima_risk_score']) for chunk in results] == [1_000, 1_000, 500]
+    assert progress == [(1_000, 1), (2_000, 2), (2_500, 3)]
+    
+    cell_latitudes, cell_longitudes, inverse = deduplicate_cells(latitudes, longitudes, 0.01)
+    expected = scorer.calculate_score_batch(cell_latitudes, cell_longitudes)
+    for name in RESULT_COLUMNS:
+        combined = np.concatenate([chunk[name] for chunk in results])
+        assert np.array_equal(combined, expected[name][inverse])
+
+
+def test_portfolio_scorer_process_workers():
+    """Test process workers give the same scores as in-process scoring, sync and async"""
+    scorer = CachedEnsembleScorer(EnsembleScorer(), cache=ScoreCache(), precision=0.01)
+    latitudes, longitudes = random_locations(600, seed=1)
+    inline = PortfolioScorer(ScoringExecutor("inline"), scorer, chunk_size=200)
+    expected = np.concatenate([
+        chunk['clima_risk_score'] for chunk in inline.score(latitudes, longitudes)
+    ])
+    
+    executor = ScoringExecutor("process", 2)
+    try:
+        engine = PortfolioScorer(executor, scorer, chunk_size=200)
+        rows = zip(latitudes.tolist(), longitudes.tolist())
+        streamed = np.concatenate([chunk['clima_risk_score'] for chunk in engine.score_rows(rows)])
+        gathered = asyncio.run(engine.score_async(latitudes, longitudes))
+    finally:
+        executor.shutdown()
+    
+    assert np.array_equal(streamed, expected)
+    assert np.array_equal(gathered['clima_risk_score'], expected)
+
+
+def test_score_csv(tmp_path):
+    """Test the CLI scorer keeps input columns and row order"""
+    latitudes, longitudes = random_locations(250, seed=2)
+    input_path = tmp_path / "properties.csv"
+    output_path = tmp_path / "scores.csv"
+    with open(input_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["property_id", "latitude", "longitude"])
+        for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            writer.writerow([f"p{i}", lat, lon])
+    
+    score_csv(str(input_path), str(output_path), workers=0, chunk_size=100, resolution=0.01)
+    
+    with open(output_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["property_id"] for row in rows] == [f"p{i}" for i in range(250)]
+    assert all(row["risk_level"] in ("low", "moderate", "high", "extreme") for row in rows)
+    assert all(0 <= float(row["clima_risk_score"]) <= 100 for row in rows)
+
+
+def test_score_csv_reports_bad_rows(tmp_path):
+    """Test rows without valid coordinates get an error instead of stopping the run"""
+    input_path = tmp_path / "properties.csv"
+    output_path = tmp_path / "scores.csv"
+    input_path.write_text(
+        "property_id,lat,lon\n"
+        "p0,19.0760,72.8777\n"
+        "p1,,72.8777\n"
+        "p2,north,72.8777\n"
+        "p3,95.0,72.8777\n"
+        "p4,28.6139,77.2090\n"
+    )
+    
+    score_csv(
+        str(input_path), str(output_path), workers=0, chunk_size=2, resolution=0.01,
+        latitude_column="lat", longitude_column="lon",
+    )
+    
+    with open(output_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["property_id"] for row in rows] == [f"p{i}" for i in range(5)]
+    assert [row["error"] for row in rows] == [
+        "",
+        "latitude and longitude are required numbers",
+        "latitude and longitude are required numbers",
+        "latitude or longitude out of range",
+        "",
+    ]
+    assert rows[0]["risk_level"] and rows[4]["risk_level"]
+    assert rows[1]["risk_level"] == rows[1]["clima_risk_score"] == ""
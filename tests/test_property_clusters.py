@@ -0,0 +1,160 @@
+"""
+Tests for property marker clustering
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_clusters
+from app.main import app
+from app.ml.property_clusters import (
+    CLUSTER_MAX_ZOOM,
+    ClusterIndex,
+    PropertyClusters,
+    synthetic_properties,
+)
+from app.ml.risk_tiles import RISK_TILE_TYPES
+
+client = TestClient(app)
+
+INDIA = (66.0, 5.0, 100.0, 38.0)
+
+
+@pytest.fixture(scope="module")
+def properties():
+    """Synthetic properties around Indian cities"""
+    return synthetic_properties(2000)
+
+
+def test_clusters_aggregate_their_properties(properties):
+    """Test every zoom partitions the properties into clusters with exact statistics"""
+    index = ClusterIndex()
+    index.upsert(properties)
+    band = RISK_TILE_TYPES.index('flood')
+    risks = dict(zip(properties.ids, properties.risks[:, band]))
+    
+    markers = {}
+    for zoom in (0, 4, 8, 12, CLUSTER_MAX_ZOOM):
+        clusters = index.clusters(INDIA, zoom, 'flood')
+        assert sum(cluster['count'] for cluster in clusters) == len(properties.ids)
+        markers[zoom] = len(clusters)
+        for cluster in clusters:
+            assert cluster['mean_risk'] <= cluster['max_risk']
+            if cluster['count'] == 1:
+                assert cluster['mean_risk'] == pytest.approx(risks[cluster['property_id']])
+            else:
+                assert cluster['property_id'] is None
+    assert markers[0] < markers[4] < markers[8] < markers[12] <= markers[CLUSTER_MAX_ZOOM]
+    
+    world = index.clusters((-180.0, -85.0, 180.0, 85.0), 0, 'flood')
+    counts = np.array([cluster['count'] for cluster in world])
+    means = np.array([cluster['mean_risk'] for cluster in world])
+    assert counts.sum() == len(properties.ids)
+    assert (counts * means).sum() / counts.sum() == pytest.approx(properties.risks[:, band].mean())
+    assert max(cluster['max_risk'] for cluster in world) == properties.risks[:, band].max()
+    
+    with pytest.raises(ValueError):
+        index.clusters(INDIA, 4, 'wind')
+
+
+def test_deep_zoom_lists_properties(properties):
+    """Test zooms past CLUSTER_MAX_ZOOM list each property in the bbox"""
+    index = ClusterIndex()
+    index.upsert(properties)
+    bbox = (77.0, 28.4, 77.4, 28.8)
+    expected = {
+        property_id
+        for property_id, latitude, longitude in zip(properties.ids, properties.latitudes, properties.longitudes)
+        if 77.0 <= longitude <= 77.4 and 28.4 <= latitude <= 28.8
+    }
+    
+    found = index.clusters(bbox, CLUSTER_MAX_ZOOM + 1)
+    assert {cluster['property_id'] for cluster in found} == expected
+    assert all(cluster['count'] == 1 for cluster in found)
+    assert ClusterIndex().clusters(INDIA, 4) == []
+
+
+def test_upsert_and_remove(properties):
+    """Test updated properties move and rescore, and removed ones drop out"""
+    index = ClusterIndex()
+    index.upsert(properties)
+    index.clusters(INDIA, 8)
+    
+    moved = properties.ids[0]
+    index.upsert(properties._replace(
+        ids=[moved],
+        latitudes=np.array([8.0]),
+        longitudes=np.array([93.0]),
+        risks=np.full((1, len(RISK_TILE_TYPES)), 99.0),
+    ))
+    assert len(index) == len(properties.ids)
+    cluster, = index.clusters((92.5, 7.5, 93.5, 8.5), 10)
+    assert cluster['property_id'] == moved and cluster['max_risk'] == 99.0
+    
+    index.remove([moved, 'unknown'])
+    assert len(index) == len(properties.ids) - 1
+    assert index.clusters((92.5, 7.5, 93.5, 8.5), 10) == []
+    assert sum(cluster['count'] for cluster in index.clusters(INDIA, 0)) == len(index)
+
+
+def test_tenants_refresh_incrementally(properties):
+    """Test refreshes load changes since the watermark and reloads load everything"""
+    stamp = datetime(2026, 1, 1)
+    calls = []
+    
+    def load(tenant_id, since):
+        calls.append((tenant_id, since))
+        if since is None:
+            return properties._replace(watermark=stamp)
+        changed = properties._replace(
+            ids=properties.ids[:1],
+            latitudes=properties.latitudes[:1],
+            longitudes=properties.longitudes[:1],
+            risks=np.zeros((1, len(RISK_TILE_TYPES))),
+            watermark=since + timedelta(minutes=1),
+        )
+        return changed
+    
+    clusters = PropertyClusters(load=load, refresh_seconds=0.0, reload_seconds=3600.0)
+    assert sum(cluster['count'] for cluster in clusters.clusters('acme', INDIA, 0)) == len(properties.ids)
+    assert calls == [('acme', None)]
+    
+    index = clusters.index('acme')
+    assert calls[-1] == ('acme', stamp)
+    assert clusters.index('acme') is index
+    assert calls[-1] == ('acme', stamp + timedelta(minutes=1))
+    assert len(index) == len(properties.ids)
+    assert index.risks[0].tolist() == [0.0] * len(RISK_TILE_TYPES)
+    
+    reloading = PropertyClusters(load=load, refresh_seconds=0.0, reload_seconds=0.0)
+    reloading.clusters('acme', INDIA, 0)
+    reloading.clusters('acme', INDIA, 0)
+    assert calls[-2:] == [('acme', None), ('acme', None)]
+
+
+def test_risk_map_clusters():
+    """Test GET /risk-map returns the tenant's clusters when asked"""
+    clusters = PropertyClusters(
+        load=lambda tenant_id, since: synthetic_properties(500),
+        refresh_seconds=3600.0,
+        reload_seconds=3600.0,
+    )
+    app.dependency_overrides[get_clusters] = lambda: clusters
+    try:
+        params = {'bbox': '66,5,100,38', 'zoom': 4}
+        response = client.get("/api/v1/risk-map", params=params)
+        assert response.status_code == 200
+        assert response.json()['clusters'] is None
+        
+        response = client.get("/api/v1/risk-map", params={**params, 'tenant_id': 'acme', 'risk_type': 'heat'})
+        assert response.status_code == 200
+        found = response.json()['clusters']
+        assert sum(cluster['count'] for cluster in found) == 500
+        assert {'latitude', 'longitude', 'mean_risk', 'max_risk', 'property_id'} <= set(found[0])
+        
+        app.dependency_overrides[get_clusters] = lambda: None
+        assert client.get("/api/v1/risk-map", params={**params, 'tenant_id': 'acme'}).status_code == 404
+    finally:
+        del app.dependency_overrides[get_clusters]
@@ -0,0 +1,228 @@
+"""
+Tests for the shared Redis score cache (against an in-process Redis stand-in)
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.ml.ensemble import EnsembleScorer
+from app.ml.redis_cache import (
+    LOCK_SUFFIX,
+    RELEASE_LOCK_SCRIPT,
+    RedisScoreCache,
+    TieredScoreCache,
+    encode_key,
+)
+from app.ml.score_cache import CachedEnsembleScorer, ScoreCache
+
+
+class FakeRedis:
+    """In-process stand-in for the subset of redis.Redis the cache uses"""
+    
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+    
+    def _live(self, name):
+        """Value of a key unless it has expired"""
+        if name in self.expires and self.expires[name] <= time.monotonic():
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return self.data.get(name)
+    
+    def get(self, name):
+        """GET"""
+        self.calls['get'] += 1
+        with self.lock:
+            return self._live(name)
+    
+    def mget(self, names):
+        """MGET"""
+        self.calls['mget'] += 1
+        with self.lock:
+            return [self._live(name) for name in names]
+    
+    def set(self, name, value, px=None, nx=False):
+        """SET with optional PX and NX"""
+        self.calls['set'] += 1
+        with self.lock:
+            if nx and self._live(name) is not None:
+                return None
+            self.data[name] = bytes(value)
+            self.expires.pop(name, None)
+            if px is not None:
+                self.expires[name] = time.monotonic() + px / 1000
+            return True
+    
+    def delete(self, *names):
+        """DEL"""
+        with self.lock:
+            for name in names:
+                self.data.pop(name, None)
+                self.expires.pop(name, None)
+    
+    def eval(self, script, numkeys, *args):
+        """EVAL of the lock release script (compare-and-delete)"""
+        assert script == RELEASE_LOCK_SCRIPT and numkeys == 1
+        name, token = args
+        with self.lock:
+            if self._live(name) != token:
+                return 0
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+            return 1
+    
+    def pipeline(self, transaction=True):
+        """Pipeline queueing SETs until execute"""
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queued commands of a FakeRedis pipeline"""
+    
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    def set(self, name, value, px=None, nx=False):
+        """Queue a SET"""
+        self.commands.append((name, value, px, nx))
+    
+    def execute(self):
+        """Send queued commands in one round trip"""
+        self.client.calls['pipeline'] += 1
+        return [self.client.set(*command) for command in self.commands]
+
+
+class BrokenRedis:
+    """Client whose every command fails, like an unreachable server"""
+    
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("redis is down")
+        return fail
+
+
+def test_redis_cache_round_trip_and_multi_get():
+    """Test binary storage, pipelined writes and single round-trip multi-get"""
+    client = FakeRedis()
+    cache = RedisScoreCache(client, ttl_seconds=60)
+    
+    values = {('score', i): {'clima_risk_score': 40.5 + i, 'risk_level': 'moderate'} for i in range(50)}
+    cache.set_many(values)
+    assert client.calls['pipeline'] == 1
+    assert all(isinstance(value, bytes) for value in client.data.values())
+    
+    keys = list(values) + [('score', 'missing')]
+    assert cache.get_many(keys) == list(values.values()) + [None]
+    assert client.calls['mget'] == 1
+    assert cache.stats()['hits'] == 50
+    assert cache.stats()['misses'] == 1
+
+
+def test_redis_cache_stampede_protection():
+    """Test a burst of identical cold requests computes the value once"""
+    cache = RedisScoreCache(FakeRedis(), ttl_seconds=60)
+    computations = []
+    
+    def compute():
+        computations.append(1)
+        time.sleep(0.2)
+        return {'clima_risk_score': 42.0}
+    
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(computations) == 1
+    assert results == [{'clima_risk_score': 42.0}] * 8
+    assert cache.stats()['lock_waits'] == 7
+
+
+def test_redis_cache_keeps_other_holders_locks():
+    """Test a computation outliving its lock leaves the next holder's lock in place"""
+    client = FakeRedis()
+    cache = RedisScoreCache(client, ttl_seconds=60, lock_timeout=0.05)
+    lock_name = encode_key('key') + LOCK_SUFFIX
+    
+    def slow_compute():
+        time.sleep(0.1)
+        # Meanwhile the lock expired and another worker took it
+        assert client.set(lock_name, b"other worker", nx=True, px=5000)
+        return 42
+    
+    assert cache.get_or_compute('key', slow_compute) == 42
+    assert client.data[lock_name] == b"other worker"
+    
+    # A computation finishing in time releases its own lock
+    assert cache.get_or_compute('fast', lambda: 1) == 1
+    assert client._live(encode_key('fast') + LOCK_SUFFIX) is None
+
+
+def test_app_imports_without_redis_packages():
+    """Test redis and msgpack are only needed once the Redis tier is enabled"""
+    code = "import sys; sys.modules['msgpack'] = sys.modules['redis'] = None; import app.api.deps"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+def test_redis_cache_early_expiry():
+    """Test hot keys are refreshed shortly before they expire"""
+    now = [1000.0]
+    draws = [0.5]
+    cache = RedisScoreCache(
+        FakeRedis(),
+        ttl_seconds=60,
+        clock=lambda: now[0],
+        random_source=lambda: draws[0],
+    )
+    cache.set('key', 'old', compute_seconds=2.0)
+    
+    # Far from expiry the stored value is served
+    assert cache.get_or_compute('key', lambda: 'new') == 'old'
+    
+    # Within a few compute-times of expiry one caller refreshes it
+    now[0] += 58.0
+    draws[0] = 0.9
+    assert cache.get_or_compute('key', lambda: 'new') == 'new'
+    assert cache.stats()['early_refreshes'] == 1
+    assert cache.get('key') == 'new'
+
+
+def test_tiered_cache_shared_between_workers():
+    """Test a second worker reuses scores another worker stored in Redis"""
+    client = FakeRedis()
+    scorer = EnsembleScorer()
+    first = CachedEnsembleScorer(scorer, TieredScoreCache(ScoreCache(), RedisScoreCache(client)))
+    second = CachedEnsembleScorer(scorer, TieredScoreCache(ScoreCache(), RedisScoreCache(client)))
+    
+    result = first.calculate_score(19.0760, 72.8777)
+    assert second.calculate_score(19.0760, 72.8777) == result
+    assert second.cache.stats()['remote']['hits'] == 1
+    
+    # Served locally from now on
+    second.calculate_score(19.0760, 72.8777)
+    assert second.cache.stats()['local']['hits'] == 1
+    assert second.cache.get_many([second.score_key(19.0760, 72.8777)]) == [result]
+
+
+def test_redis_cache_survives_redis_errors():
+    """Test an unreachable Redis degrades to recomputation"""
+    cache = TieredScoreCache(ScoreCache(), RedisScoreCache(BrokenRedis()))
+    
+    assert cache.get_or_compute('key', lambda: 7) == 7
+    assert cache.get_many(['other']) == [None]
+    cache.set('other', 8)
+    assert cache.get('other') == 8
+    assert cache.stats()['remote']['errors'] >= 3
@@ -0,0 +1,134 @@
+"""
+Tests for the process-wide model registry
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from app.api.deps import get_bulk_scorer, get_scorer
+from app.ml import risk_grid, risk_pyramid
+from app.ml.ensemble import EnsembleScorer
+from app.ml.models.flood_model import FloodRiskModel
+from app.ml.models.trained import TrainedModel
+from app.ml.registry import ModelRegistry, get_model_registry
+from app.ml.risk_grid import GridRiskLookup, build_risk_grid
+from app.ml.risk_pyramid import load_pyramid
+
+
+def test_registry_shares_one_scorer(tmp_path):
+    """Test every consumer gets the same models and scorer"""
+    registry = ModelRegistry(str(tmp_path))
+    scorer = registry.scorer
+    
+    assert registry.get('flood') is scorer.flood_model
+    assert registry.get('groundwater') is scorer.groundwater_model
+    assert registry.cached_scorer().scorer is scorer
+    assert registry.cached_scorer() is registry.cached_scorer()
+    assert registry.cached_scorer(0.01) is not registry.cached_scorer()
+    assert registry.get('risk_grid') is None  # nothing built under tmp_path
+    
+    # API dependencies hand out the process-wide instances
+    assert get_scorer() is get_scorer()
+    assert get_scorer().scorer is get_model_registry().scorer
+    assert get_bulk_scorer().scorer is get_scorer().scorer
+
+
+def test_registry_loads_artifacts_and_reports(tmp_path, monkeypatch):
+    """Test artifacts under the base path are loaded once and reported"""
+    build_risk_grid(str(tmp_path), resolution=1.0, bounds=(20.0, 22.0, 70.0, 72.0))
+    (tmp_path / "flood_model.joblib").write_bytes(b"")
+    loaded = []
+    monkeypatch.setattr(FloodRiskModel, 'load_model', lambda model, path: loaded.append(path))
+    
+    registry = ModelRegistry(str(tmp_path))
+    registry.preload()
+    registry.preload()
+    
+    assert loaded == [str(tmp_path / "flood_model.joblib")]
+    grid = registry.get('risk_grid')
+    assert isinstance(grid.grid, np.memmap)
+    assert registry.scorer.grid_lookup is grid
+    
+    report = {entry['name']: entry for entry in registry.report()}
+    assert set(report) == {
+        'rivers', 'coast', 'gazetteer', 'elevation', 'risk_grid',
+        'flood', 'heat', 'drought', 'groundwater', 'ensemble',
+    }
+    assert all(entry['load_seconds'] >= 0 for entry in report.values())
+    assert all(entry['resident_bytes'] is None or entry['resident_bytes'] >= 0
+               for entry in report.values())
+
+
+def _save_constant_flood_model(path):
+    """Save a trained flood artifact (version v7) that always predicts 99"""
+    from sklearn.dummy import DummyRegressor
+    
+    features = FloodRiskModel.FEATURES
+    TrainedModel.save(
+        DummyRegressor(strategy='constant', constant=99.0).fit(np.zeros((2, len(features))), [99.0, 99.0]),
+        path,
+        features,
+        "v7",
+    )
+
+
+def test_rule_grid_is_not_served_for_trained_models(tmp_path):
+    """Test a grid built from the rules is bypassed once an artifact is loaded"""
+    bounds = (20.0, 22.0, 70.0, 72.0)
+    build_risk_grid(str(tmp_path), resolution=1.0, bounds=bounds)
+    _save_constant_flood_model(str(tmp_path / "flood_model.joblib"))
+    
+    registry = ModelRegistry(str(tmp_path))
+    flood_model = registry.get('flood')
+    assert flood_model.predict(21, 71) == 99.0
+    assert registry.get('risk_grid') is None
+    assert registry.scorer.calculate_score(21, 71)['risk_breakdown']['flood'] == 99.0
+    assert registry.scorer.model_version.endswith("+flood.v7")
+    
+    rule_grid = GridRiskLookup.load(str(tmp_path))
+    assert EnsembleScorer(grid_lookup=rule_grid, models={'flood': flood_model}).grid_lookup is None
+    
+    # A grid evaluated from the trained model is served with it
+    trained_scorer = EnsembleScorer(models={'flood': flood_model})
+    build_risk_grid(str(tmp_path), resolution=1.0, bounds=bounds, scorer=trained_scorer)
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.scorer.grid_lookup is not None
+    assert registry.scorer.calculate_score(21, 71)['risk_breakdown']['flood'] == 99.0
+
+
+def test_grid_cli_builds_for_trained_models(tmp_path, monkeypatch):
+    """Test the grid CLI evaluates the trained artifacts it will be served with"""
+    _save_constant_flood_model(str(tmp_path / "flood_model.joblib"))
+    monkeypatch.setattr(sys, 'argv', [
+        'risk_grid', '--output', str(tmp_path), '--resolution', '1.0',
+        '--bounds', '20', '22', '70', '72',
+    ])
+    risk_grid.main()
+    
+    registry = ModelRegistry(str(tmp_path))
+    grid = registry.get('risk_grid')
+    assert grid is not None
+    assert grid.metadata['scoring_version'].endswith("+flood.v7")
+    assert registry.scorer.grid_lookup is grid
+    assert registry.scorer.calculate_score(21, 71)['risk_breakdown']['flood'] == 99.0
+
+
+def test_pyramid_cli_uses_the_served_grid(tmp_path, monkeypatch):
+    """Test the pyramid CLI builds on a trained-model grid and refuses a stale one"""
+    _save_constant_flood_model(str(tmp_path / "flood_model.joblib"))
+    build_risk_grid(str(tmp_path), resolution=1.0, bounds=(20.0, 22.0, 70.0, 72.0))
+    monkeypatch.setattr(sys, 'argv', ['risk_pyramid', '--grid', str(tmp_path)])
+    with pytest.raises(SystemExit):
+        risk_pyramid.main()
+    
+    monkeypatch.setattr(sys, 'argv', [
+        'risk_grid', '--output', str(tmp_path), '--resolution', '1.0',
+        '--bounds', '20', '22', '70', '72',
+    ])
+    risk_grid.main()
+    monkeypatch.setattr(sys, 'argv', ['risk_pyramid', '--grid', str(tmp_path)])
+    risk_pyramid.main()
+    
+    grid = ModelRegistry(str(tmp_path)).get('risk_grid')
+    assert load_pyramid(str(tmp_path), grid) is not None
@@ -0,0 +1,96 @@
+"""
+Tests for the precompiled risk grid
+"""
+import json
+import logging
+import os
+
+import numpy as np
+import pytest
+from app.ml.ensemble import EnsembleScorer
+from app.ml.fingerprint import scoring_version
+from app.ml.models.flood_model import FloodRiskModel
+from app.ml.risk_grid import (
+    RISK_GRID_METADATA_FILENAME,
+    GridRiskLookup,
+    build_risk_grid,
+    load_default_grid,
+)
+
+
+@pytest.fixture(scope="module")
+def grid_dir(tmp_path_factory):
+    """Small coarse grid around northern India"""
+    output_dir = tmp_path_factory.mktemp("risk_grid")
+    build_risk_grid(str(output_dir), resolution=0.25, bounds=(20.0, 32.0, 70.0, 80.0))
+    return str(output_dir)
+
+
+def test_grid_matches_live_models_at_cell_centres(grid_dir):
+    """Test grid values equal live model output at cell centres"""
+    lookup = GridRiskLookup.load(grid_dir)
+    latitudes = np.array([20.0, 23.0, 28.5, 29.25, 32.0])
+    longitudes = np.array([70.0, 72.75, 77.25, 75.0, 80.0])
+    
+    components, on_grid = lookup.lookup_batch(latitudes, longitudes)
+    live = EnsembleScorer()._predict_components_batch(latitudes, longitudes)
+    
+    assert on_grid.all()
+    for band, values in live.items():
+        assert components[band].tolist() == values.tolist()
+    assert lookup.lookup(28.5, 77.25) == {band: values[2] for band, values in live.items()}
+
+
+def test_grid_lookup_off_grid(grid_dir):
+    """Test points outside the grid are reported as off-grid"""
+    lookup = GridRiskLookup.load(grid_dir)
+    
+    _, on_grid = lookup.lookup_batch(np.array([19.0, 25.0, np.nan]), np.array([75.0, 90.0, 75.0]))
+    
+    assert not on_grid.any()
+    assert lookup.lookup(19.0, 75.0) is None
+
+
+def test_ensemble_uses_grid_with_live_fallback(grid_dir):
+    """Test the ensemble answers from the grid and falls back for custom inputs"""
+    lookup = GridRiskLookup.load(grid_dir)
+    live_scorer = EnsembleScorer()
+    grid_scorer = EnsembleScorer(grid_lookup=lookup)
+    
+    # Off-centre point: the grid answers with its nearest cell centre
+    grid_result = grid_scorer.calculate_score(latitude=28.51, longitude=77.24)
+    assert grid_result['risk_breakdown'] == live_scorer.calculate_score(
+        latitude=28.5, longitude=77.25
+    )['risk_breakdown']
+    
+    # Custom model inputs and off-grid points are evaluated live
+    assert grid_scorer.calculate_score(
+        latitude=28.51, longitude=77.24, elevation=5
+    )['risk_breakdown'] == live_scorer.calculate_score(
+        latitude=28.51, longitude=77.24, elevation=5
+    )['risk_breakdown']
+    
+    batch = grid_scorer.calculate_score_batch(np.array([28.5, 10.0]), np.array([77.25, 78.0]))
+    expected = live_scorer.calculate_score_batch(np.array([28.5, 10.0]), np.array([77.25, 78.0]))
+    assert batch['clima_risk_score'].tolist() == expected['clima_risk_score'].tolist()
+
+
+def test_grid_from_other_inputs_is_refused(tmp_path, caplog):
+    """Test a grid built from other rules, data or models is not loaded"""
+    build_risk_grid(str(tmp_path), resolution=1.0, bounds=(20.0, 22.0, 70.0, 72.0))
+    assert GridRiskLookup.load(str(tmp_path)).metadata['scoring_version'] == scoring_version()
+    assert load_default_grid(str(tmp_path)) is not None
+    
+    trained = FloodRiskModel()
+    trained.model_version = "v7"
+    with caplog.at_level(logging.WARNING, logger="app.ml.risk_grid"):
+        assert load_default_grid(str(tmp_path), {'flood': trained}) is None
+    assert "rebuild" in caplog.text
+    
+    metadata_path = os.path.join(str(tmp_path), RISK_GRID_METADATA_FILENAME)
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    metadata['scoring_version'] = "0.1.0+rules.000000000000"
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f)
+    assert load_default_grid(str(tmp_path)) is None
@@ -0,0 +1,88 @@
+"""
+Tests for the risk grid pyramid
+"""
+import numpy as np
+import pytest
+
+from app.ml.ensemble import EnsembleScorer
+from app.ml.risk_grid import GridRiskLookup, build_risk_grid
+from app.ml.risk_pyramid import _grid_values, build_risk_pyramid, reduce_blocks
+from app.ml.risk_tiles import render_tile, risk_layer, tile_pixel_coordinates, tile_version
+
+
+@pytest.fixture(scope="module")
+def grid_dir(tmp_path_factory):
+    """Directory with a small coarse grid around northern India and its pyramid"""
+    output_dir = str(tmp_path_factory.mktemp("risk_pyramid"))
+    grid = build_risk_grid(output_dir, resolution=0.25, bounds=(20.0, 32.0, 70.0, 80.0))
+    build_risk_pyramid(grid, output_dir, EnsembleScorer().weights, levels=3)
+    return output_dir
+
+
+def test_reduce_blocks_matches_numpy():
+    """Test block mean, max and p90 equal numpy's over each block, ignoring padding"""
+    values = np.random.default_rng(0).uniform(0, 100, size=(8, 8, 2)).astype(np.float32)
+    values[6:, :, :] = np.nan
+    values[:, 7, :] = np.nan
+    
+    reduced = reduce_blocks(values, 4)
+    for row in range(2):
+        for col in range(2):
+            block = values[row * 4:(row + 1) * 4, col * 4:(col + 1) * 4].reshape(-1, 2)
+            block = block[~np.isnan(block).any(axis=1)]
+            assert np.allclose(reduced['mean'][row, col], block.mean(axis=0))
+            assert np.allclose(reduced['max'][row, col], block.max(axis=0))
+            assert np.allclose(reduced['p90'][row, col], np.percentile(block, 90, axis=0))
+
+
+def test_pyramid_levels_reduce_the_grid(grid_dir):
+    """Test levels hold the block statistics of the grid and load with it"""
+    grid = GridRiskLookup.load(grid_dir)
+    pyramid = grid.pyramid
+    assert pyramid is not None and pyramid.n_levels == 3
+    assert pyramid.bands[-1] == 'overall'
+    
+    values = _grid_values(grid, EnsembleScorer().weights, 0, grid.n_lat)
+    level = pyramid.overview(2, 'max')
+    assert level.shape == (-(-grid.n_lat // 4), -(-grid.n_lon // 4), len(pyramid.bands))
+    assert np.allclose(level[1, 2], values[4:8, 8:12].reshape(-1, len(pyramid.bands)).max(axis=0), atol=0.05)
+    assert (pyramid.overview(2, 'mean') <= level).all()
+    
+    assert pyramid.level_for(0.1) == 0
+    assert pyramid.level_for(1.0) == 2
+    assert pyramid.level_for(100.0) == 3
+    with pytest.raises(ValueError):
+        pyramid.overview(1, 'min')
+    
+
+def test_rebuilt_grid_ignores_stale_pyramid(tmp_path):
+    """Test a grid rebuilt after its pyramid is loaded without it"""
+    bounds = (20.0, 24.0, 70.0, 74.0)
+    grid = build_risk_grid(str(tmp_path), resolution=0.25, bounds=bounds)
+    build_risk_pyramid(grid, str(tmp_path), EnsembleScorer().weights)
+    assert GridRiskLookup.load(str(tmp_path)).pyramid is not None
+    
+    build_risk_grid(str(tmp_path), resolution=0.25, bounds=bounds)
+    assert GridRiskLookup.load(str(tmp_path)).pyramid is None
+
+
+def test_low_zoom_tiles_read_the_pyramid(grid_dir):
+    """Test low-zoom layers come from the pyramid, worst case at least the mean"""
+    scorer = EnsembleScorer(grid_lookup=GridRiskLookup.load(grid_dir))
+    latitudes, longitudes = tile_pixel_coordinates(1, 1, 0)
+    pixel_size = 360.0 / 2 ** 1 / 256
+    assert scorer.grid_lookup.pyramid.level_for(pixel_size) == 1
+    
+    mean = risk_layer(scorer, 'overall', latitudes, longitudes, pixel_size=pixel_size)
+    worst = risk_layer(scorer, 'overall', latitudes, longitudes, aggregation='max', pixel_size=pixel_size)
+    sampled = risk_layer(scorer, 'overall', latitudes, longitudes)
+    
+    on_grid = sampled != 255
+    assert ((mean == 255) == ~on_grid).all() and ((worst == 255) == ~on_grid).all()
+    assert (worst[on_grid] >= mean[on_grid]).all()
+    assert (worst[on_grid] != mean[on_grid]).any()
+    
+    assert render_tile(scorer, 'overall', 1, 1, 0, 'p90') != render_tile(scorer, 'overall', 1, 1, 0)
+    assert tile_version(scorer) != scorer.model_version
+    with pytest.raises(ValueError):
+        render_tile(scorer, 'overall', 1, 1, 0, 'min')
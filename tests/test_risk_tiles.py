@@ -0,0 +1,97 @@
+"""
+Tests for risk map tile rendering
+"""
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from app.ml.ensemble import EnsembleScorer
+from app.ml.risk_grid import build_risk_grid
+from app.ml.risk_tiles import (
+    NODATA_INDEX,
+    RISK_COLORMAP,
+    _quantize,
+    encode_png,
+    render_tile,
+    risk_layer,
+    tile_bounds,
+    tile_pixel_coordinates,
+    tiles_covering,
+)
+
+
+@pytest.fixture(scope="module")
+def grid_scorer(tmp_path_factory):
+    """Scorer on a small coarse grid around northern India"""
+    output_dir = tmp_path_factory.mktemp("risk_grid")
+    lookup = build_risk_grid(str(output_dir), resolution=0.25, bounds=(20.0, 32.0, 70.0, 80.0))
+    return EnsembleScorer(grid_lookup=lookup)
+
+
+def _decode_png(data: bytes):
+    """(indices, palette RGB, palette alpha) of an 8-bit palette PNG"""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, offset = {}, 8
+    while offset < len(data):
+        length, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        chunks[kind] = data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+    width, height, depth, color_type = struct.unpack(">IIBB", chunks[b"IHDR"][:10])
+    assert (depth, color_type) == (8, 3)
+    scanlines = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, width + 1)
+    assert not scanlines[:, 0].any()
+    return scanlines[:, 1:], chunks[b"PLTE"], chunks[b"tRNS"]
+
+
+def test_tile_addressing():
+    """Test pixel centres lie inside their tile and bbox covering finds the tile"""
+    x, y = tiles_covering((77.2090, 28.6139, 77.2090, 28.6139), 10)
+    assert (x, y) == (range(731, 732), range(426, 427))
+    
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(10, 731, 426)
+    latitudes, longitudes = tile_pixel_coordinates(10, 731, 426)
+    assert min_lat < latitudes.min() and latitudes.max() < max_lat
+    assert min_lon < longitudes.min() and longitudes.max() < max_lon
+    assert (np.diff(latitudes) < 0).all()
+    assert tiles_covering((-180, -85, 180, 85), 0) == (range(0, 1), range(0, 1))
+
+
+def test_grid_layer_matches_per_point_grid_lookup(grid_scorer):
+    """Test the row x column grid gather equals per-pixel grid scoring"""
+    latitudes, longitudes = tile_pixel_coordinates(6, 44, 27)
+    lat_grid, lon_grid = np.meshgrid(latitudes, longitudes, indexing='ij')
+    components, on_grid = grid_scorer.grid_lookup.lookup_batch(lat_grid, lon_grid)
+    results = grid_scorer.calculate_score_batch(lat_grid.ravel(), lon_grid.ravel())
+    
+    overall = risk_layer(grid_scorer, 'overall', latitudes, longitudes)
+    flood = risk_layer(grid_scorer, 'flood', latitudes, longitudes)
+    
+    assert on_grid.any() and not on_grid.all()
+    assert (overall[~on_grid] == NODATA_INDEX).all()
+    expected = _quantize(results['clima_risk_score']).reshape(overall.shape)
+    assert (overall[on_grid] == expected[on_grid]).all()
+    assert (flood[on_grid] == _quantize(components['flood'])[on_grid]).all()
+
+
+def test_render_tile_png(grid_scorer):
+    """Test tiles encode as palette PNGs and tiles outside coverage are transparent"""
+    indices, palette, alpha = _decode_png(render_tile(grid_scorer, 'heat', 6, 45, 27))
+    assert indices.shape == (256, 256)
+    assert palette == RISK_COLORMAP[:, :3].tobytes()
+    assert alpha[NODATA_INDEX] == 0 and alpha[0] == 255
+    
+    empty, _, _ = _decode_png(render_tile(grid_scorer, 'heat', 6, 0, 0))
+    assert (empty == NODATA_INDEX).all()
+    
+    with pytest.raises(ValueError):
+        render_tile(grid_scorer, 'heat', 1, 2, 0)
+    with pytest.raises(ValueError):
+        render_tile(grid_scorer, 'wind', 1, 0, 0)
+
+
+def test_encode_png_round_trip():
+    """Test encoded indices decode unchanged"""
+    indices = np.random.default_rng(0).integers(0, 256, size=(16, 32), dtype=np.uint8)
+    decoded, _, _ = _decode_png(encode_png(indices))
+    assert (decoded == indices).all()
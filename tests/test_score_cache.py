@@ -0,0 +1,133 @@
+"""
+Tests for the in-process score cache
+"""
+import threading
+
+from app import __version__
+from app.ml import fingerprint
+from app.ml.ensemble import EnsembleScorer
+from app.ml.score_cache import CachedEnsembleScorer, ScoreCache, snap_coordinates
+
+
+class FakeClock:
+    """Manually advanced time source"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        """Current fake time in seconds"""
+        return self.now
+
+
+def test_score_cache_lru_and_ttl():
+    """Test LRU eviction, expiry and the hit/miss/eviction counters"""
+    clock = FakeClock()
+    cache = ScoreCache(max_size=2, ttl_seconds=10, clock=clock)
+    
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    
+    clock.now = 11
+    assert cache.get('a') is None
+    assert cache.stats() == {
+        'size': 1,
+        'max_size': 2,
+        'hits': 2,
+        'misses': 2,
+        'evictions': 1,
+        'expirations': 1,
+    }
+    
+    calls = []
+    assert cache.get_or_compute('d', lambda: calls.append(1) or 4) == 4
+    assert cache.get_or_compute('d', lambda: calls.append(1) or 5) == 4
+    assert len(calls) == 1
+
+
+def test_score_cache_thread_safety():
+    """Test concurrent readers and writers keep the cache consistent"""
+    cache = ScoreCache(max_size=50)
+    
+    def worker(offset):
+        for i in range(2000):
+            key = (offset + i) % 80
+            if cache.get(key) is None:
+                cache.set(key, key)
+    
+    threads = [threading.Thread(target=worker, args=(n * 7,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    stats = cache.stats()
+    assert stats['size'] == len(cache) <= 50
+    assert stats['hits'] + stats['misses'] == 8 * 2000
+    assert all(cache.get(key) in (None, key) for key in range(80))
+
+
+def test_cached_ensemble_scorer():
+    """Test cache keys cover the cell, inputs and model version"""
+    scorer = EnsembleScorer()
+    cached = CachedEnsembleScorer(scorer, cache=ScoreCache(), precision=0.01)
+    
+    first = cached.calculate_score(28.6139, 77.2090)
+    assert cached.calculate_score(28.6121, 77.2102) is first  # same cell
+    assert cached.cache.stats()['hits'] == 1
+    
+    latitude, longitude, _ = snap_coordinates(28.6139, 77.2090, 0.01)
+    assert first['risk_breakdown'] == scorer.calculate_score(latitude, longitude)['risk_breakdown']
+    
+    # Inputs that change the result get their own entries
+    assert cached.calculate_score(28.6139, 77.2090, elevation=5.0) is not first
+    assert cached.calculate_score(28.6139, 77.2090, "commercial") is not first
+    assert cached.calculate_score(28.6139, 77.2090, area_sqm=None) is first
+    scorer.model_version = "retrained"
+    assert cached.calculate_score(28.6139, 77.2090) is not first
+    
+    forecast = cached.forecast(28.6139, 77.2090, years=[5, 10])
+    assert cached.forecast(28.6139, 77.2090, years=[5, 10]) is forecast
+    assert cached.forecast(28.6139, 77.2090, years=[5]) is not forecast
+    
+    # Everything else passes through to the scorer
+    assert cached.weights is scorer.weights
+
+
+def test_cached_calculate_score_many():
+    """Test batched scoring matches single scoring and shares its cache entries"""
+    scorer = EnsembleScorer()
+    cached = CachedEnsembleScorer(scorer, cache=ScoreCache(), precision=0.01)
+    hit = cached.calculate_score(28.6139, 77.2090)
+    requests = [
+        {'latitude': 28.6139, 'longitude': 77.2090},
+        {'latitude': 19.0760, 'longitude': 72.8777, 'property_type': 'commercial', 'floor': 3},
+        {'latitude': 12.9716, 'longitude': 77.5946, 'elevation': 900.0},
+    ]
+    
+    results = cached.calculate_score_many(requests)
+    
+    assert results[0] is hit
+    for request, result in zip(requests[1:], results[1:]):
+        single = CachedEnsembleScorer(scorer, cache=ScoreCache(), precision=0.01)
+        expected = single.calculate_score(**request)
+        assert result['risk_breakdown'] == expected['risk_breakdown']
+        assert result['clima_risk_score'] == expected['clima_risk_score']
+        assert cached.calculate_score(**request) is result
+
+
+def test_scoring_changes_get_new_cache_keys(monkeypatch):
+    """Test the model version (and so every key) follows the rules and data fingerprint"""
+    cache = ScoreCache()
+    scorer = EnsembleScorer()
+    assert scorer.model_version == f"{__version__}+rules.{fingerprint.rules_fingerprint()}"
+    first = CachedEnsembleScorer(scorer, cache=cache).calculate_score(28.6139, 77.2090)
+    
+    monkeypatch.setattr(fingerprint, "rules_fingerprint", lambda: "changedrules")
+    changed = EnsembleScorer()
+    assert changed.model_version == f"{__version__}+rules.changedrules"
+    assert CachedEnsembleScorer(changed, cache=cache).calculate_score(28.6139, 77.2090) is not first
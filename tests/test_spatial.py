@@ -0,0 +1,293 @@
+"""
+Tests for spatial indexes and regional rule tables
+"""
+import numpy as np
+import pytest
+from app.ml.spatial.coast import (
+    CoastDistanceGrid,
+    CoastDistanceSampler,
+    build_coast_distance_grid,
+    get_coast_sampler,
+    load_coastline,
+)
+from app.ml.spatial.elevation import DemTile, ElevationService
+from app.ml.spatial.gazetteer import get_urban_gazetteer
+from app.ml.spatial.grid_index import GridIndex
+from app.ml.spatial.kdtree import SegmentKDTree
+from app.ml.spatial.rtree import PackedRTree
+from app.ml.spatial.regions import RegionTable, load_region_tables
+from app.ml.spatial.rivers import get_river_network
+
+
+def test_packed_rtree_matches_brute_force():
+    """Test tree queries return exactly the containing boxes"""
+    rng = np.random.default_rng(0)
+    centres = rng.uniform([66, 5], [100, 38], (500, 2))
+    sizes = rng.uniform(0, 2, (500, 2))
+    boxes = np.column_stack([centres - sizes, centres + sizes])
+    tree = PackedRTree(boxes, node_capacity=8)
+    
+    x = rng.uniform(66, 100, 300)
+    y = rng.uniform(5, 38, 300)
+    points, ids = tree.query_points(x, y)
+    
+    expected = set()
+    for i in range(len(x)):
+        inside = np.nonzero(
+            (boxes[:, 0] <= x[i]) & (x[i] <= boxes[:, 2]) &
+            (boxes[:, 1] <= y[i]) & (y[i] <= boxes[:, 3])
+        )[0].tolist()
+        expected.update((i, j) for j in inside)
+        assert sorted(tree.query_point(x[i], y[i])) == inside
+    assert set(zip(points.tolist(), ids.tolist())) == expected
+
+
+def test_region_table_priority_and_edges():
+    """Test overlapping regions, exclusive edges, polygons and defaults"""
+    table = RegionTable(
+        [
+            {"value": 1, "priority": 1, "min_lat": 0, "max_lat": 10, "min_lon": 0, "max_lon": 10},
+            {"value": 2, "priority": 5, "min_lat": 5, "max_lat": 10, "min_lon": 5, "max_lon": 10,
+             "max_lat_inclusive": False},
+            {"value": 3, "polygon": [[20, 0], [30, 0], [20, 10]]},
+        ],
+        default=0,
+    )
+    latitudes = np.array([1.0, 6.0, 10.0, 2.0, 8.0, 50.0])
+    longitudes = np.array([1.0, 6.0, 6.0, 21.0, 29.0, 50.0])
+    expected = [1, 2, 1, 3, 0, 0]
+    
+    assert [table.lookup(lat, lon) for lat, lon in zip(latitudes, longitudes)] == expected
+    assert table.lookup_batch(latitudes, longitudes).tolist() == expected
+
+
+def test_bundled_regional_rules():
+    """Test bundled tables reproduce known regional values"""
+    tables = load_region_tables()
+    
+    # Punjab-Haryana is a critical groundwater zone
+    assert tables['groundwater_regional_risk'].lookup(30.0, 75.0) == 85
+    # Southern edge of the monsoon latitudes is exclusive for the southern region
+    assert tables['drought_precipitation'].lookup(17.9, 78.0) == 40
+    assert tables['drought_precipitation'].lookup(18.0, 78.0) == 50
+    # Agricultural intensity leaves unmatched locations to the urban check
+    assert tables['groundwater_agricultural_intensity'].lookup(12.97, 77.59) is None
+
+
+def test_grid_index_matches_brute_force():
+    """Test bucket grid queries return exactly the containing boxes"""
+    rng = np.random.default_rng(1)
+    centres = rng.uniform([66, 5], [100, 38], (500, 2))
+    sizes = rng.uniform(0, 0.5, (500, 2))
+    boxes = np.column_stack([centres - sizes, centres + sizes])
+    index = GridIndex(boxes)
+    
+    x = np.append(rng.uniform(65, 101, 300), np.nan)
+    y = np.append(rng.uniform(4, 39, 300), 20.0)
+    points, ids = index.query_points(x, y)
+    
+    expected = set()
+    for i in range(len(x)):
+        inside = np.nonzero(
+            (boxes[:, 0] <= x[i]) & (x[i] <= boxes[:, 2]) &
+            (boxes[:, 1] <= y[i]) & (y[i] <= boxes[:, 3])
+        )[0].tolist()
+        expected.update((i, j) for j in inside)
+        assert sorted(index.query_point(x[i], y[i])) == inside
+    assert set(zip(points.tolist(), ids.tolist())) == expected
+
+
+def test_urban_gazetteer():
+    """Test urban detection uses great-circle radii and batch matches scalar"""
+    gazetteer = get_urban_gazetteer()
+    
+    assert gazetteer.centre(gazetteer.nearest_urban_centre(28.6139, 77.2090))['name'] == 'Delhi'
+    assert gazetteer.is_urban(19.2183, 72.9781)  # Thane, within Mumbai's radius
+    assert gazetteer.is_urban(12.9716, 77.5946)
+    assert not gazetteer.is_urban(26.0, 75.0)
+    
+    rng = np.random.default_rng(2)
+    latitudes = rng.uniform(8, 35, 2000)
+    longitudes = rng.uniform(68, 97, 2000)
+    nearest, distances = gazetteer.nearest_urban_centres(latitudes, longitudes)
+    for i in range(len(latitudes)):
+        expected = gazetteer.nearest_urban_centre(latitudes[i], longitudes[i])
+        assert nearest[i] == (-1 if expected is None else expected)
+    covered = nearest >= 0
+    assert np.all(distances[covered] <= gazetteer.radii_km[nearest[covered]])
+    assert np.array_equal(gazetteer.is_urban_batch(latitudes, longitudes), covered)
+
+
+def test_segment_kdtree_matches_brute_force():
+    """Test nearest-segment queries against an exhaustive search"""
+    rng = np.random.default_rng(3)
+    starts = rng.uniform(-1, 1, (400, 3))
+    ends = starts + rng.normal(0, 0.05, (400, 3))
+    ends[:50] = starts[:50]  # Zero-length segments behave as points
+    tree = SegmentKDTree(starts, ends, leaf_size=8)
+    
+    points = rng.uniform(-1.5, 1.5, (200, 3))
+    points[0] = np.nan
+    direction = ends - starts
+    length2 = np.maximum((direction ** 2).sum(axis=1), 1e-300)
+    
+    for max_distance in (np.inf, 0.1):
+        distances, indices = tree.query(points, max_distance=max_distance)
+        assert distances[0] == np.inf and indices[0] == -1
+        for i in range(1, len(points)):
+            along = np.clip(((points[i] - starts) * direction).sum(axis=1) / length2, 0, 1)
+            expected = np.sqrt(((points[i] - starts - along[:, None] * direction) ** 2).sum(axis=1))
+            if expected.min() < max_distance:
+                assert distances[i] == pytest.approx(expected.min())
+                assert expected[indices[i]] == pytest.approx(expected.min())
+            else:
+                assert distances[i] == np.inf and indices[i] == -1
+            assert tree.query_point(points[i], max_distance)[0] == pytest.approx(distances[i])
+
+
+def test_river_network_distances():
+    """Test nearest-river distances on the bundled network"""
+    rivers = get_river_network()
+    
+    distance, name = rivers.nearest_river(25.3176, 83.0104)  # Varanasi ghats
+    assert name == 'Ganga' and distance < 2
+    assert rivers.nearest_river(28.6139, 77.2090)[1] == 'Yamuna'
+    assert rivers.distance_km(26.0, 75.0) > 100
+    assert rivers.distance_km(26.0, 75.0, max_distance_km=40) == np.inf
+    
+    rng = np.random.default_rng(4)
+    latitudes = np.append(rng.uniform(8, 35, 500), np.nan)
+    longitudes = np.append(rng.uniform(68, 97, 500), 80.0)
+    distances = rivers.distances_km(latitudes, longitudes)
+    assert distances[-1] == np.inf
+    for i in range(len(latitudes) - 1):
+        assert rivers.distance_km(latitudes[i], longitudes[i]) == pytest.approx(distances[i])
+
+
+def test_coast_distance_raster(tmp_path):
+    """Test the distance-to-coast raster against direct coastline distances"""
+    coastline = load_coastline()
+    grid = build_coast_distance_grid(str(tmp_path), resolution=0.25, bounds=(15.0, 25.0, 68.0, 78.0))
+    sampler = CoastDistanceSampler(coastline, CoastDistanceGrid.load(str(tmp_path)))
+    
+    # Grid points hold the exact distance; samples between them interpolate
+    assert grid.distance_km(19.0, 73.0) == pytest.approx(coastline.distance_km(19.0, 73.0), rel=1e-6)
+    rng = np.random.default_rng(5)
+    latitudes = np.append(rng.uniform(14, 26, 300), np.nan)
+    longitudes = np.append(rng.uniform(67, 79, 300), 70.0)
+    distances = sampler.distances_km(latitudes, longitudes)
+    exact = coastline.distances_km(latitudes, longitudes)
+    assert np.allclose(distances[:-1], exact[:-1], atol=20)
+    assert distances[-1] == np.inf
+    
+    # Outside the raster the coastline is measured directly
+    outside = (latitudes < 15) | (latitudes > 25) | (longitudes < 68) | (longitudes > 78)
+    assert np.array_equal(distances[outside], exact[outside])
+    for i in range(len(latitudes)):
+        assert sampler.distance_km(latitudes[i], longitudes[i]) == pytest.approx(distances[i])
+
+
+def test_default_coast_sampler():
+    """Test coastal classification shared by the models"""
+    coast = get_coast_sampler()
+    
+    assert coast.is_coastal(19.0760, 72.8777)  # Mumbai
+    assert coast.is_coastal(13.0827, 80.2707)  # Chennai
+    assert not coast.is_coastal(28.6139, 77.2090)  # Delhi
+    assert coast.distance_km(28.6139, 77.2090) > 500
+
+
+def write_hgt_tile(directory, latitude, longitude, size=11, void=None):
+    """Write an SRTM tile whose elevation is 1000 m per degree north plus 100 m per degree east"""
+    rows = latitude + 1 - np.arange(size)[:, None] / (size - 1)
+    cols = longitude + np.arange(size)[None, :] / (size - 1)
+    values = np.rint(1000 * (rows - 28) + 100 * (cols - 77)).astype('>i2')
+    if void is not None:
+        values[void] = -32768
+    name = f"N{latitude:02d}E{longitude:03d}.hgt"
+    values.tofile(str(directory / name))
+
+
+def test_dem_elevation_sampling(tmp_path):
+    """Test bilinear DEM sampling, coverage gaps and voids"""
+    write_hgt_tile(tmp_path, 28, 77, void=(0, 0))
+    write_hgt_tile(tmp_path, 28, 78)
+    service = ElevationService(str(tmp_path))
+    assert len(service) == 2
+    
+    # A planar surface is reproduced exactly between samples
+    assert service.elevation(28.25, 77.35) == pytest.approx(285.0)
+    assert service.elevation(28.55, 78.05) == pytest.approx(655.0)
+    assert service.elevation(30.0, 77.5) is None
+    assert service.elevation(28.99, 77.01) is None  # next to the void
+    
+    latitudes = np.array([28.25, 28.55, 30.0, 28.99, np.nan, 28.123, 28.0])
+    longitudes = np.array([77.35, 78.05, 77.5, 77.01, 77.5, 78.987, 79.0])
+    elevations = service.elevations(latitudes, longitudes)
+    for i in range(len(latitudes)):
+        expected = service.elevation(latitudes[i], longitudes[i])
+        if expected is None:
+            assert np.isnan(elevations[i])
+        else:
+            assert elevations[i] == expected
+    
+    # Batches without a finite point (e.g. chunks of invalid rows) sample nothing
+    assert service.elevations(np.array([]), np.array([])).shape == (0,)
+    assert np.isnan(service.elevations(np.array([np.nan, 28.5]), np.array([77.5, np.inf]))).all()
+
+
+def test_dem_tile_cache(tmp_path, monkeypatch):
+    """Test batches decode each tile once and the cache respects its budget"""
+    for longitude in (77, 78, 79):
+        write_hgt_tile(tmp_path, 28, longitude)
+    tile_bytes = 11 * 11 * 4
+    service = ElevationService(str(tmp_path), cache_bytes=2 * tile_bytes)
+    
+    decodes = []
+    original_decode = DemTile.decode
+    monkeypatch.setattr(DemTile, 'decode', lambda tile: decodes.append(tile) or original_decode(tile))
+    
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(28, 29, 3000)
+    longitudes = rng.uniform(77, 80, 3000)
+    elevations = service.elevations(latitudes, longitudes)
+    assert len(decodes) == 3
+    assert service.cached_bytes == 2 * tile_bytes
+    assert elevations == pytest.approx(1000 * (latitudes - 28) + 100 * (longitudes - 77), abs=1.0)
+    
+    # The least recently used tile was evicted; the other two are reused
+    service.elevations(latitudes[longitudes >= 78], longitudes[longitudes >= 78])
+    assert len(decodes) == 3
+    service.elevations(np.array([28.5]), np.array([77.5]))
+    assert len(decodes) == 4
+    assert service.cached_bytes == 2 * tile_bytes
+
+
+
+def test_dem_geotiff_tiles_read_once(tmp_path, monkeypatch):
+    """Test tiles decoded on read (GeoTIFF) are opened once while cached"""
+    for longitude in (77, 78):
+        write_hgt_tile(tmp_path, 28, longitude)
+    service = ElevationService(str(tmp_path), cache_bytes=11 * 11 * 4)
+    
+    # Read the tiles into memory as GeoTIFF tiles are
+    opens = []
+    original_open = DemTile.open.__func__
+    
+    def open_in_memory(cls, path, latitude, longitude):
+        opens.append(path)
+        tile = original_open(cls, path, latitude, longitude)
+        return cls(tile.decode(), tile.north, tile.west, tile.step_lat, tile.step_lon)
+    
+    monkeypatch.setattr(DemTile, 'open', classmethod(open_in_memory))
+    
+    assert service.elevation(28.25, 77.35) == pytest.approx(285.0)
+    assert service.elevation(28.75, 77.5) == pytest.approx(800.0)
+    assert service.elevations(np.array([28.5, 28.6]), np.array([77.5, 77.2])) == pytest.approx([550.0, 620.0])
+    assert len(opens) == 1
+    
+    # Over budget the least recently used tile is dropped and read again
+    assert service.elevation(28.5, 78.5) == pytest.approx(650.0)
+    assert service.elevation(28.5, 77.5) == pytest.approx(550.0)
+    assert len(opens) == 3
+    assert service.cached_bytes == 11 * 11 * 4
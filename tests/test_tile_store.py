@@ -0,0 +1,89 @@
+"""
+Tests for the MBTiles risk tile store
+"""
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_tiles
+from app.main import app
+from app.ml import fingerprint
+from app.ml.ensemble import EnsembleScorer
+from app.ml.registry import get_model_registry
+from app.ml.risk_tiles import render_tile, tile_version
+from app.ml.tile_store import TileStore, seed_tiles
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Tile store in a temporary directory, used by the API"""
+    store = TileStore(str(tmp_path / "tiles.mbtiles"))
+    app.dependency_overrides[get_tiles] = lambda: store
+    yield store
+    app.dependency_overrides.clear()
+
+
+def test_store_keys_tiles_by_layer_and_model_version(store):
+    """Test tiles are stored per risk type and model version with TMS rows"""
+    store.put("flood", "v1", 3, 5, 1, b"tile-v1")
+    store.put("flood", "v2", 3, 5, 1, b"tile-v2")
+    
+    assert store.get("flood", "v1", 3, 5, 1) == b"tile-v1"
+    assert store.get("flood", "v2", 3, 5, 1) == b"tile-v2"
+    assert store.get("heat", "v1", 3, 5, 1) is None
+    assert store.get("flood", "v1", 3, 5, 1, aggregation="max") is None
+    assert store.existing("flood", "v1", 3) == {(5, 1)}
+    
+    rows = sqlite3.connect(store.path).execute("SELECT DISTINCT tile_row FROM tiles").fetchall()
+    assert rows == [(6,)]
+    
+    assert store.prune("v2") == 1
+    assert store.get("flood", "v1", 3, 5, 1) is None
+
+
+def test_rule_and_data_changes_retire_stored_tiles(store, monkeypatch):
+    """Test tiles rendered before a rule or data change are not found under the new version"""
+    before = tile_version(EnsembleScorer())
+    assert fingerprint.rules_fingerprint() in before
+    store.put("flood", before, 3, 5, 1, b"old rules")
+    
+    monkeypatch.setattr(fingerprint, "rules_fingerprint", lambda: "changedrules")
+    after = tile_version(EnsembleScorer())
+    assert after != before
+    assert store.get("flood", after, 3, 5, 1) is None
+    assert store.prune(after) == 1
+
+
+def test_seed_tiles_resumes(store):
+    """Test seeding stores rendered tiles and skips those already stored"""
+    bbox = (76.0, 27.0, 78.0, 29.0)
+    model_version = tile_version(get_model_registry().scorer)
+    
+    first = seed_tiles(store, ["heat"], (2, 4), bbox, workers=0)
+    again = seed_tiles(store, ["heat"], (2, 4), bbox, workers=0)
+    
+    assert first["tiles"] == 3
+    assert again["tiles"] == 0
+    assert store.get("heat", model_version, 4, 11, 6) == render_tile(
+        get_model_registry().scorer, "heat", 4, 11, 6
+    )
+    assert seed_tiles(store, ["heat"], (4, 4), bbox, workers=0, tile_format="mvt")["tiles"] == 1
+    assert store.existing("heat", model_version, 4, "mvt") == {(11, 6)}
+    with pytest.raises(ValueError):
+        seed_tiles(store, ["wind"], (2, 2), bbox, workers=0)
+
+
+def test_tile_endpoint_serves_stored_tiles(store):
+    """Test the tile endpoint serves the stored tile of the current model version"""
+    model_version = tile_version(get_model_registry().scorer)
+    store.put("drought", model_version, 5, 22, 13, b"stored tile")
+    
+    stored = client.get("/api/v1/risk-map/tiles/drought/5/22/13.png")
+    rendered = client.get("/api/v1/risk-map/tiles/drought/5/22/14.png")
+    
+    assert stored.content == b"stored tile"
+    assert rendered.content.startswith(b"\x89PNG")
+    assert store.get("drought", model_version, 5, 22, 14) == rendered.content
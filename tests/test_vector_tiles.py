@@ -0,0 +1,141 @@
+"""
+Tests for risk map vector tiles
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.ml.ensemble import EnsembleScorer, RISK_LEVELS
+from app.ml.risk_grid import build_risk_grid
+from app.ml.vector_tiles import (
+    MVT_EXTENT,
+    MVT_MEDIA_TYPE,
+    polygonize,
+    render_vector_tile,
+    risk_classes,
+    sample_size,
+)
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def grid_scorer(tmp_path_factory):
+    """Scorer on a small coarse grid around northern India"""
+    output_dir = tmp_path_factory.mktemp("risk_grid")
+    lookup = build_risk_grid(str(output_dir), resolution=0.25, bounds=(20.0, 32.0, 70.0, 80.0))
+    return EnsembleScorer(grid_lookup=lookup)
+
+
+def _varint(data: bytes, offset: int):
+    """(value, next offset) of the protobuf varint at offset"""
+    value, shift = 0, 0
+    while True:
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        offset, shift = offset + 1, shift + 7
+        if byte < 0x80:
+            return value, offset
+
+
+def _packed(data: bytes):
+    """Values of a packed repeated varint field"""
+    values, offset = [], 0
+    while offset < len(data):
+        value, offset = _varint(data, offset)
+        values.append(value)
+    return values
+
+
+def _fields(data: bytes):
+    """(field number, value) of a protobuf message (varints and length-delimited only)"""
+    offset, fields = 0, []
+    while offset < len(data):
+        key, offset = _varint(data, offset)
+        if key & 7 == 0:
+            value, offset = _varint(data, offset)
+        else:
+            assert key & 7 == 2
+            length, offset = _varint(data, offset)
+            value, offset = data[offset:offset + length], offset + length
+        fields.append((key >> 3, value))
+    return fields
+
+
+def _decode_layer(tile: bytes):
+    """(layer fields, [(properties, geometry commands)]) of a single-layer tile"""
+    (field, layer), = _fields(tile)
+    assert field == 3
+    fields = _fields(layer)
+    keys = [value.decode() for field, value in fields if field == 3]
+    values = []
+    for field, value in fields:
+        if field == 4:
+            (kind, raw), = _fields(value)
+            values.append(raw.decode() if kind == 1 else (raw >> 1) ^ -(raw & 1))
+    features = []
+    for field, feature in fields:
+        if field == 2:
+            parts = dict(_fields(feature))
+            tags = _packed(parts[2])
+            properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            assert parts[3] == 3
+            features.append((properties, _packed(parts[4])))
+    return dict(fields), features
+
+
+def test_polygonize_areas_and_holes():
+    """Test polygons cover the mask exactly, with holes and diagonal touches"""
+    mask = np.zeros((12, 12), dtype=bool)
+    mask[1:11, 1:11] = True
+    mask[3:9, 3:9] = False
+    mask[5:7, 5:7] = True
+    mask[0, 0] = True
+    
+    area = polygonize(mask)
+    assert area.is_valid
+    assert area.area == mask.sum()
+    assert len(area.geoms) == 3
+    assert sorted(len(polygon.interiors) for polygon in area.geoms) == [0, 0, 1]
+    
+    checkerboard = np.indices((6, 6)).sum(axis=0) % 2 == 0
+    squares = polygonize(checkerboard)
+    assert squares.is_valid and squares.area == checkerboard.sum()
+    assert polygonize(np.zeros((4, 4), dtype=bool)).is_empty
+
+
+def test_risk_classes_and_sample_size(grid_scorer):
+    """Test scores classify into risk levels and sampling follows the grid"""
+    classes = risk_classes(np.array([0.0, 24.9, 25.0, 60.0, 99.0, np.nan]))
+    assert classes.tolist() == [0, 0, 1, 2, 3, 255]
+    assert sample_size(grid_scorer, 0) == 256
+    assert sample_size(grid_scorer, 12) == 16
+
+
+def test_render_vector_tile(grid_scorer):
+    """Test tiles decode as one layer of risk level polygons in tile extent"""
+    layer, features = _decode_layer(render_vector_tile(grid_scorer, 'heat', 6, 45, 27))
+    assert layer[1] == b"heat"
+    assert layer[15] == 2 and layer[5] == MVT_EXTENT
+    assert features
+    for properties, commands in features:
+        assert properties['risk_level'] == RISK_LEVELS[properties['risk_class']]
+        assert commands[0] == 9 and commands[-1] == 15
+    
+    assert render_vector_tile(grid_scorer, 'heat', 6, 0, 0) == b""
+    with pytest.raises(ValueError):
+        render_vector_tile(grid_scorer, 'wind', 1, 0, 0)
+
+
+def test_vector_tile_endpoint(monkeypatch):
+    """Test vector tiles are served with the MVT media type"""
+    monkeypatch.setattr(settings, "RISK_TILE_STORE_ENABLED", False)
+    response = client.get("/api/v1/risk-map/tiles/flood/6/45/27.mvt")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MVT_MEDIA_TYPE
+    layer, features = _decode_layer(response.content)
+    assert layer[1] == b"flood" and features
+    assert client.get("/api/v1/risk-map/tiles/flood/2/4/0.mvt").status_code == 404